@@ -0,0 +1,113 @@
+r"""
+Compares a benchmark result file against a stored baseline, and flags regressions.
+
+Usage (from integration-test/):
+```bash
+python3 -m tests.benchmarks.compare benchmark-results/latest.json benchmark-baseline.json
+# Or, to replace the baseline with the results:
+python3 -m tests.benchmarks.compare benchmark-results/latest.json benchmark-baseline.json --update
+```
+
+Exits with 1 if anything regressed. Timings are noisy, so a benchmark only counts as slower if it's slower by both a
+relative and an absolute margin. Request counts are close to deterministic, so they get a much tighter margin.
+"""
+import argparse
+from dataclasses import dataclass
+import json
+import shutil
+import sys
+
+
+@dataclass
+class Regression:
+    name: str
+    metric: str
+    baseline: float
+    current: float
+
+    def __str__(self):
+        change = (self.current - self.baseline) / self.baseline * 100 if self.baseline > 0 else float("inf")
+        return f"{self.name}: {self.metric} went from {self.baseline:g} to {self.current:g} ({change:+.1f}%)"
+
+
+def result_key(result: dict) -> str:
+    return f"{result['name']}@{result['files']}"
+
+
+def total_requests(result: dict) -> int | None:
+    report = result.get("report")
+    if report is None:
+        return None
+    return sum(report["requests"].values())
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    time_threshold: float = 0.2,
+    min_seconds: float = 0.5,
+    request_threshold: float = 0.05,
+) -> tuple[list[Regression], list[str]]:
+    r"""
+    \returns    (regressions, benchmarks that are in the baseline but missing from the results)
+    """
+    previous = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = result_key(result)
+        old = previous.pop(key, None)
+        if old is None:
+            continue
+        if result["seconds"] > old["seconds"] * (1 + time_threshold) \
+                and result["seconds"] - old["seconds"] > min_seconds:
+            regressions.append(Regression(key, "seconds", old["seconds"], result["seconds"]))
+        old_requests = total_requests(old)
+        new_requests = total_requests(result)
+        if old_requests is not None and new_requests is not None \
+                and new_requests > old_requests * (1 + request_threshold):
+            regressions.append(Regression(key, "requests", old_requests, new_requests))
+    return regressions, sorted(previous.keys())
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Compares benchmark results against a baseline")
+    parser.add_argument("results", help="The result file written by the benchmarks")
+    parser.add_argument("baseline", help="The baseline to compare against")
+    parser.add_argument("--update", action="store_true", help="Replace the baseline with the results")
+    parser.add_argument("--time-threshold", type=float, default=0.2,
+                        help="Relative slowdown that counts as a regression (default: 0.2)")
+    parser.add_argument("--min-seconds", type=float, default=0.5,
+                        help="Absolute slowdown that counts as a regression (default: 0.5)")
+    parser.add_argument("--request-threshold", type=float, default=0.05,
+                        help="Relative increase in requests that counts as a regression (default: 0.05)")
+    args = parser.parse_args(argv)
+
+    if args.update:
+        shutil.copyfile(args.results, args.baseline)
+        print(f"Baseline updated from {args.results}")
+        return 0
+
+    with open(args.results) as f:
+        current = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions, missing = compare(
+        baseline,
+        current,
+        args.time_threshold,
+        args.min_seconds,
+        args.request_threshold
+    )
+    for name in missing:
+        print(f"{name}: not in the results; skipped")
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    if len(regressions) == 0:
+        print(f"No regressions in {len(current['results'])} benchmarks")
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,77 @@
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import shutil
+import subprocess
+
+import pytest
+
+from tests.benchmarks.vault_gen import VaultSpec, generate_vault
+from tests.constants import BENCHMARK_RESULTS_DIR
+from tests.utils import install_plugin
+
+BASE_VAULT = "./test-vaults/trans-rights-are-human-rights/"
+
+
+@pytest.fixture
+def vault(request: pytest.FixtureRequest):
+    """
+    Replaces the standard vault fixture with a generated vault. The VaultSpec is passed through indirect
+    parametrisation; without one, the vault only contains the config folder (with the plugin installed).
+
+    The config folder is taken from the standard test vault, so the plugin is enabled the same way.
+    """
+    spec: VaultSpec | None = getattr(request, "param", None)
+    test_vault = os.path.join(os.getcwd(), "test_vault") \
+        .replace("\\", "/")
+    if os.path.exists(test_vault):
+        shutil.rmtree(test_vault)
+    shutil.copytree(
+        os.path.join(BASE_VAULT, ".obsidian"),
+        os.path.join(test_vault, ".obsidian")
+    )
+    if spec is not None:
+        generate_vault(test_vault, spec)
+    install_plugin(test_vault, "../dist/livi-webdav-sync")
+    yield test_vault
+
+    shutil.rmtree(test_vault)
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+@pytest.fixture(scope="session")
+def benchmark_results():
+    """
+    Collects the results from all the benchmarks in the session, and writes them to
+    benchmark-results/<timestamp>.json, as well as benchmark-results/latest.json, once the session is done. See
+    compare.py for comparing the results against a baseline.
+    """
+    results: list[dict] = []
+    yield results
+
+    if len(results) == 0:
+        return
+    os.makedirs(BENCHMARK_RESULTS_DIR, exist_ok=True)
+    now = datetime.now(timezone.utc)
+    out = {
+        "meta": {
+            "date": now.isoformat(),
+            "commit": _commit(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    for name in [now.strftime("%Y%m%dT%H%M%SZ") + ".json", "latest.json"]:
+        with open(os.path.join(BENCHMARK_RESULTS_DIR, name), "w") as f:
+            json.dump(out, f, indent=4)
@@ -0,0 +1,218 @@
+r"""
+End-to-end sync benchmarks against copyparty, using generated vaults.
+
+These are skipped unless WEBDAV_BENCHMARK=1 is set, as the larger vaults take a long time to generate and sync. The
+sizes can be overridden with WEBDAV_BENCHMARK_SIZES, for example `WEBDAV_BENCHMARK_SIZES=1000,10000`.
+
+The shaped benchmarks run through the shaping proxy instead, with the link profiles in WEBDAV_BENCHMARK_PROFILES
+(`lte,transatlantic` by default) and the sizes in WEBDAV_BENCHMARK_SHAPED_SIZES (`1000` by default).
+"""
+import json
+import os
+import re
+import shutil
+from time import monotonic, sleep
+
+import pytest
+from selenium.webdriver import Chrome
+
+from tests.benchmarks.vault_gen import VaultSpec, generate_vault, mutate_vault
+from tests.constants import BENCHMARK_PROFILES, BENCHMARK_SHAPED_SIZES, BENCHMARK_SIZES, BENCHMARKS_ENABLED
+from tests.copyparty import Copyparty
+from tests.shaping_proxy import PROFILES, ShapingProxy
+from tests.utils import close_notices, default_settings, execute, get_notice_messages, inject_settings
+
+pytestmark = pytest.mark.skipif(
+    not BENCHMARKS_ENABLED,
+    reason="Benchmarks only run with WEBDAV_BENCHMARK=1"
+)
+
+PLUGIN = 'app.plugins.plugins["livi-webdav-sync"]'
+
+
+def spec_for(files: int) -> VaultSpec:
+    # Keeps the number of files per folder in a realistic range as the vault grows
+    return VaultSpec(
+        files=files,
+        depth=3 if files <= 10000 else 4,
+    )
+
+
+def timeout_for(files: int) -> float:
+    return 60 + files * 0.05
+
+
+def evaluate(driver: Chrome, script: str):
+    return json.loads(execute(driver, script)["result"]["value"])
+
+
+def list_notes(path: str) -> list[str]:
+    out = []
+    for root, dirs, files in os.walk(path):
+        if ".obsidian" in dirs:
+            dirs.remove(".obsidian")
+        for file in files:
+            out.append(
+                os.path.relpath(os.path.join(root, file), path).replace("\\", "/")
+            )
+    return out
+
+
+def wait_for_vault(driver: Chrome, files: int, timeout: float):
+    """
+    Waits for obsidian to index at least `files` files. Local listings use obsidian's index where possible, so
+    timing a sync before obsidian is done loading the vault measures the wrong thing.
+    """
+    deadline = monotonic() + timeout
+    while evaluate(driver, "JSON.stringify(app.vault.getFiles().length)") < files:
+        if monotonic() > deadline:
+            pytest.fail(f"Obsidian didn't index {files} files in time")
+        sleep(0.5)
+
+
+def run_action(driver: Chrome, action: str, timeout: float) -> tuple[float, dict | None]:
+    r"""
+    Runs one of the plugin's sync actions (uploadAction, downloadAction, syncAction), and waits for it to finish.
+
+    \returns    (the time the action took in seconds, measured in obsidian, the plugin's report for the sync)
+    """
+    close_notices(driver)
+    execute(driver, """
+        window.webdavBenchmark = { done: false, error: null, seconds: null };
+        (() => {
+            const start = performance.now();
+            %s.%s(false)
+                .then(() => { window.webdavBenchmark.seconds = (performance.now() - start) / 1000; })
+                .catch((ex) => { window.webdavBenchmark.error = String(ex); })
+                .finally(() => { window.webdavBenchmark.done = true; });
+        })();
+        0
+        """ % (PLUGIN, action)
+    )
+    deadline = monotonic() + timeout
+    while True:
+        state = evaluate(driver, "JSON.stringify(window.webdavBenchmark)")
+        if state["done"]:
+            break
+        if monotonic() > deadline:
+            pytest.fail(f"{action} didn't finish within {timeout} seconds")
+        sleep(0.25)
+    assert state["error"] is None, state["error"]
+
+    for notice in get_notice_messages(driver):
+        errors = re.search(r"\((\d+) errors\)", notice)
+        assert errors is None or errors.group(1) == "0", notice
+
+    return state["seconds"], evaluate(driver, f"JSON.stringify({PLUGIN}.syncReports.last())")
+
+
+def record(
+    results: list[dict],
+    name: str,
+    files: int,
+    result: tuple[float, dict | None],
+    proxy: ShapingProxy | None = None
+):
+    seconds, report = result
+    results.append({
+        "name": name,
+        "files": files,
+        "seconds": seconds,
+        "report": report,
+        # What went over the shaped link during this action
+        **({} if proxy is None else { "link": vars(proxy.reset_stats()) }),
+    })
+    print(f"{name}@{files}: {seconds:.2f} s")
+
+
+@pytest.mark.parametrize(
+    "vault",
+    [pytest.param(spec_for(files), id=str(files)) for files in BENCHMARK_SIZES],
+    indirect=True
+)
+def test_benchmark_push(
+    obsidian: Chrome,
+    vault: str,
+    copyparty: Copyparty,
+    benchmark_results: list[dict]
+):
+    notes = list_notes(vault)
+    files = len(notes)
+    timeout = timeout_for(files)
+    inject_settings(obsidian)
+    wait_for_vault(obsidian, files, timeout)
+
+    record(benchmark_results, "push", files, run_action(obsidian, "uploadAction", timeout))
+    record(benchmark_results, "noop-push", files, run_action(obsidian, "uploadAction", timeout))
+
+    # 1% of the files change on each side
+    local = mutate_vault(vault, notes, 0.01, seed=1)
+    mutate_vault(copyparty.root_vault_path, notes, 0.01, seed=2, exclude=set(local))
+    # Give obsidian's file watcher time to pick up the local edits
+    sleep(2)
+    record(benchmark_results, "delta-sync", files, run_action(obsidian, "syncAction", timeout))
+
+
+@pytest.mark.parametrize("files", BENCHMARK_SIZES, ids=str)
+def test_benchmark_pull(
+    obsidian: Chrome,
+    vault: str,
+    copyparty: Copyparty,
+    benchmark_results: list[dict],
+    files: int
+):
+    timeout = timeout_for(files)
+    inject_settings(obsidian)
+    # Lets the settings be written to disk before the config folder is copied
+    sleep(1)
+    # The config folder has to exist on the server, or the pull would delete it locally
+    shutil.copytree(
+        os.path.join(vault, ".obsidian"),
+        os.path.join(copyparty.root_vault_path, ".obsidian"),
+        dirs_exist_ok=True
+    )
+    generate_vault(copyparty.root_vault_path, spec_for(files))
+
+    record(benchmark_results, "pull", files, run_action(obsidian, "downloadAction", timeout))
+    wait_for_vault(obsidian, files, timeout)
+    record(benchmark_results, "noop-pull", files, run_action(obsidian, "downloadAction", timeout))
+
+
+@pytest.mark.parametrize(
+    "vault",
+    [pytest.param(spec_for(files), id=str(files)) for files in BENCHMARK_SHAPED_SIZES],
+    indirect=True
+)
+@pytest.mark.parametrize(
+    "shaping_proxy",
+    [pytest.param(PROFILES[name], id=name) for name in BENCHMARK_PROFILES],
+    indirect=True
+)
+def test_benchmark_shaped(
+    obsidian: Chrome,
+    vault: str,
+    shaping_proxy: ShapingProxy,
+    benchmark_results: list[dict]
+):
+    notes = list_notes(vault)
+    files = len(notes)
+    # Stalls and retries make these far less predictable than the local runs
+    timeout = timeout_for(files) * 10
+    inject_settings(obsidian, default_settings(url=shaping_proxy.url))
+    wait_for_vault(obsidian, files, timeout)
+    shaping_proxy.reset_stats()
+    profile = shaping_proxy.profile.name
+
+    record(benchmark_results, f"push[{profile}]", files, run_action(obsidian, "uploadAction", timeout), shaping_proxy)
+    record(
+        benchmark_results,
+        f"noop-push[{profile}]",
+        files,
+        run_action(obsidian, "uploadAction", timeout),
+        shaping_proxy
+    )
+    # Removing the local copies turns the next sync into a full download over the shaped link
+    for note in notes:
+        os.remove(os.path.join(vault, note))
+    sleep(2)
+    record(benchmark_results, f"pull[{profile}]", files, run_action(obsidian, "downloadAction", timeout), shaping_proxy)
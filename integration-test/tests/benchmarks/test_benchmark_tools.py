@@ -0,0 +1,77 @@
+import json
+import os
+
+from tests.benchmarks.compare import compare, main
+from tests.benchmarks.vault_gen import VaultSpec, generate_vault, mutate_vault
+
+
+def test_generator_is_deterministic(tmp_path):
+    spec = VaultSpec(files=200, depth=2, fanout=3, binary_fraction=0.2)
+    first = generate_vault(str(tmp_path / "a"), spec)
+    second = generate_vault(str(tmp_path / "b"), spec)
+    assert first == second
+    assert len(first) == 200
+    for file in first:
+        with open(tmp_path / "a" / file, "rb") as a, open(tmp_path / "b" / file, "rb") as b:
+            assert a.read() == b.read()
+    # Nothing deeper than the requested depth
+    assert max(file.count("/") for file in first) <= 2
+    binary = [file for file in first if not file.endswith(".md")]
+    assert 10 < len(binary) < 80
+
+
+def test_generator_respects_sizes(tmp_path):
+    spec = VaultSpec(files=50, sizes=[(1000, 1)], binary_fraction=0)
+    for file in generate_vault(str(tmp_path), spec):
+        assert 750 <= os.path.getsize(tmp_path / file) <= 1250
+
+
+def test_mutations_dont_overlap(tmp_path):
+    files = generate_vault(str(tmp_path), VaultSpec(files=100, sizes=[(100, 1)]))
+    local = mutate_vault(str(tmp_path), files, 0.5, seed=1)
+    remote = mutate_vault(str(tmp_path), files, 0.5, seed=2, exclude=set(local))
+    assert len(local) == 50
+    assert len(remote) == 50
+    assert set(local).isdisjoint(remote)
+
+
+def result(name: str, seconds: float, requests: int | None = None):
+    return {
+        "name": name,
+        "files": 1000,
+        "seconds": seconds,
+        "report": None if requests is None else { "requests": { "PROPFIND": 1, "PUT": requests - 1 } },
+    }
+
+
+def test_compare_flags_regressions():
+    baseline = { "results": [
+        result("push", 10, 1001),
+        result("noop-push", 1, 1),
+        result("pull", 0.1),
+        result("delta-sync", 5),
+    ] }
+    current = { "results": [
+        # Slower, and more requests
+        result("push", 13, 1100),
+        # Much slower in relative terms, but within the noise in absolute terms
+        result("noop-push", 1.4, 1),
+        result("pull", 0.1),
+    ] }
+    regressions, missing = compare(baseline, current)
+    assert [(r.name, r.metric) for r in regressions] == [
+        ("push@1000", "seconds"),
+        ("push@1000", "requests"),
+    ]
+    assert missing == ["delta-sync@1000"]
+
+
+def test_compare_exit_code(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    results = tmp_path / "results.json"
+    results.write_text(json.dumps({ "results": [result("push", 10)] }))
+
+    assert main([str(results), str(baseline), "--update"]) == 0
+    assert main([str(results), str(baseline)]) == 0
+    results.write_text(json.dumps({ "results": [result("push", 20)] }))
+    assert main([str(results), str(baseline)]) == 1
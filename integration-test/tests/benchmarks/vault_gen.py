@@ -0,0 +1,119 @@
+r"""
+Synthetic vault generator for the benchmarks.
+
+The generated vaults are deterministic for a given seed, so two benchmark runs with the same parameters sync the exact
+same tree, and results can be compared between runs.
+"""
+from dataclasses import dataclass, field
+import os
+import random
+
+WORDS = [
+    "trans", "rights", "are", "human", "rights", "the", "sync", "plugin", "vault", "note", "meow", "mrrp", "awoo",
+    "server", "folder", "file", "change", "conflict", "today", "tomorrow", "link", "tag", "idea", "draft",
+]
+
+BINARY_EXTENSIONS = [".png", ".pdf", ".bin"]
+
+
+@dataclass
+class VaultSpec:
+    r"""
+    Describes the vault to generate.
+
+    \param files            The number of files to generate, excluding the config folder
+    \param depth            The maximum folder depth. Files are spread over folders up to this deep
+    \param fanout           The number of subfolders per folder
+    \param sizes            (size in bytes, weight) pairs. Each file picks a size from these, and jitters it by up
+                            to 25%
+    \param binary_fraction  The fraction of files that get random binary content rather than markdown
+    \param seed             Seed for the random generator
+    """
+    files: int = 1000
+    depth: int = 3
+    fanout: int = 8
+    sizes: list[tuple[int, int]] = field(default_factory=lambda: [
+        (512, 60),
+        (4 * 1024, 30),
+        (64 * 1024, 9),
+        (2 * 1024 * 1024, 1),
+    ])
+    binary_fraction: float = 0.05
+    seed: int = 69420
+
+
+def _folders(spec: VaultSpec) -> list[str]:
+    folders = [""]
+    level = [""]
+    for _ in range(spec.depth):
+        level = [
+            os.path.join(parent, f"folder {i}")
+            for parent in level
+            for i in range(spec.fanout)
+        ]
+        folders.extend(level)
+    return folders
+
+
+def _text(rng: random.Random, size: int) -> bytes:
+    out = []
+    length = 0
+    while length < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(12)) + "\n"
+        out.append(line)
+        length += len(line)
+    return "".join(out).encode("utf-8")[:size]
+
+
+def _pick_size(rng: random.Random, spec: VaultSpec) -> int:
+    sizes = [size for size, _ in spec.sizes]
+    weights = [weight for _, weight in spec.sizes]
+    size = rng.choices(sizes, weights)[0]
+    return max(1, int(size * rng.uniform(0.75, 1.25)))
+
+
+def generate_vault(path: str, spec: VaultSpec) -> list[str]:
+    """
+    Generates the files described by `spec` into `path`. Existing files are left alone, so this can be pointed at a
+    vault that already has a config folder.
+
+    Returns the generated paths, relative to `path`, with / as the separator.
+    """
+    rng = random.Random(spec.seed)
+    folders = _folders(spec)
+    files = []
+    for i in range(spec.files):
+        folder = rng.choice(folders)
+        binary = rng.random() < spec.binary_fraction
+        name = f"note {i}" + (rng.choice(BINARY_EXTENSIONS) if binary else ".md")
+        size = _pick_size(rng, spec)
+        relative = os.path.join(folder, name)
+        full = os.path.join(path, relative)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "wb") as f:
+            f.write(rng.randbytes(size) if binary else _text(rng, size))
+        files.append(relative.replace("\\", "/"))
+    return files
+
+
+def mutate_vault(
+    path: str,
+    files: list[str],
+    fraction: float,
+    seed: int,
+    exclude: set[str] = set()
+) -> list[str]:
+    """
+    Appends a line to a random `fraction` of `files`, to simulate a small set of edits. Returns the edited paths.
+
+    When editing both the local and remote copies, pass the local edits as `exclude` for the remote ones, so the edits
+    don't overlap and turn into conflicts.
+    """
+    rng = random.Random(seed)
+    candidates = [file for file in files if file not in exclude]
+    count = min(len(candidates), max(1, int(len(files) * fraction)))
+    edited = rng.sample(candidates, count)
+    for relative in edited:
+        with open(os.path.join(path, relative), "ab") as f:
+            f.write(f"\nEdited by the benchmark ({seed})\n".encode("utf-8"))
+    return edited
@@ -7,6 +7,7 @@ import shutil
 import subprocess
 from time import sleep
 import platform
+from urllib.parse import urlparse
 import random
 from tests.helpers import driver as DriverUtil
 
@@ -19,7 +20,10 @@ from selenium.webdriver.support.wait import WebDriverWait
 
 from tests.constants import SCREENSHOT_DIR
 from tests.copyparty import Copyparty
-from tests.utils import close_notices, delay_for_windows_bullshit, execute
+from tests.dav_server import DavServer, InstrumentedCopyparty
+from tests.shaping_proxy import LinkProfile, ShapingProxy
+from tests.utils import close_notices, delay_for_windows_bullshit, execute, \
+    install_plugin
 
 @pytest.fixture
 def vault():
@@ -35,7 +39,7 @@ def vault():
         "./test-vaults/trans-rights-are-human-rights/",
         test_vault
     )
-    _install_plugin(test_vault, "../dist/livi-webdav-sync")
+    install_plugin(test_vault, "../dist/livi-webdav-sync")
     yield test_vault
 
     shutil.rmtree(test_vault)
@@ -132,6 +136,56 @@ def copyparty():
                   + "that a now dead process still holds the file. "
                   + "(have you considered using a real OS instead?)")
 
+@pytest.fixture
+def dav_server():
+    """
+    Instrumented stand-in for copyparty (see dav_server.py), which records every request it gets. It has the same
+    interface as the copyparty fixture, plus the request log in `.log`.
+
+    To run a test module against it rather than copyparty, override the copyparty fixture in the module, which also
+    makes fixtures like preloaded_vault use it:
+    ```python3
+    @pytest.fixture
+    def copyparty(dav_server):
+        return dav_server
+    ```
+    """
+    DATA_DIR = "./dav-server/"
+    BASE_URL = "http://localhost:62169"
+    if os.path.exists(DATA_DIR):
+        shutil.rmtree(DATA_DIR)
+    server = DavServer(DATA_DIR)
+    server.start()
+    try:
+        yield InstrumentedCopyparty(
+            BASE_URL,
+            DATA_DIR,
+            server
+        )
+    finally:
+        server.stop()
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+@pytest.fixture
+def shaping_proxy(request: pytest.FixtureRequest, copyparty: Copyparty):
+    """
+    Proxy in front of the copyparty fixture that simulates a slow and unreliable network (see shaping_proxy.py).
+    It doesn't do anything by default; pass a LinkProfile through indirect parametrisation to configure it:
+    ```python3
+    @pytest.mark.parametrize("shaping_proxy", [PROFILES["lte"]], indirect=True)
+    def test_thing(obsidian, shaping_proxy):
+        inject_settings(obsidian, default_settings(url=shaping_proxy.url))
+    ```
+    """
+    profile: LinkProfile = getattr(request, "param", LinkProfile())
+    upstream = urlparse(copyparty.baseUrl)
+    proxy = ShapingProxy(upstream.hostname or "localhost", upstream.port or 80, 62172, profile)
+    proxy.start()
+    try:
+        yield proxy
+    finally:
+        proxy.stop()
+
 @pytest.fixture
 def preloaded_vault(vault: str, copyparty: Copyparty):
     """
@@ -160,26 +214,6 @@ def preloaded_vault(vault: str, copyparty: Copyparty):
         dirs_exist_ok=True
     )
 
-def _install_plugin(vault_path: str, plugin_dist_path: str):
-    if not os.path.exists(plugin_dist_path):
-        raise RuntimeError(
-            "Developer error: <git root>/dist/livi-webdav-sync doesn't exist"
-        )
-    shutil.copytree(
-        plugin_dist_path,
-        # The three hardest problems in software:
-        # * Naming things
-        # * Cache invalidation
-        # * Telling whether directory operations are inclusive or exclusive of
-        #   the specified target directory
-        os.path.join(
-            vault_path,
-            ".obsidian",
-            "plugins",
-            "livi-webdav-sync"
-        ),
-    )
-
 def _load_vault(driver: Chrome, vault_path: str):
     # Forcibly mock the file dialogs
     # You have no power here, electron >:3
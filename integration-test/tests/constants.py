@@ -1,3 +1,5 @@
+import os
+
 SCREENSHOT_DIR = "_screenshots"
 
 NOTICE_CLASS = "notice"
@@ -5,3 +7,17 @@ NOTICE_CLASS = "notice"
 # Plugin-specific identifiers
 UPLOAD_BUTTON_ID = "livi-webdav-sync-up"
 DOWNLOAD_BUTTON_ID = "livi-webdav-sync-down"
+
+# Benchmarks (see tests/benchmarks). They take a long time, so they're opt-in
+BENCHMARKS_ENABLED = os.environ.get("WEBDAV_BENCHMARK") == "1"
+BENCHMARK_SIZES = [
+    int(size)
+    for size in os.environ.get("WEBDAV_BENCHMARK_SIZES", "1000,10000,100000").split(",")
+]
+BENCHMARK_RESULTS_DIR = "./benchmark-results"
+# Benchmarks over a shaped link (see tests/shaping_proxy.py). These are far slower, so they use smaller vaults
+BENCHMARK_PROFILES = os.environ.get("WEBDAV_BENCHMARK_PROFILES", "lte,transatlantic").split(",")
+BENCHMARK_SHAPED_SIZES = [
+    int(size)
+    for size in os.environ.get("WEBDAV_BENCHMARK_SHAPED_SIZES", "1000").split(",")
+]
@@ -0,0 +1,421 @@
+r"""
+Minimal, instrumented WebDAV server that can stand in for copyparty.
+
+It only implements what the plugin uses (PROPFIND, GET with ranges, PUT, DELETE, MKCOL, MOVE, COPY, and OPTIONS),
+but it records every request it gets. That lets tests assert on how many round-trips a sync takes, and not just on
+what ends up on disk; see test_request_budget.py.
+
+The shares and accounts mirror copyparty.conf, so tests can use either server with the same settings.
+"""
+from dataclasses import dataclass, field
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import base64
+import os
+import shutil
+import threading
+from urllib.parse import quote, unquote, urlparse
+from xml.sax.saxutils import escape
+
+from tests.copyparty import Copyparty
+
+ACCOUNTS = {
+    "full": "password",
+    "limited": "password2",
+}
+# Folders each account can access, including everything below them
+PERMISSIONS = {
+    "full": ["/vault"],
+    "limited": ["/vault/subfolder"],
+}
+
+
+@dataclass
+class DavRequest:
+    method: str
+    path: str
+    # None if the request didn't have a Depth header
+    depth: str | None
+    bytes_in: int
+    bytes_out: int
+    status: int
+    # CORS preflights are sent by the browser rather than the plugin, so they're normally left out of the counts
+    preflight: bool = False
+
+
+class RequestLog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests: list[DavRequest] = []
+
+    def add(self, request: DavRequest):
+        with self.lock:
+            self.requests.append(request)
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+
+    def filter(
+        self,
+        method: str | None = None,
+        path: str | None = None,
+        depth: str | None = None,
+        preflight: bool = False
+    ) -> list[DavRequest]:
+        r"""
+        \param path Only count requests for this path, or anything below it
+        """
+        with self.lock:
+            return [
+                request for request in self.requests
+                if request.preflight == preflight
+                    and (method is None or request.method == method)
+                    and (depth is None or request.depth == depth)
+                    and (path is None or request.path == path or request.path.startswith(path.rstrip("/") + "/"))
+            ]
+
+    def count(self, method: str | None = None, path: str | None = None, depth: str | None = None) -> int:
+        return len(self.filter(method, path, depth))
+
+    def bytes_in(self) -> int:
+        return sum(request.bytes_in for request in self.filter())
+
+    def bytes_out(self) -> int:
+        return sum(request.bytes_out for request in self.filter())
+
+    def summary(self) -> dict[str, int]:
+        """
+        Request counts by method. Useful as an assertion message.
+        """
+        out: dict[str, int] = {}
+        for request in self.filter():
+            out[request.method] = out.get(request.method, 0) + 1
+        return out
+
+
+def _etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _propstat(href: str, path: str) -> str:
+    stat = os.stat(path)
+    props = [
+        f"<d:displayname>{escape(os.path.basename(path.rstrip('/')))}</d:displayname>",
+        f"<d:getlastmodified>{formatdate(stat.st_mtime, usegmt=True)}</d:getlastmodified>",
+    ]
+    if os.path.isdir(path):
+        # No ETags for collections, as they don't change when something deeper in the tree changes. The plugin
+        # falls back to regular listings when they're missing.
+        props.append("<d:resourcetype><d:collection/></d:resourcetype>")
+    else:
+        props.extend([
+            "<d:resourcetype/>",
+            f"<d:getcontentlength>{stat.st_size}</d:getcontentlength>",
+            "<d:getcontenttype>application/octet-stream</d:getcontenttype>",
+            f"<d:getetag>{escape(_etag(stat))}</d:getetag>",
+        ])
+    return (
+        f"<d:response><d:href>{escape(href)}</d:href><d:propstat><d:prop>{''.join(props)}</d:prop>"
+        "<d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, like a real server
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _path(self, url: str | None = None) -> str:
+        path = unquote(urlparse(url if url is not None else self.path).path)
+        path = "/" + "/".join(part for part in path.split("/") if part not in ("", ".", ".."))
+        return path
+
+    def _fs_path(self, path: str) -> str:
+        return os.path.join(self.server.root, path.lstrip("/"))
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length > 0 else b""
+        self._bytes_in = len(body)
+        return body
+
+    def _send(self, status: int, body: bytes = b"", headers: dict[str, str] = {}, head: bool = False):
+        # Logged before responding, so the request is in the log by the time the client sees the response
+        self._logged = True
+        self.server.log.add(DavRequest(
+            self._method,
+            self._request_path,
+            self.headers.get("Depth"),
+            self._bytes_in,
+            0 if head else len(body),
+            status,
+            self._preflight_request,
+        ))
+        self.send_response(status)
+        origin = self.headers.get("Origin")
+        if origin is not None:
+            self.send_header("Access-Control-Allow-Origin", origin)
+            self.send_header("Access-Control-Allow-Credentials", "true")
+            self.send_header("Access-Control-Expose-Headers", "DAV, ETag, Content-Range, Content-Length, Accept-Ranges")
+            self.send_header("Vary", "Origin")
+        self.send_header("Timing-Allow-Origin", "*")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head and len(body) > 0:
+            self.wfile.write(body)
+
+    def _handle(self, method: str):
+        self._method = method
+        self._request_path = self._path()
+        self._preflight_request = method == "OPTIONS" and "Access-Control-Request-Method" in self.headers
+        self._bytes_in = 0
+        self._logged = False
+        try:
+            if self._preflight_request:
+                self._preflight()
+            elif self._authorise(self._request_path):
+                getattr(self, "_do_" + method)(self._request_path)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception:
+            if not self._logged:
+                self._send(500)
+            raise
+
+    def _authorise(self, path: str) -> bool:
+        header = self.headers.get("Authorization") or ""
+        user = None
+        if header.startswith("Basic "):
+            try:
+                username, password = base64.b64decode(header[6:]).decode("utf-8").split(":", 1)
+            except ValueError:
+                username, password = "", ""
+            if ACCOUNTS.get(username) == password:
+                user = username
+        if user is None:
+            self._read_body()
+            self._send(401, headers={"WWW-Authenticate": 'Basic realm="dav"'})
+            return False
+        self._user = user
+        if self.command == "OPTIONS" or self._allowed(path):
+            return True
+        self._read_body()
+        self._send(403)
+        return False
+
+    def _allowed(self, path: str) -> bool:
+        return any(
+            path == prefix or path.startswith(prefix + "/") for prefix in PERMISSIONS[self._user]
+        )
+
+    def _preflight(self):
+        self._send(204, headers={
+            "Access-Control-Allow-Methods": "GET, HEAD, PUT, DELETE, MKCOL, MOVE, COPY, PROPFIND, OPTIONS",
+            "Access-Control-Allow-Headers": self.headers.get("Access-Control-Request-Headers") or "*",
+            "Access-Control-Max-Age": "600",
+        })
+
+    def _do_OPTIONS(self, path: str):
+        self._read_body()
+        self._send(200, headers={
+            "DAV": "1",
+            "Allow": "OPTIONS, GET, HEAD, PUT, DELETE, MKCOL, MOVE, COPY, PROPFIND",
+        })
+
+    def _do_PROPFIND(self, path: str):
+        self._read_body()
+        fs_path = self._fs_path(path)
+        if not os.path.exists(fs_path):
+            self._send(404)
+            return
+        depth = (self.headers.get("Depth") or "infinity").lower()
+        responses = []
+
+        def href(path: str, folder: bool) -> str:
+            return quote(path.rstrip("/") + ("/" if folder else ""))
+
+        responses.append(_propstat(href(path, os.path.isdir(fs_path)), fs_path))
+        if os.path.isdir(fs_path) and depth != "0":
+            for root, dirs, files in os.walk(fs_path):
+                relative = os.path.relpath(root, fs_path).replace("\\", "/")
+                base = path.rstrip("/") + ("" if relative == "." else "/" + relative)
+                for name in sorted(dirs):
+                    responses.append(_propstat(href(f"{base}/{name}", True), os.path.join(root, name)))
+                for name in sorted(files):
+                    responses.append(_propstat(href(f"{base}/{name}", False), os.path.join(root, name)))
+                if depth == "1":
+                    break
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?><d:multistatus xmlns:d="DAV:">'
+            + "".join(responses)
+            + "</d:multistatus>"
+        ).encode("utf-8")
+        self._send(207, body, {"Content-Type": "application/xml; charset=utf-8"})
+
+    def _do_GET(self, path: str, head: bool = False):
+        self._read_body()
+        fs_path = self._fs_path(path)
+        if not os.path.isfile(fs_path):
+            self._send(404, head=head)
+            return
+        stat = os.stat(fs_path)
+        with open(fs_path, "rb") as f:
+            data = f.read()
+        headers = {
+            "ETag": _etag(stat),
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+            "Accept-Ranges": "bytes",
+        }
+        range_header = self.headers.get("Range")
+        if range_header is not None and range_header.startswith("bytes="):
+            start_str, _, end_str = range_header[6:].partition("-")
+            start = int(start_str) if start_str else max(0, len(data) - int(end_str))
+            end = min(int(end_str), len(data) - 1) if start_str and end_str else len(data) - 1
+            if start >= len(data):
+                self._send(416, headers={"Content-Range": f"bytes */{len(data)}"}, head=head)
+                return
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            self._send(206, data[start:end + 1], headers, head)
+            return
+        self._send(200, data, headers, head)
+
+    def _do_HEAD(self, path: str):
+        self._do_GET(path, True)
+
+    def _do_PUT(self, path: str):
+        body = self._read_body()
+        fs_path = self._fs_path(path)
+        if os.path.isdir(fs_path):
+            self._send(405)
+            return
+        existed = os.path.exists(fs_path)
+        # Like copyparty, missing parent folders are created
+        os.makedirs(os.path.dirname(fs_path), exist_ok=True)
+        with open(fs_path, "wb") as f:
+            f.write(body)
+        headers = {}
+        mtime = self.headers.get("X-OC-MTime")
+        if mtime is not None and mtime.lstrip("-").isdigit() and int(mtime) > 0:
+            os.utime(fs_path, (int(mtime), int(mtime)))
+            headers["X-OC-MTime"] = "accepted"
+        headers["ETag"] = _etag(os.stat(fs_path))
+        self._send(204 if existed else 201, headers=headers)
+
+    def _do_DELETE(self, path: str):
+        self._read_body()
+        fs_path = self._fs_path(path)
+        if os.path.isdir(fs_path):
+            shutil.rmtree(fs_path)
+        elif os.path.exists(fs_path):
+            os.remove(fs_path)
+        else:
+            self._send(404)
+            return
+        self._send(204)
+
+    def _do_MKCOL(self, path: str):
+        self._read_body()
+        fs_path = self._fs_path(path)
+        if os.path.exists(fs_path):
+            self._send(405)
+        elif not os.path.isdir(os.path.dirname(fs_path.rstrip("/"))):
+            self._send(409)
+        else:
+            os.mkdir(fs_path)
+            self._send(201)
+
+    def _transfer(self, path: str, copy: bool):
+        self._read_body()
+        source = self._fs_path(path)
+        destination_header = self.headers.get("Destination")
+        if destination_header is None:
+            self._send(400)
+            return
+        destination_path = self._path(destination_header)
+        if not self._allowed(destination_path):
+            self._send(403)
+            return
+        destination = self._fs_path(destination_path)
+        if not os.path.exists(source):
+            self._send(404)
+            return
+        existed = os.path.exists(destination)
+        if existed and (self.headers.get("Overwrite") or "T").upper() == "F":
+            self._send(412)
+            return
+        if not os.path.isdir(os.path.dirname(destination.rstrip("/"))):
+            self._send(409)
+            return
+        if existed:
+            if os.path.isdir(destination):
+                shutil.rmtree(destination)
+            else:
+                os.remove(destination)
+        if copy:
+            if os.path.isdir(source):
+                shutil.copytree(source, destination)
+            else:
+                shutil.copy2(source, destination)
+        else:
+            shutil.move(source, destination)
+        self._send(204 if existed else 201)
+
+    def _do_MOVE(self, path: str):
+        self._transfer(path, False)
+
+    def _do_COPY(self, path: str):
+        self._transfer(path, True)
+
+
+for _method in ["OPTIONS", "PROPFIND", "GET", "HEAD", "PUT", "DELETE", "MKCOL", "MOVE", "COPY"]:
+    setattr(_Handler, "do_" + _method, (lambda method: lambda self: self._handle(method))(_method))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    root: str
+    log: RequestLog
+
+
+class DavServer:
+    r"""
+    The server itself. Runs in a background thread until stopped.
+
+    \param root The folder to serve. The shares from copyparty.conf (/vault and /vault/subfolder) are created in it.
+    """
+    def __init__(self, root: str, port: int = 62169):
+        self.root = os.path.abspath(root)
+        self.log = RequestLog()
+        os.makedirs(os.path.join(self.root, "vault", "subfolder"), exist_ok=True)
+        self.httpd = _Server(("localhost", port), _Handler)
+        self.httpd.root = self.root
+        self.httpd.log = self.log
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+@dataclass
+class InstrumentedCopyparty(Copyparty):
+    """
+    Same interface as the copyparty fixture, with access to the request log.
+    """
+    server: DavServer | None = field(default=None)
+
+    @property
+    def log(self) -> RequestLog:
+        assert self.server is not None
+        return self.server.log
@@ -0,0 +1,290 @@
+r"""
+HTTP proxy that makes a local WebDAV server behave like it's on the other end of a real network link.
+
+The proxy adds latency and jitter to every request, caps the bandwidth in each direction, randomly stalls transfers,
+and randomly fails requests with a 503. Everything is simulated at the HTTP level, so the numbers are approximations:
+the latency is added once per request (on top of the connection setup, which stays local), and stalls hit chunks of
+`chunk_size` bytes rather than individual packets.
+
+Use it through the shaping_proxy fixture, and point the plugin at `proxy.url` rather than the server itself.
+"""
+from dataclasses import dataclass
+from http.client import HTTPConnection, HTTPException
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import threading
+from time import monotonic, sleep
+
+# Headers that only apply to a single connection, and must not be forwarded
+HOP_BY_HOP = [
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+]
+
+
+@dataclass
+class LinkProfile:
+    r"""
+    \param rtt                  Round-trip time added to each request, in seconds
+    \param jitter               Maximum random deviation from the RTT, in seconds
+    \param down                 Server to client bandwidth in bytes per second, or None for no cap
+    \param up                   Client to server bandwidth in bytes per second, or None for no cap
+    \param stall_probability    The probability that any one chunk of a transfer stalls
+    \param stall_duration       How long a stall lasts, in seconds
+    \param error_rate           The fraction of requests that fail with a 503 without reaching the server
+    """
+    name: str = "local"
+    rtt: float = 0
+    jitter: float = 0
+    down: float | None = None
+    up: float | None = None
+    stall_probability: float = 0
+    stall_duration: float = 0
+    error_rate: float = 0
+    chunk_size: int = 16 * 1024
+    seed: int = 69420
+
+
+MBIT = 1000 * 1000 / 8
+
+PROFILES = {
+    "lte": LinkProfile(
+        name="lte",
+        rtt=0.06,
+        jitter=0.02,
+        down=20 * MBIT,
+        up=5 * MBIT,
+        stall_probability=0.005,
+        stall_duration=1,
+        error_rate=0.01,
+    ),
+    "transatlantic": LinkProfile(
+        name="transatlantic",
+        rtt=0.09,
+        jitter=0.005,
+        down=100 * MBIT,
+        up=50 * MBIT,
+        error_rate=0.001,
+    ),
+    "flaky": LinkProfile(
+        name="flaky",
+        rtt=0.15,
+        jitter=0.1,
+        down=2 * MBIT,
+        up=1 * MBIT,
+        stall_probability=0.02,
+        stall_duration=3,
+        error_rate=0.05,
+    ),
+}
+
+
+class Throttle:
+    """
+    Caps the bandwidth of one direction of the link. It's shared between all connections, like a real link would be.
+    """
+    def __init__(self, rate: float | None):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.next_free = monotonic()
+
+    def consume(self, size: int):
+        if self.rate is None or size == 0:
+            return
+        with self.lock:
+            now = monotonic()
+            start = max(now, self.next_free)
+            self.next_free = start + size / self.rate
+            wait = self.next_free - now
+        sleep(wait)
+
+
+@dataclass
+class ProxyStats:
+    requests: int = 0
+    injected_errors: int = 0
+    stalls: int = 0
+    bytes_up: int = 0
+    bytes_down: int = 0
+
+
+class _Shaper:
+    def __init__(self, profile: LinkProfile):
+        self.profile = profile
+        self.rng = random.Random(profile.seed)
+        self.lock = threading.Lock()
+        self.up = Throttle(profile.up)
+        self.down = Throttle(profile.down)
+        self.stats = ProxyStats()
+
+    def random(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+    def one_way_delay(self):
+        """
+        Half a round trip, with jitter. Called once on the way to the server, and once on the way back.
+        """
+        delay = self.profile.rtt / 2 + (self.random() * 2 - 1) * self.profile.jitter / 2
+        if delay > 0:
+            sleep(delay)
+
+    def transfer(self, data: bytes, throttle: Throttle, write=None):
+        r"""
+        Sends `data` over the shaped link, chunk by chunk.
+
+        \param write    Called with each chunk once it's "arrived", or None if the data isn't streamed anywhere
+        """
+        size = self.profile.chunk_size
+        for start in range(0, len(data), size):
+            chunk = data[start:start + size]
+            throttle.consume(len(chunk))
+            if self.profile.stall_probability > 0 and self.random() < self.profile.stall_probability:
+                with self.lock:
+                    self.stats.stalls += 1
+                sleep(self.profile.stall_duration)
+            if write is not None:
+                write(chunk)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # One upstream connection per client connection, so keep-alive behaves the same way on both sides
+        self.upstream: HTTPConnection | None = None
+
+    def finish(self):
+        super().finish()
+        if self.upstream is not None:
+            self.upstream.close()
+
+    def _read_body(self) -> bytes:
+        if (self.headers.get("Transfer-Encoding") or "").lower() == "chunked":
+            out = b""
+            while True:
+                length = int(self.rfile.readline().strip().split(b";")[0], 16)
+                if length == 0:
+                    self.rfile.readline()
+                    return out
+                out += self.rfile.read(length)
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length > 0 else b""
+
+    def _forward(self, body: bytes, headers: dict[str, str]):
+        for attempt in range(2):
+            if self.upstream is None:
+                self.upstream = HTTPConnection(self.server.upstream_host, self.server.upstream_port)
+            try:
+                self.upstream.request(self.command, self.path, body=body, headers=headers)
+                response = self.upstream.getresponse()
+                return response, response.read()
+            except (HTTPException, ConnectionError):
+                # The server closed the kept-alive connection; reconnect once
+                self.upstream.close()
+                self.upstream = None
+                if attempt == 1:
+                    raise
+        raise AssertionError("unreachable")
+
+    def _handle(self):
+        shaper = self.server.shaper
+        body = self._read_body()
+        with shaper.lock:
+            shaper.stats.requests += 1
+            shaper.stats.bytes_up += len(body)
+        shaper.transfer(body, shaper.up)
+        shaper.one_way_delay()
+
+        # Preflights are left alone. The browser turns a failed preflight into a generic network error, which hides
+        # the 503 from the plugin.
+        preflight = self.command == "OPTIONS" and "Access-Control-Request-Method" in self.headers
+        if not preflight and shaper.profile.error_rate > 0 and shaper.random() < shaper.profile.error_rate:
+            with shaper.lock:
+                shaper.stats.injected_errors += 1
+            shaper.one_way_delay()
+            self.send_response_only(503, "Service Unavailable")
+            origin = self.headers.get("Origin")
+            if origin is not None:
+                self.send_header("Access-Control-Allow-Origin", origin)
+                self.send_header("Access-Control-Allow-Credentials", "true")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        headers = {
+            name: value for name, value in self.headers.items()
+            if name.lower() not in HOP_BY_HOP
+        }
+        response, data = self._forward(body, headers)
+        shaper.one_way_delay()
+
+        self.send_response_only(response.status, response.reason)
+        for name, value in response.getheaders():
+            if name.lower() not in HOP_BY_HOP and name.lower() != "content-length":
+                self.send_header(name, value)
+        if self.command == "HEAD":
+            self.send_header("Content-Length", response.getheader("Content-Length") or "0")
+            self.end_headers()
+            return
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        with shaper.lock:
+            shaper.stats.bytes_down += len(data)
+        shaper.transfer(data, shaper.down, self.wfile.write)
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_PATCH = do_DELETE = do_OPTIONS = _handle
+    do_PROPFIND = do_PROPPATCH = do_MKCOL = do_MOVE = do_COPY = do_LOCK = do_UNLOCK = _handle
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    upstream_host: str
+    upstream_port: int
+    shaper: _Shaper
+
+
+class ShapingProxy:
+    def __init__(self, upstream_host: str, upstream_port: int, port: int, profile: LinkProfile):
+        self.profile = profile
+        self.httpd = _Server(("localhost", port), _Handler)
+        self.httpd.upstream_host = upstream_host
+        self.httpd.upstream_port = upstream_port
+        self.httpd.shaper = _Shaper(profile)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.url = f"http://localhost:{port}"
+
+    @property
+    def stats(self) -> ProxyStats:
+        return self.httpd.shaper.stats
+
+    def reset_stats(self) -> ProxyStats:
+        r"""
+        \returns   the stats since the last reset
+        """
+        shaper = self.httpd.shaper
+        with shaper.lock:
+            stats = shaper.stats
+            shaper.stats = ProxyStats()
+        return stats
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
@@ -0,0 +1,94 @@
+import base64
+from http.client import HTTPConnection
+import os
+import shutil
+
+import pytest
+
+from tests.dav_server import DavServer
+
+PORT = 62170
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = DavServer(str(tmp_path), PORT)
+    server.start()
+    yield server
+    server.stop()
+
+
+def request(
+    method: str,
+    path: str,
+    body: bytes = b"",
+    headers: dict[str, str] = {},
+    user: str = "full:password"
+) -> tuple[int, bytes, dict[str, str]]:
+    conn = HTTPConnection("localhost", PORT)
+    all_headers = {
+        "Authorization": "Basic " + base64.b64encode(user.encode("utf-8")).decode("ascii"),
+        **headers,
+    }
+    conn.request(method, path, body=body, headers=all_headers)
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    return response.status, data, dict(response.getheaders())
+
+
+def test_basic_operations(server: DavServer):
+    status, _, headers = request("PUT", "/vault/a/b/note.md", b"meow", { "X-OC-MTime": "1700000000" })
+    assert status == 201
+    assert headers["X-OC-MTime"] == "accepted"
+    assert os.path.getmtime(os.path.join(server.root, "vault/a/b/note.md")) == 1700000000
+
+    status, body, _ = request("GET", "/vault/a/b/note.md", headers={ "Range": "bytes=1-2" })
+    assert status == 206
+    assert body == b"eo"
+
+    status, _, _ = request("MOVE", "/vault/a/b/note.md", headers={
+        "Destination": f"http://localhost:{PORT}/vault/a/moved%20note.md",
+        "Overwrite": "F",
+    })
+    assert status == 201
+    assert os.path.exists(os.path.join(server.root, "vault/a/moved note.md"))
+
+    status, body, _ = request("PROPFIND", "/vault/", headers={ "Depth": "infinity" })
+    assert status == 207
+    assert b"<d:href>/vault/a/moved%20note.md</d:href>" in body
+    assert b"<d:href>/vault/a/b/</d:href>" in body
+
+    status, body, _ = request("PROPFIND", "/vault/", headers={ "Depth": "1" })
+    assert b"/vault/a/" in body
+    assert b"moved" not in body
+
+    assert request("DELETE", "/vault/a")[0] == 204
+    assert not os.path.exists(os.path.join(server.root, "vault/a"))
+
+
+def test_permissions(server: DavServer):
+    assert request("PROPFIND", "/vault/", user="full:nope")[0] == 401
+    assert request("PROPFIND", "/vault/", user="limited:password2")[0] == 403
+    assert request("PUT", "/vault/subfolder/x.md", b"x", user="limited:password2")[0] == 201
+
+
+def test_request_log(server: DavServer):
+    request("PUT", "/vault/note.md", b"12345")
+    request("PROPFIND", "/vault", headers={ "Depth": "infinity" })
+    request("GET", "/vault/note.md")
+    request("OPTIONS", "/vault/note.md", headers={
+        "Origin": "app://obsidian.md",
+        "Access-Control-Request-Method": "GET",
+    })
+
+    log = server.log
+    assert log.summary() == { "PUT": 1, "PROPFIND": 1, "GET": 1 }
+    assert log.count("PROPFIND", depth="infinity") == 1
+    assert log.count(path="/vault/note.md") == 2
+    assert log.bytes_in() == 5
+    assert log.filter("GET")[0].bytes_out == 5
+    assert len(log.filter(preflight=True)) == 1
+
+    log.reset()
+    assert log.count() == 0
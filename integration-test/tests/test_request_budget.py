@@ -0,0 +1,80 @@
+r"""
+Request budgets for common syncs. These run against the instrumented stand-in server rather than copyparty, and fail
+if a sync makes more round-trips than it needs to, even if the end result on disk is correct.
+"""
+import os
+
+import pytest
+from selenium.webdriver import Chrome
+
+from tests.dav_server import InstrumentedCopyparty
+from tests.utils import autodownload, autoupload, close_notices, get_notice_messages, inject_settings
+
+
+@pytest.fixture
+def copyparty(dav_server: InstrumentedCopyparty):
+    return dav_server
+
+
+def count_files(path: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(path))
+
+
+def test_push_budget(
+    obsidian: Chrome,
+    copyparty: InstrumentedCopyparty,
+    screenshotter
+):
+    inject_settings(obsidian)
+    copyparty.log.reset()
+
+    autoupload(obsidian, screenshotter)
+    notices = get_notice_messages(obsidian)
+    assert "Push complete" in notices[0], notices
+
+    log = copyparty.log
+    # A single deep listing, and one PUT per file. PUT creates the parent folders, so there's no need for MKCOL
+    assert log.count("PROPFIND") == 1, log.summary()
+    assert log.count("PUT") == count_files(copyparty.root_vault_path), log.summary()
+    assert log.count("MKCOL") == 0, log.summary()
+    assert log.count("DELETE") == 0, log.summary()
+    assert log.count("GET") == 0, log.summary()
+
+
+def test_noop_push_budget(
+    obsidian: Chrome,
+    copyparty: InstrumentedCopyparty,
+    screenshotter
+):
+    inject_settings(obsidian)
+    autoupload(obsidian, screenshotter)
+    close_notices(obsidian)
+    copyparty.log.reset()
+
+    autoupload(obsidian, screenshotter)
+    notices = get_notice_messages(obsidian)
+    assert "0 files were updated" in notices[0], notices
+
+    log = copyparty.log
+    assert log.count("PROPFIND") <= 1, log.summary()
+    assert log.count() == log.count("PROPFIND"), log.summary()
+
+
+def test_noop_pull_budget(
+    obsidian: Chrome,
+    copyparty: InstrumentedCopyparty,
+    screenshotter,
+    preloaded_vault: None
+):
+    inject_settings(obsidian)
+    copyparty.log.reset()
+
+    autodownload(obsidian, screenshotter)
+    notices = get_notice_messages(obsidian)
+    assert "Pull complete" in notices[0], notices
+
+    log = copyparty.log
+    # The server has the exact same files, so nothing should be downloaded
+    assert log.count("PROPFIND") <= 1, log.summary()
+    assert log.count("GET") == 0, log.summary()
+    assert log.count("PUT") == 0, log.summary()
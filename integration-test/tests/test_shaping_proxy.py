@@ -0,0 +1,109 @@
+import base64
+from http.client import HTTPConnection
+from time import monotonic
+
+import pytest
+
+from tests.dav_server import DavServer
+from tests.shaping_proxy import LinkProfile, ShapingProxy
+
+SERVER_PORT = 62173
+PROXY_PORT = 62174
+AUTH = { "Authorization": "Basic " + base64.b64encode(b"full:password").decode("ascii") }
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = DavServer(str(tmp_path), SERVER_PORT)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_proxy(server: DavServer):
+    proxies = []
+
+    def make(profile: LinkProfile) -> ShapingProxy:
+        proxy = ShapingProxy("localhost", SERVER_PORT, PROXY_PORT, profile)
+        proxy.start()
+        proxies.append(proxy)
+        return proxy
+
+    yield make
+    for proxy in proxies:
+        proxy.stop()
+
+
+def timed_requests(requests: list[tuple[str, str, bytes]]) -> tuple[float, list[tuple[int, bytes]]]:
+    """
+    Sends the requests over a single kept-alive connection to the proxy.
+    """
+    conn = HTTPConnection("localhost", PROXY_PORT)
+    out = []
+    start = monotonic()
+    for method, path, body in requests:
+        conn.request(method, path, body=body, headers=AUTH)
+        response = conn.getresponse()
+        out.append((response.status, response.read()))
+    elapsed = monotonic() - start
+    conn.close()
+    return elapsed, out
+
+
+def test_passthrough(make_proxy, server: DavServer):
+    proxy = make_proxy(LinkProfile())
+    _, responses = timed_requests([
+        ("PUT", "/vault/note.md", b"meow"),
+        ("GET", "/vault/note.md", b""),
+        ("PROPFIND", "/vault/", b""),
+    ])
+    assert responses[0][0] == 201
+    assert responses[1] == (200, b"meow")
+    assert responses[2][0] == 207
+    assert server.log.summary() == { "PUT": 1, "GET": 1, "PROPFIND": 1 }
+    assert proxy.stats.requests == 3
+    assert proxy.stats.bytes_up == 4
+
+
+def test_latency(make_proxy):
+    make_proxy(LinkProfile(rtt=0.1))
+    elapsed, _ = timed_requests([("PROPFIND", "/vault/", b"")] * 5)
+    assert elapsed >= 0.5
+
+
+def test_bandwidth(make_proxy):
+    data = b"x" * 200_000
+    proxy = make_proxy(LinkProfile(down=1_000_000, up=400_000))
+    elapsed, _ = timed_requests([("PUT", "/vault/big.bin", data)])
+    assert elapsed >= 0.45
+    elapsed, responses = timed_requests([("GET", "/vault/big.bin", b"")])
+    assert responses[0] == (200, data)
+    assert elapsed >= 0.18
+    assert proxy.stats.bytes_down >= len(data)
+
+
+def test_stalls(make_proxy):
+    proxy = make_proxy(LinkProfile(stall_probability=1, stall_duration=0.1, chunk_size=1000))
+    elapsed, _ = timed_requests([("PUT", "/vault/note.md", b"x" * 3000)])
+    assert proxy.stats.stalls == 3
+    assert elapsed >= 0.3
+
+
+def test_errors(make_proxy, server: DavServer):
+    proxy = make_proxy(LinkProfile(error_rate=1))
+    _, responses = timed_requests([("PUT", "/vault/note.md", b"meow")] * 3)
+    assert [status for status, _ in responses] == [503] * 3
+    # None of them made it to the server
+    assert server.log.count() == 0
+    assert proxy.reset_stats().injected_errors == 3
+    assert proxy.stats.injected_errors == 0
+
+    # Preflights always go through
+    conn = HTTPConnection("localhost", PROXY_PORT)
+    conn.request("OPTIONS", "/vault/note.md", headers={
+        "Origin": "app://obsidian.md",
+        "Access-Control-Request-Method": "PUT",
+    })
+    assert conn.getresponse().status < 300
+    conn.close()
@@ -6,7 +6,9 @@ from selenium.webdriver import ActionChains, Chrome, Keys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 import json
+import os
 import platform
+import shutil
 
 from selenium.webdriver.support.wait import WebDriverWait
 
@@ -99,13 +101,17 @@ def get_settings_data(driver: Chrome):
     )["result"]["value"])
 
 def default_settings(
-    username: Literal["full", "limited"] = "full"
+    username: Literal["full", "limited"] = "full",
+    url: str = "http://localhost:62169"
 ):
     """
     Returns the default settings that'll be used for most tests.
     This doesn't need to be explicitly called unless the object is modified, as
     inject_settings with settings_object = None will call this function
     automagically to get the defaults.
+
+    `url` can be used to point the plugin somewhere other than the server
+    directly, like the shaping_proxy fixture.
     """
     return {
         "server_conf": {
@@ -114,7 +120,7 @@ def default_settings(
                 "full": "password",
                 "limited": "password2",
             }[username],
-            "url": "http://localhost:62169"
+            "url": url
         },
         "sync": {
             "full_vault_sync": True,
@@ -124,6 +130,19 @@ def default_settings(
             "subfolders": {},
             "ignore_workspace": True,
             "ignore_config_folder": False,
+            "sync_nested_hidden_files": True,
+            "concurrency": 4,
+            "incremental_remote_listing": False,
+            "streaming_remote_listing": False,
+            "content_hashing": False,
+            "large_file_threshold": 32,
+            "delta_uploads": False,
+            "dirty_tracking": False,
+            "compact_diff": False,
+            "auto_sync": False,
+            "auto_push_delay": 30,
+            "auto_pull_interval": 10,
+            "pull_on_focus": True,
         }
     }
 
@@ -159,6 +178,26 @@ def inject_settings(driver: Chrome, settings_object = None):
     assert out["result"]["value"] == 0, \
         json.dumps(out)
 
+def install_plugin(vault_path: str, plugin_dist_path: str):
+    if not os.path.exists(plugin_dist_path):
+        raise RuntimeError(
+            "Developer error: <git root>/dist/livi-webdav-sync doesn't exist"
+        )
+    shutil.copytree(
+        plugin_dist_path,
+        # The three hardest problems in software:
+        # * Naming things
+        # * Cache invalidation
+        # * Telling whether directory operations are inclusive or exclusive of
+        #   the specified target directory
+        os.path.join(
+            vault_path,
+            ".obsidian",
+            "plugins",
+            "livi-webdav-sync"
+        ),
+    )
+
 def close_notices(driver: Chrome):
     for elem in driver.find_elements(
         By.CLASS_NAME,
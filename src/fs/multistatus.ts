@@ -0,0 +1,186 @@
+/**
+ * Incremental parser for PROPFIND multistatus responses. The webdav client only parses a response once all of it has
+ * arrived, which for a deep listing of a large vault means the entire listing has to be downloaded and held in memory
+ * (as text, as a parsed document, and as a FileStat array) before any of it can be used. This parser is fed the
+ * response as it arrives, and returns each <response> element as soon as it's complete.
+ *
+ * It's not a general XML parser; it only understands as much as it needs to pull the listing properties out of a
+ * multistatus response. The entries are built the same way the webdav client builds its FileStats, so the two listing
+ * modes produce identical entries, down to the ETags stored in the manifest.
+ */
+import { RemoteEntry } from "../sync/remote_tree";
+
+// Namespace prefixes vary between servers ("d:", "D:", "lp1:", or a default namespace without a prefix)
+const PREFIX = "(?:[\\w.-]+:)?";
+
+function elementPattern(name: string): RegExp {
+  // Either self-closing, or with content
+  return new RegExp(`<${PREFIX}${name}(?:\\s[^>]*)?(?:/>|>([\\s\\S]*?)</${PREFIX}${name}\\s*>)`);
+}
+
+const HREF = elementPattern("href");
+const STATUS = elementPattern("status");
+const LAST_MODIFIED = elementPattern("getlastmodified");
+const CONTENT_LENGTH = elementPattern("getcontentlength");
+const ETAG = elementPattern("getetag");
+const RESOURCE_TYPE = elementPattern("resourcetype");
+const COLLECTION = new RegExp(`<${PREFIX}collection[\\s/>]`);
+const RESPONSE_START = new RegExp(`<${PREFIX}response[\\s>]`);
+const PROPSTAT = new RegExp(`<${PREFIX}propstat(?:\\s[^>]*)?>([\\s\\S]*?)</${PREFIX}propstat\\s*>`, "g");
+// Long enough for any realistic closing tag, so one that's split between chunks is still found
+const TAG_OVERLAP = 256;
+
+const ENTITIES: { [name: string]: string } = {
+  amp: "&",
+  lt: "<",
+  gt: ">",
+  quot: "\"",
+  apos: "'",
+};
+
+function decodeXml(text: string): string {
+  return text
+    .replace(/<!\[CDATA\[([\s\S]*?)\]\]>/g, "$1")
+    .replace(/&(#x[0-9a-fA-F]+|#[0-9]+|[a-z]+);/g, (match, entity: string) => {
+      if (entity[0] == "#") {
+        const codePoint = entity[1] == "x" ? parseInt(entity.substring(2), 16) : parseInt(entity.substring(1));
+        // fromCharCode would truncate anything outside the BMP (like emoji) to 16 bits
+        return codePoint <= 0x10FFFF ? String.fromCodePoint(codePoint) : match;
+      }
+      return ENTITIES[entity] ?? match;
+    })
+    .trim();
+}
+
+function textOf(xml: string, pattern: RegExp): string | null {
+  const match = pattern.exec(xml);
+  if (match == null) {
+    return null;
+  }
+  return decodeXml(match[1] ?? "");
+}
+
+/**
+ * Same as the webdav client's normalisePath: a leading slash, and no trailing slash.
+ */
+function normalisePath(path: string): string {
+  let out = path[0] == "/" ? path : "/" + path;
+  if (out.length > 1 && out.endsWith("/")) {
+    out = out.substring(0, out.length - 1);
+  }
+  return out;
+}
+
+function withSlash(path: string): string {
+  return path.endsWith("/") ? path : path + "/";
+}
+
+export class MultistatusParser {
+  /**
+   * The unparsed tail of the response.
+   */
+  private buffer: string = "";
+  /**
+   * Where in the buffer to continue looking for the end of a response. Everything before it was already searched.
+   */
+  private scanFrom: number = 0;
+  private responseEnd: RegExp = new RegExp(`</${PREFIX}response\\s*>`, "g");
+  private serverBase: string;
+  private requestPath: string;
+
+  /**
+   * \param serverBasePath  The path of the server URL, i.e. the part of each href that isn't part of the filename
+   * \param requestPath     The folder that was listed. Like in the webdav client, it's left out of the entries.
+   */
+  constructor(serverBasePath: string, requestPath: string) {
+    this.serverBase = decodeURIComponent(withSlash(serverBasePath));
+    this.requestPath = requestPath.replace(/\/$/, "");
+  }
+
+  /**
+   * Feeds the next part of the response to the parser.
+   *
+   * \returns the entries completed by this part
+   */
+  push(chunk: string): RemoteEntry[] {
+    this.buffer += chunk;
+    const out: RemoteEntry[] = [];
+    let start = 0;
+    this.responseEnd.lastIndex = this.scanFrom;
+    let match: RegExpExecArray | null;
+    while ((match = this.responseEnd.exec(this.buffer)) != null) {
+      const end = match.index + match[0].length;
+      const entry = this.parseResponse(this.buffer.substring(start, end));
+      if (entry != null) {
+        out.push(entry);
+      }
+      start = end;
+    }
+    this.buffer = this.buffer.substring(start);
+    this.scanFrom = Math.max(0, this.buffer.length - TAG_OVERLAP);
+    return out;
+  }
+
+  /**
+   * Called once the whole response has been fed to the parser.
+   *
+   * \throws Error if the response ended in the middle of an entry
+   */
+  end(): RemoteEntry[] {
+    const out = this.push("");
+    if (RESPONSE_START.test(this.buffer)) {
+      throw new Error("PROPFIND response ended in the middle of an entry");
+    }
+    this.buffer = "";
+    return out;
+  }
+
+  /**
+   * Parses a single <response> element. The text may start with whatever came before the element, such as the XML
+   * declaration and the opening multistatus tag, as none of that can be mistaken for a property.
+   */
+  private parseResponse(xml: string): RemoteEntry | null {
+    const href = textOf(xml, HREF);
+    if (href == null) {
+      return null;
+    }
+
+    // Prefer the propstat with the properties that were found. The webdav client just uses the first one, which is
+    // the same thing for every server that lists the successful propstat first, which is every server I know of.
+    let props: string | null = null;
+    PROPSTAT.lastIndex = 0;
+    let propstat: RegExpExecArray | null;
+    while ((propstat = PROPSTAT.exec(xml)) != null) {
+      const status = textOf(propstat[1], STATUS);
+      if (status == null || /\s2\d\d(\s|$)/.test(status)) {
+        props = propstat[1];
+        break;
+      }
+      props = props ?? propstat[1];
+    }
+    if (props == null) {
+      // A response with just a status, i.e. an error for this href
+      return null;
+    }
+
+    const path = decodeURIComponent(href.replace(/^https?:\/\/[^/]+/, ""));
+    const filename = normalisePath(
+      this.serverBase != "/" && path.startsWith(this.serverBase) ? path.substring(this.serverBase.length) : path
+    );
+    const basename = filename.substring(filename.lastIndexOf("/") + 1);
+    const resourceType = RESOURCE_TYPE.exec(props);
+    const type = resourceType?.[1] != null && COLLECTION.test(resourceType[1]) ? "directory" : "file";
+    if (basename == "" || (type == "directory" && filename == this.requestPath)) {
+      return null;
+    }
+    const etag = textOf(props, ETAG);
+    return {
+      filename,
+      basename,
+      type,
+      lastmod: textOf(props, LAST_MODIFIED) ?? "",
+      size: parseInt(textOf(props, CONTENT_LENGTH) ?? "0", 10),
+      etag: etag == null ? null : etag.replace(/"/g, ""),
+    };
+  }
+}
@@ -0,0 +1,41 @@
+/**
+ * Helpers for Nextcloud's (and ownCloud's) chunked upload endpoint. Nextcloud doesn't support SabreDAV's partial
+ * updates, but it does let a file be uploaded as a series of PUTs into an upload folder, which is then assembled with a
+ * single MOVE. See https://docs.nextcloud.com/server/latest/developer_manual/client_apis/WebDAV/chunking.html
+ */
+
+/**
+ * Finds the upload folder root that goes with a files URL, i.e. `.../remote.php/dav/files/<user>/...` becomes
+ * `.../remote.php/dav/uploads/<user>`.
+ *
+ * \returns the root, or null if the URL isn't a Nextcloud or ownCloud files URL
+ */
+export function chunkedUploadRoot(url: string): string | null {
+  const match = /^(.*\/remote\.php\/dav)\/files\/([^/]+)(\/|$)/.exec(url);
+  if (match == null) {
+    return null;
+  }
+  return `${match[1]}/uploads/${match[2]}`;
+}
+
+/**
+ * The name of the nth chunk (starting at 1). Newer servers want the chunk numbers, older ones assemble the chunks in
+ * name order, so the numbers are padded to sort the same either way.
+ */
+export function chunkName(index: number): string {
+  const digits = index.toString();
+  return digits.length >= 5 ? digits : "00000".substring(digits.length) + digits;
+}
+
+/**
+ * The full URL of a path on the server, for the Destination header. The path is relative to the server URL, like the
+ * paths passed to the WebDAV client.
+ */
+export function resolveUrl(serverUrl: string, path: string): string {
+  const encoded = path
+    .split("/")
+    .filter(part => part.length > 0)
+    .map(part => encodeURIComponent(part))
+    .join("/");
+  return serverUrl.replace(/\/+$/, "") + "/" + encoded;
+}
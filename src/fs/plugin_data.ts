@@ -0,0 +1,57 @@
+import { normalizePath } from "obsidian";
+import WebDAVSyncPlugin from "main";
+
+/**
+ * Files the plugin keeps in its own folder to track sync state. These are device-local, and must never be synced;
+ * FileProvider ignores them.
+ */
+export const MANIFEST_FILE = "sync-manifest.json";
+export const REMOTE_TREE_FILE = "remote-tree-cache.json";
+export const HASH_CACHE_FILE = "content-hash-cache.json";
+export const BLOCK_SIGNATURE_FILE = "block-signatures.json";
+export const JOURNAL_FILE = "sync-journal.jsonl";
+export const LOCAL_INDEX_FILE = "local-index.json";
+export const SYNC_REPORT_FILE = "sync-report.json";
+export const PLUGIN_STATE_FILES = [
+  MANIFEST_FILE,
+  REMOTE_TREE_FILE,
+  HASH_CACHE_FILE,
+  BLOCK_SIGNATURE_FILE,
+  JOURNAL_FILE,
+  LOCAL_INDEX_FILE,
+  SYNC_REPORT_FILE,
+];
+
+export function pluginDataPath(plugin: WebDAVSyncPlugin, name: string): string {
+  const dir = plugin.manifest.dir ?? `${plugin.configDir()}/plugins/${plugin.manifest.id}`;
+  return normalizePath(dir + "/" + name);
+}
+
+export function isPluginStateFile(plugin: WebDAVSyncPlugin, path: string): boolean {
+  const normalised = path.replace("\\", "/");
+  return PLUGIN_STATE_FILES.some(name => pluginDataPath(plugin, name) == normalised);
+}
+
+/**
+ * Reads a JSON file from the plugin folder. Returns null if the file doesn't exist, or if it can't be parsed; state
+ * files are caches, so a broken one is treated as a missing one rather than as a fatal error.
+ */
+export async function readPluginJson<T>(plugin: WebDAVSyncPlugin, name: string): Promise<T | null> {
+  const path = pluginDataPath(plugin, name);
+  if (!(await plugin.adapter().exists(path))) {
+    return null;
+  }
+  try {
+    return JSON.parse(await plugin.adapter().read(path)) as T;
+  } catch (ex) {
+    console.error(`Failed to read ${path}; ignoring it`, ex);
+    return null;
+  }
+}
+
+export async function writePluginJson(plugin: WebDAVSyncPlugin, name: string, data: unknown) {
+  await plugin.adapter().write(
+    pluginDataPath(plugin, name),
+    JSON.stringify(data)
+  );
+}
@@ -0,0 +1,319 @@
+/**
+ * Retry and adaptive concurrency control for WebDAV requests. Wraps the webdav client, so the rest of the code doesn't
+ * need to care about any of this.
+ */
+
+export interface RetryPolicy {
+  /**
+   * Number of retries after the first attempt.
+   */
+  maxRetries: number;
+  /**
+   * Base delay for the exponential backoff, in milliseconds.
+   */
+  baseDelay: number;
+  /**
+   * Upper bound for any single delay, including ones requested by Retry-After.
+   */
+  maxDelay: number;
+}
+
+export const DEFAULT_RETRY_POLICY: RetryPolicy = {
+  maxRetries: 4,
+  baseDelay: 500,
+  maxDelay: 30000,
+};
+
+/**
+ * Status codes that mean "try again later" rather than "this request is wrong".
+ */
+const RETRYABLE_STATUSES = [408, 425, 429, 500, 502, 503, 504];
+/**
+ * Status codes that mean the server wants fewer requests.
+ */
+const THROTTLE_STATUSES = [429, 503];
+
+/**
+ * Client methods that are safe to retry. MOVE and MKCOL aren't, as a retry after a lost response fails because the
+ * first attempt succeeded.
+ */
+const IDEMPOTENT_METHODS = [
+  "exists",
+  "stat",
+  "getDirectoryContents",
+  "getFileContents",
+  "putFileContents",
+  "deleteFile",
+];
+const IDEMPOTENT_HTTP_METHODS = ["GET", "HEAD", "OPTIONS", "PROPFIND", "PUT", "DELETE", "PATCH"];
+
+/**
+ * Client methods that make requests. Anything else (header getters and setters and the like) isn't touched.
+ */
+const REQUEST_METHODS = IDEMPOTENT_METHODS.concat([
+  "customRequest",
+  "moveFile",
+  "copyFile",
+  "createDirectory",
+  "getQuota",
+]);
+
+/**
+ * The HTTP method each client method sends, for the request counters. customRequest sends whatever it's told to.
+ */
+const HTTP_METHODS: { [method: string]: string } = {
+  exists: "PROPFIND",
+  stat: "PROPFIND",
+  getDirectoryContents: "PROPFIND",
+  getQuota: "PROPFIND",
+  getFileContents: "GET",
+  putFileContents: "PUT",
+  deleteFile: "DELETE",
+  moveFile: "MOVE",
+  copyFile: "COPY",
+  createDirectory: "MKCOL",
+};
+
+/**
+ * Methods where the latency says something about the server rather than the amount of data transferred. Only these
+ * are used for the latency signal in the limiter.
+ */
+const LATENCY_METHODS = [
+  "exists",
+  "stat",
+  "deleteFile",
+  "moveFile",
+  "createDirectory",
+];
+
+interface HttpError {
+  status?: number;
+  response?: { headers?: { get(name: string): string | null } };
+}
+
+function statusOf(ex: unknown): number | null {
+  const status = (ex as HttpError | null)?.status;
+  return typeof status == "number" ? status : null;
+}
+
+/**
+ * Parses a Retry-After header, which is either a number of seconds or an HTTP date.
+ *
+ * @returns The delay in milliseconds, or null if the header is missing or invalid
+ */
+export function parseRetryAfter(value: string | null | undefined, now: number = Date.now()): number | null {
+  if (value == null || value.trim() == "") {
+    return null;
+  }
+  if (/^\d+$/.test(value.trim())) {
+    return parseInt(value.trim()) * 1000;
+  }
+  const date = Date.parse(value);
+  if (isNaN(date)) {
+    return null;
+  }
+  return Math.max(0, date - now);
+}
+
+/**
+ * Exponential backoff with full jitter, i.e. a random delay between 0 and the exponential ceiling. The jitter keeps
+ * parallel transfers that failed at the same time from retrying at the same time.
+ */
+export function backoffDelay(attempt: number, policy: RetryPolicy, random: () => number = Math.random): number {
+  return random() * Math.min(policy.maxDelay, policy.baseDelay * Math.pow(2, attempt));
+}
+
+/**
+ * Whether an error is worth retrying. Errors without a status are network errors, which are.
+ */
+export function isRetryable(ex: unknown): boolean {
+  const status = statusOf(ex);
+  return status == null || RETRYABLE_STATUSES.indexOf(status) != -1;
+}
+
+/**
+ * AIMD limit on the number of requests in flight, like TCP congestion control: the limit grows by roughly one for
+ * every `limit` successful requests, and is halved when the server throttles or fails. Requests that take much longer
+ * than the usual fast latency also shrink the limit slightly, so the limit backs off before the server starts
+ * rejecting requests.
+ */
+export class AdaptiveLimiter {
+  limit: number;
+  min: number;
+  max: number;
+  inFlight: number = 0;
+  waiting: (() => void)[] = [];
+  /**
+   * The recent low latency per method, in milliseconds. A faster request lowers it right away, and every other request
+   * pulls it up by `baselineDrift` of the difference, so a single lucky request doesn't count as the norm forever.
+   */
+  baselines: Map<string, number> = new Map();
+  baselineDrift: number = 0.05;
+  latencyFactor: number = 3;
+
+  constructor(max: number, min: number = 1) {
+    this.max = max;
+    this.min = min;
+    this.limit = max;
+  }
+
+  async acquire() {
+    while (this.inFlight >= Math.floor(this.limit)) {
+      await new Promise<void>(resolve => this.waiting.push(resolve));
+    }
+    this.inFlight++;
+  }
+
+  release() {
+    this.inFlight--;
+    this.wake();
+  }
+
+  /**
+   * Wakes up as many waiting requests as there are free slots. The woken requests re-check the limit themselves.
+   */
+  wake() {
+    let slots = Math.floor(this.limit) - this.inFlight;
+    while (slots > 0 && this.waiting.length > 0) {
+      (this.waiting.shift() as () => void)();
+      slots--;
+    }
+  }
+
+  onSuccess(method: string, latency: number) {
+    if (LATENCY_METHODS.indexOf(method) != -1) {
+      const baseline = this.baselines.get(method);
+      if (baseline == null || latency < baseline) {
+        this.baselines.set(method, latency);
+      } else {
+        this.baselines.set(method, baseline + (latency - baseline) * this.baselineDrift);
+        if (latency > baseline * this.latencyFactor) {
+          this.limit = Math.max(this.min, this.limit * 0.9);
+          return;
+        }
+      }
+    }
+    this.limit = Math.min(this.max, this.limit + 1 / this.limit);
+    this.wake();
+  }
+
+  onFailure(throttled: boolean) {
+    this.limit = Math.max(this.min, this.limit / (throttled ? 2 : 1.5));
+  }
+}
+
+/**
+ * Request counters, exposed through Connection.
+ */
+export interface TransportStats {
+  requests: number;
+  retries: number;
+  failures: number;
+  /**
+   * Requests by HTTP method, retries included.
+   */
+  methods: { [method: string]: number };
+}
+
+export function emptyTransportStats(): TransportStats {
+  return {
+    requests: 0,
+    retries: 0,
+    failures: 0,
+    methods: {},
+  };
+}
+
+function sleep(ms: number) {
+  return new Promise<void>(resolve => setTimeout(resolve, ms));
+}
+
+export function httpMethodOf(method: string, args: unknown[]): string {
+  if (method == "customRequest") {
+    return ((args[1] as { method?: string } | undefined)?.method ?? "GET").toUpperCase();
+  }
+  return HTTP_METHODS[method] ?? method;
+}
+
+function isIdempotent(method: string, args: unknown[]): boolean {
+  if (method == "customRequest") {
+    return IDEMPOTENT_HTTP_METHODS.indexOf(httpMethodOf(method, args)) != -1;
+  }
+  return IDEMPOTENT_METHODS.indexOf(method) != -1;
+}
+
+/**
+ * Runs a single request through the limiter, retrying it if it's idempotent and the failure is transient.
+ */
+export async function runRequest<T>(
+  method: string,
+  args: unknown[],
+  request: () => Promise<T>,
+  limiter: AdaptiveLimiter,
+  policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+  wait: (ms: number) => Promise<void> = sleep,
+  stats: TransportStats = emptyTransportStats(),
+): Promise<T> {
+  const retryable = isIdempotent(method, args);
+  const httpMethod = httpMethodOf(method, args);
+  for (let attempt = 0; ; ++attempt) {
+    let delay: number;
+    await limiter.acquire();
+    const started = Date.now();
+    stats.requests++;
+    stats.methods[httpMethod] = (stats.methods[httpMethod] ?? 0) + 1;
+    if (attempt > 0) {
+      stats.retries++;
+    }
+    try {
+      const result = await request();
+      limiter.onSuccess(method, Date.now() - started);
+      return result;
+    } catch (ex) {
+      const status = statusOf(ex);
+      const transient = isRetryable(ex);
+      if (transient) {
+        limiter.onFailure(status != null && THROTTLE_STATUSES.indexOf(status) != -1);
+      }
+      if (!retryable || !transient || attempt >= policy.maxRetries) {
+        stats.failures++;
+        throw ex;
+      }
+      const retryAfter = parseRetryAfter((ex as HttpError).response?.headers?.get("Retry-After"));
+      delay = Math.min(policy.maxDelay, retryAfter ?? backoffDelay(attempt, policy));
+      console.warn(`WebDAV ${method} failed (${status ?? "network error"}); retrying in ${Math.round(delay)} ms`);
+    } finally {
+      // Released before waiting, so other requests can use the slot in the meantime
+      limiter.release();
+    }
+    await wait(delay);
+  }
+}
+
+/**
+ * Wraps a client so every request goes through runRequest. Everything else is passed through as-is.
+ */
+export function withTransport<T extends object>(
+  client: T,
+  limiter: AdaptiveLimiter,
+  stats: TransportStats = emptyTransportStats(),
+  policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+): T {
+  return new Proxy(client, {
+    get(target, prop, receiver) {
+      const value = Reflect.get(target, prop, receiver);
+      if (typeof value != "function" || typeof prop != "string" || REQUEST_METHODS.indexOf(prop) == -1) {
+        return value;
+      }
+      return (...args: unknown[]) => runRequest(
+        prop,
+        args,
+        () => (value as (...a: unknown[]) => Promise<unknown>).apply(target, args),
+        limiter,
+        policy,
+        sleep,
+        stats
+      );
+    }
+  });
+}
@@ -1,5 +1,7 @@
 import { App } from "obsidian";
 import { AuthType, createClient, WebDAVClient } from "webdav";
+import { AdaptiveLimiter, emptyTransportStats, TransportStats, withTransport } from "./transport";
+import { chunkedUploadRoot } from "./nextcloud";
 
 export type DAVServerConfig = {
   username: string | undefined;
@@ -13,10 +15,53 @@ export const DEFAULT_DAV_CONFIG: DAVServerConfig = {
   url: null,
 }
 
+/**
+ * Hard upper bound on requests in flight. The sync settings limit this further; the limiter only exists to back off
+ * when the server struggles.
+ */
+const MAX_REQUESTS_IN_FLIGHT = 16;
+
+export interface ConnectionStats extends TransportStats {
+  /**
+   * Requests the browser exposed connection timings for. The timings are only visible if the server sends a
+   * Timing-Allow-Origin header, so the counts below only cover this many requests.
+   */
+  timedRequests: number;
+  newConnections: number;
+  tlsHandshakes: number;
+}
+
 export class Connection {
   conf: DAVServerConfig;
   client: WebDAVClient;
+  /**
+   * Client for the server's chunked upload endpoint (see chunkedUploadRoot), or null if it doesn't look like it has one.
+   * It shares the limiter and stats with the main client.
+   */
+  uploads: WebDAVClient | null = null;
+  limiter: AdaptiveLimiter;
+  /**
+   * Cached result of the partial update probe. The promise itself is cached, so parallel transfers share one probe.
+   */
+  partialUpdate: Promise<boolean> | null = null;
+  /**
+   * The password the client was created with, so reloadClient can tell whether the secret changed.
+   */
+  password: string | undefined;
+  stats: ConnectionStats = {
+    ...emptyTransportStats(),
+    timedRequests: 0,
+    newConnections: 0,
+    tlsHandshakes: 0,
+  };
+  observer: PerformanceObserver | null = null;
 
+  /**
+   * Note that connections are reused by the browser as long as the same client keeps talking to the same server, and
+   * the client keeps the negotiated auth state (including the Digest nonce, if the server uses Digest) for as long as
+   * it exists. The only thing that matters for keeping the handshakes down is to not recreate the Connection when
+   * nothing changed; see matches().
+   */
   constructor(
     app: App,
     server_config: DAVServerConfig
@@ -27,14 +72,90 @@ export class Connection {
     ) {
       return
     }
-    this.conf = server_config;
+    this.conf = { ...server_config };
+    this.password = app.secretStorage.getSecret(server_config.password)
+      || /* fuck you typescript */ undefined;
 
-    this.client = createClient(server_config.url, {
+    this.limiter = new AdaptiveLimiter(MAX_REQUESTS_IN_FLIGHT);
+    const options = {
       username: server_config.username,
-      password: app.secretStorage.getSecret(server_config.password)
-        || /* fuck you typescript */ undefined,
+      password: this.password,
       authType: AuthType.Auto,
       withCredentials: true,
-    })
+    };
+    this.client = withTransport(createClient(server_config.url, options), this.limiter, this.stats);
+    const uploadRoot = chunkedUploadRoot(server_config.url);
+    if (uploadRoot != null) {
+      this.uploads = withTransport(createClient(uploadRoot, options), this.limiter, this.stats);
+    }
+    this.observe(server_config.url);
+  }
+
+  /**
+   * Whether or not this connection was created with the same config, in which case it can be kept as-is.
+   */
+  matches(app: App, server_config: DAVServerConfig): boolean {
+    return this.conf != null
+      && this.conf.url == server_config.url
+      && this.conf.username == server_config.username
+      && this.conf.password == server_config.password
+      && server_config.password != null
+      && this.password == (app.secretStorage.getSecret(server_config.password) || undefined);
+  }
+
+  /**
+   * Counts new connections and TLS handshakes to the server using the Resource Timing API.
+   */
+  observe(url: string) {
+    if (typeof PerformanceObserver == "undefined") {
+      return;
+    }
+    let origin: string;
+    try {
+      origin = new URL(url).origin;
+    } catch (_ex) {
+      return;
+    }
+    this.observer = new PerformanceObserver((list) => {
+      for (const entry of list.getEntries() as PerformanceResourceTiming[]) {
+        // requestStart is 0 when the timings are hidden from us
+        if (!entry.name.startsWith(origin) || entry.requestStart == 0) {
+          continue;
+        }
+        this.stats.timedRequests++;
+        if (entry.connectEnd > entry.connectStart) {
+          this.stats.newConnections++;
+        }
+        if (entry.secureConnectionStart > 0) {
+          this.stats.tlsHandshakes++;
+        }
+      }
+    });
+    this.observer.observe({ type: "resource" });
+  }
+
+  close() {
+    this.observer?.disconnect();
+    this.observer = null;
+  }
+
+  /**
+   * Whether or not the server supports SabreDAV's partial update extension, which is used for chunked uploads. Servers
+   * that support it advertise it in the Accept-Patch header.
+   */
+  supportsPartialUpdate(): Promise<boolean> {
+    if (this.partialUpdate == null) {
+      this.partialUpdate = this.client.customRequest("/", {
+        method: "OPTIONS"
+      }).then(
+        (response) => (response.headers.get("Accept-Patch") ?? "")
+          .contains("application/x-sabredav-partialupdate"),
+        (ex) => {
+          console.warn("OPTIONS request failed; assuming no partial update support", ex);
+          return false;
+        }
+      );
+    }
+    return this.partialUpdate;
   }
 }
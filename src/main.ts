@@ -1,17 +1,56 @@
-import {Notice, Plugin} from 'obsidian';
+import {Notice, Plugin, TAbstractFile} from 'obsidian';
 import {DEFAULT_SETTINGS, settings_t, WebDAVSettingsTab} from 'settings';
 import {Connection} from './fs/webdav';
 import {FileProvider} from 'sync/files';
 import {SyncImpl} from 'sync/sync_impl';
 import {onActionError, showActionTaskGraph} from 'integration/actions';
 import {SyncModal} from 'sync/sync_modal';
+import {DEFAULT_SYNC_SETTINGS} from 'sync/sync_settings';
+import {ManifestStore} from 'sync/manifest_store';
+import {RemoteTreeStore} from 'sync/remote_tree';
+import {HashCacheStore} from 'sync/hash_cache_store';
+import {BlockSignatureStore} from 'sync/delta_store';
+import {SyncJournal} from 'sync/journal_store';
+import {DirtyTracker} from 'sync/dirty_tracker';
+import {SyncReportStore} from 'sync/report_store';
+import {AutoSyncScheduler, SyncLock} from 'sync/scheduler';
+import {SyncDir} from 'sync/syncdir';
+import {ActionedItem} from 'sync/status';
+import {describeProgress} from 'sync/progress';
 
 export default class WebDAVSyncPlugin extends Plugin {
   settings: settings_t;
   client: Connection | null;
+  syncManifest: ManifestStore;
+  remoteTree: RemoteTreeStore;
+  hashCache: HashCacheStore;
+  blockSignatures: BlockSignatureStore;
+  syncJournal: SyncJournal;
+  dirtyTracker: DirtyTracker;
+  syncReports: SyncReportStore;
+  syncLock: SyncLock = new SyncLock();
+  autoSync: AutoSyncScheduler;
+  statusBar: HTMLElement;
 
   async onload() {
+    this.syncManifest = new ManifestStore(this);
+    this.remoteTree = new RemoteTreeStore(this);
+    this.hashCache = new HashCacheStore(this);
+    this.blockSignatures = new BlockSignatureStore(this);
+    this.syncJournal = new SyncJournal(this);
+    this.dirtyTracker = new DirtyTracker(this);
+    this.syncReports = new SyncReportStore(this);
+    this.autoSync = new AutoSyncScheduler(this.syncLock, this.autoSyncAction.bind(this), {
+      setTimeout: (callback, ms) => window.setTimeout(callback, ms),
+      clearTimeout: (id) => window.clearTimeout(id),
+      setInterval: (callback, ms) => window.setInterval(callback, ms),
+      clearInterval: (id) => window.clearInterval(id),
+      now: () => Date.now(),
+    });
     await this.loadSettings();
+    this.statusBar = this.addStatusBarItem();
+    this.dirtyTracker.register();
+    this.registerAutoSync();
     await this.initRibbon();
     await this.reloadClient();
 
@@ -34,6 +73,21 @@ export default class WebDAVSyncPlugin extends Plugin {
         false
       )
     });
+    this.addCommand({
+      id: "webdav-sync",
+      name: "Sync both ways with WebDAV",
+      icon: "refresh-cw",
+      callback: this.syncAction.bind(
+        this,
+        false
+      )
+    });
+    this.addCommand({
+      id: "webdav-connection-stats",
+      name: "Show connection statistics",
+      icon: "activity",
+      callback: this.showConnectionStats.bind(this)
+    });
     this.addCommand({
       id: "webdav-modal",
       name: "Open sync menu",
@@ -43,35 +97,133 @@ export default class WebDAVSyncPlugin extends Plugin {
   }
 
   onunload() {
-
+    this.autoSync.stop();
+    this.client?.close();
   }
 
   async uploadAction(dryRun: boolean) {
-    for await (const _unused of new SyncImpl(
+    await this.runLocked(SyncDir.UP, new SyncImpl(
       this,
       onActionError,
       showActionTaskGraph,
       () => {},
       dryRun,
       false
-    ).upload()) {
-      // ignored
-    }
+    ).upload());
   }
 
   async downloadAction(dryRun: boolean) {
-    for await (const _unused of new SyncImpl(
+    await this.runLocked(SyncDir.DOWN, new SyncImpl(
       this,
       onActionError,
       showActionTaskGraph,
       () => {},
       dryRun,
       false
-    ).download()) {
-      // ignored
+    ).download());
+  }
+
+  async syncAction(dryRun: boolean) {
+    // Two-way syncs can write locally, but they also push, so local changes made meanwhile still need to trigger
+    // automatic pushes
+    await this.runLocked(SyncDir.UP, new SyncImpl(
+      this,
+      onActionError,
+      showActionTaskGraph,
+      () => {},
+      dryRun,
+      false
+    ).sync());
+  }
+
+  /**
+   * Runs a sync while holding the sync lock. If another sync is already running, this one is dropped. Progress is
+   * shown in the status bar, as there's no modal to show it in.
+   */
+  async runLocked(direction: SyncDir, sync: AsyncGenerator<ActionedItem>) {
+    if (!this.syncLock.tryAcquire(direction)) {
+      new Notice("A sync is already running");
+      return;
+    }
+    try {
+      await this.showProgress(sync);
+    } finally {
+      this.syncLock.release();
     }
   }
 
+  async showProgress(sync: AsyncGenerator<ActionedItem>) {
+    try {
+      for await (const item of sync) {
+        this.statusBar.setText(`WebDAV: ${describeProgress(item)}`);
+      }
+    } finally {
+      this.statusBar.setText("");
+    }
+  }
+
+  /**
+   * Used by the scheduler, which takes care of the lock itself.
+   */
+  async autoSyncAction(direction: SyncDir) {
+    const impl = new SyncImpl(
+      this,
+      onActionError,
+      showActionTaskGraph,
+      () => {},
+      false,
+      false
+    );
+    await this.showProgress(direction == SyncDir.UP ? impl.upload() : impl.download());
+  }
+
+  registerAutoSync() {
+    this.app.workspace.onLayoutReady(() => {
+      const vault = this.app.vault;
+      const onChange = (file: TAbstractFile) => this.autoSync.notifyChange(file.path);
+      this.registerEvent(vault.on("create", onChange));
+      this.registerEvent(vault.on("modify", onChange));
+      this.registerEvent(vault.on("delete", onChange));
+      this.registerEvent(vault.on("rename", (file, oldPath) => {
+        this.autoSync.notifyChange(oldPath);
+        this.autoSync.notifyChange(file.path);
+      }));
+      this.registerDomEvent(window, "focus", () => this.autoSync.notifyFocus());
+      this.configureAutoSync();
+    });
+  }
+
+  configureAutoSync() {
+    const sync = this.settings.sync;
+    if (!sync.auto_sync || this.client == null) {
+      this.autoSync.configure(null);
+      return;
+    }
+    this.autoSync.configure({
+      pushDelay: sync.auto_push_delay * 1000,
+      // Continuous typing still gets pushed every now and then
+      maxPushDelay: sync.auto_push_delay * 1000 * 5,
+      pullInterval: sync.auto_pull_interval * 60 * 1000,
+      pullOnFocus: sync.pull_on_focus,
+    });
+  }
+
+  showConnectionStats() {
+    if (this.client == null || this.client.stats == null) {
+      new Notice("Not connected");
+      return;
+    }
+    const stats = this.client.stats;
+    new Notice(
+      `WebDAV connection: ${stats.requests} requests (${stats.retries} retries, ${stats.failures} failed). `
+        + (stats.timedRequests > 0
+          ? `Of ${stats.timedRequests} timed requests, ${stats.newConnections} opened a new connection, and `
+            + `${stats.tlsHandshakes} did a TLS handshake.`
+          : "Connection timings are unavailable; the server needs to send Timing-Allow-Origin for those."),
+      10000
+    );
+  }
+
   async initRibbon() {
     const ribbonIconEl = this.addRibbonIcon('cloud', 'Open WebDAV sync panel', (evt: MouseEvent) => {
       this.openModal();
@@ -105,10 +257,15 @@ export default class WebDAVSyncPlugin extends Plugin {
 
   async loadSettings() {
     this.settings = Object.assign({}, DEFAULT_SETTINGS, await this.loadData() as Partial<settings_t>);
+    // The assign above is shallow, so new sync settings would be missing entirely for existing installs
+    this.settings.sync = Object.assign({}, DEFAULT_SYNC_SETTINGS, this.settings.sync);
   }
 
   async saveSettings() {
     await this.saveData(this.settings);
+    if (this.app.workspace.layoutReady) {
+      this.configureAutoSync();
+    }
   }
 
   /**
@@ -117,7 +274,13 @@ export default class WebDAVSyncPlugin extends Plugin {
    * the new settings take hold.
    */
   async reloadClient(): Promise<boolean> {
+    // Keep the existing connection if nothing changed, so the negotiated auth and open connections aren't thrown away
+    // whenever an unrelated setting is changed
+    if (this.client != null && this.client.matches(this.app, this.settings.server_conf)) {
+      return true;
+    }
     // The reset is noop at startup
+    this.client?.close();
     this.client = null;
     if (!this.settings.server_conf.url) {
       new Notice(
@@ -136,6 +136,121 @@ export class WebDAVSettingsTab extends PluginSettingTab {
               key: "sync.ignore_config_folder"
             }
           },
+          {
+            name: "Sync hidden files inside folders",
+            desc: "Whether or not to sync hidden files and folders (names starting with a dot) that are inside other "
+              + "folders, like a .git folder in a subfolder. Hidden files directly in the vault or synced folder, "
+              + "including the config folder, are always synced. Obsidian doesn't keep track of hidden files, so "
+              + "finding them means listing every folder in the vault on each sync. Disabling this makes the local "
+              + "scan much faster on large vaults, but hidden files inside other folders are then left alone on both "
+              + "sides.",
+            control: {
+              type: "toggle",
+              key: "sync.sync_nested_hidden_files"
+            }
+          },
+          {
+            name: "Incremental remote listing",
+            desc: "If enabled, the plugin remembers the ETag of each remote folder, and only re-lists the folders "
+              + "that changed since the last sync. If nothing changed, this means a single request instead of a full "
+              + "listing of the remote. This only works if your WebDAV server changes a folder's ETag when anything "
+              + "inside it changes, which Nextcloud and ownCloud do. Leave this off for other servers, as stale "
+              + "listings can cause files to be missed.",
+            control: {
+              type: "toggle",
+              key: "sync.incremental_remote_listing"
+            }
+          },
+          {
+            name: "Streaming remote listing",
+            desc: "If enabled, the remote listing is processed as it arrives rather than after all of it has been "
+              + "downloaded. On pulls, files that are missing locally start downloading while the rest of the listing "
+              + "is still loading. This mostly helps with large vaults on slow connections. It has no effect with "
+              + "incremental remote listing, which doesn't use large listings to begin with.",
+            control: {
+              type: "toggle",
+              key: "sync.streaming_remote_listing"
+            }
+          },
+          {
+            name: "Track changes for faster pushes",
+            desc: "If enabled, the plugin keeps track of which files changed in the vault, so pushes only have to "
+              + "check those rather than listing the entire vault. Hidden files and folders are always checked. "
+              + "Changes Obsidian can't see (new hidden files inside normal folders, if those are synced, and changes "
+              + "made while Obsidian was closed) are picked up by a full scan at least once an hour. Pulls always list "
+              + "the entire vault, and the first push after a pull does a full scan.",
+            control: {
+              type: "toggle",
+              key: "sync.dirty_tracking"
+            }
+          },
+          {
+            name: "Compact diff",
+            desc: "If enabled, the local and remote listings are compared with a compact, sorted index rather than "
+              + "file by file lookups. This uses less memory and is faster on very large vaults (hundreds of thousands "
+              + "of files), and gives the same result.",
+            control: {
+              type: "toggle",
+              key: "sync.compact_diff"
+            }
+          },
+          {
+            name: "Content hashing",
+            desc: "If enabled, the plugin hashes local files and remembers the hashes, so files that were modified "
+              + "without their content changing aren't uploaded again, and don't show up as conflicts when pulling. "
+              + "Each file is only hashed once per change, but the first sync after enabling this reads the entire "
+              + "vault. Files above the large file threshold aren't hashed.",
+            control: {
+              type: "toggle",
+              key: "sync.content_hashing"
+            }
+          },
+          {
+            name: "Parallel transfers",
+            desc: "The maximum number of files to upload, download, or delete at the same time. Higher values make "
+              + "syncs with many changed files significantly faster on high-latency connections, but some servers "
+              + "throttle or reject clients that make too many requests at once. Set to 1 to sync one file at a time.",
+            render: (el) => {
+              el.addSlider(slider => slider
+                .setLimits(1, 16, 1)
+                .setValue(this.plugin.settings.sync.concurrency)
+                .setDynamicTooltip()
+                .onChange(async (value) => {
+                  this.plugin.settings.sync.concurrency = value;
+                  await this.plugin.saveSettings();
+                })
+              );
+            }
+          },
+          {
+            name: "Large file threshold (MiB)",
+            desc: "Files at or above this size are downloaded in chunks, so large attachments don't have to fit in "
+              + "memory all at once. Chunked uploads additionally require a desktop device, and a server that supports "
+              + "SabreDAV partial updates or Nextcloud/ownCloud chunked uploads. On mobile, Obsidian can only read "
+              + "files whole, so large files are uploaded in one go as normal.",
+            render: (el) => {
+              el.addSlider(slider => slider
+                .setLimits(8, 512, 8)
+                .setValue(this.plugin.settings.sync.large_file_threshold)
+                .setDynamicTooltip()
+                .onChange(async (value) => {
+                  this.plugin.settings.sync.large_file_threshold = value;
+                  await this.plugin.saveSettings();
+                })
+              );
+            }
+          },
+          {
+            name: "Delta uploads for large files",
+            desc: "If enabled, large files that were uploaded from this device before only have their changed parts "
+              + "uploaded, rather than the entire file. Like chunked uploads, this requires a desktop device and a "
+              + "server that supports SabreDAV partial updates. If the file was changed on the server or by another "
+              + "device since, the full file is uploaded instead.",
+            control: {
+              type: "toggle",
+              key: "sync.delta_uploads"
+            }
+          },
           {
             name: "WebDAV share for the full vault",
             desc: "Where to sync the full vault to. This is a path relative to the WebDAV server, and must not include "
@@ -262,6 +377,62 @@ export class WebDAVSettingsTab extends PluginSettingTab {
           ...this.regenerateFolderMappings()
         ]
       },
+      {
+        type: "group",
+        heading: "Automatic sync",
+        items: [
+          {
+            name: "Sync automatically",
+            desc: "If enabled, changes are pushed automatically shortly after you stop editing, and changes are pulled "
+              + "on an interval and when Obsidian regains focus. Small, frequent syncs are much faster than large, "
+              + "infrequent ones, and far less likely to run into conflicts. Automatic syncs never run at the same time "
+              + "as another sync.",
+            control: {
+              type: "toggle",
+              key: "sync.auto_sync"
+            }
+          },
+          {
+            name: "Push delay (seconds)",
+            desc: "How long to wait after the last change before pushing. Changes made in the meantime are pushed "
+              + "together. If you keep editing, changes are still pushed after at most five times this delay.",
+            render: (el) => {
+              el.addSlider(slider => slider
+                .setLimits(5, 300, 5)
+                .setValue(this.plugin.settings.sync.auto_push_delay)
+                .setDynamicTooltip()
+                .onChange(async (value) => {
+                  this.plugin.settings.sync.auto_push_delay = value;
+                  await this.plugin.saveSettings();
+                })
+              );
+            }
+          },
+          {
+            name: "Pull interval (minutes)",
+            desc: "How often to pull changes from the server. Set to 0 to only pull when Obsidian regains focus.",
+            render: (el) => {
+              el.addSlider(slider => slider
+                .setLimits(0, 120, 5)
+                .setValue(this.plugin.settings.sync.auto_pull_interval)
+                .setDynamicTooltip()
+                .onChange(async (value) => {
+                  this.plugin.settings.sync.auto_pull_interval = value;
+                  await this.plugin.saveSettings();
+                })
+              );
+            }
+          },
+          {
+            name: "Pull when Obsidian regains focus",
+            desc: "Pulls when you switch back to Obsidian, at most once a minute.",
+            control: {
+              type: "toggle",
+              key: "sync.pull_on_focus"
+            }
+          },
+        ]
+      },
       {
         type: "group",
         heading: "Meta",
@@ -318,8 +489,8 @@ export class WebDAVSettingsTab extends PluginSettingTab {
       key,
       value
     );
-    await this.plugin.saveData(this.plugin.settings);
     await this.plugin.reloadClient();
+    await this.plugin.saveSettings();
     this.update()
   }
 
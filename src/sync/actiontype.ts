@@ -9,7 +9,12 @@ export enum ActionType {
    * to ADD, REMOVE, or NOOP, as the sync implementations assume all conflict resolution has already been done.
    */
   ADD_LOCAL,
-  NOOP
+  NOOP,
+  /**
+   * The file was moved or renamed in the source. Only ever created by detectMoves, and the old path is passed to
+   * onUpdate through the context argument.
+   */
+  MOVE
 };
 
 export function actionToDescriptiveString(action: ActionType): string {
@@ -22,5 +27,7 @@ export function actionToDescriptiveString(action: ActionType): string {
     return "Conflict identified; ask user";
   case ActionType.NOOP:
     return "No changes made";
+  case ActionType.MOVE:
+    return "Move or rename";
   }
 }
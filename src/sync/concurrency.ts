@@ -0,0 +1,182 @@
+/**
+ * Minimal bounded task pool used to run sync actions in parallel.
+ *
+ * The pool deliberately doesn't queue anything itself. Callers are expected to check `hasCapacity()` (and
+ * `waitForAny()` if there isn't any) before submitting, which lets the caller decide what to do while waiting; in
+ * runSync's case, that's yielding progress reports from the transfers that have finished.
+ *
+ * Tasks must handle their own errors. Rejections are logged and otherwise swallowed to keep the pool consistent, so
+ * anything that isn't caught inside the task never reaches the caller.
+ */
+export class TaskPool {
+  limit: number;
+  running: Set<Promise<void>> = new Set();
+  shared: SharedLimit | null;
+
+  /**
+   * \param shared  An overall limit shared with other pools, if any. The pool then only has capacity if both its own
+   *                limit and the shared one do.
+   */
+  constructor(limit: number, shared: SharedLimit | null = null) {
+    // Also catches NaN and undefined, which would otherwise deadlock the pool
+    this.limit = limit >= 1 ? Math.floor(limit) : 1;
+    this.shared = shared;
+  }
+
+  get size(): number {
+    return this.running.size;
+  }
+
+  hasCapacity(): boolean {
+    return this.running.size < this.limit && (this.shared == null || this.shared.hasCapacity());
+  }
+
+  submit(task: () => Promise<void>) {
+    this.shared?.take();
+    const done = () => {
+      this.running.delete(promise);
+      this.shared?.release();
+    };
+    const promise: Promise<void> = Promise.resolve()
+      .then(task)
+      .then(
+        done,
+        (ex) => {
+          console.error(ex);
+          done();
+        }
+      );
+    this.running.add(promise);
+  }
+
+  /**
+   * Resolves once at least one of the running tasks has completed, or, with a shared limit, once any pool sharing it
+   * frees up a slot. Resolves immediately if nothing is running anywhere.
+   */
+  async waitForAny() {
+    if (this.shared != null && this.shared.used > this.running.size) {
+      // Some of the shared slots are held by other pools
+      await Promise.race(Array.from(this.running).concat([this.shared.waitForRelease()]));
+      return;
+    }
+    if (this.running.size == 0) {
+      return;
+    }
+    await Promise.race(this.running);
+  }
+}
+
+/**
+ * A limit shared between several TaskPools, so pools that run side by side (such as one per synced folder) stay within
+ * one overall limit between them, rather than each getting the full limit.
+ */
+export class SharedLimit {
+  limit: number;
+  used: number = 0;
+  private waiting: (() => void)[] = [];
+
+  constructor(limit: number) {
+    this.limit = limit >= 1 ? Math.floor(limit) : 1;
+  }
+
+  hasCapacity(): boolean {
+    return this.used < this.limit;
+  }
+
+  take() {
+    this.used++;
+  }
+
+  release() {
+    this.used--;
+    for (const resolve of this.waiting.splice(0)) {
+      resolve();
+    }
+  }
+
+  /**
+   * Resolves the next time a slot is released.
+   */
+  waitForRelease(): Promise<void> {
+    return new Promise<void>(resolve => this.waiting.push(resolve));
+  }
+}
+
+/**
+ * Runs a queue of tasks with bounded concurrency. Tasks may push further tasks onto the queue while running, which is
+ * what makes this usable for tree walks. The first error stops any new tasks from being started, and is rethrown once
+ * the tasks that are already running have finished.
+ */
+export async function runTaskQueue(queue: (() => Promise<void>)[], limit: number) {
+  const pool = new TaskPool(limit);
+  const state = {
+    failed: false,
+    failure: null as unknown,
+  };
+  while (!state.failed && (queue.length > 0 || pool.size > 0)) {
+    while (!state.failed && queue.length > 0 && pool.hasCapacity()) {
+      const task = queue.pop()!;
+      pool.submit(async () => {
+        try {
+          await task();
+        } catch (ex) {
+          if (!state.failed) {
+            state.failed = true;
+            state.failure = ex;
+          }
+        }
+      });
+    }
+    await pool.waitForAny();
+  }
+  while (pool.size > 0) {
+    await pool.waitForAny();
+  }
+  if (state.failed) {
+    throw state.failure;
+  }
+}
+
+/**
+ * Runs several async generators at once, at most `limit` at a time, and yields their values as they arrive, tagged
+ * with the index of the generator they came from. Generators are started in order as earlier ones finish. Returns
+ * the return values of the generators, in the same order as the generators.
+ *
+ * An error from any of the generators is rethrown as-is, so generators that can fail should catch their own errors.
+ */
+export async function* mergeGenerators<T, R>(
+  generators: (() => AsyncGenerator<T, R>)[],
+  limit: number,
+): AsyncGenerator<[number, T], R[]> {
+  const results: R[] = new Array(generators.length);
+  const active = new Map<number, AsyncGenerator<T, R>>();
+  const steps = new Map<number, Promise<{ index: number, step: IteratorResult<T, R> }>>();
+  const max = limit >= 1 ? Math.floor(limit) : 1;
+  let next = 0;
+
+  const advance = (index: number) => {
+    steps.set(index, active.get(index)!.next().then(step => ({ index, step })));
+  };
+  const fill = () => {
+    while (active.size < max && next < generators.length) {
+      const index = next++;
+      active.set(index, generators[index]());
+      advance(index);
+    }
+  };
+
+  fill();
+  while (steps.size > 0) {
+    const { index, step } = await Promise.race(steps.values());
+    if (step.done) {
+      results[index] = step.value;
+      steps.delete(index);
+      active.delete(index);
+      fill();
+    } else {
+      advance(index);
+      yield [index, step.value];
+    }
+  }
+  return results;
+}
@@ -4,13 +4,21 @@ import { ActionType } from "./actiontype";
 import { FileData } from "./sync";
 
 const CONFLICT_MODAL_SELECT_ACTION = "livi-webdav-sync-conflict-modal-action-picker";
-export type ConflictResolver = (action: ActionType | null) => void;
+/**
+ * Called with the chosen action, or null if the sync was aborted. In two-way mode, adding comes with the direction to
+ * add in.
+ */
+export type ConflictResolver = (action: ActionType | null, direction?: SyncDir) => void;
 export class ConflictModal extends Modal {
   fileName: string;
   direction: SyncDir;
   resolver: ConflictResolver;
   srcData: FileData;
   destData: FileData;
+  /**
+   * Two-way syncs let the user keep either side. The source is always the local side in this mode.
+   */
+  twoWay: boolean;
 
   hasYielded: boolean = false;
 
@@ -21,6 +29,7 @@ export class ConflictModal extends Modal {
     srcData: FileData,
     destData: FileData,
     resolver: ConflictResolver,
+    twoWay: boolean = false,
   ) {
     super(app)
     this.fileName = fileName;
@@ -28,10 +37,15 @@ export class ConflictModal extends Modal {
     this.srcData = srcData;
     this.destData = destData;
     this.resolver = resolver;
+    this.twoWay = twoWay;
   }
 
   onOpen() {
     const { contentEl } = this;
+    if (this.twoWay) {
+      this.openTwoWay();
+      return;
+    }
 
     contentEl.createEl("h1", {
       text: `Conflict: File edited ${this.direction == SyncDir.DOWN ? "locally" : "remotely"}`
@@ -54,7 +68,42 @@ export class ConflictModal extends Modal {
       text: `Discard ${this.direction == SyncDir.DOWN ? "local" : "remote"} changes`,
       value: "add"
     });
+    this.addButtons();
+  }
+
+  openTwoWay() {
+    const { contentEl } = this;
+    contentEl.createEl("h1", {
+      text: "Conflict: File edited on both sides"
+    });
+    contentEl.createEl("p", {
+      text: `The file ${this.fileName} was changed both locally and remotely since the last sync. The local file was `
+        + `edited on ${this.formatDate(this.srcData.lastModified)}, and the remote file was edited on `
+        + `${this.formatDate(this.destData.lastModified)}. What would you like to do?`
+    });
+    const dropdown = contentEl.createEl("select", {
+      attr: {
+        id: CONFLICT_MODAL_SELECT_ACTION
+      },
+      cls: ["livi-webdav-override"]
+    });
+    dropdown.createEl("option", {
+      text: "Do nothing (the file stays in conflict until the next sync)",
+      value: "noop"
+    });
+    dropdown.createEl("option", {
+      text: "Keep the local version (discard remote changes)",
+      value: "up"
+    });
+    dropdown.createEl("option", {
+      text: "Keep the remote version (discard local changes)",
+      value: "down"
+    });
+    this.addButtons();
+  }
 
+  addButtons() {
+    const { contentEl } = this;
     const btnWrapper = contentEl.createDiv({
       cls: ["livi-webdav-button-wrapper", "livi-webdav-flex"]
     });
@@ -87,9 +136,13 @@ export class ConflictModal extends Modal {
       new Notification("Must select an action");
       return;
     }
-    this.resolver(
-      diag.value == "add" ? ActionType.ADD : ActionType.NOOP
-    );
+    if (diag.value == "up" || diag.value == "down") {
+      this.resolver(ActionType.ADD, diag.value == "up" ? SyncDir.UP : SyncDir.DOWN);
+    } else {
+      this.resolver(
+        diag.value == "add" ? ActionType.ADD : ActionType.NOOP
+      );
+    }
     this.hasYielded = true;
     this.close();
   }
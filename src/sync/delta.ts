@@ -0,0 +1,130 @@
+import { sha256Hex } from "./hash_cache";
+import { ProgressCallback } from "./progress";
+
+/**
+ * Size of the blocks delta uploads are diffed in. Smaller blocks mean less data sent per edit, but more hashes to
+ * store and compare.
+ */
+export const BLOCK_SIZE = 1024 * 1024;
+
+/**
+ * Per-block hashes of a remote file, as of the last upload from this device. The signature is only valid for as long
+ * as the remote file's ETag matches; if anything else touched the file, it's stale, and the next upload is a full one.
+ */
+export interface BlockSignature {
+  etag: string | null;
+  size: number;
+  blockSize: number;
+  blocks: string[];
+}
+
+/**
+ * Whether or not a signature can be used to delta upload a file of `size` bytes over a remote file with the given
+ * ETag. Partial updates can't truncate files, so shrunk files need a full upload.
+ */
+export function canDelta(signature: BlockSignature | null | undefined, etag: string | null | undefined, size: number) {
+  return signature != null
+    && etag != null
+    && signature.etag == etag
+    && signature.blockSize == BLOCK_SIZE
+    && size >= signature.size;
+}
+
+/**
+ * Works out which byte ranges need to be sent to turn the old file into the new one. Adjacent changed blocks are
+ * merged, up to maxRange bytes per range.
+ *
+ * @returns Inclusive [start, end] byte ranges
+ */
+export function changedRanges(
+  oldBlocks: string[],
+  newBlocks: string[],
+  size: number,
+  blockSize: number,
+  maxRange: number,
+): [number, number][] {
+  const out: [number, number][] = [];
+  for (let i = 0; i < newBlocks.length; ++i) {
+    if (i < oldBlocks.length && oldBlocks[i] == newBlocks[i]) {
+      continue;
+    }
+    const start = i * blockSize;
+    const end = Math.min(start + blockSize, size) - 1;
+    const last = out[out.length - 1];
+    if (last != null && last[1] + 1 == start && end - last[0] + 1 <= maxRange) {
+      last[1] = end;
+    } else {
+      out.push([start, end]);
+    }
+  }
+  return out;
+}
+
+/**
+ * Reads byte ranges from a local file without loading the whole file.
+ */
+export interface RangeReader {
+  read(start: number, length: number): Promise<ArrayBuffer>;
+  close(): Promise<void>;
+}
+
+/**
+ * The remote operations a delta upload needs. Implemented on top of the WebDAV client in transfer.ts.
+ */
+export interface DeltaRemote {
+  /**
+   * Server-side copy, overwriting the destination
+   */
+  copy(from: string, to: string): Promise<void>;
+  /**
+   * Writes data at an offset in an existing file
+   */
+  patch(path: string, offset: number, data: ArrayBuffer): Promise<void>;
+  /**
+   * Moves a file into place, overwriting the destination
+   */
+  move(from: string, to: string): Promise<void>;
+}
+
+/**
+ * Sends the changed blocks of a file. The blocks aren't written to the remote file directly, as anything reading it in
+ * the meantime (or an interrupted upload) would see a mix of old and new content. Instead, the remote file is copied
+ * on the server, the copy is patched, and the copy is moved into place once it's complete.
+ *
+ * \param partialPath  Where to put the copy while it's being patched
+ * \param known        The signature of the remote file, which has to be valid for it (see canDelta)
+ * \returns the signature blocks of the new file, and the number of bytes sent
+ */
+export async function patchChangedBlocks(
+  remote: DeltaRemote,
+  reader: RangeReader,
+  remotePath: string,
+  partialPath: string,
+  known: BlockSignature,
+  size: number,
+  maxRange: number,
+  onProgress?: ProgressCallback,
+): Promise<{ blocks: string[]; sent: number }> {
+  // The file is read twice: once to find the changed blocks, and once to send them. Local reads are cheap compared
+  // to the network, and this keeps memory use bounded.
+  const blocks: string[] = [];
+  for (let offset = 0; offset < size; offset += BLOCK_SIZE) {
+    blocks.push(await sha256Hex(await reader.read(offset, Math.min(BLOCK_SIZE, size - offset))));
+  }
+  const ranges = changedRanges(known.blocks, blocks, size, BLOCK_SIZE, maxRange);
+  if (ranges.length == 0) {
+    onProgress?.(size);
+    return { blocks, sent: 0 };
+  }
+
+  let sent = 0;
+  await remote.copy(remotePath, partialPath);
+  for (const [start, end] of ranges) {
+    await remote.patch(partialPath, start, await reader.read(start, end - start + 1));
+    sent += end - start + 1;
+    // Unchanged blocks count as done, so progress is reported as the position in the file
+    onProgress?.(end + 1);
+  }
+  await remote.move(partialPath, remotePath);
+  return { blocks, sent };
+}
@@ -0,0 +1,50 @@
+import WebDAVSyncPlugin from "main";
+import { BLOCK_SIGNATURE_FILE, readPluginJson, writePluginJson } from "../fs/plugin_data";
+import { BlockSignature } from "./delta";
+
+const BLOCK_SIGNATURE_VERSION = 1;
+
+interface BlockSignatureJson {
+  version: number;
+  files: { [remotePath: string]: BlockSignature };
+}
+
+/**
+ * Persists the block signatures used by delta uploads, keyed by the remote path. These are kept locally rather than
+ * next to the remote file, so they never show up in the share or on other devices; the ETag in each signature is what
+ * tells whether it still describes the remote file.
+ */
+export class BlockSignatureStore {
+  plugin: WebDAVSyncPlugin;
+  files: Map<string, BlockSignature> = new Map();
+  loaded: boolean = false;
+
+  constructor(plugin: WebDAVSyncPlugin) {
+    this.plugin = plugin;
+  }
+
+  async load() {
+    if (this.loaded) {
+      return;
+    }
+    const data = await readPluginJson<BlockSignatureJson>(this.plugin, BLOCK_SIGNATURE_FILE);
+    this.files.clear();
+    if (data != null && data.version == BLOCK_SIGNATURE_VERSION) {
+      for (const path in data.files) {
+        this.files.set(path, data.files[path]);
+      }
+    }
+    this.loaded = true;
+  }
+
+  async save() {
+    const out: BlockSignatureJson = {
+      version: BLOCK_SIGNATURE_VERSION,
+      files: {},
+    };
+    for (const [path, signature] of this.files) {
+      out.files[path] = signature;
+    }
+    await writePluginJson(this.plugin, BLOCK_SIGNATURE_FILE, out);
+  }
+}
@@ -0,0 +1,251 @@
+import { normalizePath, TAbstractFile } from "obsidian";
+import WebDAVSyncPlugin from "main";
+import { LOCAL_INDEX_FILE, readPluginJson, writePluginJson } from "../fs/plugin_data";
+import { FileProvider } from "./files";
+import { DirtySet, hiddenRoot, mergeSubtree, removeSubtree, sortContent, toRootKey } from "./local_index";
+import { Content, FileData, Folder, Path } from "./sync";
+
+const LOCAL_INDEX_VERSION = 1;
+
+/**
+ * How long a listing built from vault events is trusted before it's verified with a full scan. Vault events don't
+ * cover changes made while Obsidian isn't running, or new hidden files in normal folders, and this is what eventually
+ * catches those.
+ */
+export const VERIFY_INTERVAL = 60 * 60 * 1000;
+
+/**
+ * How long to wait after a vault event before saving the dirty set, so a burst of events is a single write.
+ */
+const SAVE_DELAY = 5000;
+
+interface RootSnapshot {
+  verifiedAt: number;
+  content: Content;
+}
+
+interface LocalIndexJson {
+  version: number;
+  dirty: Path[];
+  roots: {
+    [root: string]: {
+      verifiedAt: number;
+      files: [Path, FileData][];
+      folders: Folder[];
+    };
+  };
+}
+
+/**
+ * Tracks which paths in the vault changed using the vault events, so a push can update the last listing of the vault
+ * rather than listing the whole thing again.
+ *
+ * This is only used for pushes. A stale local listing on a push at worst means a change isn't pushed until the next
+ * verification scan, while on a pull, it could mean overwriting local changes.
+ */
+export class DirtyTracker {
+  plugin: WebDAVSyncPlugin;
+  dirty: DirtySet = new DirtySet();
+  roots: Map<string, RootSnapshot> = new Map();
+  loaded: boolean = false;
+  saveTimer: number | null = null;
+
+  constructor(plugin: WebDAVSyncPlugin) {
+    this.plugin = plugin;
+  }
+
+  register() {
+    // Obsidian fires create for every file while loading the vault, none of which are actual changes
+    this.plugin.app.workspace.onLayoutReady(() => {
+      const vault = this.plugin.app.vault;
+      this.plugin.registerEvent(vault.on("create", (file: TAbstractFile) => this.mark(file.path)));
+      this.plugin.registerEvent(vault.on("modify", (file: TAbstractFile) => this.mark(file.path)));
+      this.plugin.registerEvent(vault.on("delete", (file: TAbstractFile) => this.mark(file.path)));
+      this.plugin.registerEvent(vault.on("rename", (file: TAbstractFile, oldPath: string) => {
+        this.mark(oldPath);
+        this.mark(file.path);
+      }));
+    });
+  }
+
+  mark(path: Path) {
+    if (!this.plugin.settings.sync.dirty_tracking) {
+      // Nothing is recorded while tracking is off, so the stored listings are out of date if it's turned back on
+      this.dirty.lose();
+      if (!this.loaded || this.roots.size > 0) {
+        this.invalidate().catch((ex) => console.error("Failed to save the local index", ex));
+      }
+      return;
+    }
+    this.dirty.add(path);
+    if (this.saveTimer == null) {
+      this.saveTimer = window.setTimeout(() => {
+        this.saveTimer = null;
+        this.save().catch((ex) => console.error("Failed to save the local index", ex));
+      }, SAVE_DELAY);
+    }
+  }
+
+  async load() {
+    if (this.loaded) {
+      return;
+    }
+    const data = await readPluginJson<LocalIndexJson>(this.plugin, LOCAL_INDEX_FILE);
+    this.roots.clear();
+    if (data != null && data.version == LOCAL_INDEX_VERSION) {
+      for (const path of data.dirty) {
+        this.dirty.add(path);
+      }
+      for (const root in data.roots) {
+        const stored = data.roots[root];
+        this.roots.set(root, {
+          verifiedAt: stored.verifiedAt,
+          content: {
+            files: new Map(stored.files),
+            folderPaths: stored.folders,
+          },
+        });
+      }
+    }
+    this.loaded = true;
+  }
+
+  async save() {
+    const out: LocalIndexJson = {
+      version: LOCAL_INDEX_VERSION,
+      dirty: Array.from(this.dirty.paths),
+      roots: {},
+    };
+    for (const [root, snapshot] of this.roots) {
+      out.roots[root] = {
+        verifiedAt: snapshot.verifiedAt,
+        files: Array.from(snapshot.content.files.entries()),
+        folders: snapshot.content.folderPaths,
+      };
+    }
+    await writePluginJson(this.plugin, LOCAL_INDEX_FILE, out);
+  }
+
+  /**
+   * Lists a sync root in the vault. If the last listing is recent enough, only the paths that changed since are
+   * checked; otherwise, this is a full scan.
+   */
+  async listLocal(fileProvider: FileProvider, root: string): Promise<Content> {
+    await this.load();
+    const snapshot = this.roots.get(root);
+    let content: Content;
+    let verifiedAt: number;
+
+    if (
+      snapshot == null
+      || Date.now() - snapshot.verifiedAt > VERIFY_INTERVAL
+      || !this.dirty.trusts(snapshot.verifiedAt)
+    ) {
+      // Taken before the scan, so anything that changes during the scan is checked again next time
+      this.dirty.take(root);
+      verifiedAt = Date.now();
+      content = await fileProvider.getVaultFiles(root);
+    } else {
+      const started = performance.now();
+      verifiedAt = snapshot.verifiedAt;
+      content = {
+        files: new Map(snapshot.content.files),
+        folderPaths: snapshot.content.folderPaths.slice(),
+      };
+      const changed = this.dirty.take(root);
+      for (const path of changed) {
+        await this.refresh(fileProvider, content, path, root);
+      }
+      // Hidden files and folders (the config folder included) don't generate vault events, so they're always listed
+      for (const path of await this.hiddenPaths(content, root)) {
+        await this.refresh(fileProvider, content, path, root);
+      }
+      content = sortContent(content);
+      console.debug(
+        `WebDAV sync: updated the local listing of ${root} from ${changed.length} changed paths in `
+          + `${Math.round(performance.now() - started)} ms`
+      );
+    }
+
+    this.roots.set(root, {
+      verifiedAt,
+      content,
+    });
+    try {
+      await this.save();
+    } catch (ex) {
+      console.error("Failed to save the local index", ex);
+    }
+    return content;
+  }
+
+  /**
+   * Finds the hidden paths under a root, i.e. the paths vault events don't cover: the topmost hidden folders and files
+   * in the listing, and any new ones directly in the root. If sync_nested_hidden_files is enabled, new hidden files
+   * deeper down in normal folders are still only found by the next full scan; as they aren't in the listing, they're
+   * just not pushed until then.
+   */
+  async hiddenPaths(content: Content, root: string): Promise<Path[]> {
+    const out = new Set<Path>();
+    const add = (path: Path) => {
+      const hidden = hiddenRoot(path);
+      if (hidden != null) {
+        out.add(hidden);
+      }
+    };
+    for (const file of content.files.keys()) {
+      add(root == "/" ? file : root + "/" + file);
+    }
+    for (const folder of content.folderPaths) {
+      add(folder.realPath);
+    }
+    const top = await this.plugin.adapter().list(normalizePath(root));
+    for (const path of top.files.concat(top.folders)) {
+      add(path);
+    }
+    return Array.from(out).sort();
+  }
+
+  /**
+   * Drops every stored listing, so the next push does a full scan. Used before anything that writes to the vault
+   * through the adapter, such as pulls, as those writes don't necessarily generate vault events, and whenever changes
+   * go unrecorded because tracking is off.
+   */
+  async invalidate() {
+    await this.load();
+    if (this.roots.size == 0) {
+      return;
+    }
+    this.roots.clear();
+    try {
+      await this.save();
+    } catch (ex) {
+      console.error("Failed to save the local index", ex);
+    }
+  }
+
+  async refresh(fileProvider: FileProvider, content: Content, path: Path, root: string) {
+    const key = toRootKey(path, root);
+    removeSubtree(content, key);
+    const stat = await this.plugin.adapter().stat(normalizePath(path));
+    if (stat == null) {
+      return;
+    }
+    if (stat.type == "file") {
+      if (!fileProvider.shouldIgnoreFile(path)) {
+        content.files.set(key, {
+          lastModified: stat.mtime || null,
+          size: stat.size,
+          destination: path,
+        } as FileData);
+      }
+    } else if (!fileProvider.shouldIgnoreFolder(path)) {
+      mergeSubtree(
+        content,
+        { realPath: path, commonPath: key },
+        await fileProvider.getVaultFiles(path),
+        root
+      );
+    }
+  }
+}
@@ -0,0 +1,96 @@
+import { FileData, Path } from "./sync";
+
+/**
+ * Downloads that start while the remote listing is still streaming in (see FileProvider.listRemoteStreaming). On a
+ * pull, a remote file that doesn't exist locally is always going to be downloaded, so there's no need to wait for the
+ * rest of the listing to start on it.
+ *
+ * At most `limit` downloads run at once, with a short queue behind them. Anything that doesn't fit in the queue, or is
+ * still queued when the listing finishes, is left to the regular sync. runSync then picks up the results through
+ * get(), and only downloads the file itself if the early download failed.
+ */
+export class EarlyDownloads {
+  limit: number;
+  download: (file: Path, data: FileData) => Promise<void>;
+  running: number = 0;
+  queue: [Path, FileData][] = [];
+  closed: boolean = false;
+  /**
+   * Whether each started download succeeded.
+   */
+  results: Map<Path, Promise<boolean>> = new Map();
+  /**
+   * How long each successful download took, so it can be reported like any other transfer.
+   */
+  durations: Map<Path, number> = new Map();
+  now: () => number;
+
+  constructor(
+    limit: number,
+    download: (file: Path, data: FileData) => Promise<void>,
+    now: () => number = Date.now,
+  ) {
+    this.limit = limit >= 1 ? Math.floor(limit) : 1;
+    this.download = download;
+    this.now = now;
+  }
+
+  offer(file: Path, data: FileData) {
+    if (this.closed || this.results.has(file)) {
+      return;
+    }
+    if (this.running < this.limit) {
+      this.start(file, data);
+    } else if (this.queue.length < this.limit * 4) {
+      this.queue.push([file, data]);
+    }
+  }
+
+  private start(file: Path, data: FileData) {
+    this.running++;
+    const started = this.now();
+    const result = this.download(file, data).then(
+      () => {
+        this.durations.set(file, this.now() - started);
+        return true;
+      },
+      (ex) => {
+        console.warn(`Early download of ${file} failed; leaving it to the sync`, ex);
+        return false;
+      }
+    ).then((ok) => {
+      this.running--;
+      if (!this.closed && this.queue.length > 0) {
+        const [next, nextData] = this.queue.shift() as [Path, FileData];
+        this.start(next, nextData);
+      }
+      return ok;
+    });
+    this.results.set(file, result);
+  }
+
+  /**
+   * Called when the listing is done. Downloads that haven't started yet are dropped, as the regular sync is about to
+   * take over.
+   */
+  close() {
+    this.closed = true;
+    this.queue = [];
+  }
+
+  /**
+   * \returns whether the early download of the file succeeded, or undefined if it was never started
+   */
+  get(file: Path): Promise<boolean> | undefined {
+    return this.results.get(file);
+  }
+
+  /**
+   * Waits for every started download to finish. Used when the sync is aborted after the listing, so nothing is still
+   * writing to the vault afterwards.
+   */
+  async settle() {
+    this.close();
+    await Promise.all(Array.from(this.results.values()));
+  }
+}
@@ -1,9 +1,16 @@
 import {FileStat} from "webdav";
 import {RemoteFileResult} from "./sync_modal";
 import {Content, FileData, Folder, Path} from "./sync";
-import {normalizePath, Notice} from "obsidian";
+import {normalizePath, Notice, TFile, TFolder} from "obsidian";
 import WebDAVSyncPlugin from "main";
-import {stripPrefix} from "./pathutils";
+import {prefixToStr, stripPrefix} from "./pathutils";
+import {isPluginStateFile} from "../fs/plugin_data";
+import {CachedCollection, flattenTree, RemoteEntry} from "./remote_tree";
+import {runTaskQueue} from "./concurrency";
+import {PARTIAL_SUFFIX} from "./transfer";
+import {entriesUnder, ListingGroup, planSharedListings} from "./listing";
+import {MultistatusParser} from "../fs/multistatus";
+import {hiddenRoot} from "./local_index";
 
 export class FileProvider {
   plugin: WebDAVSyncPlugin;
@@ -12,8 +19,15 @@ export class FileProvider {
   ) {
     this.plugin = plugin;
   }
+  /**
+   * Lists a remote folder.
+   *
+   * \param onFile  With streaming listings (see canStreamListing), called with each file as soon as it's listed. It's
+   *                not called for ignored files.
+   */
   async getRemoteFiles(
     folder: string,
+    onFile?: (path: Path, data: FileData) => void,
   ): Promise<RemoteFileResult> {
     if (this.plugin.client == null) {
       return {
@@ -22,48 +36,29 @@ export class FileProvider {
       };
     }
     try {
-      const files: FileStat[] = await this.plugin.client.client.getDirectoryContents(
-        folder, {
-          deep: true,
-        }
-      );
-      const folders = [] as Folder[];
-      const out = new Map<Path, FileData>();
-
-      for (const file of files) {
-        const sanitised = file.filename.replace(folder + (folder.endsWith("/") ? "" : "/"), "");
-        // Obsidian does not include directories, so this is necessary to avoid every folder
-        // being marked for removal
-        // TODO: this should mean that stub folders aren't deleted either. Separating them into a separate map
-        // with special deletion logic is probably a good idea.
-        if (file.type == "directory") {
-          if (this.shouldIgnoreFolder(sanitised)) {
-            continue;
+      if (this.canStreamListing()) {
+        // Builds the content as the listing arrives, so the full listing is never held in memory twice
+        const content: Content = { files: new Map(), folderPaths: [] };
+        await this.listRemoteStreaming(folder, (entry) => {
+          const path = this.addRemoteEntry(content, folder, entry);
+          if (path != null && onFile != null) {
+            onFile(path, content.files.get(path) as FileData);
           }
-          folders.push({
-            realPath: sanitised,
-            commonPath: sanitised
-          })
-          continue;
-        }
-        if (this.shouldIgnoreFile(sanitised)) {
-          continue;
-        }
-
-        out.set(
-          sanitised,
-          {
-            lastModified: Date.parse(file.lastmod),
-            destination: sanitised,
-          } as FileData
-        )
+        });
+        return {
+          content,
+          error: null
+        };
       }
-
+      const files: RemoteEntry[] = this.plugin.settings.sync.incremental_remote_listing
+        ? await this.listRemoteIncremental(folder)
+        : await this.plugin.client.client.getDirectoryContents(
+          folder, {
+            deep: true,
+          }
+        ) as FileStat[];
       return {
-        content: {
-          files: out,
-          folderPaths: folders,
-        },
+        content: this.toRemoteContent(folder, files),
         error: null
       };
     } catch (ex) {
@@ -80,13 +75,279 @@ export class FileProvider {
     }
   }
 
+  /**
+   * Lists several remote folders at once, for subfolder sync. The listings run in parallel, and share a single deep
+   * listing where possible (see planSharedListings). Sharing is skipped with incremental listing, as the ETag cache is
+   * per folder, and unchanged folders are already cheap to list.
+   *
+   * Partial sync setups often deny access to the parent folder, so if a shared listing fails, each folder in it is
+   * listed on its own instead.
+   *
+   * Unlike getRemoteFiles, this never throws; errors are returned for each folder that couldn't be listed.
+   */
+  async getRemoteFilesShared(
+    folders: string[],
+  ): Promise<Map<string, RemoteFileResult>> {
+    const out = new Map<string, RemoteFileResult>();
+    const client = this.plugin.client?.client;
+    const incremental = this.plugin.settings.sync.incremental_remote_listing;
+    const queue: (() => Promise<void>)[] = [];
+    const listGroup = (group: ListingGroup) => async () => {
+      try {
+        if (client == null) {
+          throw new Error("No connection established");
+        }
+        const entries: RemoteEntry[] = [];
+        if (incremental) {
+          entries.push(...await this.listRemoteIncremental(group.listRoot));
+        } else if (this.canStreamListing()) {
+          await this.listRemoteStreaming(group.listRoot, (entry) => { entries.push(entry); });
+        } else {
+          entries.push(...await client.getDirectoryContents(group.listRoot, { deep: true }) as FileStat[]);
+        }
+        for (const member of group.members) {
+          out.set(member, {
+            content: this.toRemoteContent(
+              member,
+              member == group.listRoot ? entries : entriesUnder(entries, member)
+            ),
+            error: null
+          });
+        }
+      } catch (ex) {
+        if (!group.members.includes(group.listRoot)) {
+          console.warn(`Failed to list ${group.listRoot}; listing the folders in it separately`, ex);
+          for (const member of group.members) {
+            queue.push(listGroup({ listRoot: member, members: [member] }));
+          }
+          return;
+        }
+        console.error(ex);
+        const message = !(ex instanceof Error)
+          ? "Unknown error"
+          : ex.message.contains("Failed to fetch")
+            ? "Failed to fetch from remote server. Has the server gone down?"
+            : ex.message;
+        for (const member of group.members) {
+          out.set(member, {
+            content: null,
+            error: `Failed to list ${member}: ${message}`
+          });
+        }
+      }
+    };
+    for (const group of planSharedListings(folders, !incremental)) {
+      queue.push(listGroup(group));
+    }
+    await runTaskQueue(queue, this.plugin.settings.sync.concurrency);
+    return out;
+  }
+
+  /**
+   * Converts a deep listing of a remote folder into the sync representation.
+   */
+  toRemoteContent(folder: string, files: RemoteEntry[]): Content {
+    const content: Content = {
+      files: new Map<Path, FileData>(),
+      folderPaths: [],
+    };
+    for (const file of files) {
+      this.addRemoteEntry(content, folder, file);
+    }
+    return content;
+  }
+
+  /**
+   * Adds a single listing entry to the sync representation of a remote folder.
+   *
+   * \returns the path of the file if a file was added, or null if the entry was a folder or ignored
+   */
+  addRemoteEntry(content: Content, folder: string, file: RemoteEntry): Path | null {
+    const sanitised = file.filename.replace(folder + (folder.endsWith("/") ? "" : "/"), "");
+    // Obsidian does not include directories, so this is necessary to avoid every folder
+    // being marked for removal
+    // TODO: this should mean that stub folders aren't deleted either. Separating them into a separate map
+    // with special deletion logic is probably a good idea.
+    if (this.isNestedHidden(sanitised)) {
+      // Not in the local listing either (see getVaultFiles), so these have to be left alone on both sides
+      return null;
+    }
+    if (file.type == "directory") {
+      if (!this.shouldIgnoreFolder(sanitised)) {
+        content.folderPaths.push({
+          realPath: sanitised,
+          commonPath: sanitised
+        });
+      }
+      return null;
+    }
+    if (this.shouldIgnoreFile(sanitised)) {
+      return null;
+    }
+
+    content.files.set(
+      sanitised,
+      {
+        lastModified: Date.parse(file.lastmod),
+        size: file.size,
+        etag: file.etag ?? null,
+        destination: sanitised,
+      } as FileData
+    );
+    return sanitised;
+  }
+
+  /**
+   * Whether getRemoteFiles streams deep listings. Incremental listing is made out of small Depth: 1 listings, so
+   * there's nothing to gain from streaming those.
+   */
+  canStreamListing(): boolean {
+    return this.plugin.client != null
+      && this.plugin.settings.sync.streaming_remote_listing
+      && !this.plugin.settings.sync.incremental_remote_listing;
+  }
+
+  /**
+   * Deep listing of a remote folder that parses the response as it arrives (see MultistatusParser), rather than
+   * waiting for all of it. Produces the same entries as getDirectoryContents.
+   *
+   * \param onEntry Called with each entry as soon as it's parsed
+   */
+  async listRemoteStreaming(
+    folder: string,
+    onEntry: (entry: RemoteEntry) => void,
+  ): Promise<void> {
+    if (this.plugin.client == null) {
+      throw new Error("No connection established");
+    }
+    const connection = this.plugin.client;
+    // Same request as getDirectoryContents(folder, { deep: true })
+    const response = await connection.client.customRequest(folder, {
+      method: "PROPFIND",
+      headers: {
+        Accept: "text/plain,application/xml",
+        Depth: "infinity",
+      },
+    });
+    const parser = new MultistatusParser(new URL(connection.conf.url as string).pathname, folder);
+    const reader = response.body?.getReader();
+    if (reader == null) {
+      // No streaming support, but the parsing is the same
+      parser.push(await response.text()).forEach(onEntry);
+    } else {
+      const decoder = new TextDecoder();
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+          break;
+        }
+        parser.push(decoder.decode(value, { stream: true })).forEach(onEntry);
+      }
+      parser.push(decoder.decode()).forEach(onEntry);
+    }
+    parser.end().forEach(onEntry);
+  }
+
+  /**
+   * Lists a remote folder using the ETag cache in RemoteTreeStore. The root is checked with a Depth: 0 PROPFIND, and
+   * if its ETag is unchanged, the cached tree is used as-is. Otherwise, the tree is walked with Depth: 1 PROPFINDs,
+   * but only into subfolders whose ETag changed.
+   *
+   * This relies on the server changing a collection's ETag whenever anything in it changes, recursively. Servers that
+   * don't report ETags for collections fall back to a regular deep listing.
+   *
+   * The cached tree is unfiltered, like a deep listing would be. The ignore settings are applied to the output by
+   * toRemoteContent, so changing them doesn't leave a stale cache behind.
+   */
+  async listRemoteIncremental(
+    folder: string
+  ): Promise<RemoteEntry[]> {
+    if (this.plugin.client == null) {
+      throw new Error("No connection established");
+    }
+    const client = this.plugin.client.client;
+    const store = this.plugin.remoteTree;
+    await store.load();
+
+    const rootStat = await client.stat(folder) as FileStat;
+    if (rootStat.etag == null) {
+      console.warn("WebDAV server does not report collection ETags; falling back to a full listing");
+      return await client.getDirectoryContents(folder, { deep: true }) as FileStat[];
+    }
+    const cachedRoot = store.roots.get(folder);
+    if (cachedRoot != null && cachedRoot.etag == rootStat.etag) {
+      return flattenTree(cachedRoot);
+    }
+
+    const root: CachedCollection = {
+      filename: rootStat.filename,
+      etag: rootStat.etag,
+      files: {},
+      folders: {},
+    };
+    const pending: (() => Promise<void>)[] = [];
+
+    const visit = (node: CachedCollection, cached: CachedCollection | null) => async () => {
+      const contents = await client.getDirectoryContents(node.filename) as FileStat[];
+      for (const item of contents) {
+        if (item.type == "directory") {
+          const cachedChild = cached?.folders[item.basename];
+          if (cachedChild != null && item.etag != null && cachedChild.etag == item.etag) {
+            node.folders[item.basename] = cachedChild;
+            continue;
+          }
+          const child: CachedCollection = {
+            filename: item.filename,
+            etag: item.etag ?? null,
+            files: {},
+            folders: {},
+          };
+          node.folders[item.basename] = child;
+          pending.push(visit(child, cachedChild ?? null));
+        } else {
+          node.files[item.basename] = {
+            filename: item.filename,
+            basename: item.basename,
+            type: "file",
+            lastmod: item.lastmod,
+            size: item.size,
+            etag: item.etag ?? null,
+          };
+        }
+      }
+    };
+
+    pending.push(visit(root, cachedRoot ?? null));
+    await runTaskQueue(pending, this.plugin.settings.sync.concurrency);
+
+    store.roots.set(folder, root);
+    try {
+      await store.save();
+    } catch (ex) {
+      console.error("Failed to save the remote tree cache", ex);
+    }
+    return flattenTree(root);
+  }
+
+  /**
+   * Lists the vault (or a folder in it). Folder listings and file stats are run in parallel, bounded by the
+   * concurrency setting, as the adapter calls are slow on mobile and on network-mounted vaults.
+   *
+   * Everything Obsidian indexes is taken from the vault's in-memory tree, stats included, so it doesn't cost an adapter
+   * call at all. Obsidian doesn't index hidden files and folders (the config folder included), so the ones directly in
+   * the root are walked through the adapter. Hidden files and folders further down can only be found by listing every
+   * folder, so they're skipped on both sides (see isNestedHidden), unless sync_nested_hidden_files is enabled, in which
+   * case the whole root is walked through the adapter.
+   *
+   * The order of the output is sorted by path, as the order the parallel calls complete in isn't stable.
+   */
   async getVaultFiles(
     root: string = "/"
   ): Promise<Content> {
-    //const files = this.app.vault.getFiles();
-    const queue: string[] = [];
+    const started = performance.now();
+    const adapter = this.plugin.adapter();
 
-    if (!(await this.plugin.adapter().exists(normalizePath(root)))) {
+    if (!(await adapter.exists(normalizePath(root)))) {
       return {
         files: new Map<Path, FileData>(),
         folderPaths: []
@@ -94,45 +355,104 @@ export class FileProvider {
     }
 
     const outFolders = [] as Folder[];
+    const files: { path: string, lastModified: number | null, size: number | null }[] = [];
+    const pending: (() => Promise<void>)[] = [];
+    let indexedCount = 0;
 
-    queue.push(root);
-    const files: { path: string, lastModified: number | null }[] = [];
-    while (queue.length > 0) {
-      const elem = queue.pop() as string;
-      const next = await this.plugin.adapter().list(
-        normalizePath(elem)
-      );
+    const statFile = (file: string) => async () => {
+      const stat = await adapter.stat(file);
+      files.push({
+        path: file,
+        lastModified: stat?.mtime || null,
+        size: stat?.size ?? null,
+      });
+    };
+    // The config folder is never indexed, whatever it's called
+    const isHidden = (path: string) => path.split("/").pop()?.startsWith(".") || path == this.plugin.configDir();
+    const addFolder = (elem: string) => {
+      if (this.shouldIgnoreFolder(elem)) {
+        return false;
+      }
+      if (root == "/") {
+        outFolders.push({
+          realPath: elem,
+          commonPath: elem
+        });
+      } else {
+        outFolders.push({
+          realPath: elem,
+          commonPath: stripPrefix(elem, root)
+        });
+      }
+      return true;
+    };
+    const listFolder = (elem: string) => async () => {
       // Don't push the root folder (deletion of the root folder is an irrelevant edge-case, because a deleted root folder 
       // means the entire vault or an entire shared subfolder has been deleted, and we can't delete root-level folders
       // in the webdav share. The plugin will also likely be gone at this point, at which point everything is UB anyway)
-      if (elem != root) {
-        if (this.shouldIgnoreFolder(elem)) {
+      if (elem != root && !addFolder(elem)) {
+        return;
+      }
+      const next = await adapter.list(
+        normalizePath(elem)
+      );
+      for (const folder of next.folders) {
+        pending.push(listFolder(folder));
+      }
+      for (const file of next.files) {
+        if (this.shouldIgnoreFile(file)) {
           continue;
         }
-        if (root == "/") {
-          outFolders.push({
-            realPath: elem,
-            commonPath: elem
+        const indexed = this.plugin.app.vault.getAbstractFileByPath(file);
+        if (indexed instanceof TFile) {
+          files.push({
+            path: file,
+            lastModified: indexed.stat.mtime || null,
+            size: indexed.stat.size,
           });
+          indexedCount++;
         } else {
-          outFolders.push({
-            realPath: elem,
-            commonPath: stripPrefix(elem, root)
-          });
+          pending.push(statFile(file));
         }
       }
-      queue.push(...next.folders);
-      for (const file of next.files) {
-        if (this.shouldIgnoreFile(file)) {
+    };
+
+    if (this.plugin.settings.sync.sync_nested_hidden_files || hiddenRoot(root) != null) {
+      // Nothing under a hidden root is indexed
+      pending.push(listFolder(root));
+    } else {
+      const prefix = root == "/" ? "" : prefixToStr(root);
+      for (const indexed of this.plugin.app.vault.getAllLoadedFiles()) {
+        if (!indexed.path.startsWith(prefix) || indexed.path == "/") {
           continue;
         }
-        const stat = await this.plugin.adapter().stat(file);
-        files.push({
-          path: file,
-          lastModified: stat?.mtime || null,
-        });
+        if (indexed instanceof TFolder) {
+          addFolder(indexed.path);
+        } else if (indexed instanceof TFile && !this.shouldIgnoreFile(indexed.path)) {
+          files.push({
+            path: indexed.path,
+            lastModified: indexed.stat.mtime || null,
+            size: indexed.stat.size,
+          });
+          indexedCount++;
+        }
+      }
+      const top = await adapter.list(normalizePath(root));
+      for (const folder of top.folders) {
+        if (isHidden(folder)) {
+          pending.push(listFolder(folder));
+        }
+      }
+      for (const file of top.files) {
+        if (isHidden(file) && !this.shouldIgnoreFile(file)) {
+          pending.push(statFile(file));
+        }
       }
     }
+    await runTaskQueue(pending, this.plugin.settings.sync.concurrency);
+
+    files.sort((a, b) => a.path < b.path ? -1 : a.path > b.path ? 1 : 0);
+    outFolders.sort((a, b) => a.realPath < b.realPath ? -1 : a.realPath > b.realPath ? 1 : 0);
 
     const out = new Map<Path, FileData>();
 
@@ -150,17 +470,35 @@ export class FileProvider {
         compliantDestinationMap,
         { 
           lastModified: file.lastModified,
+          size: file.size,
           destination: localFile
         } as FileData
       )
     }
 
+    console.debug(
+      `WebDAV sync: scanned ${out.size} files (${indexedCount} from the vault index) and ${outFolders.length} folders `
+        + `in ${root} in ${Math.round(performance.now() - started)} ms`
+    );
+
     return {
       files: out,
       folderPaths: outFolders
     }
   }
 
+  /**
+   * Whether a path (relative to a sync root) is a hidden file or folder below the top level of the root, or inside
+   * one. Those aren't indexed by Obsidian, so finding them means listing every folder; unless sync_nested_hidden_files
+   * is enabled, they're skipped on both sides instead.
+   */
+  isNestedHidden(path: string) {
+    if (this.plugin.settings.sync.sync_nested_hidden_files) {
+      return false;
+    }
+    return hiddenRoot(path)?.includes("/") ?? false;
+  }
+
   _isPathPrefixDisabled(path: string) {
 
     return this.plugin.settings.sync.ignore_config_folder 
@@ -173,6 +511,8 @@ export class FileProvider {
 
   shouldIgnoreFile(file: string) {
     return this._isPathPrefixDisabled(file)
+      || isPluginStateFile(this.plugin, file)
+      || file.endsWith(PARTIAL_SUFFIX)
       || (
         this.plugin.settings.sync.ignore_workspace
         && (
@@ -0,0 +1,103 @@
+import { runTaskQueue } from "./concurrency";
+import { Files } from "./sync";
+
+/**
+ * A cached content hash. The hash is only valid as long as the size and mtime still match; anything that changes the
+ * content changes at least one of them.
+ */
+export interface HashCacheEntry {
+  size: number;
+  mtime: number;
+  hash: string;
+}
+
+export async function sha256Hex(data: ArrayBuffer): Promise<string> {
+  const digest = new Uint8Array(await crypto.subtle.digest("SHA-256", data));
+  let out = "";
+  for (let i = 0; i < digest.length; ++i) {
+    out += (digest[i] < 16 ? "0" : "") + digest[i].toString(16);
+  }
+  return out;
+}
+
+/**
+ * Content hashes of local files, keyed by the vault path. Used by the content hashing mode so files that were touched
+ * without being changed (which some parts of Obsidian love to do, particularly on Android) don't get transferred again.
+ * Each file is only hashed once per change, as the cache is keyed on (path, size, mtime).
+ */
+export class HashCache {
+  entries: Map<string, HashCacheEntry> = new Map();
+  /**
+   * Set whenever an entry is added or removed, so the cache is only written back when something changed.
+   */
+  dirty: boolean = false;
+
+  get(path: string, size: number, mtime: number): string | null {
+    const entry = this.entries.get(path);
+    if (entry == null || entry.size != size || entry.mtime != mtime) {
+      return null;
+    }
+    return entry.hash;
+  }
+
+  set(path: string, size: number, mtime: number, hash: string) {
+    this.entries.set(path, { size, mtime, hash });
+    this.dirty = true;
+  }
+
+  /**
+   * Drops entries under `prefix` that aren't in `present`. Entries outside the prefix belong to other synced roots, and
+   * are left alone.
+   */
+  retain(prefix: string, present: Set<string>) {
+    for (const path of Array.from(this.entries.keys())) {
+      if (path.startsWith(prefix) && !present.has(path)) {
+        this.entries.delete(path);
+        this.dirty = true;
+      }
+    }
+  }
+
+  /**
+   * Attaches content hashes to a set of local files, hashing the ones that aren't cached. Files without a known size or
+   * mtime are skipped, as there's no way to tell when the hash goes stale.
+   *
+   * Files of `maxSize` bytes or more are skipped too, as they'd have to be read into memory whole; they're compared by
+   * timestamp and size like they would be without content hashing.
+   *
+   * @param prefix  The vault prefix of the files' keys, i.e. the output of prefixToStr
+   * @param read    Reads the file at the given vault path
+   * @param maxSize The size from which files aren't hashed
+   */
+  async attach(
+    files: Files,
+    prefix: string,
+    read: (path: string) => Promise<ArrayBuffer>,
+    concurrency: number,
+    maxSize: number = Infinity,
+  ) {
+    const present = new Set<string>();
+    const pending: (() => Promise<void>)[] = [];
+    for (const [file, data] of files) {
+      const path = prefix + file;
+      const size = data.size;
+      const mtime = data.lastModified;
+      if (size == null || mtime == null || size >= maxSize) {
+        continue;
+      }
+      present.add(path);
+      const cached = this.get(path, size, mtime);
+      if (cached != null) {
+        data.hash = cached;
+        continue;
+      }
+      pending.push(async () => {
+        const hash = await sha256Hex(await read(path));
+        this.set(path, size, mtime, hash);
+        data.hash = hash;
+      });
+    }
+    await runTaskQueue(pending, concurrency);
+    this.retain(prefix, present);
+  }
+}
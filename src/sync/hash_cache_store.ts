@@ -0,0 +1,53 @@
+import WebDAVSyncPlugin from "main";
+import { HASH_CACHE_FILE, readPluginJson, writePluginJson } from "../fs/plugin_data";
+import { HashCache, HashCacheEntry } from "./hash_cache";
+
+const HASH_CACHE_VERSION = 1;
+
+interface HashCacheJson {
+  version: number;
+  entries: { [path: string]: HashCacheEntry };
+}
+
+/**
+ * Persists the content hash cache (see hash_cache.ts) in the plugin folder. Like the manifest, it's loaded lazily and
+ * kept in memory afterwards.
+ */
+export class HashCacheStore {
+  plugin: WebDAVSyncPlugin;
+  cache: HashCache = new HashCache();
+  loaded: boolean = false;
+
+  constructor(plugin: WebDAVSyncPlugin) {
+    this.plugin = plugin;
+  }
+
+  async load() {
+    if (this.loaded) {
+      return;
+    }
+    const data = await readPluginJson<HashCacheJson>(this.plugin, HASH_CACHE_FILE);
+    this.cache = new HashCache();
+    if (data != null && data.version == HASH_CACHE_VERSION) {
+      for (const path in data.entries) {
+        this.cache.entries.set(path, data.entries[path]);
+      }
+    }
+    this.loaded = true;
+  }
+
+  async save() {
+    if (!this.cache.dirty) {
+      return;
+    }
+    const out: HashCacheJson = {
+      version: HASH_CACHE_VERSION,
+      entries: {},
+    };
+    for (const [path, entry] of this.cache.entries) {
+      out.entries[path] = entry;
+    }
+    await writePluginJson(this.plugin, HASH_CACHE_FILE, out);
+    this.cache.dirty = false;
+  }
+}
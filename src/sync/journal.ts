@@ -0,0 +1,243 @@
+import { ActionType } from "./actiontype";
+import { Actions, Content, FileData, Files, findDeletedFolders, Folder, Path } from "./sync";
+import { SyncDir } from "./syncdir";
+
+const JOURNAL_VERSION = 3;
+
+/**
+ * Written before a root is synced. Contains everything needed to run the remaining actions without listing both sides
+ * again. Subfolders are synced concurrently, so the journal can contain one plan per root, with their other records
+ * interleaved.
+ *
+ * Only the files the actions refer to are stored, rather than the full listings, as the plan is written on every sync
+ * with something to do.
+ */
+export interface JournalPlan {
+  type: "plan";
+  version: number;
+  /**
+   * The manifest key of the root being synced (see manifestKey)
+   */
+  key: string;
+  direction: SyncDir;
+  dest: string;
+  localPrefix: string | null;
+  actions: [Path, ActionType][];
+  moves: [Path, Path][];
+  src: [Path, FileData][];
+  target: [Path, FileData][];
+  /**
+   * Folders in the target that aren't in the source, i.e. the folders the sync deletes (see findDeletedFolders)
+   */
+  deletedFolders: Folder[];
+}
+
+/**
+ * Written once per completed action. Folders are the roots of deleted subtrees, which also complete any REMOVE under
+ * them. "end" is written when a root is done (or superseded), so it's no longer resumed.
+ */
+export type JournalRecord = JournalPlan
+  | { type: "done"; key: string; path: Path; action: ActionType }
+  | { type: "folder"; key: string; path: Path }
+  | { type: "end"; key: string };
+
+/**
+ * The parsed state of an unfinished sync.
+ */
+export interface JournalState {
+  plan: JournalPlan;
+  done: Actions;
+  deletedFolders: Set<Path>;
+}
+
+export function createPlan(
+  key: string,
+  direction: SyncDir,
+  dest: string,
+  localPrefix: string | null,
+  source: Content,
+  target: Content,
+  actions: Actions,
+  moves: Map<Path, Path>,
+): JournalPlan {
+  const src: [Path, FileData][] = [];
+  const dst: [Path, FileData][] = [];
+  const add = (out: [Path, FileData][], files: Files, file: Path) => {
+    const data = files.get(file);
+    if (data != null) {
+      out.push([file, data]);
+    }
+  };
+  for (const [file] of actions) {
+    add(src, source.files, file);
+    add(dst, target.files, file);
+    const movedFrom = moves.get(file);
+    if (movedFrom != null) {
+      add(dst, target.files, movedFrom);
+    }
+  }
+  return {
+    type: "plan",
+    version: JOURNAL_VERSION,
+    key,
+    direction,
+    dest,
+    localPrefix,
+    actions: Array.from(actions.entries()),
+    moves: Array.from(moves.entries()),
+    src,
+    target: dst,
+    deletedFolders: findDeletedFolders(source.folderPaths, target.folderPaths),
+  };
+}
+
+/**
+ * Parses a journal into the unfinished roots in it, by manifest key. The journal is append-only, so an interrupted
+ * write can only ever break one line, which is skipped; whatever it was recording is just redone. Records without a
+ * (usable) plan before them are ignored.
+ */
+export function parseJournal(text: string): Map<string, JournalState> {
+  const states = new Map<string, JournalState>();
+  for (const line of text.split("\n")) {
+    if (line.trim() == "") {
+      continue;
+    }
+    let record: JournalRecord;
+    try {
+      record = JSON.parse(line) as JournalRecord;
+    } catch (_ex) {
+      continue;
+    }
+    if (record.type == "plan") {
+      if (record.version == JOURNAL_VERSION) {
+        states.set(record.key, {
+          plan: record,
+          done: new Map(),
+          deletedFolders: new Set(),
+        });
+      } else {
+        states.delete(record.key);
+      }
+      continue;
+    }
+    const state = states.get(record.key);
+    if (state == null) {
+      continue;
+    } else if (record.type == "done") {
+      state.done.set(record.path, record.action);
+    } else if (record.type == "folder") {
+      state.deletedFolders.add(record.path);
+    } else if (record.type == "end") {
+      states.delete(record.key);
+    }
+  }
+  return states;
+}
+
+function isUnder(path: Path, folder: Path) {
+  return path.startsWith(folder + "/");
+}
+
+/**
+ * Whether a file in a fresh listing is still the one the plan was made for.
+ */
+function unchanged(current: FileData | undefined, planned: FileData | undefined) {
+  if (current == null || planned == null) {
+    return current == planned;
+  }
+  if (current.etag != null && planned.etag != null) {
+    return current.etag == planned.etag;
+  }
+  return current.lastModified == planned.lastModified
+    && (current.size ?? null) == (planned.size ?? null);
+}
+
+/**
+ * Works out what's left to do from a journal, revalidating the remaining actions against fresh listings of both sides.
+ * Actions for files that changed on either side since the plan was made are dropped rather than run against stale
+ * data; in particular, nothing written to the target after the interruption is overwritten or deleted without a
+ * conflict check. The next full sync picks the dropped files up, with the usual conflict handling.
+ */
+export function pendingActions(
+  state: JournalState,
+  currentSrc: Files,
+  currentTarget: Files,
+): { pending: Actions; dropped: number } {
+  const plannedSrc = new Map(state.plan.src);
+  const plannedTarget = new Map(state.plan.target);
+  const moves = new Map(state.plan.moves);
+  const deletedFolders = Array.from(state.deletedFolders);
+  const pending: Actions = new Map();
+  let dropped = 0;
+  for (const [file, action] of state.plan.actions) {
+    if (state.done.has(file)) {
+      continue;
+    }
+    if (action == ActionType.REMOVE) {
+      if (deletedFolders.some(folder => isUnder(file, folder))) {
+        continue;
+      }
+      if (!currentTarget.has(file) && !currentSrc.has(file)) {
+        // Already removed; the done record just didn't make it into the journal
+        continue;
+      }
+    }
+    const movedFrom = moves.get(file);
+    let valid = action == ActionType.REMOVE
+      ? !currentSrc.has(file)
+      : unchanged(currentSrc.get(file), plannedSrc.get(file))
+        && (action != ActionType.MOVE || movedFrom != null);
+    valid = valid && unchanged(currentTarget.get(file), plannedTarget.get(file));
+    if (valid && movedFrom != null) {
+      valid = unchanged(currentTarget.get(movedFrom), plannedTarget.get(movedFrom));
+    }
+    if (valid) {
+      pending.set(file, action);
+    } else {
+      dropped += 1;
+    }
+  }
+  return { pending, dropped };
+}
+
+/**
+ * Rebuilds the listings the plan was made from, as far as the pending actions need them.
+ *
+ * Folders are only deleted if everything left in them is about to be removed anyway, as a recursive delete would
+ * otherwise take files added or changed since the plan was made with it. Subtrees that were already deleted are left
+ * out, so they aren't deleted again.
+ *
+ * \param currentTarget  A fresh listing of the target
+ * \param pending        The result of pendingActions
+ */
+export function plannedContent(
+  state: JournalState,
+  currentTarget: Content,
+  pending: Actions,
+): { source: Content; target: Content } {
+  const deleted = Array.from(state.deletedFolders);
+  const existing = new Set(currentTarget.folderPaths.map(folder => folder.commonPath));
+  // Folders with something in them that isn't being removed
+  const kept = new Set<string>();
+  for (const [file] of currentTarget.files) {
+    if (pending.get(file) == ActionType.REMOVE) {
+      continue;
+    }
+    const parts = file.split("/");
+    for (let i = 1; i < parts.length; ++i) {
+      kept.add(parts.slice(0, i).join("/"));
+    }
+  }
+  return {
+    source: {
+      files: new Map(state.plan.src),
+      folderPaths: [],
+    },
+    target: {
+      files: new Map(state.plan.target),
+      folderPaths: state.plan.deletedFolders.filter(folder => existing.has(folder.commonPath)
+        && !kept.has(folder.commonPath)
+        && !deleted.some(path => folder.commonPath == path || isUnder(folder.commonPath, path))),
+    },
+  };
+}
@@ -0,0 +1,88 @@
+import WebDAVSyncPlugin from "main";
+import { JOURNAL_FILE, pluginDataPath } from "../fs/plugin_data";
+import { ActionType } from "./actiontype";
+import { JournalPlan, JournalRecord, JournalState, parseJournal } from "./journal";
+import { Path } from "./sync";
+
+/**
+ * Write-ahead journal for the sync currently in progress (see journal.ts). Each root's plan is written before any of
+ * its actions are run, and each completed action is appended afterwards, so an interrupted sync can pick up where it
+ * left off.
+ *
+ * Failing to write the journal is never fatal; worst case, an interrupted sync is redone from scratch, which is what
+ * happened before the journal existed anyway.
+ */
+export class SyncJournal {
+  plugin: WebDAVSyncPlugin;
+  /**
+   * Appends are chained, as parallel transfers complete at the same time, and appends need to land in order.
+   */
+  writes: Promise<void> = Promise.resolve();
+
+  constructor(plugin: WebDAVSyncPlugin) {
+    this.plugin = plugin;
+  }
+
+  path() {
+    return pluginDataPath(this.plugin, JOURNAL_FILE);
+  }
+
+  async read(): Promise<Map<string, JournalState>> {
+    await this.writes;
+    try {
+      if (!(await this.plugin.adapter().exists(this.path()))) {
+        return new Map();
+      }
+      return parseJournal(await this.plugin.adapter().read(this.path()));
+    } catch (ex) {
+      console.error("Failed to read the sync journal; ignoring it", ex);
+      return new Map();
+    }
+  }
+
+  start(plan: JournalPlan) {
+    return this.append(plan);
+  }
+
+  markDone(key: string, path: Path, action: ActionType) {
+    return this.append({ type: "done", key, path, action });
+  }
+
+  markFolder(key: string, path: Path) {
+    return this.append({ type: "folder", key, path });
+  }
+
+  /**
+   * Marks a root as done, so it isn't resumed.
+   */
+  finish(key: string) {
+    return this.append({ type: "end", key });
+  }
+
+  append(record: JournalRecord): Promise<void> {
+    this.writes = this.writes.then(async () => {
+      try {
+        await this.plugin.adapter().append(this.path(), JSON.stringify(record) + "\n");
+      } catch (ex) {
+        console.error("Failed to append to the sync journal", ex);
+      }
+    });
+    return this.writes;
+  }
+
+  /**
+   * Removes the journal if every root in it is done.
+   */
+  async clearFinished() {
+    if ((await this.read()).size > 0) {
+      return;
+    }
+    try {
+      if (await this.plugin.adapter().exists(this.path())) {
+        await this.plugin.adapter().remove(this.path());
+      }
+    } catch (ex) {
+      console.error("Failed to remove the sync journal", ex);
+    }
+  }
+}
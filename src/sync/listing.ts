@@ -0,0 +1,84 @@
+/**
+ * A remote listing that's shared by one or more sync roots.
+ */
+export interface ListingGroup {
+  /**
+   * The folder to list.
+   */
+  listRoot: string;
+  /**
+   * The sync destinations served by the listing, as they appear in the settings.
+   */
+  members: string[];
+}
+
+function trimSlash(path: string): string {
+  return path.length > 1 && path.endsWith("/") ? trimSlash(path.substring(0, path.length - 1)) : path;
+}
+
+function isUnder(path: string, folder: string): boolean {
+  return path.startsWith(folder == "/" ? "/" : folder + "/") && path != folder;
+}
+
+function parentOf(path: string): string {
+  const slash = path.lastIndexOf("/");
+  return slash <= 0 ? "/" : path.substring(0, slash);
+}
+
+/**
+ * Works out which remote listings are needed to list a set of sync destinations. A destination inside another
+ * destination is covered by the outer one's listing. If `shareParents` is set, destinations that are siblings are
+ * listed with a single deep listing of their shared parent, unless that parent is the root of the WebDAV server, which
+ * could be arbitrarily large.
+ */
+export function planSharedListings(folders: string[], shareParents: boolean): ListingGroup[] {
+  const unique = Array.from(new Set(folders));
+  const normalised = new Map(unique.map(folder => [folder, trimSlash(folder)]));
+  const topLevel = unique.filter(folder => !unique.some(
+    other => isUnder(normalised.get(folder)!, normalised.get(other)!)
+  ));
+
+  const byParent = new Map<string, string[]>();
+  for (const folder of topLevel) {
+    const parent = parentOf(normalised.get(folder)!);
+    const siblings = byParent.get(parent);
+    if (siblings == null) {
+      byParent.set(parent, [folder]);
+    } else {
+      siblings.push(folder);
+    }
+  }
+
+  const groups = new Map<string, ListingGroup>();
+  const groupOf = new Map<string, ListingGroup>();
+  for (const [parent, siblings] of byParent) {
+    const shared = shareParents && parent != "/" && siblings.length > 1;
+    for (const folder of siblings) {
+      const listRoot = shared ? parent : folder;
+      let group = groups.get(listRoot);
+      if (group == null) {
+        group = { listRoot, members: [] };
+        groups.set(listRoot, group);
+      }
+      group.members.push(folder);
+      groupOf.set(folder, group);
+    }
+  }
+
+  for (const folder of unique) {
+    if (groupOf.has(folder)) {
+      continue;
+    }
+    const outer = topLevel.find(other => isUnder(normalised.get(folder)!, normalised.get(other)!))!;
+    groupOf.get(outer)!.members.push(folder);
+  }
+  return Array.from(groups.values());
+}
+
+/**
+ * Filters a deep listing down to the entries inside a folder.
+ */
+export function entriesUnder<T extends { filename: string }>(entries: T[], folder: string): T[] {
+  const prefix = trimSlash(folder) == "/" ? "/" : trimSlash(folder) + "/";
+  return entries.filter(entry => entry.filename.startsWith(prefix));
+}
@@ -0,0 +1,115 @@
+import { Content, FileData, Folder, Path } from "./sync";
+import { stripPrefix } from "./pathutils";
+
+/**
+ * Vault paths that changed since they were last listed, as reported by the vault events.
+ */
+export class DirtySet {
+  paths: Set<Path> = new Set();
+  /**
+   * When the last change that wasn't recorded happened, if any. Listings from before then are missing it.
+   */
+  lostAt: number | null = null;
+
+  add(path: Path) {
+    this.paths.add(path);
+  }
+
+  /**
+   * Records that something changed without being added, such as a vault event while tracking is off.
+   */
+  lose(now: number = Date.now()) {
+    this.lostAt = now;
+  }
+
+  /**
+   * Whether a listing made at the given time can be brought up to date with the recorded paths.
+   */
+  trusts(verifiedAt: number): boolean {
+    return this.lostAt == null || verifiedAt > this.lostAt;
+  }
+
+  /**
+   * Removes and returns the paths under a sync root. Paths are sorted, so parents come before their children.
+   */
+  take(root: string): Path[] {
+    const out: Path[] = [];
+    for (const path of this.paths) {
+      if (root == "/" || path == root || path.startsWith(root + "/")) {
+        out.push(path);
+      }
+    }
+    for (const path of out) {
+      this.paths.delete(path);
+    }
+    return out.sort();
+  }
+}
+
+/**
+ * Converts a vault path into the root-relative key used by getVaultFiles.
+ */
+export function toRootKey(path: Path, root: string): Path {
+  return root == "/" ? path : stripPrefix(path, root);
+}
+
+/**
+ * Removes a file, or a folder and everything in it, from a listing.
+ */
+export function removeSubtree(content: Content, key: Path) {
+  const prefix = key + "/";
+  for (const file of Array.from(content.files.keys())) {
+    if (file == key || file.startsWith(prefix)) {
+      content.files.delete(file);
+    }
+  }
+  content.folderPaths = content.folderPaths.filter(
+    folder => folder.commonPath != key && !folder.commonPath.startsWith(prefix)
+  );
+}
+
+/**
+ * Merges a listing of a folder in the vault (i.e. the output of getVaultFiles(folder)) into a listing of a sync root.
+ * The folder itself isn't part of the sub-listing, so it's passed separately.
+ */
+export function mergeSubtree(content: Content, folder: Folder, sub: Content, root: string) {
+  content.folderPaths.push(folder);
+  for (const [, data] of sub.files) {
+    const path = (data as FileData & { destination: string }).destination;
+    content.files.set(toRootKey(path, root), data);
+  }
+  for (const subFolder of sub.folderPaths) {
+    content.folderPaths.push({
+      realPath: subFolder.realPath,
+      commonPath: toRootKey(subFolder.realPath, root),
+    });
+  }
+}
+
+/**
+ * Sorts a listing the same way getVaultFiles does.
+ */
+export function sortContent(content: Content): Content {
+  const files = Array.from(content.files.entries());
+  files.sort((a, b) => a[0] < b[0] ? -1 : a[0] > b[0] ? 1 : 0);
+  const folders = content.folderPaths.slice();
+  folders.sort((a, b) => a.realPath < b.realPath ? -1 : a.realPath > b.realPath ? 1 : 0);
+  return {
+    files: new Map(files),
+    folderPaths: folders,
+  };
+}
+
+/**
+ * The topmost hidden (dot) file or folder a vault path is in, if any. Obsidian doesn't index hidden paths, so vault
+ * events don't cover anything under them.
+ */
+export function hiddenRoot(path: Path): Path | null {
+  const parts = path.split("/");
+  for (let i = 0; i < parts.length; ++i) {
+    if (parts[i].startsWith(".")) {
+      return parts.slice(0, i + 1).join("/");
+    }
+  }
+  return null;
+}
@@ -0,0 +1,162 @@
+import { ActionType } from "./actiontype";
+import { Actions, FileData, Files, Path, SyncBase } from "./sync";
+import { SyncDir } from "./syncdir";
+import { FileIndex, IndexBase } from "./file_index";
+
+/**
+ * The state of a single file on both sides, as of the last sync where the two were known to be in sync.
+ */
+export interface ManifestEntry {
+  local: FileData;
+  remote: FileData;
+}
+
+export type ManifestEntries = Map<Path, ManifestEntry>;
+
+/**
+ * Used to identify a synced root in the manifest. Full vault sync and each subfolder mapping get separate entries, as
+ * the paths are relative to the root.
+ */
+export function manifestKey(dest: string, localPrefix: string | null): string {
+  return (localPrefix ?? "") + "::" + dest;
+}
+
+/**
+ * Strips a FileData object down to the fields that are worth storing. The listings attach additional bookkeeping
+ * fields that don't belong in the manifest.
+ */
+export function snapshotFileData(data: FileData): FileData {
+  return {
+    lastModified: data.lastModified,
+    size: data.size ?? null,
+    etag: data.etag ?? null,
+    hash: data.hash ?? null,
+  };
+}
+
+/**
+ * Converts the manifest into a SyncBase for the given direction, so it can be passed to calculateSyncActions.
+ */
+export function toSyncBase(entries: ManifestEntries, direction: SyncDir): SyncBase {
+  const local: Files = new Map();
+  const remote: Files = new Map();
+  for (const [file, entry] of entries) {
+    local.set(file, entry.local);
+    remote.set(file, entry.remote);
+  }
+  return direction == SyncDir.UP ? {
+    src: local,
+    dest: remote,
+  } : {
+    src: remote,
+    dest: local,
+  };
+}
+
+/**
+ * Same as toSyncBase, but as indexes for calculateIndexActions. The indexes are built straight from the manifest, so
+ * the two intermediate Files aren't needed.
+ */
+export function toManifestIndexBase(entries: ManifestEntries, direction: SyncDir): IndexBase {
+  const paths = Array.from(entries.keys());
+  const local = FileIndex.build(paths, path => (entries.get(path) as ManifestEntry).local);
+  // build sorts the paths in place, so the second index can reuse them as-is
+  const remote = FileIndex.build(paths, path => (entries.get(path) as ManifestEntry).remote);
+  return direction == SyncDir.UP ? {
+    src: local,
+    dest: remote,
+  } : {
+    src: remote,
+    dest: local,
+  };
+}
+
+/**
+ * Updates the manifest after a sync.
+ *
+ * \param actions   The full set of actions calculated for the sync. Files that had no action are in sync, and are
+ *                  recorded as-is from the listings.
+ * \param completed The actions that were actually completed. Files with failed actions, or conflicts that were
+ *                  resolved to NOOP, keep their old entry (if any), so the next sync still sees them as changed.
+ * \param moves     Detected moves, as new path -> old path
+ * \param partial   If true, `src` and `dest` only contain the files with actions (as with resumed syncs), so only the
+ *                  completed actions are recorded, and nothing is purged.
+ * \param written   The metadata of transferred copies that don't match their source (see OnUpdateCallback)
+ */
+export function applySyncResults(
+  entries: ManifestEntries,
+  direction: SyncDir,
+  src: Files,
+  dest: Files,
+  actions: Actions,
+  completed: Actions,
+  moves: Map<Path, Path> = new Map(),
+  partial: boolean = false,
+  written: Files = new Map(),
+) {
+  const toEntry = (srcData: FileData, destData: FileData): ManifestEntry => {
+    return direction == SyncDir.UP ? {
+      local: snapshotFileData(srcData),
+      remote: snapshotFileData(destData),
+    } : {
+      local: snapshotFileData(destData),
+      remote: snapshotFileData(srcData),
+    };
+  };
+
+  for (const [file, action] of completed) {
+    if (action == ActionType.REMOVE) {
+      entries.delete(file);
+    } else if (action == ActionType.ADD) {
+      const srcData = src.get(file);
+      if (srcData == null) {
+        continue;
+      }
+      // The transferred copy gets the source's timestamp, size, and content, unless the transfer said otherwise. Its
+      // ETag is usually unknown until the next listing, so matchesBase falls back to timestamps for it until then.
+      const copy = written.get(file);
+      entries.set(file, toEntry(srcData, {
+        lastModified: copy != null ? copy.lastModified : srcData.lastModified,
+        size: copy?.size ?? srcData.size ?? null,
+        etag: copy?.etag ?? null,
+        hash: srcData.hash ?? null,
+      }));
+    } else if (action == ActionType.MOVE) {
+      const oldPath = moves.get(file);
+      const srcData = src.get(file);
+      const destData = oldPath != null ? dest.get(oldPath) : undefined;
+      if (oldPath == null || srcData == null || destData == null) {
+        continue;
+      }
+      entries.delete(oldPath);
+      // The moved copy keeps its content and timestamp, but servers may or may not keep the ETag across a move
+      entries.set(file, toEntry(srcData, {
+        lastModified: destData.lastModified,
+        size: destData.size ?? null,
+        etag: null,
+        hash: destData.hash ?? null,
+      }));
+    }
+  }
+
+  if (partial) {
+    return;
+  }
+
+  for (const [file, srcData] of src) {
+    if (actions.has(file)) {
+      continue;
+    }
+    const destData = dest.get(file);
+    if (destData != null) {
+      entries.set(file, toEntry(srcData, destData));
+    }
+  }
+
+  // Purge entries for files that are gone from both sides
+  for (const file of Array.from(entries.keys())) {
+    if (!src.has(file) && !dest.has(file)) {
+      entries.delete(file);
+    }
+  }
+}
@@ -0,0 +1,72 @@
+import WebDAVSyncPlugin from "main";
+import { MANIFEST_FILE, readPluginJson, writePluginJson } from "../fs/plugin_data";
+import { ManifestEntries, ManifestEntry } from "./manifest";
+
+const MANIFEST_VERSION = 1;
+
+interface ManifestJson {
+  version: number;
+  roots: {
+    [root: string]: {
+      [path: string]: ManifestEntry;
+    };
+  };
+}
+
+/**
+ * Persists the last-sync manifest (see manifest.ts) in the plugin folder. The manifest is loaded lazily on the first
+ * sync, and kept in memory for the rest of the session.
+ */
+export class ManifestStore {
+  plugin: WebDAVSyncPlugin;
+  roots: Map<string, ManifestEntries> = new Map();
+  loaded: boolean = false;
+
+  constructor(plugin: WebDAVSyncPlugin) {
+    this.plugin = plugin;
+  }
+
+  async load() {
+    if (this.loaded) {
+      return;
+    }
+    const data = await readPluginJson<ManifestJson>(this.plugin, MANIFEST_FILE);
+    this.roots.clear();
+    // Unknown versions are discarded. Worst case, the next sync is a full diff.
+    if (data != null && data.version == MANIFEST_VERSION) {
+      for (const root in data.roots) {
+        const entries: ManifestEntries = new Map();
+        const stored = data.roots[root];
+        for (const path in stored) {
+          entries.set(path, stored[path]);
+        }
+        this.roots.set(root, entries);
+      }
+    }
+    this.loaded = true;
+  }
+
+  async save() {
+    const out: ManifestJson = {
+      version: MANIFEST_VERSION,
+      roots: {}
+    };
+    for (const [root, entries] of this.roots) {
+      const stored: { [path: string]: ManifestEntry } = {};
+      for (const [path, entry] of entries) {
+        stored[path] = entry;
+      }
+      out.roots[root] = stored;
+    }
+    await writePluginJson(this.plugin, MANIFEST_FILE, out);
+  }
+
+  getRoot(key: string): ManifestEntries {
+    let entries = this.roots.get(key);
+    if (entries == null) {
+      entries = new Map();
+      this.roots.set(key, entries);
+    }
+    return entries;
+  }
+}
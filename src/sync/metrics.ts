@@ -0,0 +1,218 @@
+import { formatBytes } from "./progress";
+import { SyncDir } from "./syncdir";
+
+/**
+ * The phases a sync spends its time in:
+ * - local: listing the vault
+ * - remote: listing the server
+ * - hashing: content hashing of the local files, if enabled
+ * - calculate: working out the actions, including move detection
+ * - transfers: running the actions, minus the time spent waiting on conflict dialogs
+ * - conflicts: waiting on the user to resolve conflicts
+ */
+export type Phase = "local" | "remote" | "hashing" | "calculate" | "transfers" | "conflicts";
+export const PHASES: Phase[] = ["local", "remote", "hashing", "calculate", "transfers", "conflicts"];
+
+/**
+ * The number of slowest files kept in each report.
+ */
+const SLOWEST_PATHS = 10;
+
+/**
+ * The number of reports kept in the report file.
+ */
+export const REPORT_HISTORY = 20;
+
+export interface SlowPath {
+  path: string;
+  ms: number;
+  bytes: number;
+}
+
+export type RequestCounts = { [method: string]: number };
+
+const KIND_NAMES = {
+  push: "Push",
+  pull: "Pull",
+  sync: "Sync",
+};
+
+export interface SyncReport {
+  kind: "push" | "pull" | "sync";
+  dryRun: boolean;
+  /**
+   * Epoch ms.
+   */
+  startedAt: number;
+  /**
+   * Wall time of the entire sync, in ms.
+   */
+  duration: number;
+  /**
+   * Time spent in each phase, in ms. Folder mappings are synced concurrently, and their phases overlap, so these can
+   * add up to more than the duration.
+   */
+  phases: { [phase in Phase]: number };
+  /**
+   * Requests made during the sync, by HTTP method. Retries are counted as separate requests.
+   */
+  requests: RequestCounts;
+  bytesUp: number;
+  bytesDown: number;
+  files: number;
+  slowest: SlowPath[];
+}
+
+/**
+ * Collects timings for a single sync run. The clock is injectable for the tests.
+ */
+export class SyncMetrics {
+  now: () => number;
+  kind: SyncReport["kind"];
+  dryRun: boolean;
+  startedAt: number;
+  started: number;
+  phases: { [phase in Phase]: number } = {
+    local: 0,
+    remote: 0,
+    hashing: 0,
+    calculate: 0,
+    transfers: 0,
+    conflicts: 0,
+  };
+  bytesUp: number = 0;
+  bytesDown: number = 0;
+  files: number = 0;
+  slowest: SlowPath[] = [];
+  requestsBefore: RequestCounts;
+
+  /**
+   * @param requests  The connection's request counters, which are compared against when the report is made
+   */
+  constructor(
+    kind: SyncReport["kind"],
+    dryRun: boolean,
+    requests: RequestCounts = {},
+    now: () => number = () => Date.now(),
+    epoch: () => number = () => Date.now(),
+  ) {
+    this.kind = kind;
+    this.dryRun = dryRun;
+    this.now = now;
+    this.started = now();
+    this.startedAt = epoch();
+    this.requestsBefore = { ...requests };
+  }
+
+  add(phase: Phase, ms: number) {
+    this.phases[phase] += ms;
+  }
+
+  /**
+   * Runs `fn`, and adds the time it took to `phase`.
+   */
+  async time<T>(phase: Phase, fn: () => Promise<T>): Promise<T> {
+    const start = this.now();
+    try {
+      return await fn();
+    } finally {
+      this.add(phase, this.now() - start);
+    }
+  }
+
+  timeSync<T>(phase: Phase, fn: () => T): T {
+    const start = this.now();
+    try {
+      return fn();
+    } finally {
+      this.add(phase, this.now() - start);
+    }
+  }
+
+  /**
+   * Records a completed action.
+   *
+   * @param bytes The size of the transferred file, or 0 for actions that don't transfer anything
+   */
+  recordFile(path: string, direction: SyncDir, bytes: number, ms: number) {
+    this.files++;
+    if (direction == SyncDir.UP) {
+      this.bytesUp += bytes;
+    } else {
+      this.bytesDown += bytes;
+    }
+    if (this.slowest.length == SLOWEST_PATHS && this.slowest[SLOWEST_PATHS - 1].ms >= ms) {
+      return;
+    }
+    this.slowest.push({ path, ms, bytes });
+    this.slowest.sort((a, b) => b.ms - a.ms);
+    this.slowest.length = Math.min(this.slowest.length, SLOWEST_PATHS);
+  }
+
+  finish(requests: RequestCounts = {}): SyncReport {
+    return {
+      kind: this.kind,
+      dryRun: this.dryRun,
+      startedAt: this.startedAt,
+      duration: this.now() - this.started,
+      phases: { ...this.phases },
+      requests: diffCounts(this.requestsBefore, requests),
+      bytesUp: this.bytesUp,
+      bytesDown: this.bytesDown,
+      files: this.files,
+      slowest: this.slowest.slice(),
+    };
+  }
+}
+
+/**
+ * The requests made between two snapshots of the counters. Methods with no requests are left out.
+ */
+export function diffCounts(before: RequestCounts, after: RequestCounts): RequestCounts {
+  const out: RequestCounts = {};
+  for (const method in after) {
+    const count = after[method] - (before[method] ?? 0);
+    if (count > 0) {
+      out[method] = count;
+    }
+  }
+  return out;
+}
+
+/**
+ * Adds a report to the history, dropping the oldest ones past `limit`.
+ */
+export function appendReport(reports: SyncReport[], report: SyncReport, limit: number = REPORT_HISTORY): SyncReport[] {
+  return reports.concat([report]).slice(-limit);
+}
+
+function formatMs(ms: number): string {
+  return ms < 1000 ? `${Math.round(ms)} ms` : `${(ms / 1000).toFixed(1)} s`;
+}
+
+/**
+ * Short, human-readable summary of a report, for the sync modal.
+ */
+export function summarizeReport(report: SyncReport): string[] {
+  const lines: string[] = [];
+  lines.push(
+    `${report.dryRun ? `Dry run (${report.kind})` : KIND_NAMES[report.kind]} took ${formatMs(report.duration)}: `
+      + `${report.files} files, ${formatBytes(report.bytesUp)} up, ${formatBytes(report.bytesDown)} down`
+  );
+  lines.push(
+    PHASES.filter(phase => report.phases[phase] > 0)
+      .map(phase => `${phase} ${formatMs(report.phases[phase])}`)
+      .join(", ")
+  );
+  const methods = Object.keys(report.requests).sort();
+  const total = methods.reduce((sum, method) => sum + report.requests[method], 0);
+  lines.push(
+    `${total} requests`
+      + (methods.length > 0 ? ` (${methods.map(method => `${report.requests[method]} ${method}`).join(", ")})` : "")
+  );
+  if (report.slowest.length > 0) {
+    const slowest = report.slowest[0];
+    lines.push(`Slowest file: ${slowest.path} (${formatMs(slowest.ms)}, ${formatBytes(slowest.bytes)})`);
+  }
+  return lines;
+}
@@ -0,0 +1,99 @@
+import { ActionType } from "./actiontype";
+import { Actions, FileData, Files, matchesBase, Path, SyncBase } from "./sync";
+import { IndexBase } from "./file_index";
+
+/**
+ * Detected moves, as new path -> old path. The new path carries the MOVE action; the old path has no action.
+ */
+export type Moves = Map<Path, Path>;
+
+/**
+ * Whether `current` (a new file in the source) is the same content as `old` (a removed file). Only one side of a sync
+ * is local, and remote files have no content hash, so the two can't be compared directly. The manifest has to vouch for
+ * it instead: the old path must have looked exactly like the new file in the source at the last sync, and the
+ * destination copy must not have changed since. "Looked exactly like" uses matchesBase, i.e. the ETag or content hash
+ * where both have one, and the size and timestamp otherwise.
+ */
+function isSameContent(
+  current: FileData,
+  oldDest: FileData,
+  oldPath: Path,
+  base: SyncBase | IndexBase | null,
+): boolean {
+  if (current.size == null || oldDest.size == null || current.size != oldDest.size) {
+    return false;
+  }
+  const srcBase = base?.src.get(oldPath);
+  const destBase = base?.dest.get(oldPath);
+  return srcBase != null
+    && destBase != null
+    && matchesBase(current, srcBase)
+    && matchesBase(oldDest, destBase);
+}
+
+/**
+ * Pairs up removed and added files that are the same file under a new path, and replaces each pair with a MOVE, so a
+ * renamed folder is a handful of moves rather than deleting and re-transferring every byte in it.
+ *
+ * Only new files (ADD for a path that doesn't exist in the destination) and REMOVEs are considered. If more than one
+ * removed file could match an added file, or the other way around, the pair is left alone; guessing wrong would move
+ * the wrong file, while not guessing just costs a transfer.
+ *
+ * `actions` is modified in place.
+ */
+export function detectMoves(
+  src: Files,
+  dest: Files,
+  actions: Actions,
+  base: SyncBase | IndexBase | null = null,
+): Moves {
+  const moves: Moves = new Map();
+
+  // Removed files, indexed by size, as the size has to match in every case
+  const removedBySize = new Map<number, Path[]>();
+  for (const [file, action] of actions) {
+    const destData = dest.get(file);
+    if (action != ActionType.REMOVE || destData?.size == null) {
+      continue;
+    }
+    const bucket = removedBySize.get(destData.size);
+    if (bucket == null) {
+      removedBySize.set(destData.size, [file]);
+    } else {
+      bucket.push(file);
+    }
+  }
+  if (removedBySize.size == 0) {
+    return moves;
+  }
+
+  const candidates = new Map<Path, Path[]>();
+  // Number of added files each removed file matches
+  const claims = new Map<Path, number>();
+  for (const [file, action] of actions) {
+    const srcData = src.get(file);
+    if (action != ActionType.ADD || dest.has(file) || srcData?.size == null) {
+      continue;
+    }
+    const matches = (removedBySize.get(srcData.size) ?? []).filter(
+      (oldPath) => isSameContent(srcData, dest.get(oldPath) as FileData, oldPath, base)
+    );
+    if (matches.length == 0) {
+      continue;
+    }
+    candidates.set(file, matches);
+    for (const oldPath of matches) {
+      claims.set(oldPath, (claims.get(oldPath) ?? 0) + 1);
+    }
+  }
+
+  for (const [file, matches] of candidates) {
+    if (matches.length != 1 || claims.get(matches[0]) != 1) {
+      continue;
+    }
+    moves.set(file, matches[0]);
+    actions.set(file, ActionType.MOVE);
+    actions.delete(matches[0]);
+  }
+  return moves;
+}
@@ -0,0 +1,205 @@
+import { ActionedItem, Status } from "./status";
+
+/**
+ * Reports how many bytes of a file have been transferred so far.
+ */
+export type ProgressCallback = (bytes: number) => void;
+
+/**
+ * Every action costs a request or two regardless of its size, so each one counts as this many bytes on top of its
+ * actual size when working out the progress. Without it, syncs of many small files (or deletions, which don't
+ * transfer anything) wouldn't appear to progress at all.
+ */
+export const ACTION_OVERHEAD = 16 * 1024;
+
+/**
+ * How far back the throughput is averaged over, in ms.
+ */
+const RATE_WINDOW = 5000;
+
+/**
+ * The minimum time between progress reports passed to the UI, in ms.
+ */
+export const FRAME_INTERVAL = 100;
+
+interface Sample {
+  time: number;
+  bytes: number;
+  weight: number;
+}
+
+/**
+ * Tracks the progress of a sync in bytes, rather than files, so a single large file doesn't look like it's stuck.
+ */
+export class ProgressTracker {
+  now: () => number;
+  totalBytes: number = 0;
+  doneBytes: number = 0;
+  totalWeight: number = 0;
+  doneWeight: number = 0;
+  planned: Map<string, number> = new Map();
+  partial: Map<string, number> = new Map();
+  samples: Sample[] = [];
+
+  constructor(now: () => number = () => Date.now()) {
+    this.now = now;
+  }
+
+  /**
+   * Adds an action to the total.
+   */
+  plan(file: string, bytes: number) {
+    this.planned.set(file, bytes);
+    this.totalBytes += bytes;
+    this.totalWeight += bytes + ACTION_OVERHEAD;
+  }
+
+  /**
+   * Starts the clock. Called once everything is planned.
+   */
+  start() {
+    this.samples = [];
+    this.sample();
+  }
+
+  /**
+   * Records partial progress of a file in flight.
+   *
+   * @param bytes The number of bytes of the file transferred so far
+   */
+  advance(file: string, bytes: number) {
+    const planned = this.planned.get(file) ?? 0;
+    const previous = this.partial.get(file) ?? 0;
+    const current = Math.min(bytes, planned);
+    if (current <= previous) {
+      return;
+    }
+    this.partial.set(file, current);
+    this.doneBytes += current - previous;
+    this.doneWeight += current - previous;
+    this.sample();
+  }
+
+  /**
+   * Marks a file as done. Failed actions count as done too, as far as progress is concerned.
+   */
+  complete(file: string) {
+    const planned = this.planned.get(file) ?? 0;
+    const previous = this.partial.get(file) ?? 0;
+    this.partial.delete(file);
+    this.doneBytes += planned - previous;
+    this.doneWeight += planned - previous + ACTION_OVERHEAD;
+    this.sample();
+  }
+
+  /**
+   * Removes an action that turned out not to do anything (i.e. conflicts resolved to NOOP) from the total.
+   */
+  skip(file: string) {
+    const planned = this.planned.get(file) ?? 0;
+    const previous = this.partial.get(file) ?? 0;
+    this.partial.delete(file);
+    this.totalBytes -= planned - previous;
+    this.totalWeight -= planned - previous + ACTION_OVERHEAD;
+  }
+
+  sample() {
+    const time = this.now();
+    this.samples.push({
+      time,
+      bytes: this.doneBytes,
+      weight: this.doneWeight,
+    });
+    // Keep one sample from before the window, so there's always a baseline to measure against
+    while (this.samples.length > 2 && this.samples[1].time <= time - RATE_WINDOW) {
+      this.samples.shift();
+    }
+  }
+
+  item(lastFile: string): ActionedItem {
+    const time = this.now();
+    const baseline = this.samples[0];
+    const elapsed = baseline == null ? 0 : (time - baseline.time) / 1000;
+    const throughput = elapsed > 0 ? (this.doneBytes - baseline.bytes) / elapsed : 0;
+    const weightRate = elapsed > 0 ? (this.doneWeight - baseline.weight) / elapsed : 0;
+    const remaining = this.totalWeight - this.doneWeight;
+    return {
+      lastFile,
+      lastProgress: this.totalWeight > 0 ? 100 * this.doneWeight / this.totalWeight : 100,
+      bytesDone: this.doneBytes,
+      bytesTotal: this.totalBytes,
+      throughput,
+      eta: remaining <= 0 ? 0 : weightRate > 0 ? remaining / weightRate : null,
+    };
+  }
+}
+
+/**
+ * Coalesces progress reports, so the UI is updated at most once per `interval` ms no matter how quickly files
+ * complete. The final report before the sync result is always passed through, as is the result itself.
+ */
+export async function* throttleProgress(
+  statuses: AsyncGenerator<Status>,
+  interval: number = FRAME_INTERVAL,
+  now: () => number = () => Date.now(),
+): AsyncGenerator<Status> {
+  let last = -Infinity;
+  let held: Status | null = null;
+  for await (const status of statuses) {
+    if (!("lastFile" in status.result)) {
+      if (held != null) {
+        yield held;
+        held = null;
+      }
+      yield status;
+      continue;
+    }
+    const time = now();
+    if (time - last >= interval) {
+      last = time;
+      held = null;
+      yield status;
+    } else {
+      held = status;
+    }
+  }
+  if (held != null) {
+    yield held;
+  }
+}
+
+export function formatBytes(bytes: number): string {
+  const units = ["B", "KiB", "MiB", "GiB", "TiB"];
+  let unit = 0;
+  while (bytes >= 1024 && unit < units.length - 1) {
+    bytes /= 1024;
+    unit += 1;
+  }
+  return `${unit == 0 ? bytes : bytes.toFixed(1)} ${units[unit]}`;
+}
+
+export function formatDuration(seconds: number): string {
+  if (seconds < 60) {
+    return `${Math.ceil(seconds)} s`;
+  } else if (seconds < 3600) {
+    return `${Math.floor(seconds / 60)} min ${Math.ceil(seconds % 60)} s`;
+  }
+  return `${Math.floor(seconds / 3600)} h ${Math.ceil((seconds % 3600) / 60)} min`;
+}
+
+/**
+ * Human-readable summary of a progress report, for the modal and the status bar.
+ */
+export function describeProgress(item: ActionedItem): string {
+  let out = `${Math.floor(item.lastProgress)}%`;
+  if (item.bytesTotal != null && item.bytesTotal > 0) {
+    out += `, ${formatBytes(item.bytesDone ?? 0)} of ${formatBytes(item.bytesTotal)}`;
+  }
+  if (item.throughput != null && item.throughput > 0) {
+    out += `, ${formatBytes(item.throughput)}/s`;
+  }
+  if (item.eta != null && item.eta > 0) {
+    out += `, about ${formatDuration(item.eta)} left`;
+  }
+  return out;
+}
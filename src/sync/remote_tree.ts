@@ -0,0 +1,99 @@
+import WebDAVSyncPlugin from "main";
+import { readPluginJson, REMOTE_TREE_FILE, writePluginJson } from "../fs/plugin_data";
+
+/**
+ * Minimal subset of webdav's FileStat that the listing code needs. FileStat satisfies this structurally, and cached
+ * entries are flattened back into this shape, so both listing modes can share the same post-processing.
+ */
+export interface RemoteEntry {
+  filename: string;
+  basename: string;
+  type: "file" | "directory";
+  lastmod: string;
+  size: number;
+  etag?: string | null;
+}
+
+/**
+ * A cached remote collection. The ETag is the collection's own ETag; on servers that propagate changes upwards (such
+ * as Nextcloud and ownCloud), it changes whenever anything in the subtree changes, so a matching ETag means the entire
+ * cached subtree can be reused without asking the server.
+ */
+export interface CachedCollection {
+  filename: string;
+  etag: string | null;
+  files: { [name: string]: RemoteEntry };
+  folders: { [name: string]: CachedCollection };
+}
+
+// Version 1 trees had the ignored folders filtered out, so they can't be reused after the ignore settings change
+const REMOTE_TREE_VERSION = 2;
+
+interface RemoteTreeJson {
+  version: number;
+  roots: { [folder: string]: CachedCollection };
+}
+
+/**
+ * Flattens a cached tree into the same shape a deep PROPFIND returns; the root itself is not included.
+ */
+export function flattenTree(
+  node: CachedCollection,
+  out: RemoteEntry[] = []
+): RemoteEntry[] {
+  for (const name in node.files) {
+    out.push(node.files[name]);
+  }
+  for (const name in node.folders) {
+    const folder = node.folders[name];
+    out.push({
+      filename: folder.filename,
+      basename: name,
+      type: "directory",
+      lastmod: "",
+      size: 0,
+      etag: folder.etag,
+    });
+    flattenTree(folder, out);
+  }
+  return out;
+}
+
+/**
+ * Persists the ETag-annotated remote tree used by incremental listing. Like the manifest, it's kept in memory once
+ * loaded.
+ */
+export class RemoteTreeStore {
+  plugin: WebDAVSyncPlugin;
+  roots: Map<string, CachedCollection> = new Map();
+  loaded: boolean = false;
+
+  constructor(plugin: WebDAVSyncPlugin) {
+    this.plugin = plugin;
+  }
+
+  async load() {
+    if (this.loaded) {
+      return;
+    }
+    const data = await readPluginJson<RemoteTreeJson>(this.plugin, REMOTE_TREE_FILE);
+    this.roots.clear();
+    if (data != null && data.version == REMOTE_TREE_VERSION) {
+      for (const folder in data.roots) {
+        this.roots.set(folder, data.roots[folder]);
+      }
+    }
+    this.loaded = true;
+  }
+
+  async save() {
+    const out: RemoteTreeJson = {
+      version: REMOTE_TREE_VERSION,
+      roots: {},
+    };
+    for (const [folder, tree] of this.roots) {
+      out.roots[folder] = tree;
+    }
+    await writePluginJson(this.plugin, REMOTE_TREE_FILE, out);
+  }
+}
@@ -0,0 +1,52 @@
+import WebDAVSyncPlugin from "main";
+import { readPluginJson, SYNC_REPORT_FILE, writePluginJson } from "../fs/plugin_data";
+import { appendReport, SyncReport } from "./metrics";
+
+const SYNC_REPORT_VERSION = 1;
+
+interface SyncReportJson {
+  version: number;
+  runs: SyncReport[];
+}
+
+/**
+ * Keeps the timing reports of the last few syncs (see metrics.ts) in the plugin folder, so slow syncs can be looked
+ * into after the fact.
+ */
+export class SyncReportStore {
+  plugin: WebDAVSyncPlugin;
+  runs: SyncReport[] = [];
+  loaded: boolean = false;
+
+  constructor(plugin: WebDAVSyncPlugin) {
+    this.plugin = plugin;
+  }
+
+  async load() {
+    if (this.loaded) {
+      return;
+    }
+    const data = await readPluginJson<SyncReportJson>(this.plugin, SYNC_REPORT_FILE);
+    this.runs = data != null && data.version == SYNC_REPORT_VERSION ? data.runs : [];
+    this.loaded = true;
+  }
+
+  last(): SyncReport | null {
+    return this.runs.length > 0 ? this.runs[this.runs.length - 1] : null;
+  }
+
+  async add(report: SyncReport) {
+    await this.load();
+    this.runs = appendReport(this.runs, report);
+    const out: SyncReportJson = {
+      version: SYNC_REPORT_VERSION,
+      runs: this.runs,
+    };
+    try {
+      await writePluginJson(this.plugin, SYNC_REPORT_FILE, out);
+    } catch (ex) {
+      // The report is purely informational
+      console.error("Failed to save the sync report", ex);
+    }
+  }
+}
@@ -0,0 +1,210 @@
+import { SyncDir } from "./syncdir";
+
+/**
+ * Makes sure only one sync runs at a time, whether it was started by the user or by the scheduler.
+ */
+export class SyncLock {
+  /**
+   * The direction of the running sync, or null if nothing is running.
+   */
+  direction: SyncDir | null = null;
+
+  /**
+   * Vault paths the running (or last) sync wrote to, so the vault events they cause can be told apart from the user's
+   * own changes.
+   */
+  written: Set<string> = new Set();
+
+  /**
+   * Invoked whenever the lock is released.
+   */
+  onRelease: (() => void) | null = null;
+
+  get busy(): boolean {
+    return this.direction != null;
+  }
+
+  tryAcquire(direction: SyncDir): boolean {
+    if (this.direction != null) {
+      return false;
+    }
+    this.direction = direction;
+    this.written.clear();
+    return true;
+  }
+
+  release() {
+    this.direction = null;
+    this.onRelease?.();
+  }
+}
+
+export interface SchedulerTimers {
+  setTimeout(callback: () => void, ms: number): number;
+  clearTimeout(id: number): void;
+  setInterval(callback: () => void, ms: number): number;
+  clearInterval(id: number): void;
+  now(): number;
+}
+
+export interface AutoSyncOptions {
+  /**
+   * How long to wait after the last change before pushing, in ms.
+   */
+  pushDelay: number;
+  /**
+   * The longest a push can be postponed by a steady stream of changes, in ms.
+   */
+  maxPushDelay: number;
+  /**
+   * How often to pull, in ms. 0 disables interval pulls.
+   */
+  pullInterval: number;
+  pullOnFocus: boolean;
+}
+
+/**
+ * Focus pulls are skipped if the last pull was less than this long ago, so switching between windows doesn't cause a
+ * pull every time.
+ */
+export const FOCUS_PULL_COOLDOWN = 60 * 1000;
+
+/**
+ * Runs pushes and pulls in the background.
+ *
+ * Changes are debounced, so a burst of changes results in a single push once things quiet down. Pulls run on an
+ * interval and when the window regains focus. Anything requested while another sync holds the lock is queued, and
+ * runs once the lock is released; multiple requests for the same direction are coalesced into a single sync.
+ */
+export class AutoSyncScheduler {
+  lock: SyncLock;
+  run: (direction: SyncDir) => Promise<void>;
+  timers: SchedulerTimers;
+
+  options: AutoSyncOptions | null = null;
+  pending: Set<SyncDir> = new Set();
+  firstChange: number | null = null;
+  lastPull: number | null = null;
+  pushTimer: number | null = null;
+  pullTimer: number | null = null;
+
+  constructor(lock: SyncLock, run: (direction: SyncDir) => Promise<void>, timers: SchedulerTimers) {
+    this.lock = lock;
+    this.run = run;
+    this.timers = timers;
+    this.lock.onRelease = () => {
+      if (this.options != null && this.pending.size > 0) {
+        // Deferred so whoever released the lock finishes up before the next sync starts
+        this.timers.setTimeout(() => this.runPending(), 0);
+      }
+    };
+  }
+
+  /**
+   * (Re)configures the scheduler. Passing null disables it.
+   */
+  configure(options: AutoSyncOptions | null) {
+    this.stop();
+    this.options = options;
+    if (options != null && options.pullInterval > 0) {
+      this.pullTimer = this.timers.setInterval(() => this.request(SyncDir.DOWN), options.pullInterval);
+    }
+  }
+
+  stop() {
+    if (this.pushTimer != null) {
+      this.timers.clearTimeout(this.pushTimer);
+      this.pushTimer = null;
+    }
+    if (this.pullTimer != null) {
+      this.timers.clearInterval(this.pullTimer);
+      this.pullTimer = null;
+    }
+    this.pending.clear();
+    this.firstChange = null;
+    this.options = null;
+  }
+
+  /**
+   * Called when something in the vault changes.
+   *
+   * @param path  The vault path that changed, if known
+   */
+  notifyChange(path: string | null = null) {
+    if (this.options == null) {
+      return;
+    }
+    if (this.lock.busy && path != null && this.lock.written.has(path)) {
+      // Changes made by the sync itself don't need to be pushed back, but the user's own changes during it do
+      return;
+    }
+    const now = this.timers.now();
+    if (this.firstChange == null) {
+      this.firstChange = now;
+    }
+    if (this.pushTimer != null) {
+      this.timers.clearTimeout(this.pushTimer);
+    }
+    const delay = Math.max(
+      0,
+      Math.min(this.options.pushDelay, this.firstChange + this.options.maxPushDelay - now)
+    );
+    this.pushTimer = this.timers.setTimeout(() => {
+      this.pushTimer = null;
+      this.request(SyncDir.UP);
+    }, delay);
+  }
+
+  /**
+   * Called when the window regains focus.
+   */
+  notifyFocus() {
+    if (this.options == null || !this.options.pullOnFocus) {
+      return;
+    }
+    if (this.lastPull != null && this.timers.now() - this.lastPull < FOCUS_PULL_COOLDOWN) {
+      return;
+    }
+    this.request(SyncDir.DOWN);
+  }
+
+  request(direction: SyncDir) {
+    if (this.options == null) {
+      return;
+    }
+    this.pending.add(direction);
+    if (!this.lock.busy) {
+      this.runPending();
+    }
+  }
+
+  /**
+   * Runs the next pending sync. Pushes go first, so local changes reach the server before a pull can conflict with
+   * them.
+   */
+  runPending() {
+    if (this.options == null || this.pending.size == 0) {
+      return;
+    }
+    if (this.pending.has(SyncDir.DOWN) && this.pushTimer != null) {
+      // A push is still waiting out its debounce. The pull can't go first, as it would delete new local files that
+      // haven't been pushed yet.
+      this.timers.clearTimeout(this.pushTimer);
+      this.pushTimer = null;
+      this.pending.add(SyncDir.UP);
+    }
+    const direction = this.pending.has(SyncDir.UP) ? SyncDir.UP : SyncDir.DOWN;
+    if (!this.lock.tryAcquire(direction)) {
+      return;
+    }
+    this.pending.delete(direction);
+    if (direction == SyncDir.UP) {
+      this.firstChange = null;
+    } else {
+      this.lastPull = this.timers.now();
+    }
+    this.run(direction)
+      .catch((ex) => console.error("Automatic sync failed", ex))
+      .then(() => this.lock.release());
+  }
+}
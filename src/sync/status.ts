@@ -4,8 +4,24 @@
  */
 export interface ActionedItem {
   lastFile: string;
+  /**
+   * Overall progress, from 0 to 100. Weighted by the number of bytes to transfer (see ProgressTracker).
+   */
   lastProgress: number;
   // TODO: add ActionType?
+  /**
+   * Bytes transferred so far, and in total.
+   */
+  bytesDone?: number;
+  bytesTotal?: number;
+  /**
+   * Transfer rate in bytes per second, averaged over the last few seconds.
+   */
+  throughput?: number;
+  /**
+   * Estimated number of seconds left, or null if there isn't enough to go on yet.
+   */
+  eta?: number | null;
 }
 
 /**
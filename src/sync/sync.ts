@@ -1,14 +1,33 @@
 import { ActionType } from "./actiontype";
 import { Status } from "./status";
+import { SharedLimit, TaskPool } from "./concurrency";
 import { SyncDir } from "./syncdir";
+import { ProgressCallback, ProgressTracker } from "./progress";
 
 export interface FileData {
   lastModified: number | null;
+  /**
+   * File size in bytes. Optional, as not all sources (or tests) provide it.
+   */
+  size?: number | null;
+  /**
+   * The ETag reported by the WebDAV server. Only ever set for remote files, and only if the server provides it.
+   */
+  etag?: string | null;
+  /**
+   * SHA-256 of the content. Only set for local files in content hashing mode, and for manifest entries recorded from
+   * them.
+   */
+  hash?: string | null;
 };
 
 export type Path = string;
 export type Files = Map<Path, FileData>;
 export type Actions = Map<Path, ActionType>;
+/**
+ * Per-path sync directions, used by two-way syncs where each action can go either way.
+ */
+export type Directions = Map<Path, SyncDir>;
 export type OnErrorHandler = (message: string) => void;
 
 export type ActionResult = {
@@ -28,12 +47,45 @@ export interface Content {
   folderPaths: Folder[];
 }
 
+/**
+ * The state of both sides as of the last successful sync, relative to the sync direction. Used as the common ancestor
+ * when deciding which side changed.
+ */
+export interface SyncBase {
+  src: Files;
+  dest: Files;
+}
+
+/**
+ * Additional information about an action that doesn't fit in the other arguments.
+ */
+export interface UpdateContext {
+  /**
+   * For MOVE, the path the file is being moved from.
+   */
+  movedFrom?: Path;
+  /**
+   * The direction of this specific action. Only set in two-way syncs.
+   */
+  direction?: SyncDir;
+  /**
+   * For folder removals, the REMOVE actions for files in the folder, which are done once the folder is deleted.
+   */
+  covered?: Path[];
+}
+
+/**
+ * Performs an action. May return the metadata of the written copy, if it's known to differ from the source's (for
+ * instance because the timestamp couldn't be set), so it can be recorded in the manifest.
+ */
 export type OnUpdateCallback = (
   type: ActionType,
   path: string,
   localData: FileData | undefined,
-  remoteData: FileData | undefined
-) => Promise<void>;
+  remoteData: FileData | undefined,
+  context?: UpdateContext,
+  onProgress?: ProgressCallback
+) => Promise<FileData | void>;
 
 export type OnConflictCallback = (
   path: string,
@@ -63,6 +115,43 @@ function approx(a: number, b: number): boolean {
     || Math.abs(a - b) <= 1;
 }
 
+/**
+ * Checks whether a file is unchanged relative to its state at the last sync. If both sides have an ETag or a content
+ * hash, that's authoritative. Otherwise, the size (if known) and the rounded timestamps have to match.
+ */
+export function matchesBase(current: FileData, base: FileData): boolean {
+  if (current.etag != null && base.etag != null) {
+    return current.etag == base.etag;
+  }
+  if (current.hash != null && base.hash != null) {
+    return current.hash == base.hash;
+  }
+  if (current.size != null && base.size != null && current.size != base.size) {
+    return false;
+  }
+  if (current.lastModified == null || base.lastModified == null) {
+    return false;
+  }
+  return approx(dateRounder(current.lastModified), dateRounder(base.lastModified));
+}
+
+/**
+ * Checks whether two files on opposite sides are very likely identical. ETags can't be compared across sides, so this
+ * only uses the size and timestamp, unless both sides have a content hash.
+ */
+export function sameFile(a: FileData, b: FileData): boolean {
+  if (a.hash != null && b.hash != null) {
+    return a.hash == b.hash;
+  }
+  if (a.size != null && b.size != null && a.size != b.size) {
+    return false;
+  }
+  if (a.lastModified == null || b.lastModified == null) {
+    return false;
+  }
+  return approx(dateRounder(a.lastModified), dateRounder(b.lastModified));
+}
+
 export function resolveActions(dest: Files, actions: Actions): Set<string> {
   let out = new Set<string>();
   // prepopulate the array with the destination vault
@@ -81,10 +170,134 @@ export function resolveActions(dest: Files, actions: Actions): Set<string> {
   return out;
 }
 
+/**
+ * Compares the timestamps of two copies of a file, with the same rounding as classifyPair.
+ *
+ * \returns a positive number if a is newer, a negative number if b is newer, 0 if they're (approximately) the same
+ *          age, or null if either timestamp is unknown
+ */
+export function compareModified(a: FileData, b: FileData): number | null {
+  if (a.lastModified == null || b.lastModified == null) {
+    return null;
+  }
+  const aDate = dateRounder(a.lastModified);
+  const bDate = dateRounder(b.lastModified);
+  return approx(aDate, bDate) ? 0 : aDate - bDate;
+}
+
+/**
+ * Classifies a file that exists on both sides. This is the part of calculateSyncActions that's shared with
+ * calculateIndexActions, so the two can't disagree on what to do with a file.
+ *
+ * \returns the action, or null if the file doesn't need one (and includeNoop is false)
+ */
+export function classifyPair(
+  data: FileData,
+  remoteData: FileData,
+  srcBase: FileData | undefined,
+  destBase: FileData | undefined,
+  includeNoop: boolean,
+): ActionType | null {
+  if (srcBase != null && destBase != null) {
+    const srcChanged = !matchesBase(data, srcBase);
+    const destChanged = !matchesBase(remoteData, destBase);
+    if (!destChanged && srcChanged) {
+      return ActionType.ADD;
+    } else if (destChanged && !sameFile(data, remoteData)) {
+      // The destination was changed since the last sync, and doesn't match the source. Regardless of whether or
+      // not the source was changed as well, overwriting it would discard changes.
+      return ActionType.ADD_LOCAL;
+    }
+    return includeNoop ? ActionType.NOOP : null;
+  }
+
+  // Check the dates
+  if (remoteData.lastModified == null || data.lastModified == null) {
+    // If either of the dates are null, the underlying filesystem or remote webdav server doesn't support
+    // it/has it disabled. We need to add just in case.
+    return ActionType.ADD;
+  }
+
+  if (approx(dateRounder(remoteData.lastModified), dateRounder(data.lastModified))) {
+    return includeNoop ? ActionType.NOOP : null;
+  } else if (dateRounder(remoteData.lastModified) > dateRounder(data.lastModified)) {
+    // remote is newer; likely forgotten pull. ADD_LOCAL gives an option of which to pick
+    return ActionType.ADD_LOCAL;
+  }
+  // local file is newer than the remote file; add it.
+  return ActionType.ADD;
+}
+
+/**
+ * The wipe protection checks, shared between calculateSyncActions and calculateIndexActions.
+ *
+ * \param srcEmpty                  Whether the source has no files at all
+ * \param hasFiles                  Whether the destination has any files left after the actions
+ * \param hasNonObsidianFiles       Whether any of those are outside the config folder
+ * \param destHasNonObsidianFiles   Whether the destination currently has files outside the config folder
+ * \returns the error to show, or null if the actions are fine
+ */
+export function wipeError(
+  srcEmpty: boolean,
+  hasFiles: boolean,
+  hasNonObsidianFiles: boolean,
+  destHasNonObsidianFiles: boolean,
+  obsidianConfDir: string,
+): string | null {
+  // Trivial scenario: source reports 0 files found. Ignore
+  if (srcEmpty) {
+    return "WebDAV sync: Action blocked: detected full vault wipe";
+  }
+  // The more likely scenario is the actions resolving to everything being removed due to a bug in the action
+  // calculation system.
+  if (!hasFiles) {
+    return "WebDAV sync: Action blocked: detected full vault wipe. This is likely a bug; please open an issue on GitHub";
+  }
+  // destHasNonObsidianFiles is used to check if we need to care. If a vault, for whatever reason, only contains
+  // content in the .obsidian folder, we don't need to care about hasNonObsidianFiles = false. It's a very weird
+  // edge-case borderline not worth caring about, but I'm doing it anyway.
+  if (!hasNonObsidianFiles && destHasNonObsidianFiles) {
+    return `WebDAV sync: Action blocked: identified vault content wipe (${obsidianConfDir} untouched)`;
+  }
+  return null;
+}
+
+/**
+ * The parts of resolveActions that the wipe checks need, without building the resolved set. Stops as soon as it finds
+ * a file outside the config folder, which for any normal vault is one of the first few files.
+ */
+function summariseResolved(
+  dest: Files,
+  actions: Actions,
+  obsidianConfDir: string
+): { hasFiles: boolean, hasNonObsidianFiles: boolean } {
+  let hasFiles = false;
+  for (const [file] of dest) {
+    if (actions.get(file) != ActionType.REMOVE) {
+      hasFiles = true;
+      if (!file.startsWith(obsidianConfDir)) {
+        return { hasFiles, hasNonObsidianFiles: true };
+      }
+    }
+  }
+  for (const [file, action] of actions) {
+    if ((action == ActionType.ADD || action == ActionType.ADD_LOCAL) && !dest.has(file)) {
+      hasFiles = true;
+      if (!file.startsWith(obsidianConfDir)) {
+        return { hasFiles, hasNonObsidianFiles: true };
+      }
+    }
+  }
+  return { hasFiles, hasNonObsidianFiles: false };
+}
+
 /**
  * Calculates the sync changes to do.
  *
  * The function is pseudo-bidirectional, and attempts to do a file-level merge [not implemented]
+ *
+ * If a base is provided, files that exist on both sides and in the base are classified by which side changed since the
+ * last sync, rather than by comparing raw timestamps. Files that aren't in the base fall back to timestamp comparisons.
  */
 export function calculateSyncActions(
   src: Files,
@@ -93,6 +306,7 @@ export function calculateSyncActions(
   includeNoop: boolean = false,
   deleteIsNoop: boolean = false,
   blockWipes: boolean = true,
+  base: SyncBase | null = null,
 ): ActionResult {
   const out: Actions = new Map<string, ActionType>();
 
@@ -119,64 +333,42 @@ export function calculateSyncActions(
       // File available locally but not remotely: push.
       out.set(file, ActionType.ADD);
     } else {
-      // Check the dates
-      let remoteData = dest.get(file) as FileData;
-      if (remoteData.lastModified == null || data.lastModified == null) {
-        // If either of the dates are null, the underlying filesystem or remote webdav server doesn't support
-        // it/has it disabled. We need to add just in case.
-        out.set(file, ActionType.ADD);
-        continue;
-      }
-
-      if (approx(dateRounder(remoteData.lastModified), dateRounder(data.lastModified))) {
-        if (includeNoop) {
-          out.set(file, ActionType.NOOP);
-        }
-      } else if (dateRounder(remoteData.lastModified) > dateRounder(data.lastModified)) {
-        // remote is newer; likely forgotten pull. ADD_LOCAL gives an option of which to pick
-        out.set(file, ActionType.ADD_LOCAL);
-      } else {
-        // local file is newer than the remote file; add it.
-        out.set(file, ActionType.ADD);
+      const action = classifyPair(
+        data,
+        dest.get(file) as FileData,
+        base?.src.get(file),
+        base?.dest.get(file),
+        includeNoop
+      );
+      if (action != null) {
+        out.set(file, action);
       }
     }
   }
 
   if (blockWipes) {
-    // Trivial scenario: source reports 0 files found. Ignore
-    if (src.size == 0) {
-      return {
-        actions: null,
-        error: "WebDAV sync: Action blocked: detected full vault wipe"
-      }
-    }
-
-    let resolvedFiles = resolveActions(dest, out);
-    // The more likely scenario is the actions resolving to everything being removed due to a bug in the action
-    // calculation system.
-    if (resolvedFiles.size == 0) {
-      return {
-        actions: null,
-        error: "WebDAV sync: Action blocked: detected full vault wipe. This is likely a bug; please open an issue on GitHub"
+    const resolved = summariseResolved(dest, out, obsidianConfDir);
+    let destHasNonObsidianFiles = false;
+    if (!resolved.hasNonObsidianFiles) {
+      for (const [file] of dest) {
+        if (!file.startsWith(obsidianConfDir)) {
+          destHasNonObsidianFiles = true;
+          break;
+        }
       }
     }
-
-    let hasNonObsidianFiles = Array.from(resolvedFiles).some(fn => {
-      return !fn.startsWith(obsidianConfDir);
-    });
-
-    // Used to check if we need to care. If a vault, for whatever reason, only contains content in the .obsidian folder,
-    // we don't need to care about hasNonObsidianFiles = false. It's a very weird edge-case borderline not worth caring
-    // about, but I'm doing it anyway.
-    let destHasNonObsidianFiles = Array.from(dest.entries()).some(entry => {
-      return !entry[0].startsWith(obsidianConfDir)
-    });
-
-    if (!hasNonObsidianFiles && destHasNonObsidianFiles) {
+    const error = wipeError(
+      src.size == 0,
+      resolved.hasFiles,
+      resolved.hasNonObsidianFiles,
+      destHasNonObsidianFiles,
+      obsidianConfDir
+    );
+    if (error != null) {
       return {
         actions: null,
-        error: `WebDAV sync: Action blocked: identified vault content wipe (${obsidianConfDir} untouched)`
-      }
+        error
+      };
     }
   }
 
@@ -201,14 +393,11 @@ export function findDeletedFolders(
   dest: Folder[]
 ): Folder[] {
   let deleted = [];
-  // TODO: this is nasty. There has to be a better way
-  // (Maybe do a Set() instead?)
+  // We only care about the commonPath, because it's the same path in both.
+  // realPath varies between the two, so it'll fail to match subfolder sync if that's used.
+  const srcPaths = new Set(src.map(folder => folder.commonPath));
   for (let destFolder of dest) {
-    // We only care about the commonPath, because it's the same path in both.
-    // realPath varies between the two, so it'll fail to match subfolder sync if that's used.
-    if (!src.some(srcFolder =>
-      destFolder.commonPath == srcFolder.commonPath
-    )) {
+    if (!srcPaths.has(destFolder.commonPath)) {
       deleted.push(destFolder);
     }
   }
@@ -229,9 +418,161 @@ export function findDeletedFolders(
   return deleted;
 }
 
+export interface DeletionPlan {
+  /**
+   * The topmost deleted folders, i.e. deleted folders whose parent isn't deleted. Each of these is deleted with a
+   * single recursive delete.
+   */
+  roots: Folder[];
+  /**
+   * Files removed as part of a root, mapped to the commonPath of the root.
+   */
+  covered: Map<Path, string>;
+  /**
+   * The number of deleted folders in each root, including the root itself. Used to keep the folder count the same as
+   * if each folder was deleted separately.
+   */
+  folderCounts: Map<string, number>;
+  /**
+   * The side each root is deleted from. Only set for two-way syncs (see planTwoWayDeletions).
+   */
+  directions?: Map<string, SyncDir>;
+}
+
+/**
+ * Groups folder deletions into maximal deleted subtrees, so a deleted folder costs one recursive delete rather than
+ * one request per file and folder in it. Files with a REMOVE action inside a deleted subtree are covered by the
+ * subtree's delete, and don't need to be deleted separately.
+ */
+export function planDeletions(
+  src: Folder[],
+  dest: Folder[],
+  actions: Actions,
+): DeletionPlan {
+  return groupDeletions(findDeletedFolders(src, dest), actions);
+}
+
+/**
+ * Deleted folders for a two-way sync. A folder that only exists on one side is either new on that side or deleted on
+ * the other, and the manifest doesn't track folders, so this only counts a folder as deleted if every file in it is
+ * being removed from that side. Empty folders are left alone.
+ *
+ * \param direction The direction of the sync, i.e. the default direction in `directions`
+ */
+export function planTwoWayDeletions(
+  direction: SyncDir,
+  source: Content,
+  dest: Content,
+  actions: Actions,
+  directions: Directions,
+): DeletionPlan {
+  const sideDeletions = (side: Content, other: Folder[], sideDirection: SyncDir): Folder[] => {
+    const otherPaths = new Set(other.map(folder => folder.commonPath));
+    const hasFiles = new Set<string>();
+    const kept = new Set<string>();
+    for (const [file] of side.files) {
+      const removed = actions.get(file) == ActionType.REMOVE
+        && (directions.get(file) ?? direction) == sideDirection;
+      const parts = file.split("/");
+      for (let i = 1; i < parts.length; ++i) {
+        const folder = parts.slice(0, i).join("/");
+        hasFiles.add(folder);
+        if (!removed) {
+          kept.add(folder);
+        }
+      }
+    }
+    return side.folderPaths.filter(folder => !otherPaths.has(folder.commonPath)
+      && hasFiles.has(folder.commonPath)
+      && !kept.has(folder.commonPath));
+  };
+
+  // REMOVE in the sync direction removes from the destination, and the other way around
+  const reverse = direction == SyncDir.UP ? SyncDir.DOWN : SyncDir.UP;
+  const fromDest = sideDeletions(dest, source.folderPaths, direction);
+  const fromSource = sideDeletions(source, dest.folderPaths, reverse);
+
+  const plan = groupDeletions(fromDest.concat(fromSource), actions);
+  plan.directions = new Map();
+  for (const folder of fromDest) {
+    plan.directions.set(folder.commonPath, direction);
+  }
+  for (const folder of fromSource) {
+    plan.directions.set(folder.commonPath, reverse);
+  }
+  return plan;
+}
+
+function groupDeletions(
+  deletedFolders: Folder[],
+  actions: Actions,
+): DeletionPlan {
+  const deleted = new Map<string, Folder>();
+  for (const folder of deletedFolders) {
+    deleted.set(folder.commonPath, folder);
+  }
+
+  // Walks from the top down, so the first deleted ancestor is the topmost one
+  const findRoot = (path: string): string | null => {
+    const parts = path.split("/");
+    let current = "";
+    for (let i = 0; i < parts.length; ++i) {
+      current = i == 0 ? parts[0] : current + "/" + parts[i];
+      if (deleted.has(current)) {
+        return current;
+      }
+    }
+    return null;
+  };
+
+  const roots: Folder[] = [];
+  const folderCounts = new Map<string, number>();
+  for (const [path, folder] of deleted) {
+    const root = findRoot(path) as string;
+    if (root == path) {
+      roots.push(folder);
+    }
+    folderCounts.set(root, (folderCounts.get(root) ?? 0) + 1);
+  }
+
+  const covered = new Map<Path, string>();
+  for (const [file, action] of actions) {
+    if (action != ActionType.REMOVE) {
+      continue;
+    }
+    // Only the parent folders are relevant; a file can't be a deleted folder
+    const slash = file.lastIndexOf("/");
+    const root = slash == -1 ? null : findRoot(file.substring(0, slash));
+    if (root != null) {
+      covered.set(file, root);
+    }
+  }
+
+  return {
+    roots,
+    covered,
+    folderCounts,
+  };
+}
+
 /**
  * General template for the sync system, since it's the same shit in both places with some minor differences.
  *
+ * File actions are run through a bounded pool, so up to `concurrency` transfers can be in flight at once. Progress
+ * reports are still yielded in pairs per file (one when the action is started, one when it completes), but with
+ * concurrency > 1, the completion reports can arrive out of order relative to the start reports. Progress is measured
+ * in bytes (see ProgressTracker); onUpdate gets a callback it can use to report partial progress of large files.
+ * With a heartbeat, additional progress reports are yielded while waiting on slow transfers, so that partial progress
+ * is actually seen. These can't be told apart from regular progress reports, so counting reports isn't meaningful
+ * with a heartbeat.
+ *
+ * Conflicts (ADD_LOCAL) pause the entire pipeline; all in-flight transfers are allowed to finish before the user is
+ * asked, and no new transfers are started until the conflict is resolved.
+ *
+ * Deleted folders are deleted as whole subtrees after every file action has completed (see planDeletions). Removed
+ * files inside them still get their progress reports, and count towards actionedCount if the subtree is deleted, but
+ * they're not passed to onUpdate individually.
+ *
  * \param direction   The sync direction; used for some actions that require knowing whether the source is local
  *                    or not
  * \param sourceFiles The files in the source directory. Does not have to be local
@@ -241,6 +582,14 @@ export function findDeletedFolders(
  *                    with the corresponding adapter
  * \param onConflict  Called when a conflict happens. In production, this just shows a dialog to the user. In unit tests,
  *                    it's a noop or an otherwise fixed result.
+ * \param concurrency The maximum number of file actions to run at once. Defaults to 1, i.e. fully sequential.
+ * \param moves       Detected moves (see detectMoves), used to look up the old path for MOVE actions.
+ * \param directions  For two-way syncs, the direction of each action. Actions that go against `direction` get their
+ *                    source and destination data swapped, and the direction is passed to onUpdate in the context.
+ *                    onConflict may change the direction of the conflicting file in this map.
+ * \param tracker     Tracks the progress. Only needs to be passed in if the caller wants to look at it afterwards.
+ * \param heartbeat   If > 0, the maximum time in ms to go without a progress report while transfers are running.
+ * \param shared      An overall limit on file actions shared with other runSyncs running at the same time, if any.
  */
 export async function* runSync(
   direction: SyncDir,
@@ -250,20 +599,71 @@ export async function* runSync(
   onError: OnErrorHandler,
   onUpdate: OnUpdateCallback,
   onConflict: OnConflictCallback,
-  deleteIsNoop: boolean
+  deleteIsNoop: boolean,
+  concurrency: number = 1,
+  moves: Map<Path, Path> = new Map(),
+  directions: Directions | null = null,
+  tracker: ProgressTracker = new ProgressTracker(),
+  heartbeat: number = 0,
+  shared: SharedLimit | null = null,
 ): AsyncGenerator<Status> {
   let actionedCount = 0;
   let errorCount = 0;
-  let totalActions = actions.size;
-  let processedActions = 0;
+  let lastFile = "";
+
+  for (const [file, action] of actions) {
+    let bytes = 0;
+    if (action == ActionType.ADD || action == ActionType.ADD_LOCAL) {
+      const fileDirection = directions?.get(file) ?? direction;
+      bytes = (fileDirection == direction ? source : dest).files.get(file)?.size ?? 0;
+    }
+    tracker.plan(file, bytes);
+  }
+  tracker.start();
+
+  const plan = deleteIsNoop
+    ? null
+    : directions != null
+      ? planTwoWayDeletions(direction, source, dest, actions, directions)
+      : planDeletions(source.folderPaths, dest.folderPaths, actions);
+  // Covered files, grouped by the root that deletes them
+  const deferred = new Map<string, Path[]>();
+
+  const pool = new TaskPool(concurrency, shared);
+  // Completion reports from the pool. These are written by the tasks, and drained by the generator whenever it gets
+  // control back.
+  const completed: Status[] = [];
+  // Waits for a transfer to finish, or for the heartbeat, whichever is first. Returns the reports to yield.
+  const wait = async (): Promise<Status[]> => {
+    if (heartbeat <= 0) {
+      await pool.waitForAny();
+      return completed.splice(0);
+    }
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    await Promise.race([
+      pool.waitForAny(),
+      new Promise(resolve => { timer = setTimeout(resolve, heartbeat); }),
+    ]);
+    clearTimeout(timer);
+    const out = completed.splice(0);
+    return out.length > 0 || pool.size == 0 ? out : [{ result: tracker.item(lastFile) }];
+  };
+
   for (let [file, action] of actions.entries()) {
-    let srcData = source.files.get(file);
-    let destData = dest.files.get(file);
-    yield {
-      result: {
-        lastFile: file,
-        lastProgress: 100 * processedActions / totalActions,
+    while (!pool.hasCapacity()) {
+      for (const status of await wait()) {
+        yield status;
       }
+    }
+
+    const movedFrom = action == ActionType.MOVE ? moves.get(file) : undefined;
+    let fileDirection = directions?.get(file) ?? direction;
+    let srcData = (fileDirection == direction ? source : dest).files.get(file);
+    // For moves, the destination data is the file that's being moved
+    let destData = (fileDirection == direction ? dest : source).files.get(movedFrom ?? file);
+    lastFile = file;
+    yield {
+      result: tracker.item(file)
     };
 
     if (
@@ -272,6 +672,10 @@ export async function* runSync(
     ) {
       onError("Fatal: " + file + " lacks srcData");
       console.error(file, action, srcData, destData, direction);
+      // Let whatever's already running finish, so the final error count is accurate
+      while (pool.size > 0) {
+        await pool.waitForAny();
+      }
       yield {
         result: {
           actionedCount: -1,
@@ -284,13 +688,24 @@ export async function* runSync(
     // ADD_LOCAL needs to be first, so we don't have to redo value checks for action
     // ADD_LOCAL is when the remote has a change newer than anything local, i.e. a pull was not done in advance.
     if (action == ActionType.ADD_LOCAL) {
+      // The conflict modal blocks the pipeline, so everything in flight needs to settle before the user is asked.
+      while (pool.size > 0) {
+        for (const status of await wait()) {
+          yield status;
+        }
+      }
       try {
         action = await onConflict(
           file,
           srcData,
           destData,
-          direction
+          fileDirection
         );
+        const resolvedDirection = directions?.get(file) ?? direction;
+        if (resolvedDirection != fileDirection) {
+          fileDirection = resolvedDirection;
+          [srcData, destData] = [destData, srcData];
+        }
       } catch (e) {
         if (e instanceof Error) {
           onError(`Abort: Conflict resolution failed: ${e.message}`);
@@ -311,14 +726,41 @@ export async function* runSync(
     // IIRC, calculateSyncActions::includeNoop = false everywhere that isn't tests, so we don't need to care much about
     // progress reporting there
     if (action == ActionType.NOOP) {
+      tracker.skip(file);
       continue;
-    } else {
+    }
+
+    const root = action == ActionType.REMOVE ? plan?.covered.get(file) : undefined;
+    if (root != null) {
+      const group = deferred.get(root);
+      if (group == null) {
+        deferred.set(root, [file]);
+      } else {
+        group.push(file);
+      }
+      continue;
+    }
+
+    const resolvedAction = action;
+    let context: UpdateContext | undefined = undefined;
+    if (movedFrom != null) {
+      context = { movedFrom };
+    }
+    if (directions != null) {
+      context = { ...context, direction: fileDirection };
+    }
+    pool.submit(async () => {
       try {
+        if (resolvedAction == ActionType.MOVE && movedFrom == null) {
+          throw Error(`No move source for ${file}`);
+        }
         await onUpdate(
-          action,
+          resolvedAction,
           file,
           srcData,
-          destData
+          destData,
+          context,
+          (bytes) => tracker.advance(file, bytes)
         );
         actionedCount += 1;
       } catch (ex) {
@@ -334,31 +776,39 @@ export async function* runSync(
           onError("An unknown error occurred. See the console for more information.");
         }
       }
+      tracker.complete(file);
+      completed.push({
+        result: tracker.item(file)
+      });
+    });
+  }
+
+  while (pool.size > 0) {
+    for (const status of await wait()) {
+      yield status;
     }
-    yield {
-      result: {
-        lastFile: file,
-        lastProgress: 100 * (++processedActions) / totalActions,
-      }
-    };
+  }
+  for (const status of completed.splice(0)) {
+    yield status;
   }
 
   let actionedFolders = 0;
-  if (!deleteIsNoop) {
-    const foldersToDelete = findDeletedFolders(
-      source.folderPaths,
-      dest.folderPaths
-    );
-
-    for (const folder of foldersToDelete) {
+  if (plan != null) {
+    for (const folder of plan.roots) {
+      const files = deferred.get(folder.commonPath) ?? [];
+      const folderDirection = plan.directions?.get(folder.commonPath);
+      let deleted = false;
       try {
         await onUpdate(
           ActionType.REMOVE,
           folder.commonPath,
           undefined,
-          undefined
+          undefined,
+          folderDirection != null ? { direction: folderDirection, covered: files } : { covered: files }
         );
-        actionedFolders += 1;
+        actionedFolders += plan.folderCounts.get(folder.commonPath) ?? 1;
+        actionedCount += files.length;
+        deleted = true;
       } catch (ex) {
         // TODO: would be nice if this could be done atomically, but that feels involved.
         // Especially remotely. But I'm pretty sure there's move functions in the client,
@@ -371,6 +821,30 @@ export async function* runSync(
           onError("An unknown error occurred");
         }
       }
+      for (const file of files) {
+        if (!deleted) {
+          // Fall back to deleting the files one by one. The folders themselves are left for the next sync.
+          const fileDirection = directions?.get(file) ?? direction;
+          try {
+            await onUpdate(
+              ActionType.REMOVE,
+              file,
+              (fileDirection == direction ? source : dest).files.get(file),
+              (fileDirection == direction ? dest : source).files.get(file),
+              directions != null ? { direction: fileDirection } : undefined
+            );
+            actionedCount += 1;
+          } catch (ex) {
+            console.error(ex);
+            errorCount += 1;
+            onError(ex instanceof Error ? ex.message : "An unknown error occurred");
+          }
+        }
+        tracker.complete(file);
+        yield {
+          result: tracker.item(file)
+        };
+      }
     }
   }
   yield {
@@ -382,4 +856,3 @@ export async function* runSync(
   }
 }
 export { ActionType };
-
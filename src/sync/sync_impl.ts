@@ -1,22 +1,43 @@
-import {normalizePath, Notice} from "obsidian";
+import {normalizePath, Notice, TFolder} from "obsidian";
 import {
   Actions, ActionType,
   calculateSyncActions,
   Content,
+  Directions,
   FileData,
+  Files,
   OnConflictCallback,
   OnErrorHandler,
-  runSync
+  OnUpdateCallback,
+  runSync,
+  SyncBase,
+  UpdateContext
 } from "./sync";
 import WebDAVSyncPlugin from "main";
 import {FileProvider} from "./files";
 import {prefixToStr, resolvePath} from "./pathutils";
 import { SyncDir } from "./syncdir";
 import { ConflictModal } from "./conflict_modal";
+import { ActionedItem } from "./status";
+import { applySyncResults, manifestKey, toManifestIndexBase, toSyncBase } from "./manifest";
+import { downloadChunked, isLargeFile, uploadChunked, uploadDelta } from "./transfer";
+import { detectMoves, Moves } from "./moves";
+import { createPlan, JournalState, pendingActions, plannedContent } from "./journal";
+import { calculateTwoWayActions } from "./twoway";
+import { mergeGenerators, SharedLimit } from "./concurrency";
+import { RemoteFileResult } from "./sync_modal";
+import { FRAME_INTERVAL, ProgressCallback, ProgressTracker, throttleProgress } from "./progress";
+import { SyncMetrics } from "./metrics";
+import { EarlyDownloads } from "./early_downloads";
+import { calculateIndexActions, FileIndex, IndexBase } from "./file_index";
 
 export interface DryRunInfo {
   direction: SyncDir;
   subfolder: string | null;
+  /**
+   * The direction of each action, for two-way syncs.
+   */
+  directions?: Directions;
 }
 
 export type TaskGraphHandler = (actions: Actions, info: DryRunInfo) => void;
@@ -54,6 +75,16 @@ export class SyncImpl {
    */
   showTaskGraph: TaskGraphHandler;
   fileProvider: FileProvider;
+  conflicts: Promise<unknown> = Promise.resolve();
+  /**
+   * Timings for the current (or last) sync. Replaced at the start of each sync.
+   */
+  metrics: SyncMetrics = new SyncMetrics("push", false);
+  /**
+   * While several folders are synced at once, the limit on parallel transfers they share, so the folders don't each
+   * get the full number of parallel transfers.
+   */
+  transfers: SharedLimit | null = null;
 
   /**
    * @param onError         Invoked if an error occurs. Does not control termination; this is basically
@@ -85,261 +116,642 @@ export class SyncImpl {
   }
 
   async *upload() {
+    yield* this.syncAll(SyncDir.UP);
+  }
+
+  async *download() {
+    yield* this.syncAll(SyncDir.DOWN);
+  }
+
+  /**
+   * Two-way sync. Both sides are listed once, and changes are copied in whichever direction they need to go.
+   */
+  async *sync() {
+    yield* this.syncAll(SyncDir.UP, true);
+  }
+
+  /**
+   * Syncs either the full vault, or each of the mapped subfolders, depending on the settings.
+   *
+   * In subfolder mode, the remote folders are listed up front, in parallel, sharing listings where possible (see
+   * getRemoteFilesShared), and the folders are then synced concurrently. A folder that fails doesn't stop the others;
+   * its errors are reported with the folder's name.
+   *
+   * Roots with an interrupted sync in the same direction are resumed from the journal instead of being synced from
+   * scratch. Two-way syncs aren't journaled. They supersede any interrupted one-way sync, and as they compare both
+   * sides against the manifest, an interrupted two-way sync just picks up what's left on the next run.
+   */
+  async *syncAll(direction: SyncDir, twoWay: boolean = false): AsyncGenerator<ActionedItem> {
     if (this.plugin.client == null) {
       return;
     }
-    let local = await this.fileProvider.getVaultFiles();
-    // TODO: There must be a way to merge both branches of the if statement. There's a _lot_ of duplicated code
-    // Also applies to upload()
+    const client = this.plugin.client;
+    this.metrics = new SyncMetrics(
+      twoWay ? "sync" : direction == SyncDir.UP ? "push" : "pull",
+      this.dryRun,
+      client.stats.methods
+    );
+    try {
+      yield* this.syncRoots(direction, twoWay);
+    } finally {
+      await this.plugin.syncReports.add(this.metrics.finish(client.stats.methods));
+    }
+  }
+
+  async *syncRoots(direction: SyncDir, twoWay: boolean): AsyncGenerator<ActionedItem> {
+    await this.plugin.syncManifest.load();
+    if (!this.dryRun && (direction == SyncDir.DOWN || twoWay || !this.plugin.settings.sync.dirty_tracking)) {
+      // Pulls write to the vault through the adapter, which doesn't reliably generate vault events, so the listings
+      // the dirty tracker keeps for pushes can't be trusted afterwards. Pulls don't use them, so they can be dropped
+      // before anything is written. The same goes for pushes while tracking is off, which may push files the stored
+      // listings don't have; if tracking is turned back on, those would otherwise be deleted from the server.
+      await this.plugin.dirtyTracker.invalidate();
+    }
+    const roots: { dest: string, localPrefix: string | null }[] = [];
     if (this.plugin.settings.sync.full_vault_sync) {
-      let remoteResult = await this.fileProvider.getRemoteFiles(this.plugin.settings.sync.root_folder.dest);
-      if (remoteResult.error) {
-        this.onError(remoteResult.error);
-        return;
+      roots.push({
+        dest: this.plugin.settings.sync.root_folder.dest,
+        localPrefix: null
+      });
+    } else {
+      for (const vaultPath in this.plugin.settings.sync.subfolders) {
+        roots.push({
+          dest: this.plugin.settings.sync.subfolders[vaultPath].dest,
+          localPrefix: vaultPath
+        });
       }
+    }
 
-      const remote = remoteResult.content as Content;
-      let actionResult = calculateSyncActions(
-        local.files,
-        remote.files,
-        this.plugin.configDir(),
-        false,
-        this.deleteIsNoop,
-        this.blockWipes,
+    const jobs: { label: string | null, run: (onError: OnErrorHandler) => AsyncGenerator<ActionedItem, boolean> }[] = [];
+    const journals = this.dryRun ? new Map<string, JournalState>() : await this.plugin.syncJournal.read();
+    for (const [key, journal] of journals) {
+      const index = roots.findIndex(
+        root => manifestKey(root.dest, root.localPrefix) == key
       );
-
-      if (actionResult.error != null) {
-        this.onError(actionResult.error)
-        return
-      }
-      
-      if (!this.dryRun) {
-        for await (const sig of runSync(
-          SyncDir.UP,
-          local,
-          remote,
-          actionResult.actions,
-          this.onError.bind(this) as OnErrorHandler,
-          this.updateUpload.bind(
-            this,
-            this.plugin.settings.sync.root_folder.dest,
-            null
-          ),
-          this.resolveConflict.bind(this) as OnConflictCallback,
-          this.deleteIsNoop,
-        )) {
-          const { result } = sig;
-          if ("lastFile" in result) {
-            // Progress report; yield back out
-            yield result
-          } else {
-            new Notice(`Push complete. ${result.actionedCount} files were updated, `
-              + `and ${result.actionedFolders} stale folders were removed (${result.errorCount} errors).`);
-          }
-        }
-        this.onComplete(this.dryRun);
+      if (index == -1 || journal.plan.direction != direction || twoWay) {
+        // The interrupted sync is superseded by this one
+        await this.plugin.syncJournal.finish(key);
       } else {
-        console.debug("remote: ", remote);
-        console.debug("local: ", local);
-        this.showTaskGraph(actionResult.actions, {
-          direction: SyncDir.UP,
-          subfolder: null
+        jobs.push({
+          label: journal.plan.localPrefix,
+          run: (onError) => this.resumeFolder(direction, journal, onError),
         });
+        roots.splice(index, 1);
       }
-    } else {
-      for (const vaultPath in this.plugin.settings.sync.subfolders) {
-        const { dest } = this.plugin.settings.sync.subfolders[vaultPath];
-        let local = await this.fileProvider.getVaultFiles(vaultPath);
-
-        let remoteResult = await this.fileProvider.getRemoteFiles(dest);
-        if (remoteResult.error) {
-          this.onError(remoteResult.error);
-          return;
-        }
-        const remote = remoteResult.content as Content;
-        let actionResult = calculateSyncActions(
-          local.files,
-          remote.files,
-          this.plugin.configDir(),
-          false,
-          this.deleteIsNoop,
-          this.blockWipes,
-        );
+    }
 
-        if (actionResult.error != null) {
-          this.onError(actionResult.error)
-          return
-        }
+    const listings = roots.length > 1
+      ? await this.metrics.time("remote", () => this.fileProvider.getRemoteFilesShared(roots.map(root => root.dest)))
+      : null;
+    for (const root of roots) {
+      const remote = listings?.get(root.dest);
+      jobs.push({
+        label: root.localPrefix,
+        run: (onError) => twoWay
+          ? this.syncFolderTwoWay(root.dest, root.localPrefix, onError, remote)
+          : this.syncFolder(direction, root.dest, root.localPrefix, onError, remote),
+      });
+    }
 
-        if (!this.dryRun) {
-          for await (const sig of runSync(
-            SyncDir.UP,
-            local,
-            remote,
-            actionResult.actions,
-            this.onError.bind(this),
-            this.updateUpload.bind(
-              this,
-              dest,
-              vaultPath
-            ),
-            this.resolveConflict.bind(this) as OnConflictCallback,
-            this.deleteIsNoop
-          )) {
-            const { result } = sig;
-            if ("lastFile" in result) {
-              // Progress report; yield back out
-              yield result
-            } else {
-              new Notice(
-                `Push complete. ${result.actionedCount} files were updated, `
-                  + `and ${result.actionedFolders} stale folders were removed (${result.errorCount} errors).`
-              );
-            }
+    if (jobs.length == 1) {
+      yield* jobs[0].run(this.onError);
+    } else if (jobs.length > 1) {
+      // Each folder reports its own progress, so the totals are added up over the folders
+      const progress: ActionedItem[] = jobs.map(() => ({ lastFile: "", lastProgress: 0 }));
+      const failed: string[] = [];
+      this.transfers = new SharedLimit(this.plugin.settings.sync.concurrency);
+      const merged = mergeGenerators(jobs.map(job => async function* (this: SyncImpl) {
+        const onError = (message: string) => this.onError(`${job.label}: ${message}`);
+        try {
+          const succeeded: boolean = yield* job.run(onError);
+          if (!succeeded) {
+            failed.push(job.label ?? "");
           }
-          this.onComplete(this.dryRun);
-        } else {
-          this.showTaskGraph(actionResult.actions, {
-            direction: SyncDir.UP,
-            subfolder: vaultPath
-          });
+        } catch (ex) {
+          console.error(ex);
+          onError(ex instanceof Error ? ex.message : "An unknown error occurred");
+          failed.push(job.label ?? "");
         }
+        return true;
+      }.bind(this)), this.plugin.settings.sync.concurrency);
+      try {
+        for await (const [index, item] of merged) {
+          progress[index] = item;
+          const etas = progress.map(folder => folder.eta);
+          yield {
+            lastFile: item.lastFile,
+            lastProgress: progress.reduce((sum, folder) => sum + folder.lastProgress, 0) / progress.length,
+            bytesDone: progress.reduce((sum, folder) => sum + (folder.bytesDone ?? 0), 0),
+            bytesTotal: progress.reduce((sum, folder) => sum + (folder.bytesTotal ?? 0), 0),
+            throughput: progress.reduce((sum, folder) => sum + (folder.throughput ?? 0), 0),
+            // Folders that haven't started yet don't have an ETA at all
+            eta: etas.some(eta => eta === null) ? null : Math.max(...etas.map(eta => eta ?? 0)),
+          };
+        }
+      } finally {
+        this.transfers = null;
+      }
+      if (failed.length > 0) {
+        this.onError(`${failed.length} of ${jobs.length} folders failed to sync: ${failed.join(", ")}`);
       }
     }
+    if (!this.dryRun) {
+      await this.plugin.syncJournal.clearFinished();
+    }
   }
 
-  async *download() {
-    if (this.plugin.client == null) {
-      return;
+  /**
+   * Syncs a single root, i.e. the full vault or one subfolder mapping.
+   *
+   * @param dest          The WebDAV folder to sync with
+   * @param localPrefix   The vault folder to sync with, or null for the full vault
+   * @param remote        The remote listing, if it was already listed
+   * @returns             false if the sync was aborted before running, true otherwise
+   */
+  async *syncFolder(
+    direction: SyncDir,
+    dest: string,
+    localPrefix: string | null,
+    onError: OnErrorHandler = this.onError,
+    remote?: RemoteFileResult,
+  ): AsyncGenerator<ActionedItem, boolean> {
+    let local = await this.metrics.time("local", () => direction == SyncDir.UP && this.plugin.settings.sync.dirty_tracking
+      ? this.plugin.dirtyTracker.listLocal(this.fileProvider, localPrefix || "/")
+      : this.fileProvider.getVaultFiles(localPrefix || "/"));
+    if (this.plugin.settings.sync.content_hashing) {
+      await this.metrics.time("hashing", () => this.hashLocalFiles(local, localPrefix));
     }
-    if (this.plugin.settings.sync.full_vault_sync) {
-      let local = await this.fileProvider.getVaultFiles();
-      let remoteResult = await this.fileProvider.getRemoteFiles(this.plugin.settings.sync.root_folder.dest);
-      if (remoteResult.error) {
-        this.onError(remoteResult.error);
-        return;
-      }
+    // With a streaming listing, a pull can start downloading files that don't exist locally before the listing is
+    // done. Config files are left to the regular sync, as only files outside the config folder guarantee that the
+    // wipe protection won't block the sync once the listing is done.
+    const early = direction == SyncDir.DOWN && remote == null && !this.dryRun && this.fileProvider.canStreamListing()
+      ? new EarlyDownloads(
+        this.plugin.settings.sync.concurrency,
+        (file, data) => this.updateDownload(dest, localPrefix, ActionType.ADD, file, data, undefined),
+        () => this.metrics.now()
+      )
+      : null;
+    const configDir = this.plugin.configDir();
+    let remoteResult: RemoteFileResult;
+    try {
+      remoteResult = remote ?? await this.metrics.time("remote", () => this.fileProvider.getRemoteFiles(
+        dest,
+        early == null ? undefined : (file, data) => {
+          if (!local.files.has(file) && !file.startsWith(configDir)) {
+            early.offer(file, data);
+          }
+        }
+      ));
+    } catch (ex) {
+      await early?.settle();
+      throw ex;
+    }
+    early?.close();
+    if (remoteResult.error) {
+      await early?.settle();
+      onError(remoteResult.error);
+      return false;
+    }
+    const remoteContent = remoteResult.content as Content;
+    const source = direction == SyncDir.UP ? local : remoteContent;
+    const target = direction == SyncDir.UP ? remoteContent : local;
 
-      const remote = remoteResult.content as Content;
-      let actionResult = calculateSyncActions(
-        remote.files,
-        local.files,
-        this.plugin.configDir(),
+    const key = manifestKey(dest, localPrefix);
+    const manifestEntries = this.plugin.syncManifest.getRoot(key);
+    // The compact diff gives the same actions, without the per-file lookups and objects of the regular one
+    const base = this.plugin.settings.sync.compact_diff
+      ? toManifestIndexBase(manifestEntries, direction)
+      : toSyncBase(manifestEntries, direction);
+    let actionResult = this.metrics.timeSync("calculate", () => this.plugin.settings.sync.compact_diff
+      ? calculateIndexActions(
+        FileIndex.fromFiles(source.files),
+        FileIndex.fromFiles(target.files),
+        configDir,
+        false,
+        this.deleteIsNoop,
+        this.blockWipes,
+        base as IndexBase,
+      )
+      : calculateSyncActions(
+        source.files,
+        target.files,
+        configDir,
         false,
         this.deleteIsNoop,
         this.blockWipes,
+        base as SyncBase,
+      ));
+
+    if (actionResult.error != null) {
+      await early?.settle();
+      onError(actionResult.error)
+      return false;
+    }
+    // A move removes the old path, so there's nothing to detect if deletions are blocked
+    const moves: Moves = this.deleteIsNoop
+      ? new Map()
+      : this.metrics.timeSync("calculate", () => detectMoves(source.files, target.files, actionResult.actions, base));
+
+    if (this.dryRun) {
+      console.debug("remote: ", remoteContent);
+      console.debug("local: ", local);
+      this.showTaskGraph(actionResult.actions, {
+        direction,
+        subfolder: localPrefix
+      });
+      return true;
+    }
+
+    // A sync with nothing to do has nothing to resume either
+    if (actionResult.actions.size > 0) {
+      await this.plugin.syncJournal.start(createPlan(
+        key,
+        direction,
+        dest,
+        localPrefix,
+        source,
+        target,
+        actionResult.actions,
+        moves
+      ));
+    }
+    yield* this.executeActions(
+      direction,
+      dest,
+      localPrefix,
+      source,
+      target,
+      actionResult.actions,
+      actionResult.actions,
+      moves,
+      new Map(),
+      null,
+      onError,
+      early
+    );
+    return true;
+  }
+
+  /**
+   * Two-way version of syncFolder. The local side is always fully listed, as with pulls.
+   */
+  async *syncFolderTwoWay(
+    dest: string,
+    localPrefix: string | null,
+    onError: OnErrorHandler = this.onError,
+    listing?: RemoteFileResult,
+  ): AsyncGenerator<ActionedItem, boolean> {
+    const local = await this.metrics.time("local", () => this.fileProvider.getVaultFiles(localPrefix || "/"));
+    if (this.plugin.settings.sync.content_hashing) {
+      await this.metrics.time("hashing", () => this.hashLocalFiles(local, localPrefix));
+    }
+    const remoteResult = listing ?? await this.metrics.time("remote", () => this.fileProvider.getRemoteFiles(dest));
+    if (remoteResult.error) {
+      onError(remoteResult.error);
+      return false;
+    }
+    const remote = remoteResult.content as Content;
+
+    const result = this.metrics.timeSync("calculate", () => calculateTwoWayActions(
+      local.files,
+      remote.files,
+      this.plugin.syncManifest.getRoot(manifestKey(dest, localPrefix)),
+      this.plugin.configDir(),
+      this.deleteIsNoop,
+      this.blockWipes,
+    ));
+    if (result.error != null) {
+      onError(result.error);
+      return false;
+    }
+
+    if (this.dryRun) {
+      console.debug("remote: ", remote);
+      console.debug("local: ", local);
+      this.showTaskGraph(result.actions, {
+        direction: SyncDir.UP,
+        subfolder: localPrefix,
+        directions: result.directions,
+      });
+      return true;
+    }
+
+    yield* this.executeActions(
+      SyncDir.UP,
+      dest,
+      localPrefix,
+      local,
+      remote,
+      result.actions,
+      result.actions,
+      new Map(),
+      new Map(),
+      result.directions,
+      onError
+    );
+    return true;
+  }
+
+  /**
+   * Resumes an interrupted sync from the journal. Both sides are listed again, so the remaining actions aren't run with
+   * stale data, and nothing that changed on the destination since the interruption is overwritten.
+   *
+   * @returns false if either side couldn't be listed, true otherwise
+   */
+  async *resumeFolder(
+    direction: SyncDir,
+    journal: JournalState,
+    onError: OnErrorHandler = this.onError,
+  ): AsyncGenerator<ActionedItem, boolean> {
+    const { dest, localPrefix } = journal.plan;
+    const local = await this.metrics.time("local", () => this.fileProvider.getVaultFiles(localPrefix || "/"));
+    const remoteResult = await this.metrics.time("remote", () => this.fileProvider.getRemoteFiles(dest));
+    if (remoteResult.error) {
+      onError(remoteResult.error);
+      return false;
+    }
+    const remote = remoteResult.content as Content;
+    const current = direction == SyncDir.UP ? local : remote;
+    const currentTarget = direction == SyncDir.UP ? remote : local;
+
+    const { pending, dropped } = pendingActions(journal, current.files, currentTarget.files);
+    const { source, target } = plannedContent(journal, currentTarget, pending);
+    new Notice(
+      `Resuming interrupted ${direction == SyncDir.UP ? "push" : "pull"}: ${pending.size} actions left`
+        + (dropped > 0 ? ` (${dropped} skipped, as the files changed since)` : "")
+    );
+    yield* this.executeActions(
+      direction,
+      dest,
+      localPrefix,
+      source,
+      target,
+      new Map(journal.plan.actions),
+      pending,
+      new Map(journal.plan.moves),
+      journal.done,
+      null,
+      onError,
+      null,
+      true
+    );
+    return true;
+  }
+
+  /**
+   * Runs the actions for a root, and updates the manifest and journal afterwards.
+   *
+   * @param actions   All the actions planned for the root, used to update the manifest
+   * @param pending   The actions to actually run. Only differs from `actions` when resuming
+   * @param done      Actions that were completed before the sync was interrupted
+   * @param directions  The direction of each action, for two-way syncs. These aren't journaled.
+   * @param resumed   Whether this is a resumed sync, where `source` and `target` only contain the files with actions
+   */
+  async *executeActions(
+    direction: SyncDir,
+    dest: string,
+    localPrefix: string | null,
+    source: Content,
+    target: Content,
+    actions: Actions,
+    pending: Actions,
+    moves: Moves,
+    done: Actions,
+    directions: Directions | null = null,
+    onError: OnErrorHandler = this.onError,
+    early: EarlyDownloads | null = null,
+    resumed: boolean = false,
+  ): AsyncGenerator<ActionedItem> {
+    const upload = this.updateUpload.bind(this, dest, localPrefix) as OnUpdateCallback;
+    const downloadNow = this.updateDownload.bind(this, dest, localPrefix) as OnUpdateCallback;
+    // Time spent on early downloads, which ran before their action did, so the metrics count the actual transfer
+    const earlyTime = new Map<string, number>();
+    const download: OnUpdateCallback = early == null
+      ? downloadNow
+      : async (type, file, srcData, destData, context, onProgress) => {
+        if (await this.finishEarlyDownload(early, dest, localPrefix, type, file, target, context)) {
+          earlyTime.set(file, early.durations.get(file) ?? 0);
+        } else {
+          await downloadNow(type, file, srcData, destData, context, onProgress);
+        }
+      };
+    const onUpdate: OnUpdateCallback = (type, file, srcData, destData, context, onProgress) =>
+      ((context?.direction ?? direction) == SyncDir.UP ? upload : download)(
+        type, file, srcData, destData, context, onProgress
       );
+    // Successfully completed actions, used to update the manifest afterwards
+    const completed: Actions = new Map(done);
+    // Written copies that don't match their source's metadata (see OnUpdateCallback)
+    const written: Files = new Map();
+    // Only one-way syncs with something to do are journaled (see syncFolder)
+    const journal = directions == null && actions.size > 0 ? this.plugin.syncJournal : null;
+    const key = manifestKey(dest, localPrefix);
+    let aborted = false;
 
-      if (actionResult.error != null) {
-        this.onError(actionResult.error)
-        return
+    const metrics = this.metrics;
+    const resolver = directions != null
+      ? this.resolveTwoWayConflict.bind(this, directions) as OnConflictCallback
+      : this.resolveConflict.bind(this) as OnConflictCallback;
+    // Time spent waiting on the user isn't transfer time
+    let waited = 0;
+    const onConflict: OnConflictCallback = async (file, src, dest, dir) => {
+      const start = metrics.now();
+      try {
+        return await resolver(file, src, dest, dir);
+      } finally {
+        waited += metrics.now() - start;
       }
+    };
+    const started = metrics.now();
 
-      if (!this.dryRun) {
-        for await (const sig of runSync(
-          SyncDir.DOWN,
-          remote,
-          local,
-          actionResult.actions,
-          this.onError.bind(this),
-          this.updateDownload.bind(
-            this,
-            this.plugin.settings.sync.root_folder.dest,
-            null
-          ),
-          this.resolveConflict.bind(this) as OnConflictCallback,
-          this.deleteIsNoop,
-        )) {
-          const { result } = sig;
-          if ("lastFile" in result) {
-            // Progress report; yield back out
-            yield result
-          } else {
-            new Notice(
-              `Pull complete. ${result.actionedCount} files were updated, `
-                + `and ${result.actionedFolders} stale folders were removed (${result.errorCount} errors).`
-            );
+    for await (const sig of throttleProgress(runSync(
+      direction,
+      source,
+      target,
+      pending,
+      onError,
+      async (type, file, srcData, destData, context, onProgress) => {
+        const start = metrics.now();
+        const result = await onUpdate(type, file, srcData, destData, context, onProgress);
+        if (result) {
+          written.set(file, result);
+        }
+        metrics.recordFile(
+          file,
+          context?.direction ?? direction,
+          type == ActionType.ADD ? srcData?.size ?? 0 : 0,
+          metrics.now() - start + (earlyTime.get(file) ?? 0)
+        );
+        // Folder removals don't have any data, and don't belong in the manifest, but the files they covered do
+        if (srcData != null || destData != null) {
+          completed.set(file, type);
+          await journal?.markDone(key, file, type);
+        } else {
+          for (const covered of context?.covered ?? []) {
+            completed.set(covered, ActionType.REMOVE);
           }
+          // Also completes the covered files in the journal (see pendingActions)
+          await journal?.markFolder(key, file);
         }
-        this.onComplete(this.dryRun);
+      },
+      onConflict,
+      this.deleteIsNoop,
+      this.plugin.settings.sync.concurrency,
+      moves,
+      directions,
+      new ProgressTracker(),
+      FRAME_INTERVAL,
+      this.transfers,
+    ))) {
+      const { result } = sig;
+      if ("lastFile" in result) {
+        // Progress report; yield back out
+        yield result
       } else {
-        console.debug("remote: ", remote);
-        console.debug("local: ", local);
-        this.showTaskGraph(actionResult.actions, {
-          direction: SyncDir.DOWN,
-          subfolder: null
-        });
+        aborted = result.actionedCount == -1;
+        new Notice(
+          `${directions != null ? "Sync" : direction == SyncDir.UP ? "Push" : "Pull"} complete. `
+            + `${result.actionedCount} files were updated, `
+            + `and ${result.actionedFolders} stale folders were removed (${result.errorCount} errors).`
+        );
       }
-    } else {
-      for (const vaultPath in this.plugin.settings.sync.subfolders) {
-        const { dest } = this.plugin.settings.sync.subfolders[vaultPath];
-        let local = await this.fileProvider.getVaultFiles(vaultPath);
-        
-        let remoteResult = await this.fileProvider.getRemoteFiles(dest);
-        if (remoteResult.error) {
-          this.onError(remoteResult.error);
-          return;
-        }
+    }
+    metrics.add("conflicts", waited);
+    metrics.add("transfers", metrics.now() - started - waited);
 
-        const remote = remoteResult.content as Content;
-        let actionResult = calculateSyncActions(
-          remote.files,
-          local.files,
-          this.plugin.configDir(),
-          false,
-          this.deleteIsNoop,
-          this.blockWipes,
-        );
+    const entries = this.plugin.syncManifest.getRoot(key);
+    if (directions == null) {
+      applySyncResults(entries, direction, source.files, target.files, actions, completed, moves, resumed, written);
+    } else {
+      // Each direction is recorded separately, with the source and target swapped for the reverse one
+      const reverse = direction == SyncDir.UP ? SyncDir.DOWN : SyncDir.UP;
+      const forward: Actions = new Map();
+      const backward: Actions = new Map();
+      for (const [file, action] of completed) {
+        ((directions.get(file) ?? direction) == direction ? forward : backward).set(file, action);
+      }
+      applySyncResults(entries, direction, source.files, target.files, actions, forward, moves, false, written);
+      applySyncResults(entries, reverse, target.files, source.files, actions, backward, moves, false, written);
+    }
+    try {
+      await this.plugin.syncManifest.save();
+    } catch (ex) {
+      // Not fatal; the next sync just won't have as much to go on
+      console.error("Failed to save the sync manifest", ex);
+    }
+    // Aborted syncs keep their journal, so the rest of the actions can be resumed. Anything else that didn't complete
+    // (i.e. failed actions) is retried by the next full sync.
+    if (!aborted) {
+      await journal?.finish(key);
+    }
+    this.onComplete(this.dryRun);
+  }
 
-        if (actionResult.error != null) {
-          this.onError(actionResult.error)
-          return
-        }
+  /**
+   * Attaches content hashes to the local files. The hashes end up in the manifest, and are what lets calculateSyncActions
+   * tell a touched file from a changed one on the next sync.
+   */
+  async hashLocalFiles(local: Content, localPrefix: string | null) {
+    const store = this.plugin.hashCache;
+    await store.load();
+    await store.cache.attach(
+      local.files,
+      prefixToStr(localPrefix),
+      (path) => this.plugin.adapter().readBinary(normalizePath(path)),
+      this.plugin.settings.sync.concurrency,
+      // Same limit as for chunked transfers, so hashing doesn't undo their memory bound
+      this.plugin.settings.sync.large_file_threshold * 1024 * 1024,
+    );
+    try {
+      await store.save();
+    } catch (ex) {
+      console.error("Failed to save the content hash cache", ex);
+    }
+  }
 
-        if (!this.dryRun) {
-          for await (const sig of runSync(
-            SyncDir.DOWN,
-            remote,
-            local,
-            actionResult.actions,
-            this.onError.bind(this),
-            this.updateDownload.bind(
-              this,
-              dest,
-              vaultPath,
-            ),
-            this.resolveConflict.bind(this) as OnConflictCallback,
-            this.deleteIsNoop,
-          )) {
-            const { result } = sig;
-            if ("lastFile" in result) {
-              // Progres report; yield back out
-              yield result
-            } else {
-              new Notice(
-                `Pull complete. ${result.actionedCount} files were updated, `
-                  + `and ${result.actionedFolders} stale folders were removed (${result.errorCount} errors).`
-              );
-            }
-          }
-          this.onComplete(this.dryRun);
-        } else {
-          this.showTaskGraph(actionResult.actions, {
-            direction: SyncDir.DOWN,
-            subfolder: vaultPath
-          });
+  /**
+   * Creates the parent folder of a local path if it doesn't exist.
+   */
+  async ensureLocalParent(localPath: string) {
+    if (!localPath.replace("\\", "/").contains("/")) {
+      return;
+    }
+    const parentPath = localPath.replace("\\", "/")
+      .split("/")
+      .slice(0, -1)
+      .join("/");
+    if (!(await this.plugin.adapter().exists(parentPath))) {
+      try {
+        await this.plugin.app.vault.adapter.mkdir(
+          normalizePath(
+            parentPath
+          )
+        );
+      } catch (ex) {
+        // With parallel transfers, another download into the same folder may have created it between the
+        // exists check and the mkdir. That's fine; anything else is not.
+        if (!(await this.plugin.adapter().exists(parentPath))) {
+          throw ex;
         }
       }
     }
   }
 
+  /**
+   * Finishes an action for a file that was already downloaded by EarlyDownloads.
+   *
+   * \returns true if nothing else needs to be done, false if the action still needs to run as normal
+   */
+  async finishEarlyDownload(
+    early: EarlyDownloads,
+    dest: string,
+    localPrefix: string | null,
+    type: ActionType,
+    file: string,
+    target: Content,
+    context?: UpdateContext,
+  ): Promise<boolean> {
+    const result = early.get(file);
+    if (result == null || !await result) {
+      return false;
+    }
+    if (type == ActionType.ADD) {
+      return true;
+    }
+    if (type == ActionType.MOVE && context?.movedFrom != null) {
+      // The file was detected as moved after it was downloaded to the new path, so the move only needs to get rid of
+      // the old path. That's a normal local delete, so it respects the trash settings like any other.
+      await this.updateDownload(
+        dest,
+        localPrefix,
+        ActionType.REMOVE,
+        context.movedFrom,
+        undefined,
+        target.files.get(context.movedFrom) ?? { lastModified: null }
+      );
+      return true;
+    }
+    return false;
+  }
+
+  /**
+   * Records local files the sync is about to write, so the changes don't get pushed straight back.
+   */
+  markWritten(localPrefix: string | null, files: string[]) {
+    for (const file of files) {
+      this.plugin.syncLock.written.add(normalizePath(prefixToStr(localPrefix) + file));
+    }
+  }
+
   async updateDownload(
     dest: string,
     localPrefix: string | null,
     type: ActionType,
     file: string,
     srcData: FileData | undefined,
-    destData: FileData | undefined
+    destData: FileData | undefined,
+    context?: UpdateContext,
+    onProgress?: ProgressCallback
   ) {
     if (this.plugin.client == null) {
       throw Error("This should never throw, but exists to make typescript shut up");
@@ -349,21 +761,33 @@ export class SyncImpl {
     }
     let localPath = prefixToStr(localPrefix) 
       + file;
+    // Marked before writing, so the scheduler can tell the vault events this causes apart from the user's changes
+    this.markWritten(
+      localPrefix,
+      [file].concat(context?.movedFrom != null ? [context.movedFrom] : [], context?.covered ?? [])
+    );
     switch (type) {
+      case ActionType.MOVE:
+        if (context?.movedFrom == null) { throw new Error("This should never throw"); }
+        await this.ensureLocalParent(localPath);
+        await this.plugin.app.vault.adapter.rename(
+          normalizePath(prefixToStr(localPrefix) + context.movedFrom),
+          normalizePath(localPath)
+        );
+        break;
       case ActionType.ADD:
         if (srcData == null) { throw new Error("This should never throw"); }
-        if (localPath.replace("\\", "/").contains("/")) {
-          const parentPath = localPath.replace("\\", "/")
-            .split("/")
-            .slice(0, -1)
-            .join("/");
-          if (!(await this.plugin.adapter().exists(parentPath))) {
-            await this.plugin.app.vault.adapter.mkdir(
-              normalizePath(
-                parentPath
-              )
-            );
-          }
+        await this.ensureLocalParent(localPath);
+        if (isLargeFile(this.plugin, srcData.size)) {
+          await downloadChunked(
+            this.plugin,
+            resolvePath(dest, file),
+            localPath,
+            srcData.size as number,
+            srcData.lastModified,
+            onProgress
+          );
+          break;
         }
         await this.plugin.app.vault.adapter.writeBinary(
           normalizePath(localPath),
@@ -386,6 +810,17 @@ export class SyncImpl {
         }
 
         if (destData == undefined) {
+          // Folders are deleted as entire subtrees (see planDeletions), and may still contain files. Trashing the
+          // folder respects the users' trash settings for those, like trashing the files one by one would have.
+          const obsidianFolder = this.plugin.app.vault.getAbstractFileByPath(
+            localPath
+          );
+          if (obsidianFolder instanceof TFolder) {
+            await this.plugin.app.fileManager.trashFile(
+              obsidianFolder
+            );
+            return;
+          }
           await this.plugin.app.vault.adapter.rmdir(
             normalizePath(localPath),
             // Obsidian 1.13 broke rmdir(..., false) with "rm returned EISDIR (is a directory) /home/runner/work/obsidian-webdav-sync/obsidian-webdav-sync/integration-test/test_vault/private_subfolder"
@@ -419,7 +854,9 @@ export class SyncImpl {
     type: ActionType,
     file: string,
     srcData: FileData | undefined,
-    _destData: FileData | undefined
+    destData: FileData | undefined,
+    context?: UpdateContext,
+    onProgress?: ProgressCallback
   ) {
     if (this.plugin.client == null) {
       throw Error("This should never throw");
@@ -428,8 +865,57 @@ export class SyncImpl {
       throw Error("Unexpected ADD_LOCAL; this should've been processed by now");
     }
     switch (type) {
+      case ActionType.MOVE:
+        if (context?.movedFrom == null) { throw new Error("This should never throw"); }
+        if (file.contains("/")) {
+          // Unlike PUT, MOVE doesn't create missing parent folders on most servers
+          const parent = dest + "/" + file.split("/").slice(0, -1).join("/");
+          if (!(await this.plugin.client.client.exists(parent))) {
+            try {
+              await this.plugin.client.client.createDirectory(parent, {
+                recursive: true
+              });
+            } catch (ex) {
+              // Same race as in ensureLocalParent
+              if (!(await this.plugin.client.client.exists(parent))) {
+                throw ex;
+              }
+            }
+          }
+        }
+        await this.plugin.client.client.moveFile(
+          dest + "/" + context.movedFrom,
+          dest + "/" + file,
+          {
+            overwrite: false
+          }
+        );
+        break;
       case ActionType.ADD:
         if (srcData == undefined) { throw new Error("This should never throw"); }
+        if (isLargeFile(this.plugin, srcData.size)) {
+          const uploaded = this.plugin.settings.sync.delta_uploads
+            ? await uploadDelta(
+              this.plugin,
+              prefixToStr(localPrefix) + file,
+              dest + "/" + file,
+              srcData.size as number,
+              destData?.etag,
+              onProgress
+            )
+            : await uploadChunked(
+              this.plugin,
+              prefixToStr(localPrefix) + file,
+              dest + "/" + file,
+              srcData.size as number,
+              undefined,
+              onProgress
+            );
+          if (uploaded != null) {
+            // The server's timestamp sticks for these, so the manifest needs the real one
+            return uploaded;
+          }
+        }
         await this.plugin.client.client.putFileContents(
           dest
           + "/"
@@ -461,8 +947,51 @@ export class SyncImpl {
     }
   }
 
+  /**
+   * Shows conflict modals one at a time, as concurrently synced subfolders can run into conflicts at the same time.
+   */
+  queueConflict<T>(ask: () => Promise<T>): Promise<T> {
+    const turn = this.conflicts.then(ask);
+    this.conflicts = turn.catch(() => {});
+    return turn;
+  }
+
+  /**
+   * Conflict resolution for two-way syncs. The user can keep either side, so the chosen direction is written back to
+   * `directions`, which runSync reads after the conflict is resolved.
+   */
+  async resolveTwoWayConflict(
+    directions: Directions,
+    file: string,
+    src: FileData,
+    dest: FileData,
+    dir: SyncDir
+  ): Promise<ActionType> {
+    const p = this.queueConflict(() => new Promise<{ action: ActionType, direction?: SyncDir } | null>((resolve) => {
+      new ConflictModal(
+        this.plugin.app,
+        file,
+        dir,
+        src,
+        dest,
+        (action, direction) => resolve(action == null ? null : { action, direction }),
+        true
+      ).open();
+    }));
+    const result = await p;
+    if (result == null) {
+      throw Error(
+        `Aborting sync: conflict on ${file} was not resolved`
+      );
+    }
+    if (result.direction != null) {
+      directions.set(file, result.direction);
+    }
+    return result.action;
+  }
+
   async resolveConflict(file: string, src: FileData, dest: FileData, dir: SyncDir): Promise<ActionType> {
-    const p = new Promise<ActionType | null>((resolve) => {
+    const p = this.queueConflict(() => new Promise<ActionType | null>((resolve) => {
       const conflictModal = new ConflictModal(
         this.plugin.app,
         file,
@@ -472,7 +1001,7 @@ export class SyncImpl {
         resolve
       );
       conflictModal.open();
-    });
+    }));
     const result = await p
     if (result == null) {
       throw Error(
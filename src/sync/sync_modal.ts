@@ -6,6 +6,8 @@ import {DryRunInfo, SyncImpl} from "./sync_impl";
 import { AsyncProgressGenerator } from "./status";
 import { SyncDir } from "./syncdir";
 import { actionToDescriptiveString } from "./actiontype";
+import { describeProgress } from "./progress";
+import { summarizeReport } from "./metrics";
 
 export interface RemoteFileResult {
   content: Content | null;
@@ -13,14 +15,17 @@ export interface RemoteFileResult {
 };
 
 const MODAL_PROGRESS_ID = "livi-webdav-sync-modal-progress";
+const MODAL_PROGRESS_TEXT_ID = "livi-webdav-sync-modal-progress-text";
 
 export class SyncModal extends Modal {
   plugin: WebDAVSyncPlugin;
   dryRunInfoContainer: HTMLDivElement;
+  reportContainer: HTMLDivElement;
   syncImpl: SyncImpl;
 
   down: HTMLButtonElement;
   up: HTMLButtonElement;
+  both: HTMLButtonElement;
 
 
   constructor(app: App, plugin: WebDAVSyncPlugin) {
@@ -112,10 +117,19 @@ export class SyncModal extends Modal {
     this.down.addEventListener("click", () => {
       void this.download();
     });
+    this.both = btnWrapper.createEl("button", {
+      attr: {
+        id: "livi-webdav-sync-both"
+      }
+    });
+    this.both.addEventListener("click", () => {
+      void this.sync();
+    });
 
     this.setLoadingState(false);
     setIcon(this.up, "upload");
     setIcon(this.down, "download");
+    setIcon(this.both, "refresh-cw");
 
     this.up.createSpan({
       text: "\u00A0Upload"
@@ -123,6 +137,9 @@ export class SyncModal extends Modal {
     this.down.createSpan({
       text: "\u00A0Download"
     });
+    this.both.createSpan({
+      text: "\u00A0Sync both ways"
+    });
 
     contentEl.createEl("progress", {
       attr: {
@@ -131,6 +148,11 @@ export class SyncModal extends Modal {
         max: "100",
       },
     });
+    contentEl.createEl("p", {
+      attr: {
+        id: MODAL_PROGRESS_TEXT_ID,
+      },
+    });
 
     this.dryRunInfoContainer = this.contentEl.createEl("div", {
       attr: {
@@ -138,36 +160,80 @@ export class SyncModal extends Modal {
       }
     });
 
+    this.reportContainer = this.contentEl.createEl("div", {
+      attr: {
+        id: "livi-webdav-sync-report"
+      }
+    });
+    void this.plugin.syncReports.load().then(() => this.showReport());
+  }
+
+  /**
+   * Shows the timings of the last sync. The full reports for the last few syncs are in the plugin folder.
+   */
+  showReport() {
+    const report = this.plugin.syncReports.last();
+    this.reportContainer.empty();
+    if (report == null) {
+      return;
+    }
+    this.reportContainer.createEl("h2", {
+      text: "Last sync"
+    });
+    for (const line of summarizeReport(report)) {
+      this.reportContainer.createEl("p", {
+        text: line
+      });
+    }
   }
 
   async download() {
     void this.doFileTransfer(
+      SyncDir.DOWN,
       this.syncImpl.download.bind(this.syncImpl)
     )
   }
 
   async upload() {
     void this.doFileTransfer(
+      SyncDir.UP,
       this.syncImpl.upload.bind(this.syncImpl)
     )
   }
 
-  setProgress(progress: number) {
+  async sync() {
+    void this.doFileTransfer(
+      SyncDir.UP,
+      this.syncImpl.sync.bind(this.syncImpl)
+    )
+  }
+
+  setProgress(progress: number, text: string = "") {
     const el = activeDocument.getElementById(MODAL_PROGRESS_ID) as HTMLProgressElement;
     el.setAttr("value", progress);
+    const textEl = activeDocument.getElementById(MODAL_PROGRESS_TEXT_ID);
+    textEl?.setText(text);
   }
 
-  async doFileTransfer(actionFunction: AsyncProgressGenerator) {
+  async doFileTransfer(direction: SyncDir, actionFunction: AsyncProgressGenerator) {
+    if (!this.plugin.syncLock.tryAcquire(direction)) {
+      new Notice("A sync is already running. Try again once it's done.");
+      return;
+    }
     this.setLoadingState(true);
     this.checkClearDryRun();
     // Make the bar visible immediately so it still makes sense for like one big/otherwise slow upload
     this.setProgress(0);
 
-    for await (const sig of actionFunction()) {
-      const { lastProgress } = sig;
-      this.setProgress(lastProgress);
+    try {
+      for await (const sig of actionFunction()) {
+        this.setProgress(sig.lastProgress, describeProgress(sig));
+      }
+    } finally {
+      this.plugin.syncLock.release();
+      this.setLoadingState(false);
+      this.showReport();
     }
-    this.setLoadingState(false);
   }
 
   showTaskGraph(actions: Actions, info: DryRunInfo) {
@@ -177,7 +243,9 @@ export class SyncModal extends Modal {
     }
     if (this.dryRunInfoContainer.children.length == 0) {
       this.dryRunInfoContainer.createEl("p", {
-        text: (info.direction == SyncDir.DOWN ? "Downloading from" : "Uploading to") + " WebDAV server"
+        text: (info.directions != null
+          ? "Syncing both ways with"
+          : info.direction == SyncDir.DOWN ? "Downloading from" : "Uploading to") + " WebDAV server"
       });
     }
     if (info.subfolder != null) {
@@ -206,8 +274,10 @@ export class SyncModal extends Modal {
       row.createEl("td", {
         text: file
       });
+      const direction = info.directions?.get(file);
       row.createEl("td", {
         text: actionToDescriptiveString(action)
+          + (direction == null ? "" : direction == SyncDir.UP ? " (remote)" : " (local)")
       });
     }
   }
@@ -218,9 +288,11 @@ export class SyncModal extends Modal {
     if (running) {
       this.down.disabled = true;
       this.up.disabled = true;
+      this.both.disabled = true;
     } else {
       this.down.disabled = false;
       this.up.disabled = false;
+      this.both.disabled = false;
     }
   }
 
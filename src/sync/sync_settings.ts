@@ -13,6 +13,60 @@ export interface SyncSettings {
   subfolders: SubfolderMap;
   ignore_workspace: boolean;
   ignore_config_folder: boolean;
+  /**
+   * Whether or not to sync hidden files and folders that aren't directly in the synced folder. Finding them means
+   * listing every folder through the adapter rather than only using Obsidian's index, so turning it off makes the
+   * local scan faster at the cost of leaving those files alone.
+   */
+  sync_nested_hidden_files: boolean;
+  /**
+   * The maximum number of file transfers to run in parallel.
+   */
+  concurrency: number;
+  /**
+   * Whether or not to use collection ETags to avoid re-listing unchanged parts of the remote.
+   */
+  incremental_remote_listing: boolean;
+  /**
+   * Whether or not to parse deep remote listings as they arrive, and start pull downloads before the listing is done.
+   */
+  streaming_remote_listing: boolean;
+  /**
+   * Whether or not to hash local files, so files that were touched but not changed aren't transferred.
+   */
+  content_hashing: boolean;
+  /**
+   * Files at or above this size (in MiB) are transferred in chunks rather than read into memory in one go.
+   */
+  large_file_threshold: number;
+  /**
+   * Whether or not to only upload the changed blocks of large files. Requires chunked upload support.
+   */
+  delta_uploads: boolean;
+  /**
+   * Whether or not to track changed files with vault events, so pushes don't need to list the whole vault.
+   */
+  dirty_tracking: boolean;
+  /**
+   * Whether or not to compare the listings with the sorted, columnar FileIndex rather than with per-file lookups.
+   */
+  compact_diff: boolean;
+  /**
+   * Whether or not to push and pull automatically in the background.
+   */
+  auto_sync: boolean;
+  /**
+   * How long to wait after the last change before pushing automatically, in seconds.
+   */
+  auto_push_delay: number;
+  /**
+   * How often to pull automatically, in minutes. 0 disables interval pulls.
+   */
+  auto_pull_interval: number;
+  /**
+   * Whether or not to pull automatically when the Obsidian window regains focus.
+   */
+  pull_on_focus: boolean;
 };
 
 export const DEFAULT_SYNC_SETTINGS: SyncSettings = {
@@ -23,4 +77,17 @@ export const DEFAULT_SYNC_SETTINGS: SyncSettings = {
   subfolders: {},
   ignore_workspace: true,
   ignore_config_folder: false,
+  sync_nested_hidden_files: true,
+  concurrency: 4,
+  incremental_remote_listing: false,
+  streaming_remote_listing: false,
+  content_hashing: false,
+  large_file_threshold: 32,
+  delta_uploads: false,
+  dirty_tracking: false,
+  compact_diff: false,
+  auto_sync: false,
+  auto_push_delay: 30,
+  auto_pull_interval: 10,
+  pull_on_focus: true,
 };
@@ -0,0 +1,375 @@
+import { FileSystemAdapter, normalizePath, Platform } from "obsidian";
+import { FileStat, ResponseDataDetailed, WebDAVClient } from "webdav";
+import WebDAVSyncPlugin from "main";
+import { sha256Hex } from "./hash_cache";
+import { BLOCK_SIZE, canDelta, patchChangedBlocks, RangeReader } from "./delta";
+import { ProgressCallback } from "./progress";
+import { FileData } from "./sync";
+import { chunkName, resolveUrl } from "../fs/nextcloud";
+
+/**
+ * The size of each chunk in chunked transfers. This is also roughly the peak amount of file data a single chunked
+ * transfer holds in memory, regardless of the size of the file.
+ */
+export const CHUNK_SIZE = 8 * 1024 * 1024;
+
+/**
+ * Suffix for files that are still being transferred in chunks. The file is only moved into place once it's complete,
+ * so an interrupted transfer never leaves a half-written file where the real one was. FileProvider ignores these, in
+ * case one is left behind.
+ */
+export const PARTIAL_SUFFIX = ".webdav-partial";
+
+export function isLargeFile(plugin: WebDAVSyncPlugin, size: number | null | undefined): boolean {
+  return size != null
+    && size >= plugin.settings.sync.large_file_threshold * 1024 * 1024;
+}
+
+/**
+ * Downloads a file in CHUNK_SIZE pieces using ranged GETs, appending each piece to a partial file that's moved into
+ * place once complete. If the server ignores the Range header, the first response is the full file, and it's written
+ * as-is; that's no worse than a normal download.
+ */
+export async function downloadChunked(
+  plugin: WebDAVSyncPlugin,
+  remotePath: string,
+  localPath: string,
+  size: number,
+  mtime: number | null,
+  onProgress?: ProgressCallback,
+) {
+  if (plugin.client == null) {
+    throw Error("This should never throw");
+  }
+  const adapter = plugin.adapter();
+  const target = normalizePath(localPath);
+  const partial = normalizePath(localPath + PARTIAL_SUFFIX);
+  const options = mtime != null ? { mtime } : undefined;
+
+  let offset = 0;
+  while (offset < size) {
+    const end = Math.min(offset + CHUNK_SIZE, size) - 1;
+    const response = await plugin.client.client.getFileContents(remotePath, {
+      format: "binary",
+      details: true,
+      headers: {
+        Range: `bytes=${offset}-${end}`
+      }
+    }) as ResponseDataDetailed<ArrayBuffer>;
+
+    if (response.status != 206) {
+      if (offset != 0) {
+        throw Error(`Server stopped honouring range requests halfway through ${remotePath}`);
+      }
+      // Range not supported; this is the full file
+      await adapter.writeBinary(target, response.data, options);
+      if (await adapter.exists(partial)) {
+        await adapter.remove(partial);
+      }
+      return;
+    }
+    if (response.data.byteLength == 0) {
+      throw Error(`Server returned an empty range for ${remotePath}`);
+    }
+
+    if (offset == 0) {
+      await adapter.writeBinary(partial, response.data, options);
+    } else {
+      await adapter.appendBinary(partial, response.data, options);
+    }
+    offset += response.data.byteLength;
+    onProgress?.(offset);
+  }
+
+  if (await adapter.exists(target)) {
+    await adapter.remove(target);
+  }
+  await adapter.rename(partial, target);
+}
+
+/**
+ * Opens a RangeReader for a local file. Only possible on desktop, where the vault is on a normal filesystem; the mobile
+ * adapter can only read files whole.
+ */
+async function openRangeReader(plugin: WebDAVSyncPlugin, localPath: string): Promise<RangeReader | null> {
+  const adapter = plugin.adapter();
+  if (!Platform.isDesktopApp || !(adapter instanceof FileSystemAdapter)) {
+    return null;
+  }
+  // Required lazily, as fs doesn't exist on mobile
+  const fs = require("fs") as typeof import("fs");
+  const handle = await fs.promises.open(adapter.getFullPath(normalizePath(localPath)), "r");
+  return {
+    read: async (start, length) => {
+      const buffer = Buffer.alloc(length);
+      const { bytesRead } = await handle.read(buffer, 0, length, start);
+      return buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + bytesRead) as ArrayBuffer;
+    },
+    close: () => handle.close(),
+  };
+}
+
+/**
+ * Writes data at an offset in a remote file using SabreDAV's partial update extension.
+ */
+async function patchRange(client: WebDAVClient, remotePath: string, offset: number, data: ArrayBuffer) {
+  await client.customRequest(remotePath, {
+    method: "PATCH",
+    headers: {
+      "Content-Type": "application/x-sabredav-partialupdate",
+      "X-Update-Range": `bytes=${offset}-${offset + data.byteLength - 1}`,
+    },
+    data,
+  });
+}
+
+/**
+ * Stats a remote file, for uploads that can't set the remote timestamp. The timestamp and ETag of the uploaded copy
+ * are whatever the server made them, so they have to be looked up for the manifest to match the next listing.
+ */
+async function statRemote(client: WebDAVClient, remotePath: string): Promise<FileData> {
+  const stat = await client.stat(remotePath) as FileStat;
+  return {
+    lastModified: Date.parse(stat.lastmod),
+    size: stat.size,
+    etag: stat.etag ?? null,
+  };
+}
+
+/**
+ * Reads a local file in CHUNK_SIZE pieces, and hands each piece to `send`.
+ *
+ * @param send  Called with the offset, the data, and the number of the chunk (starting at 1), one chunk at a time.
+ */
+async function sendChunks(
+  reader: RangeReader,
+  localPath: string,
+  size: number,
+  send: (offset: number, chunk: ArrayBuffer, index: number) => Promise<void>,
+  blockHashes?: string[],
+  onProgress?: ProgressCallback,
+) {
+  let offset = 0;
+  let index = 0;
+  while (offset < size) {
+    const chunk = await reader.read(offset, Math.min(CHUNK_SIZE, size - offset));
+    if (chunk.byteLength == 0) {
+      throw Error(`${localPath} shrunk during upload`);
+    }
+    if (blockHashes != null) {
+      // CHUNK_SIZE is a multiple of BLOCK_SIZE, so the blocks line up
+      for (let start = 0; start < chunk.byteLength; start += BLOCK_SIZE) {
+        blockHashes.push(await sha256Hex(chunk.slice(start, start + BLOCK_SIZE)));
+      }
+    }
+    await send(offset, chunk, ++index);
+    offset += chunk.byteLength;
+    onProgress?.(offset);
+  }
+}
+
+/**
+ * Uploads a file in CHUNK_SIZE pieces through Nextcloud's (or ownCloud's) chunked upload endpoint: each chunk is PUT
+ * into an upload folder, and the server assembles them when the folder's .file is moved to the destination.
+ *
+ * @returns false if the server refused to create the upload folder, in which case nothing was uploaded.
+ */
+async function uploadToChunkFolder(
+  uploads: WebDAVClient,
+  serverUrl: string,
+  reader: RangeReader,
+  localPath: string,
+  remotePath: string,
+  size: number,
+  blockHashes?: string[],
+  onProgress?: ProgressCallback,
+): Promise<boolean> {
+  const folder = "/webdav-sync-" + Date.now().toString(36) + Math.random().toString(36).substring(2, 10);
+  // Newer servers want the destination up front, so they can check quotas and assemble the file in place
+  const headers = { Destination: resolveUrl(serverUrl, remotePath) };
+  try {
+    await uploads.customRequest(folder, { method: "MKCOL", headers });
+  } catch (ex) {
+    console.warn("Failed to start a chunked upload; falling back to a normal upload", ex);
+    return false;
+  }
+  try {
+    await sendChunks(
+      reader,
+      localPath,
+      size,
+      async (_offset, chunk, index) => {
+        await uploads.putFileContents(folder + "/" + chunkName(index), chunk, { headers });
+      },
+      blockHashes,
+      onProgress
+    );
+    await uploads.customRequest(folder + "/.file", {
+      method: "MOVE",
+      headers: {
+        ...headers,
+        "OC-Total-Length": size.toString(),
+      },
+    });
+  } catch (ex) {
+    // Best effort; the server also cleans up abandoned upload folders on its own
+    await uploads.deleteFile(folder).catch(() => undefined);
+    throw ex;
+  }
+  return true;
+}
+
+/**
+ * Uploads a file in CHUNK_SIZE pieces, so it never has to be held in memory as a whole. This uses SabreDAV's partial
+ * update extension (PATCH with X-Update-Range) into a partial file that's moved into place once complete if the server
+ * supports it, and Nextcloud's chunked upload endpoint otherwise (see uploadToChunkFolder).
+ *
+ * @param blockHashes If provided, the hash of each BLOCK_SIZE block is pushed to it, for use in delta uploads.
+ * @param onProgress  Called with the number of bytes uploaded so far after each chunk.
+ * @returns the remote file as uploaded, or null if neither the server nor the platform support chunked uploads, in
+ *          which case nothing was uploaded and the caller needs to fall back to a normal PUT. The mobile adapter can only
+ *          read files whole, so that's always the case on mobile.
+ */
+export async function uploadChunked(
+  plugin: WebDAVSyncPlugin,
+  localPath: string,
+  remotePath: string,
+  size: number,
+  blockHashes?: string[],
+  onProgress?: ProgressCallback,
+): Promise<FileData | null> {
+  if (plugin.client == null) {
+    throw Error("This should never throw");
+  }
+  const connection = plugin.client;
+  const client = connection.client;
+  const partialUpdate = await connection.supportsPartialUpdate();
+  if (!partialUpdate && connection.uploads == null) {
+    return null;
+  }
+  const reader = await openRangeReader(plugin, localPath);
+  if (reader == null) {
+    return null;
+  }
+
+  try {
+    if (partialUpdate) {
+      const partial = remotePath + PARTIAL_SUFFIX;
+      // PATCH only works on files that exist
+      await client.putFileContents(partial, new ArrayBuffer(0), {
+        overwrite: true
+      });
+      await sendChunks(
+        reader,
+        localPath,
+        size,
+        (offset, chunk) => patchRange(client, partial, offset, chunk),
+        blockHashes,
+        onProgress
+      );
+      // Note that the modification time can't be set here. X-OC-MTime is Nextcloud-specific, and Nextcloud doesn't
+      // support partial updates, so the server's timestamp sticks.
+      await client.moveFile(partial, remotePath, {
+        overwrite: true
+      });
+    } else if (!await uploadToChunkFolder(
+      connection.uploads as WebDAVClient,
+      connection.conf.url as string,
+      reader,
+      localPath,
+      remotePath,
+      size,
+      blockHashes,
+      onProgress
+    )) {
+      return null;
+    }
+  } finally {
+    await reader.close();
+  }
+  return await statRemote(client, remotePath);
+}
+
+/**
+ * Uploads only the blocks of a file that changed since the last upload from this device. Falls back to a full chunked
+ * upload if there's no usable signature for the remote file, which also records a signature for next time.
+ *
+ * Like full uploads, the changes are made to a partial file that's moved into place once complete, so the remote file
+ * is never seen half-updated. The partial file starts out as a server-side copy of the remote file, so only the changed
+ * blocks are sent (see patchChangedBlocks).
+ *
+ * @param remoteEtag  The ETag of the remote file, as listed before the sync started
+ * @returns the remote file as uploaded, or null if the server or platform doesn't support chunked uploads; see
+ *          uploadChunked.
+ */
+export async function uploadDelta(
+  plugin: WebDAVSyncPlugin,
+  localPath: string,
+  remotePath: string,
+  size: number,
+  remoteEtag: string | null | undefined,
+  onProgress?: ProgressCallback,
+): Promise<FileData | null> {
+  if (plugin.client == null) {
+    throw Error("This should never throw");
+  }
+  const client = plugin.client.client;
+  if (!(await plugin.client.supportsPartialUpdate())) {
+    // Changed blocks can't be patched in, but the upload can still be chunked
+    return await uploadChunked(plugin, localPath, remotePath, size, undefined, onProgress);
+  }
+  const store = plugin.blockSignatures;
+  await store.load();
+  const known = store.files.get(remotePath);
+  const blocks: string[] = [];
+  let sent = 0;
+  let uploaded: FileData | null = null;
+
+  if (known != null && canDelta(known, remoteEtag, size)) {
+    const reader = await openRangeReader(plugin, localPath);
+    if (reader == null) {
+      return null;
+    }
+    try {
+      const result = await patchChangedBlocks(
+        {
+          copy: (from, to) => client.copyFile(from, to, { overwrite: true }),
+          patch: (path, offset, data) => patchRange(client, path, offset, data),
+          move: (from, to) => client.moveFile(from, to, { overwrite: true }),
+        },
+        reader,
+        remotePath,
+        remotePath + PARTIAL_SUFFIX,
+        known,
+        size,
+        CHUNK_SIZE,
+        onProgress
+      );
+      blocks.push(...result.blocks);
+      sent = result.sent;
+    } finally {
+      await reader.close();
+    }
+  } else {
+    uploaded = await uploadChunked(plugin, localPath, remotePath, size, blocks, onProgress);
+    if (uploaded == null) {
+      return null;
+    }
+    sent = size;
+  }
+
+  uploaded = uploaded ?? await statRemote(client, remotePath);
+  store.files.set(remotePath, {
+    etag: uploaded.etag ?? null,
+    size,
+    blockSize: BLOCK_SIZE,
+    blocks,
+  });
+  try {
+    await store.save();
+  } catch (ex) {
+    console.error("Failed to save block signatures", ex);
+  }
+  console.debug(`WebDAV sync: delta upload of ${remotePath} sent ${sent} of ${size} bytes`);
+  return uploaded;
+}
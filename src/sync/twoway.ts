@@ -0,0 +1,133 @@
+import { ActionType } from "./actiontype";
+import { ManifestEntries } from "./manifest";
+import { Actions, compareModified, Directions, Files, matchesBase, Path, sameFile } from "./sync";
+import { SyncDir } from "./syncdir";
+
+export type TwoWayResult = {
+  actions: Actions;
+  directions: Directions;
+  error: null;
+} | {
+  actions: null;
+  directions: null;
+  error: string;
+};
+
+/**
+ * Calculates the actions for a two-way sync, by comparing each side against the manifest (the state of both sides as
+ * of the last sync). Each action gets a direction: UP for changes that need to go to the remote, DOWN for changes
+ * that need to come from it. The actions are relative to that direction, i.e. REMOVE with DOWN means the file is
+ * removed locally.
+ *
+ * Changes on one side are copied to the other without asking. Only files that changed on both sides (and didn't
+ * converge) are conflicts (ADD_LOCAL). Files on both sides without a manifest entry that don't look identical go
+ * to whichever side is older, and are only conflicts if their dates can't tell them apart. If a file was deleted
+ * on one side and changed on the other, the change wins.
+ */
+export function calculateTwoWayActions(
+  local: Files,
+  remote: Files,
+  base: ManifestEntries,
+  obsidianConfDir: string,
+  deleteIsNoop: boolean = false,
+  blockWipes: boolean = true,
+): TwoWayResult {
+  const actions: Actions = new Map();
+  const directions: Directions = new Map();
+  const set = (file: Path, action: ActionType, direction: SyncDir) => {
+    if (action == ActionType.REMOVE && deleteIsNoop) {
+      return;
+    }
+    actions.set(file, action);
+    directions.set(file, direction);
+  };
+
+  for (const [file, localData] of local) {
+    const remoteData = remote.get(file);
+    const entry = base.get(file);
+    if (remoteData == null) {
+      if (entry != null && matchesBase(localData, entry.local)) {
+        // Deleted remotely, untouched locally
+        set(file, ActionType.REMOVE, SyncDir.DOWN);
+      } else {
+        set(file, ActionType.ADD, SyncDir.UP);
+      }
+      continue;
+    }
+    if (entry == null) {
+      if (!sameFile(localData, remoteData)) {
+        // Nothing to tell what changed since the last sync, so the newer copy wins, like in a one-way sync. Only
+        // copies that can't be told apart by their dates are left for the user.
+        const newer = compareModified(localData, remoteData);
+        if (newer == null || newer == 0) {
+          set(file, ActionType.ADD_LOCAL, SyncDir.UP);
+        } else {
+          set(file, ActionType.ADD, newer > 0 ? SyncDir.UP : SyncDir.DOWN);
+        }
+      }
+      continue;
+    }
+    const localChanged = !matchesBase(localData, entry.local);
+    const remoteChanged = !matchesBase(remoteData, entry.remote);
+    if (localChanged && !remoteChanged) {
+      set(file, ActionType.ADD, SyncDir.UP);
+    } else if (remoteChanged && !localChanged) {
+      set(file, ActionType.ADD, SyncDir.DOWN);
+    } else if (localChanged && remoteChanged && !sameFile(localData, remoteData)) {
+      set(file, ActionType.ADD_LOCAL, SyncDir.UP);
+    }
+  }
+
+  for (const [file, remoteData] of remote) {
+    if (local.has(file)) {
+      continue;
+    }
+    const entry = base.get(file);
+    if (entry != null && matchesBase(remoteData, entry.remote)) {
+      // Deleted locally, untouched remotely
+      set(file, ActionType.REMOVE, SyncDir.UP);
+    } else {
+      set(file, ActionType.ADD, SyncDir.DOWN);
+    }
+  }
+
+  if (blockWipes) {
+    if ((local.size == 0 || remote.size == 0) && base.size > 0) {
+      return {
+        actions: null,
+        directions: null,
+        error: "WebDAV sync: Action blocked: detected full vault wipe"
+      };
+    }
+    // Same check as calculateSyncActions, for each side
+    const wipes = (side: Files, direction: SyncDir) => {
+      const resolved = new Set(side.keys());
+      for (const [file, action] of actions) {
+        if (directions.get(file) != direction) {
+          continue;
+        }
+        if (action == ActionType.ADD || action == ActionType.ADD_LOCAL) {
+          resolved.add(file);
+        } else if (action == ActionType.REMOVE) {
+          resolved.delete(file);
+        }
+      }
+      const hadContent = Array.from(side.keys()).some(file => !file.startsWith(obsidianConfDir));
+      const hasContent = Array.from(resolved).some(file => !file.startsWith(obsidianConfDir));
+      return hadContent && !hasContent;
+    };
+    if (wipes(local, SyncDir.DOWN) || wipes(remote, SyncDir.UP)) {
+      return {
+        actions: null,
+        directions: null,
+        error: `WebDAV sync: Action blocked: identified vault content wipe (${obsidianConfDir} untouched)`
+      };
+    }
+  }
+
+  return {
+    actions,
+    directions,
+    error: null,
+  };
+}
@@ -0,0 +1,220 @@
+/**
+ * Micro-benchmarks for the diff core in src/sync/sync.ts and src/sync/file_index.ts, with synthetic vaults of up to a
+ * million files.
+ *
+ * Usage (see CONTRIBUTING.md):
+ *     npm run bench -- [--sizes 10000,100000] [--update] [--baseline path]
+ *
+ * Without --update, the results are compared against the baseline, and the process exits with 1 if anything got
+ * noticeably slower or allocates noticeably more. Heap numbers need --expose-gc, which the npm script passes.
+ */
+import * as fs from "fs";
+import * as path from "path";
+import * as os from "os";
+
+import { calculateIndexActions, FileIndex } from "../../src/sync/file_index";
+import { calculateSyncActions, findDeletedFolders, resolveActions } from "../../src/sync/sync";
+import { generateScenario, Scenario } from "./generate";
+
+interface Benchmark {
+  name: string;
+  run: (scenario: Scenario) => unknown;
+}
+
+interface Result {
+  name: string;
+  size: number;
+  /**
+   * Median time per run.
+   */
+  ms: number;
+  /**
+   * Heap growth over a single run, with the return value still alive. This is roughly what the function allocates,
+   * minus whatever the GC managed to collect during the run. null if gc isn't exposed.
+   */
+  heapMiB: number | null;
+  runs: number;
+}
+
+interface ResultFile {
+  node: string;
+  cpu: string;
+  results: Result[];
+}
+
+const BENCHMARKS: Benchmark[] = [
+  {
+    name: "calculateSyncActions",
+    run: (s) => calculateSyncActions(s.src, s.dest, ".obsidian"),
+  },
+  {
+    name: "calculateSyncActions+base",
+    run: (s) => calculateSyncActions(s.src, s.dest, ".obsidian", false, false, true, s.base),
+  },
+  {
+    name: "calculateIndexActions",
+    run: (s) => calculateIndexActions(s.srcIndex, s.destIndex, ".obsidian"),
+  },
+  {
+    name: "calculateIndexActions+base",
+    run: (s) => calculateIndexActions(s.srcIndex, s.destIndex, ".obsidian", false, false, true, s.indexBase),
+  },
+  {
+    // The src listing isn't sorted, so this includes a sort
+    name: "FileIndex.fromFiles",
+    run: (s) => FileIndex.fromFiles(s.src),
+  },
+  {
+    name: "resolveActions",
+    run: (s) => resolveActions(s.dest, s.actions),
+  },
+  {
+    name: "findDeletedFolders",
+    run: (s) => findDeletedFolders(s.srcFolders, s.destFolders),
+  },
+];
+
+const DEFAULT_SIZES = [10000, 100000, 1000000];
+// Relative to the repo root, which is where npm runs scripts from
+const DEFAULT_BASELINE = path.join("tests", "bench", "baseline.json");
+// Runs until either of these is hit, after at least MIN_RUNS
+const MIN_RUNS = 3;
+const MAX_RUNS = 25;
+const TARGET_MS = 2000;
+// A result is a regression if it's over the relative threshold *and* the absolute one, so noise in the small sizes
+// doesn't fail the comparison
+const TIME_THRESHOLD = 0.5;
+const MIN_MS = 5;
+const HEAP_THRESHOLD = 0.25;
+const MIN_HEAP_MIB = 4;
+
+const gc: (() => void) | undefined = (globalThis as { gc?: () => void }).gc;
+
+function heapUsed(): number {
+  gc?.();
+  return process.memoryUsage().heapUsed;
+}
+
+function measure(benchmark: Benchmark, scenario: Scenario, size: number): Result {
+  // Warm-up, which also makes sure the heap measurement isn't skewed by code being compiled
+  benchmark.run(scenario);
+
+  let heapMiB: number | null = null;
+  if (gc != null) {
+    const before = heapUsed();
+    const result = benchmark.run(scenario);
+    heapMiB = (process.memoryUsage().heapUsed - before) / 1024 / 1024;
+    // Keeps the result alive until after the measurement
+    if (result == null) {
+      throw Error(`${benchmark.name} returned nothing`);
+    }
+  }
+
+  const times: number[] = [];
+  let total = 0;
+  while (times.length < MIN_RUNS || (times.length < MAX_RUNS && total < TARGET_MS)) {
+    const start = performance.now();
+    benchmark.run(scenario);
+    const elapsed = performance.now() - start;
+    times.push(elapsed);
+    total += elapsed;
+  }
+  times.sort((a, b) => a - b);
+
+  return {
+    name: benchmark.name,
+    size,
+    ms: times[Math.floor(times.length / 2)],
+    heapMiB,
+    runs: times.length,
+  };
+}
+
+function key(result: Result): string {
+  return `${result.name}@${result.size}`;
+}
+
+/**
+ * \returns descriptions of every regression relative to the baseline
+ */
+export function compare(baseline: Result[], current: Result[]): string[] {
+  const old = new Map(baseline.map(result => [key(result), result] as [string, Result]));
+  const out: string[] = [];
+  for (const result of current) {
+    const before = old.get(key(result));
+    if (before == null) {
+      continue;
+    }
+    if (result.ms > before.ms * (1 + TIME_THRESHOLD) && result.ms - before.ms > MIN_MS) {
+      out.push(`${key(result)}: ${before.ms.toFixed(1)} ms -> ${result.ms.toFixed(1)} ms`);
+    }
+    if (
+      result.heapMiB != null && before.heapMiB != null
+      && result.heapMiB > before.heapMiB * (1 + HEAP_THRESHOLD) && result.heapMiB - before.heapMiB > MIN_HEAP_MIB
+    ) {
+      out.push(`${key(result)}: ${before.heapMiB.toFixed(1)} MiB -> ${result.heapMiB.toFixed(1)} MiB`);
+    }
+  }
+  return out;
+}
+
+function parseArgs(argv: string[]): { sizes: number[], update: boolean, baseline: string } {
+  let sizes = DEFAULT_SIZES;
+  let update = false;
+  let baseline = DEFAULT_BASELINE;
+  for (let i = 0; i < argv.length; ++i) {
+    if (argv[i] == "--update") {
+      update = true;
+    } else if (argv[i] == "--sizes") {
+      sizes = argv[++i].split(",").map(size => parseInt(size));
+    } else if (argv[i] == "--baseline") {
+      baseline = argv[++i];
+    } else {
+      throw Error(`Unknown argument: ${argv[i]}`);
+    }
+  }
+  return { sizes, update, baseline };
+}
+
+function main(): number {
+  const args = parseArgs(process.argv.slice(2));
+  if (gc == null) {
+    console.warn("gc isn't exposed, so heap usage won't be measured. Run node with --expose-gc.");
+  }
+
+  const results: Result[] = [];
+  for (const size of args.sizes) {
+    const scenario = generateScenario(size);
+    for (const benchmark of BENCHMARKS) {
+      const result = measure(benchmark, scenario, size);
+      results.push(result);
+      const heap = result.heapMiB == null ? "" : `, ${result.heapMiB.toFixed(1)} MiB`;
+      console.log(`${key(result)}: ${result.ms.toFixed(2)} ms${heap} (${result.runs} runs)`);
+    }
+  }
+
+  const current: ResultFile = {
+    node: process.version,
+    cpu: os.cpus()[0]?.model ?? "unknown",
+    results,
+  };
+  if (args.update || !fs.existsSync(args.baseline)) {
+    fs.writeFileSync(args.baseline, JSON.stringify(current, null, 2) + "\n");
+    console.log(`Wrote the baseline to ${args.baseline}`);
+    return 0;
+  }
+
+  const baseline = JSON.parse(fs.readFileSync(args.baseline, "utf-8")) as ResultFile;
+  if (baseline.cpu != current.cpu || baseline.node != current.node) {
+    console.warn(
+      `The baseline is from ${baseline.cpu} on node ${baseline.node}, so the times aren't directly comparable`
+    );
+  }
+  const regressions = compare(baseline.results, results);
+  for (const regression of regressions) {
+    console.error(`Regression: ${regression}`);
+  }
+  return regressions.length > 0 ? 1 : 0;
+}
+
+process.exitCode = main();
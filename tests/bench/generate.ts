@@ -0,0 +1,155 @@
+import { FileIndex, IndexBase, toIndexBase } from "../../src/sync/file_index";
+import { Actions, calculateSyncActions, FileData, Files, Folder, SyncBase } from "../../src/sync/sync";
+
+/**
+ * Synthetic input for the diff benchmarks. Both sides start out synced (`base`), and then get a realistic amount of
+ * changes: a few files edited on either side, some files and whole folders deleted locally, and some new files.
+ */
+export interface Scenario {
+  src: Files;
+  dest: Files;
+  base: SyncBase;
+  srcFolders: Folder[];
+  destFolders: Folder[];
+  /**
+   * The actions calculateSyncActions produces for src and dest, for the benchmarks that need actions as input.
+   */
+  actions: Actions;
+  srcIndex: FileIndex;
+  destIndex: FileIndex;
+  indexBase: IndexBase;
+}
+
+const FANOUT = 20;
+const FILES_PER_FOLDER = 10;
+const CONF_DIR = ".obsidian";
+
+/**
+ * mulberry32; Math.random can't be seeded, and the scenarios have to be identical between runs.
+ */
+function prng(seed: number): () => number {
+  let state = seed >>> 0;
+  return () => {
+    state = (state + 0x6D2B79F5) >>> 0;
+    let t = state;
+    t = Math.imul(t ^ (t >>> 15), t | 1);
+    t ^= t + Math.imul(t ^ (t >>> 7), t | 61);
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+function folderOf(file: string): string {
+  const slash = file.lastIndexOf("/");
+  return slash == -1 ? "" : file.substring(0, slash);
+}
+
+/**
+ * All the folders the files are in, including the parents of those folders.
+ */
+function foldersFor(files: Iterable<string>): Folder[] {
+  const folders = new Set<string>();
+  for (const file of files) {
+    let folder = folderOf(file);
+    while (folder != "" && !folders.has(folder)) {
+      folders.add(folder);
+      folder = folderOf(folder);
+    }
+  }
+  const out: Folder[] = [];
+  for (const folder of folders) {
+    out.push({ realPath: folder, commonPath: folder });
+  }
+  return out;
+}
+
+function pathFor(index: number, folders: number, random: () => number): string {
+  // 2% of the files are config files, which matters for the wipe check
+  if (random() < 0.02) {
+    return `${CONF_DIR}/plugins/plugin-${index % 50}/data-${index}.json`;
+  }
+  // The folder index, written in base FANOUT, is the folder path. This makes a tree with `folders` folders, so the
+  // number of folders grows with the vault
+  const parts: string[] = [];
+  let folder = Math.floor(random() * folders);
+  do {
+    parts.unshift(`folder-${folder % FANOUT}`);
+    folder = Math.floor(folder / FANOUT);
+  } while (folder > 0);
+  parts.push(`note-${index}.md`);
+  return parts.join("/");
+}
+
+export function generateScenario(size: number, seed: number = 69420): Scenario {
+  const random = prng(seed);
+  const time = Date.parse("2025-06-21T00:00:00Z");
+
+  const folders = Math.max(1, Math.floor(size / FILES_PER_FOLDER));
+  const synced: Files = new Map();
+  for (let i = 0; i < size; ++i) {
+    synced.set(pathFor(i, folders, random), {
+      lastModified: time - Math.floor(random() * 1e9),
+      size: Math.floor(random() * 64 * 1024),
+    });
+  }
+
+  const src: Files = new Map(synced);
+  const dest: Files = new Map(synced);
+  const changed = (data: FileData): FileData => ({
+    lastModified: (data.lastModified ?? time) + 60 * 1000,
+    size: data.size,
+  });
+
+  // Deleted folders go first, so the other changes don't recreate them. Only leaf folders are deleted, as a deleted
+  // top-level folder would take a large part of the vault with it
+  const allFolders = foldersFor(synced.keys());
+  const parents = new Set(allFolders.map(folder => folderOf(folder.commonPath)));
+  const deletedFolders = new Set<string>();
+  for (const folder of allFolders) {
+    if (!parents.has(folder.commonPath) && !folder.commonPath.startsWith(CONF_DIR) && random() < 0.005) {
+      deletedFolders.add(folder.commonPath);
+    }
+  }
+  for (const [file] of synced) {
+    let folder = folderOf(file);
+    while (folder != "") {
+      if (deletedFolders.has(folder)) {
+        src.delete(file);
+        break;
+      }
+      folder = folderOf(folder);
+    }
+  }
+
+  for (const [file, data] of synced) {
+    if (!src.has(file)) {
+      continue;
+    }
+    const roll = random();
+    if (roll < 0.01) {
+      src.set(file, changed(data));
+    } else if (roll < 0.02) {
+      dest.set(file, changed(data));
+    } else if (roll < 0.025) {
+      src.delete(file);
+    }
+  }
+  for (let i = 0; i < size * 0.005; ++i) {
+    src.set(`new/${pathFor(size + i, folders, random)}`, { lastModified: time, size: 1024 });
+  }
+
+  const result = calculateSyncActions(src, dest, CONF_DIR);
+  if (result.error != null) {
+    throw Error(result.error);
+  }
+  return {
+    src,
+    dest,
+    base: { src: synced, dest: synced },
+    srcFolders: foldersFor(src.keys()),
+    destFolders: foldersFor(dest.keys()),
+    actions: result.actions,
+    srcIndex: FileIndex.fromFiles(src),
+    destIndex: FileIndex.fromFiles(dest),
+    indexBase: toIndexBase({ src: synced, dest: synced }),
+  };
+}
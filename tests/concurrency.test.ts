@@ -0,0 +1,85 @@
+import { runTaskQueue, SharedLimit, TaskPool } from "../src/sync/concurrency";
+
+function sleep(ms: number) {
+  return new Promise<void>((resolve) => setTimeout(resolve, ms));
+}
+
+describe("runTaskQueue", () => {
+  it("should run tasks queued by other tasks within the limit", async () => {
+    let inFlight = 0;
+    let maxInFlight = 0;
+    const visited: number[] = [];
+    const queue: (() => Promise<void>)[] = [];
+    // Binary tree walk of depth 4, like a folder listing
+    const visit = (id: number, depth: number) => async () => {
+      inFlight++;
+      maxInFlight = Math.max(maxInFlight, inFlight);
+      await sleep(2);
+      visited.push(id);
+      if (depth < 4) {
+        queue.push(visit(id * 2, depth + 1));
+        queue.push(visit(id * 2 + 1, depth + 1));
+      }
+      inFlight--;
+    };
+    queue.push(visit(1, 0));
+    await runTaskQueue(queue, 3);
+
+    expect(visited.length).toBe(31);
+    expect(maxInFlight).toBe(3);
+    expect(inFlight).toBe(0);
+  });
+
+  it("should rethrow the first error once running tasks finish", async () => {
+    let finished = 0;
+    let started = 0;
+    const queue: (() => Promise<void>)[] = [];
+    for (let i = 0; i < 10; ++i) {
+      queue.push(async () => {
+        started++;
+        await sleep(i == 9 ? 1 : 5);
+        if (i == 9) {
+          throw new Error("listing failed");
+        }
+        finished++;
+      });
+    }
+    await expect(runTaskQueue(queue, 2)).rejects.toThrow("listing failed");
+    // The task running alongside the failing one is allowed to finish, but nothing new is started
+    expect(started).toBe(2);
+    expect(finished).toBe(1);
+  });
+});
+
+describe("SharedLimit", () => {
+  it("should keep pools that share it within one limit", async () => {
+    const shared = new SharedLimit(3);
+    let inFlight = 0;
+    let maxInFlight = 0;
+    let done = 0;
+    // Each pool on its own would allow 3 at once, like one runSync per synced folder
+    const runPool = async (tasks: number, delay: number) => {
+      const pool = new TaskPool(3, shared);
+      for (let i = 0; i < tasks; ++i) {
+        while (!pool.hasCapacity()) {
+          await pool.waitForAny();
+        }
+        pool.submit(async () => {
+          inFlight++;
+          maxInFlight = Math.max(maxInFlight, inFlight);
+          await sleep(delay);
+          inFlight--;
+          done++;
+        });
+      }
+      while (pool.size > 0) {
+        await pool.waitForAny();
+      }
+    };
+    await Promise.all([runPool(8, 2), runPool(8, 3), runPool(2, 1)]);
+
+    expect(done).toBe(18);
+    expect(maxInFlight).toBe(3);
+    expect(shared.used).toBe(0);
+  });
+});
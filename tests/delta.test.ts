@@ -0,0 +1,125 @@
+import {
+  BLOCK_SIZE, BlockSignature, canDelta, changedRanges, DeltaRemote, patchChangedBlocks, RangeReader
+} from "../src/sync/delta";
+import { sha256Hex } from "../src/sync/hash_cache";
+
+describe("changedRanges", () => {
+  it("should only include changed blocks", () => {
+    const ranges = changedRanges(["a", "b", "c", "d"], ["a", "x", "c", "d"], 40, 10, 100);
+    expect(ranges).toStrictEqual([[10, 19]]);
+  });
+  it("should merge adjacent blocks up to the limit", () => {
+    const ranges = changedRanges(["a", "b", "c", "d"], ["w", "x", "y", "d"], 40, 10, 20);
+    expect(ranges).toStrictEqual([[0, 19], [20, 29]]);
+  });
+  it("should include appended blocks, and end at the file size", () => {
+    const ranges = changedRanges(["a", "b"], ["a", "b", "c", "d"], 35, 10, 100);
+    expect(ranges).toStrictEqual([[20, 34]]);
+  });
+  it("should send nothing for identical files", () => {
+    expect(changedRanges(["a", "b"], ["a", "b"], 20, 10, 100)).toStrictEqual([]);
+  });
+});
+
+describe("canDelta", () => {
+  const signature: BlockSignature = {
+    etag: "e1",
+    size: 100,
+    blockSize: BLOCK_SIZE,
+    blocks: ["a"],
+  };
+  it("should require a matching ETag", () => {
+    expect(canDelta(signature, "e1", 100)).toBe(true);
+    expect(canDelta(signature, "e2", 100)).toBe(false);
+    expect(canDelta(signature, null, 100)).toBe(false);
+    expect(canDelta(null, "e1", 100)).toBe(false);
+  });
+  it("should refuse files that shrunk", () => {
+    expect(canDelta(signature, "e1", 99)).toBe(false);
+    expect(canDelta(signature, "e1", 101)).toBe(true);
+  });
+});
+
+describe("patchChangedBlocks", () => {
+  /**
+   * In-memory remote, recording every request.
+   */
+  function fakeRemote(files: Map<string, Uint8Array>, log: string[]): DeltaRemote {
+    return {
+      copy: async (from, to) => {
+        log.push(`COPY ${from} ${to}`);
+        files.set(to, new Uint8Array(files.get(from) as Uint8Array));
+      },
+      patch: async (path, offset, data) => {
+        log.push(`PATCH ${path} ${offset}`);
+        const old = files.get(path) as Uint8Array;
+        const out = new Uint8Array(Math.max(old.length, offset + data.byteLength));
+        out.set(old);
+        out.set(new Uint8Array(data), offset);
+        files.set(path, out);
+      },
+      move: async (from, to) => {
+        log.push(`MOVE ${from} ${to}`);
+        files.set(to, files.get(from) as Uint8Array);
+        files.delete(from);
+      },
+    };
+  }
+  function reader(data: Uint8Array): RangeReader {
+    return {
+      read: async (start, length) => data.slice(start, start + length).buffer,
+      close: async () => {},
+    };
+  }
+  async function signature(data: Uint8Array): Promise<BlockSignature> {
+    const blocks: string[] = [];
+    for (let offset = 0; offset < data.length; offset += BLOCK_SIZE) {
+      blocks.push(await sha256Hex(data.slice(offset, offset + BLOCK_SIZE).buffer));
+    }
+    return { etag: "e1", size: data.length, blockSize: BLOCK_SIZE, blocks };
+  }
+
+  it("should patch a copy and move it into place", async () => {
+    const old = new Uint8Array(BLOCK_SIZE * 3 + 100).fill(1);
+    const updated = new Uint8Array(BLOCK_SIZE * 4).fill(1);
+    updated.fill(2, BLOCK_SIZE + 10, BLOCK_SIZE + 20);
+    updated.fill(3, BLOCK_SIZE * 3);
+    const files = new Map([["/vault/a.bin", old]]);
+    const log: string[] = [];
+    let seenDuringPatch: Uint8Array | undefined = undefined;
+    const remote = fakeRemote(files, log);
+    const patch = remote.patch;
+    remote.patch = async (path, offset, data) => {
+      seenDuringPatch = files.get("/vault/a.bin");
+      await patch(path, offset, data);
+    };
+
+    const result = await patchChangedBlocks(
+      remote, reader(updated), "/vault/a.bin", "/vault/a.bin.partial", await signature(old), updated.length,
+      BLOCK_SIZE * 8
+    );
+    expect(files.get("/vault/a.bin")).toStrictEqual(updated);
+    expect(files.has("/vault/a.bin.partial")).toBe(false);
+    // The live file is untouched until the move
+    expect(seenDuringPatch).toBe(old);
+    expect(log).toStrictEqual([
+      "COPY /vault/a.bin /vault/a.bin.partial",
+      `PATCH /vault/a.bin.partial ${BLOCK_SIZE}`,
+      `PATCH /vault/a.bin.partial ${BLOCK_SIZE * 3}`,
+      "MOVE /vault/a.bin.partial /vault/a.bin",
+    ]);
+    expect(result.sent).toBe(BLOCK_SIZE * 2);
+    expect(result.blocks).toStrictEqual((await signature(updated)).blocks);
+  });
+  it("should leave the remote file alone if nothing changed", async () => {
+    const data = new Uint8Array(BLOCK_SIZE + 5).fill(7);
+    const files = new Map([["/vault/a.bin", data]]);
+    const log: string[] = [];
+    const result = await patchChangedBlocks(
+      fakeRemote(files, log), reader(data), "/vault/a.bin", "/vault/a.bin.partial", await signature(data), data.length,
+      BLOCK_SIZE * 8
+    );
+    expect(log).toStrictEqual([]);
+    expect(result.sent).toBe(0);
+  });
+});
@@ -0,0 +1,85 @@
+import { EarlyDownloads } from "../src/sync/early_downloads";
+import { FileData } from "../src/sync/sync";
+
+const data: FileData = { lastModified: 0 };
+
+/**
+ * Download function that only finishes when told to.
+ */
+function controlledDownloads() {
+  const started: string[] = [];
+  const finish = new Map<string, (ok: boolean) => void>();
+  const download = (file: string) => {
+    started.push(file);
+    return new Promise<void>((resolve, reject) => {
+      finish.set(file, (ok) => ok ? resolve() : reject(new Error("Download failed")));
+    });
+  };
+  return { started, finish, download };
+}
+
+async function flush() {
+  for (let i = 0; i < 10; ++i) {
+    await Promise.resolve();
+  }
+}
+
+describe("EarlyDownloads", () => {
+  it("should limit how many downloads run at once", async () => {
+    const { started, finish, download } = controlledDownloads();
+    const early = new EarlyDownloads(2, download);
+    for (const file of ["a.md", "b.md", "c.md"]) {
+      early.offer(file, data);
+    }
+    expect(started).toStrictEqual(["a.md", "b.md"]);
+    expect(early.get("c.md")).toBeUndefined();
+
+    finish.get("a.md")!(true);
+    await flush();
+    expect(started).toStrictEqual(["a.md", "b.md", "c.md"]);
+    expect(await early.get("a.md")).toBe(true);
+  });
+  it("should drop the queue when closed", async () => {
+    const { started, finish, download } = controlledDownloads();
+    const early = new EarlyDownloads(1, download);
+    early.offer("a.md", data);
+    early.offer("b.md", data);
+    early.close();
+    early.offer("c.md", data);
+    finish.get("a.md")!(true);
+    await early.settle();
+    expect(started).toStrictEqual(["a.md"]);
+    expect(early.get("b.md")).toBeUndefined();
+  });
+  it("should report failed downloads", async () => {
+    const { finish, download } = controlledDownloads();
+    const early = new EarlyDownloads(4, download);
+    early.offer("a.md", data);
+    early.offer("b.md", data);
+    const settled = early.settle();
+    finish.get("a.md")!(false);
+    finish.get("b.md")!(true);
+    await settled;
+    expect(await early.get("a.md")).toBe(false);
+    expect(await early.get("b.md")).toBe(true);
+  });
+  it("should record how long successful downloads took", async () => {
+    const { finish, download } = controlledDownloads();
+    let time = 100;
+    const early = new EarlyDownloads(4, download, () => time);
+    early.offer("a.md", data);
+    early.offer("b.md", data);
+    time = 350;
+    finish.get("a.md")!(true);
+    finish.get("b.md")!(false);
+    await early.settle();
+    expect(early.durations).toStrictEqual(new Map([["a.md", 250]]));
+  });
+  it("should only start each file once", () => {
+    const { started, download } = controlledDownloads();
+    const early = new EarlyDownloads(4, download);
+    early.offer("a.md", data);
+    early.offer("a.md", data);
+    expect(started).toStrictEqual(["a.md"]);
+  });
+});
@@ -0,0 +1,103 @@
+import { ActionType } from "../src/sync/actiontype";
+import { calculateIndexActions, FileIndex, toIndexBase } from "../src/sync/file_index";
+import { ActionResult, calculateSyncActions, FileData, Files } from "../src/sync/sync";
+import { ManifestEntries, toManifestIndexBase, toSyncBase } from "../src/sync/manifest";
+import { SyncDir } from "../src/sync/syncdir";
+import { generateScenario } from "./bench/generate";
+
+function sortedActions(result: ActionResult): [string, ActionType][] | string {
+  if (result.error != null) {
+    return result.error;
+  }
+  return Array.from(result.actions.entries()).sort((a, b) => a[0] < b[0] ? -1 : a[0] > b[0] ? 1 : 0);
+}
+
+const time = Date.parse("2025-06-21T00:00:00Z");
+
+describe("FileIndex", () => {
+  it("should sort and look up files", () => {
+    const files: Files = new Map<string, FileData>([
+      ["b.md", { lastModified: time, size: 2 }],
+      ["a/c.md", { lastModified: null, etag: "\"x\"" }],
+      ["a.md", { lastModified: time + 1000, hash: "abc" }],
+    ]);
+    const index = FileIndex.fromFiles(files);
+    expect(index.paths).toStrictEqual(["a.md", "a/c.md", "b.md"]);
+    expect(index.indexOf("b.md")).toStrictEqual(2);
+    expect(index.indexOf("c.md")).toStrictEqual(-1);
+    expect(index.get("a/c.md")).toStrictEqual({ lastModified: null, size: null, etag: "\"x\"", hash: null });
+    expect(index.get("b.md")).toStrictEqual({ lastModified: time, size: 2, etag: null, hash: null });
+  });
+  it("should skip the columns nothing uses", () => {
+    const index = FileIndex.fromFiles(new Map([["a.md", { lastModified: time }]]));
+    expect(index.etags).toBeNull();
+    expect(index.hashes).toBeNull();
+  });
+});
+
+describe("calculateIndexActions", () => {
+  it("should match calculateSyncActions", () => {
+    const scenario = generateScenario(5000, 1);
+    const src = FileIndex.fromFiles(scenario.src);
+    const dest = FileIndex.fromFiles(scenario.dest);
+    for (const includeNoop of [false, true]) {
+      for (const deleteIsNoop of [false, true]) {
+        for (const base of [null, scenario.base]) {
+          const indexBase = base == null ? null : toIndexBase(base);
+          expect(sortedActions(calculateIndexActions(
+            src, dest, ".obsidian", includeNoop, deleteIsNoop, true, indexBase
+          )))
+            .toStrictEqual(sortedActions(calculateSyncActions(
+              scenario.src, scenario.dest, ".obsidian", includeNoop, deleteIsNoop, true, base
+            )));
+        }
+      }
+    }
+  });
+  it("should give the same wipe errors", () => {
+    const config = { lastModified: time } as FileData;
+    const dest: Files = new Map([
+      ["Index.md", { lastModified: time }],
+      [".obsidian/app.json", config],
+    ]);
+    const cases: Files[] = [
+      new Map(),
+      new Map([[".obsidian/app.json", config]]),
+      new Map([["Other.md", config]]),
+    ];
+    for (const src of cases) {
+      for (const blockWipes of [false, true]) {
+        expect(sortedActions(calculateIndexActions(
+          FileIndex.fromFiles(src), FileIndex.fromFiles(dest), ".obsidian", false, false, blockWipes
+        ))).toStrictEqual(sortedActions(calculateSyncActions(src, dest, ".obsidian", false, false, blockWipes)));
+      }
+    }
+    expect(calculateIndexActions(
+      FileIndex.fromFiles(cases[1]), FileIndex.fromFiles(dest), ".obsidian"
+    ).error).toContain("content wipe");
+  });
+  it("should put removals first, like calculateSyncActions", () => {
+    const src: Files = new Map([["a.md", { lastModified: time }], ["c.md", { lastModified: time }]]);
+    const dest: Files = new Map([["b.md", { lastModified: time }], ["d.md", { lastModified: time }]]);
+    const result = calculateIndexActions(FileIndex.fromFiles(src), FileIndex.fromFiles(dest), ".obsidian");
+    expect(Array.from(result.actions!.entries())).toStrictEqual(
+      Array.from(calculateSyncActions(src, dest, ".obsidian").actions!.entries())
+    );
+  });
+});
+
+describe("toManifestIndexBase", () => {
+  it("should index the same base as toSyncBase", () => {
+    const entries: ManifestEntries = new Map([
+      ["b.md", { local: { lastModified: time, size: 2, hash: "h" }, remote: { lastModified: time, size: 2, etag: "e" } }],
+      ["a.md", { local: { lastModified: time + 1000, size: 1 }, remote: { lastModified: time, size: 1, etag: "f" } }],
+    ]);
+    for (const direction of [SyncDir.UP, SyncDir.DOWN]) {
+      const index = toManifestIndexBase(entries, direction);
+      const expected = toIndexBase(toSyncBase(entries, direction));
+      expect(index.src.paths).toStrictEqual(expected.src.paths);
+      expect(index.src.get("b.md")).toStrictEqual(expected.src.get("b.md"));
+      expect(index.dest.get("a.md")).toStrictEqual(expected.dest.get("a.md"));
+    }
+  });
+});
@@ -0,0 +1,99 @@
+import { ActionType } from "../src/sync/actiontype";
+import { calculateSyncActions, FileData, Files } from "../src/sync/sync";
+import { HashCache } from "../src/sync/hash_cache";
+import { ManifestEntries, toSyncBase } from "../src/sync/manifest";
+import { SyncDir } from "../src/sync/syncdir";
+
+function file(date: string, hash: string | null = null, etag: string | null = null): FileData {
+  return {
+    lastModified: Date.parse(date),
+    size: 10,
+    etag,
+    hash,
+  };
+}
+
+function bytes(content: string): ArrayBuffer {
+  return new TextEncoder().encode(content).buffer as ArrayBuffer;
+}
+
+describe("HashCache", () => {
+  it("should only hash files once per change", async () => {
+    const cache = new HashCache();
+    const reads: string[] = [];
+    const read = async (path: string) => {
+      reads.push(path);
+      return bytes("content of " + path);
+    };
+    const files: Files = new Map([
+      ["a.md", file("2025-06-21T00:00:00Z")],
+      ["b.md", file("2025-06-21T00:00:00Z")],
+    ]);
+    await cache.attach(files, "sub/", read, 2);
+    expect(reads.length).toBe(2);
+    expect(files.get("a.md")?.hash).toBe(cache.get("sub/a.md", 10, Date.parse("2025-06-21T00:00:00Z")));
+
+    const again: Files = new Map([
+      ["a.md", file("2025-06-21T00:00:00Z")],
+      ["b.md", file("2025-06-22T00:00:00Z")],
+    ]);
+    await cache.attach(again, "sub/", read, 2);
+    // Only the touched file is read again
+    expect(reads.length).toBe(3);
+    expect(reads[2]).toBe("sub/b.md");
+    // Same content, same hash
+    expect(again.get("b.md")?.hash).toBe(files.get("b.md")?.hash);
+  });
+  it("should skip files at or above the size limit", async () => {
+    const cache = new HashCache();
+    const reads: string[] = [];
+    const files: Files = new Map([
+      ["small.md", { lastModified: 1, size: 9 }],
+      ["large.bin", { lastModified: 1, size: 10 }],
+    ]);
+    cache.set("large.bin", 10, 1, "stale");
+    await cache.attach(files, "", async (path) => {
+      reads.push(path);
+      return bytes(path);
+    }, 1, 10);
+    expect(reads).toStrictEqual(["small.md"]);
+    expect(files.get("large.bin")?.hash).toBeUndefined();
+    expect(cache.entries.has("large.bin")).toBe(false);
+  });
+  it("should drop entries for removed files in the same root only", async () => {
+    const cache = new HashCache();
+    cache.set("other/x.md", 1, 1, "x");
+    cache.set("sub/gone.md", 1, 1, "y");
+    await cache.attach(new Map(), "sub/", async () => bytes(""), 1);
+    expect(cache.entries.has("other/x.md")).toBe(true);
+    expect(cache.entries.has("sub/gone.md")).toBe(false);
+  });
+});
+
+describe("calculateSyncActions with content hashes", () => {
+  const base: ManifestEntries = new Map([
+    ["app.json", {
+      local: file("2025-06-21T00:00:00Z", "h1"),
+      remote: file("2025-06-21T00:00:00Z", "h1", "a"),
+    }],
+  ]);
+
+  it("should not push files that were touched without changing", () => {
+    const local: Files = new Map([["app.json", file("2025-06-25T00:00:00Z", "h1")]]);
+    const remote: Files = new Map([["app.json", file("2025-06-21T00:00:00Z", null, "a")]]);
+    const result = calculateSyncActions(local, remote, ".obsidian", true, false, true, toSyncBase(base, SyncDir.UP));
+    expect(result.actions).toStrictEqual(new Map([["app.json", ActionType.NOOP]]));
+  });
+  it("should push files with changed content", () => {
+    const local: Files = new Map([["app.json", file("2025-06-25T00:00:00Z", "h2")]]);
+    const remote: Files = new Map([["app.json", file("2025-06-21T00:00:00Z", null, "a")]]);
+    const result = calculateSyncActions(local, remote, ".obsidian", true, false, true, toSyncBase(base, SyncDir.UP));
+    expect(result.actions).toStrictEqual(new Map([["app.json", ActionType.ADD]]));
+  });
+  it("should not flag touched local files as conflicts on pull", () => {
+    const local: Files = new Map([["app.json", file("2025-06-25T00:00:00Z", "h1")]]);
+    const remote: Files = new Map([["app.json", file("2025-06-22T00:00:00Z", null, "b")]]);
+    const result = calculateSyncActions(remote, local, ".obsidian", true, false, true, toSyncBase(base, SyncDir.DOWN));
+    expect(result.actions).toStrictEqual(new Map([["app.json", ActionType.ADD]]));
+  });
+});
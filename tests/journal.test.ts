@@ -0,0 +1,146 @@
+import { ActionType } from "../src/sync/actiontype";
+import { Content, FileData } from "../src/sync/sync";
+import { createPlan, parseJournal, pendingActions, plannedContent } from "../src/sync/journal";
+import { SyncDir } from "../src/sync/syncdir";
+
+function file(date: string, size: number = 10): FileData {
+  return {
+    lastModified: Date.parse(date),
+    size,
+  };
+}
+
+describe("Sync journal", () => {
+  const source: Content = {
+    files: new Map([
+      ["a.md", file("2025-06-21T00:00:00Z")],
+      ["b.md", file("2025-06-21T00:00:00Z")],
+      ["c.md", file("2025-06-21T00:00:00Z")],
+    ]),
+    folderPaths: [],
+  };
+  const target: Content = {
+    files: new Map([
+      ["old/x.md", file("2025-06-20T00:00:00Z")],
+      ["gone.md", file("2025-06-20T00:00:00Z")],
+    ]),
+    folderPaths: [{ realPath: "old", commonPath: "old" }],
+  };
+  const plan = createPlan(
+    "::/vault",
+    SyncDir.UP,
+    "/vault",
+    null,
+    source,
+    target,
+    new Map([
+      ["a.md", ActionType.ADD],
+      ["b.md", ActionType.ADD],
+      ["c.md", ActionType.ADD],
+      ["old/x.md", ActionType.REMOVE],
+      ["gone.md", ActionType.REMOVE],
+    ]),
+    new Map()
+  );
+
+  it("should ignore a partially written line", () => {
+    const text = JSON.stringify(plan) + "\n"
+      + JSON.stringify({ type: "done", key: plan.key, path: "a.md", action: ActionType.ADD }) + "\n"
+      + "{\"type\": \"done\", \"pa";
+    const state = parseJournal(text).get(plan.key);
+    expect(state).not.toBeUndefined();
+    expect(state?.done).toStrictEqual(new Map([["a.md", ActionType.ADD]]));
+  });
+  it("should not accept records without a plan", () => {
+    expect(parseJournal(JSON.stringify({ type: "done", key: plan.key, path: "a.md", action: ActionType.ADD })).size)
+      .toBe(0);
+    expect(parseJournal("").size).toBe(0);
+  });
+  it("should track interleaved roots separately, and drop finished ones", () => {
+    const other = { ...plan, key: "Notes::/notes" };
+    const states = parseJournal(
+      JSON.stringify(plan) + "\n"
+        + JSON.stringify(other) + "\n"
+        + JSON.stringify({ type: "done", key: other.key, path: "a.md", action: ActionType.ADD }) + "\n"
+        + JSON.stringify({ type: "done", key: plan.key, path: "b.md", action: ActionType.ADD }) + "\n"
+        + JSON.stringify({ type: "end", key: other.key }) + "\n"
+    );
+    expect(Array.from(states.keys())).toEqual([plan.key]);
+    expect(states.get(plan.key)?.done).toStrictEqual(new Map([["b.md", ActionType.ADD]]));
+  });
+  it("should only leave pending actions that still apply", () => {
+    const state = parseJournal(
+      JSON.stringify(plan) + "\n"
+        + JSON.stringify({ type: "done", key: plan.key, path: "a.md", action: ActionType.ADD }) + "\n"
+        + JSON.stringify({ type: "folder", key: plan.key, path: "old" }) + "\n"
+    ).get(plan.key);
+    expect(state).not.toBeUndefined();
+    if (state == null) {
+      return;
+    }
+    const current = new Map([
+      ["a.md", file("2025-06-21T00:00:00Z")],
+      ["b.md", file("2025-06-21T00:00:00Z")],
+      // Changed after the plan was made
+      ["c.md", file("2025-06-22T00:00:00Z", 12)],
+    ]);
+    const currentTarget: Content = {
+      files: new Map([["gone.md", file("2025-06-20T00:00:00Z")]]),
+      folderPaths: [],
+    };
+    const { pending, dropped } = pendingActions(state, current, currentTarget.files);
+    expect(pending).toStrictEqual(new Map([
+      ["b.md", ActionType.ADD],
+      ["gone.md", ActionType.REMOVE],
+    ]));
+    expect(dropped).toBe(1);
+    // The deleted folder isn't deleted again
+    expect(plannedContent(state, currentTarget, pending).target.folderPaths).toStrictEqual([]);
+  });
+  it("should not overwrite changes made to the target since the plan", () => {
+    const state = parseJournal(JSON.stringify(plan) + "\n").get(plan.key);
+    expect(state).not.toBeUndefined();
+    if (state == null) {
+      return;
+    }
+    const currentTarget: Content = {
+      files: new Map([
+        // Created on the target after the interruption
+        ["b.md", file("2025-06-23T00:00:00Z")],
+        // Edited on the target after the interruption
+        ["old/x.md", file("2025-06-23T00:00:00Z")],
+        ["gone.md", file("2025-06-20T00:00:00Z")],
+      ]),
+      folderPaths: [{ realPath: "old", commonPath: "old" }],
+    };
+    const { pending, dropped } = pendingActions(state, source.files, currentTarget.files);
+    expect(pending).toStrictEqual(new Map([
+      ["a.md", ActionType.ADD],
+      ["c.md", ActionType.ADD],
+      ["gone.md", ActionType.REMOVE],
+    ]));
+    expect(dropped).toBe(2);
+    // The folder still has the edited file in it, so it can't be deleted as a whole
+    expect(plannedContent(state, currentTarget, pending).target.folderPaths).toStrictEqual([]);
+    // Without the edit, it can
+    currentTarget.files.set("old/x.md", file("2025-06-20T00:00:00Z"));
+    const unedited = pendingActions(state, source.files, currentTarget.files).pending;
+    expect(plannedContent(state, currentTarget, unedited).target.folderPaths)
+      .toStrictEqual([{ realPath: "old", commonPath: "old" }]);
+  });
+  it("should only store the files the actions refer to", () => {
+    const small = createPlan(
+      "::/vault",
+      SyncDir.UP,
+      "/vault",
+      null,
+      source,
+      target,
+      new Map([["a.md", ActionType.ADD]]),
+      new Map()
+    );
+    expect(small.src).toStrictEqual([["a.md", source.files.get("a.md")]]);
+    expect(small.target).toStrictEqual([]);
+    expect(small.deletedFolders).toStrictEqual([{ realPath: "old", commonPath: "old" }]);
+  });
+});
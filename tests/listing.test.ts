@@ -0,0 +1,62 @@
+import { entriesUnder, planSharedListings } from "../src/sync/listing";
+import { mergeGenerators } from "../src/sync/concurrency";
+
+describe("planSharedListings", () => {
+  it("should share a listing between siblings", () => {
+    const groups = planSharedListings(["/vault/a", "/vault/b/", "/vault/c", "/other"], true);
+    expect(groups).toEqual([
+      { listRoot: "/vault", members: ["/vault/a", "/vault/b/", "/vault/c"] },
+      { listRoot: "/other", members: ["/other"] },
+    ]);
+  });
+
+  it("should not share the server root, or share at all if disabled", () => {
+    expect(planSharedListings(["/a", "/b"], true)).toEqual([
+      { listRoot: "/a", members: ["/a"] },
+      { listRoot: "/b", members: ["/b"] },
+    ]);
+    expect(planSharedListings(["/vault/a", "/vault/b"], false)).toEqual([
+      { listRoot: "/vault/a", members: ["/vault/a"] },
+      { listRoot: "/vault/b", members: ["/vault/b"] },
+    ]);
+  });
+
+  it("should reuse the listing of an outer destination", () => {
+    expect(planSharedListings(["/vault/a/nested", "/vault/a", "/vault/ab"], false)).toEqual([
+      { listRoot: "/vault/a", members: ["/vault/a", "/vault/a/nested"] },
+      { listRoot: "/vault/ab", members: ["/vault/ab"] },
+    ]);
+  });
+
+  it("should filter entries by folder", () => {
+    const entries = [
+      { filename: "/vault/a/x.md" },
+      { filename: "/vault/ab/y.md" },
+      { filename: "/vault/a" },
+    ];
+    expect(entriesUnder(entries, "/vault/a/")).toEqual([{ filename: "/vault/a/x.md" }]);
+  });
+});
+
+describe("mergeGenerators", () => {
+  it("should interleave generators and return their results in order", async () => {
+    const delay = (ms: number) => new Promise(resolve => setTimeout(resolve, ms));
+    const make = (name: string, ms: number) => async function* () {
+      for (let i = 0; i < 2; ++i) {
+        await delay(ms);
+        yield `${name}${i}`;
+      }
+      return name;
+    };
+    const merged = mergeGenerators([make("slow", 20), make("fast", 5)], 2);
+    const seen: [number, string][] = [];
+    let step = await merged.next();
+    while (!step.done) {
+      seen.push(step.value);
+      step = await merged.next();
+    }
+    expect(step.value).toEqual(["slow", "fast"]);
+    expect(seen.slice(0, 2)).toEqual([[1, "fast0"], [1, "fast1"]]);
+    expect(seen.length).toBe(4);
+  });
+});
@@ -0,0 +1,86 @@
+import { Content, FileData } from "../src/sync/sync";
+import { DirtySet, hiddenRoot, mergeSubtree, removeSubtree, sortContent, toRootKey } from "../src/sync/local_index";
+
+function file(path: string): FileData {
+  return {
+    lastModified: 0,
+    size: 10,
+    destination: path,
+  } as FileData;
+}
+
+describe("DirtySet", () => {
+  it("should only take paths under the root", () => {
+    const dirty = new DirtySet();
+    dirty.add("Notes/b.md");
+    dirty.add("Notes");
+    dirty.add("Notes2/a.md");
+    dirty.add("a.md");
+
+    expect(dirty.take("Notes")).toEqual(["Notes", "Notes/b.md"]);
+    expect(Array.from(dirty.paths).sort()).toEqual(["Notes2/a.md", "a.md"]);
+    expect(dirty.take("/")).toEqual(["Notes2/a.md", "a.md"]);
+    expect(dirty.paths.size).toBe(0);
+  });
+
+  it("should not trust listings from before a lost change", () => {
+    const dirty = new DirtySet();
+    expect(dirty.trusts(1000)).toBe(true);
+    dirty.lose(2000);
+    expect(dirty.trusts(1000)).toBe(false);
+    expect(dirty.trusts(2000)).toBe(false);
+    expect(dirty.trusts(3000)).toBe(true);
+  });
+});
+
+describe("Local index", () => {
+  it("should map paths to root keys", () => {
+    expect(toRootKey("Notes/a.md", "/")).toBe("Notes/a.md");
+    expect(toRootKey("Notes/a.md", "Notes")).toBe("a.md");
+  });
+
+  it("should remove and merge subtrees", () => {
+    const content: Content = {
+      files: new Map([
+        ["a.md", file("Notes/a.md")],
+        ["Sub/b.md", file("Notes/Sub/b.md")],
+        ["Sub/Deeper/c.md", file("Notes/Sub/Deeper/c.md")],
+        ["Subway.md", file("Notes/Subway.md")],
+      ]),
+      folderPaths: [
+        { realPath: "Notes/Sub", commonPath: "Sub" },
+        { realPath: "Notes/Sub/Deeper", commonPath: "Sub/Deeper" },
+      ],
+    };
+    removeSubtree(content, "Sub");
+    expect(Array.from(content.files.keys())).toEqual(["a.md", "Subway.md"]);
+    expect(content.folderPaths).toEqual([]);
+
+    // getVaultFiles("Notes/Sub") keys everything relative to Notes/Sub
+    const sub: Content = {
+      files: new Map([
+        ["d.md", file("Notes/Sub/d.md")],
+        ["New/e.md", file("Notes/Sub/New/e.md")],
+      ]),
+      folderPaths: [
+        { realPath: "Notes/Sub/New", commonPath: "New" },
+      ],
+    };
+    mergeSubtree(content, { realPath: "Notes/Sub", commonPath: "Sub" }, sub, "Notes");
+    const sorted = sortContent(content);
+    expect(Array.from(sorted.files.keys())).toEqual(["Sub/New/e.md", "Sub/d.md", "Subway.md", "a.md"]);
+    expect(sorted.folderPaths).toEqual([
+      { realPath: "Notes/Sub", commonPath: "Sub" },
+      { realPath: "Notes/Sub/New", commonPath: "Sub/New" },
+    ]);
+  });
+});
+
+describe("hiddenRoot", () => {
+  it("should find the topmost hidden path", () => {
+    expect(hiddenRoot(".obsidian/plugins/x/data.json")).toBe(".obsidian");
+    expect(hiddenRoot("Notes/.hidden/a.md")).toBe("Notes/.hidden");
+    expect(hiddenRoot("Notes/.env")).toBe("Notes/.env");
+    expect(hiddenRoot("Notes/a.md")).toBeNull();
+  });
+});
@@ -0,0 +1,100 @@
+import { ActionType } from "../src/sync/actiontype";
+import {
+  Actions,
+  calculateSyncActions,
+  FileData,
+  Files,
+} from "../src/sync/sync";
+import { applySyncResults, ManifestEntries, toSyncBase } from "../src/sync/manifest";
+import { SyncDir } from "../src/sync/syncdir";
+
+function file(date: string, size: number = 10, etag: string | null = null): FileData {
+  return {
+    lastModified: Date.parse(date),
+    size,
+    etag,
+  };
+}
+
+describe("calculateSyncActions with a base", () => {
+  const base: ManifestEntries = new Map([
+    ["Index.md", {
+      local: file("2025-06-21T00:00:00Z"),
+      remote: file("2025-06-21T00:00:00Z", 10, "a"),
+    }],
+  ]);
+
+  it("should ignore timestamp drift when both sides are unchanged", () => {
+    // Remote timestamp is way off, but the ETag says it's the same file we saw last time
+    const local: Files = new Map([["Index.md", file("2025-06-21T00:00:00Z")]]);
+    const remote: Files = new Map([["Index.md", file("2025-06-25T00:00:00Z", 10, "a")]]);
+    const result = calculateSyncActions(local, remote, ".obsidian", true, false, true, toSyncBase(base, SyncDir.UP));
+    expect(result.actions).toStrictEqual(new Map([["Index.md", ActionType.NOOP]]));
+  });
+  it("should push local changes when the remote is unchanged", () => {
+    const local: Files = new Map([["Index.md", file("2025-06-20T00:00:00Z", 12)]]);
+    const remote: Files = new Map([["Index.md", file("2025-06-21T00:00:00Z", 10, "a")]]);
+    // Without a base, the older local timestamp would've been a conflict
+    const result = calculateSyncActions(local, remote, ".obsidian", true, false, true, toSyncBase(base, SyncDir.UP));
+    expect(result.actions).toStrictEqual(new Map([["Index.md", ActionType.ADD]]));
+  });
+  it("should flag remote changes as conflicts on push", () => {
+    const local: Files = new Map([["Index.md", file("2025-06-22T00:00:00Z", 12)]]);
+    const remote: Files = new Map([["Index.md", file("2025-06-21T00:00:00Z", 11, "b")]]);
+    const result = calculateSyncActions(local, remote, ".obsidian", true, false, true, toSyncBase(base, SyncDir.UP));
+    expect(result.actions).toStrictEqual(new Map([["Index.md", ActionType.ADD_LOCAL]]));
+  });
+  it("should pull remote changes when the local file is unchanged", () => {
+    const local: Files = new Map([["Index.md", file("2025-06-21T00:00:00Z")]]);
+    const remote: Files = new Map([["Index.md", file("2025-06-22T00:00:00Z", 11, "b")]]);
+    const result = calculateSyncActions(remote, local, ".obsidian", true, false, true, toSyncBase(base, SyncDir.DOWN));
+    expect(result.actions).toStrictEqual(new Map([["Index.md", ActionType.ADD]]));
+  });
+});
+
+describe("applySyncResults", () => {
+  it("should record transferred, unchanged, and removed files", () => {
+    const entries: ManifestEntries = new Map([
+      ["Removed.md", { local: file("2025-06-21T00:00:00Z"), remote: file("2025-06-21T00:00:00Z") }],
+      ["Failed.md", { local: file("2025-06-21T00:00:00Z"), remote: file("2025-06-21T00:00:00Z") }],
+    ]);
+    const local: Files = new Map([
+      ["Index.md", file("2025-06-22T00:00:00Z", 15)],
+      ["Same.md", file("2025-06-21T00:00:00Z")],
+      ["Failed.md", file("2025-06-23T00:00:00Z")],
+    ]);
+    const remote: Files = new Map([
+      ["Same.md", file("2025-06-21T00:00:00Z", 10, "s")],
+      ["Removed.md", file("2025-06-21T00:00:00Z")],
+      ["Failed.md", file("2025-06-21T00:00:00Z")],
+    ]);
+    const actions: Actions = new Map([
+      ["Index.md", ActionType.ADD],
+      ["Removed.md", ActionType.REMOVE],
+      ["Failed.md", ActionType.ADD],
+    ]);
+    const completed: Actions = new Map([
+      ["Index.md", ActionType.ADD],
+      ["Removed.md", ActionType.REMOVE],
+    ]);
+    applySyncResults(entries, SyncDir.UP, local, remote, actions, completed);
+
+    expect(entries.has("Removed.md")).toBe(false);
+    expect(entries.get("Index.md")?.remote.size).toBe(15);
+    expect(entries.get("Same.md")?.remote.etag).toBe("s");
+    // Failed transfers keep the old state, so the next sync still sees the file as changed
+    expect(entries.get("Failed.md")?.local.lastModified).toBe(Date.parse("2025-06-21T00:00:00Z"));
+  });
+  it("should record the real remote state of uploads that couldn't set it", () => {
+    const entries: ManifestEntries = new Map();
+    const local: Files = new Map([["Large.bin", file("2025-06-22T00:00:00Z", 15)]]);
+    const actions: Actions = new Map([["Large.bin", ActionType.ADD]]);
+    const written: Files = new Map([["Large.bin", file("2025-06-25T00:00:00Z", 15, "w")]]);
+    applySyncResults(entries, SyncDir.UP, local, new Map(), actions, actions, new Map(), false, written);
+
+    expect(entries.get("Large.bin")?.local.lastModified).toBe(Date.parse("2025-06-22T00:00:00Z"));
+    expect(entries.get("Large.bin")?.remote).toStrictEqual(
+      { lastModified: Date.parse("2025-06-25T00:00:00Z"), size: 15, etag: "w", hash: null }
+    );
+  });
+});
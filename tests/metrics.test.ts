@@ -0,0 +1,91 @@
+import { appendReport, diffCounts, summarizeReport, SyncMetrics, SyncReport } from "../src/sync/metrics";
+import { SyncDir } from "../src/sync/syncdir";
+
+class Clock {
+  time = 0;
+  now = () => this.time;
+}
+
+describe("SyncMetrics", () => {
+  it("Should time phases", async () => {
+    const clock = new Clock();
+    const metrics = new SyncMetrics("push", false, {}, clock.now, () => 1000);
+    const listing = await metrics.time("remote", async () => {
+      clock.time += 250;
+      return "listing";
+    });
+    expect(listing).toBe("listing");
+    metrics.timeSync("calculate", () => { clock.time += 5; });
+    await expect(metrics.time("local", async () => {
+      clock.time += 100;
+      throw new Error("Failed");
+    })).rejects.toThrow("Failed");
+
+    const report = metrics.finish();
+    expect(report.startedAt).toBe(1000);
+    expect(report.duration).toBe(355);
+    expect(report.phases.remote).toBe(250);
+    expect(report.phases.calculate).toBe(5);
+    // Failed phases still took time
+    expect(report.phases.local).toBe(100);
+    expect(report.phases.transfers).toBe(0);
+  });
+
+  it("Should count bytes per direction and keep the slowest files", () => {
+    const metrics = new SyncMetrics("sync", false, {}, new Clock().now);
+    for (let i = 0; i < 15; ++i) {
+      metrics.recordFile(`${i}.md`, i % 2 == 0 ? SyncDir.UP : SyncDir.DOWN, 100, i * 10);
+    }
+    const report = metrics.finish();
+    expect(report.files).toBe(15);
+    expect(report.bytesUp).toBe(800);
+    expect(report.bytesDown).toBe(700);
+    expect(report.slowest.length).toBe(10);
+    expect(report.slowest[0]).toEqual({ path: "14.md", ms: 140, bytes: 100 });
+    expect(report.slowest[9].path).toBe("5.md");
+  });
+
+  it("Should only count requests made during the sync", () => {
+    const counters: { [method: string]: number } = { PROPFIND: 4, GET: 2 };
+    const metrics = new SyncMetrics("pull", false, counters, new Clock().now);
+    counters.PROPFIND += 1;
+    counters.GET += 10;
+    counters.PUT = 1;
+    expect(metrics.finish(counters).requests).toEqual({ PROPFIND: 1, GET: 10, PUT: 1 });
+  });
+});
+
+describe("Reports", () => {
+  function report(startedAt: number): SyncReport {
+    const metrics = new SyncMetrics("push", false, {}, () => 0, () => startedAt);
+    return metrics.finish();
+  }
+
+  it("Should diff counters", () => {
+    expect(diffCounts({ GET: 1, PUT: 2 }, { GET: 1, PUT: 5, DELETE: 1 })).toEqual({ PUT: 3, DELETE: 1 });
+  });
+
+  it("Should keep a rolling history", () => {
+    let reports: SyncReport[] = [];
+    for (let i = 0; i < 5; ++i) {
+      reports = appendReport(reports, report(i), 3);
+    }
+    expect(reports.map(r => r.startedAt)).toEqual([2, 3, 4]);
+  });
+
+  it("Should summarise reports", () => {
+    const clock = new Clock();
+    const metrics = new SyncMetrics("push", false, {}, clock.now);
+    metrics.add("remote", 1500);
+    metrics.add("transfers", 20);
+    metrics.recordFile("big.pdf", SyncDir.UP, 2048, 20);
+    clock.time = 1520;
+    const lines = summarizeReport(metrics.finish({ PROPFIND: 1, PUT: 1 }));
+    expect(lines).toEqual([
+      "Push took 1.5 s: 1 files, 2.0 KiB up, 0 B down",
+      "remote 1.5 s, transfers 20 ms",
+      "2 requests (1 PROPFIND, 1 PUT)",
+      "Slowest file: big.pdf (20 ms, 2.0 KiB)",
+    ]);
+  });
+});
@@ -0,0 +1,132 @@
+import { ActionType } from "../src/sync/actiontype";
+import { Actions, calculateSyncActions, Content, FileData, Files, runSync, UpdateContext } from "../src/sync/sync";
+import { ManifestEntries, toSyncBase } from "../src/sync/manifest";
+import { detectMoves } from "../src/sync/moves";
+import { SyncDir } from "../src/sync/syncdir";
+
+function file(date: string, size: number = 10, etag: string | null = null): FileData {
+  return {
+    lastModified: Date.parse(date),
+    size,
+    etag,
+  };
+}
+
+describe("detectMoves", () => {
+  const base: ManifestEntries = new Map([
+    ["Attachments/a.png", {
+      local: file("2025-06-21T00:00:00Z", 100),
+      remote: file("2025-06-21T00:00:00Z", 100, "a"),
+    }],
+    ["Attachments/b.png", {
+      local: file("2025-06-21T00:00:00Z", 200),
+      remote: file("2025-06-21T00:00:00Z", 200, "b"),
+    }],
+  ]);
+
+  it("should turn renamed files into moves", () => {
+    const local: Files = new Map([
+      ["Media/a.png", file("2025-06-21T00:00:00Z", 100)],
+      ["Media/b.png", file("2025-06-21T00:00:00Z", 200)],
+    ]);
+    const remote: Files = new Map([
+      ["Attachments/a.png", file("2025-06-21T00:00:00Z", 100, "a")],
+      ["Attachments/b.png", file("2025-06-21T00:00:00Z", 200, "b")],
+    ]);
+    const syncBase = toSyncBase(base, SyncDir.UP);
+    const actions = calculateSyncActions(local, remote, ".obsidian", false, false, true, syncBase).actions as Actions;
+    const moves = detectMoves(local, remote, actions, syncBase);
+
+    expect(moves).toStrictEqual(new Map([
+      ["Media/a.png", "Attachments/a.png"],
+      ["Media/b.png", "Attachments/b.png"],
+    ]));
+    expect(actions).toStrictEqual(new Map([
+      ["Media/a.png", ActionType.MOVE],
+      ["Media/b.png", ActionType.MOVE],
+    ]));
+  });
+  it("should not move files that changed on the destination", () => {
+    const local: Files = new Map([["Media/a.png", file("2025-06-21T00:00:00Z", 100)]]);
+    const remote: Files = new Map([["Attachments/a.png", file("2025-06-22T00:00:00Z", 100, "changed")]]);
+    const actions: Actions = new Map([
+      ["Media/a.png", ActionType.ADD],
+      ["Attachments/a.png", ActionType.REMOVE],
+    ]);
+    const moves = detectMoves(local, remote, actions, toSyncBase(base, SyncDir.UP));
+    expect(moves.size).toBe(0);
+    expect(actions.get("Attachments/a.png")).toBe(ActionType.REMOVE);
+  });
+  it("should leave ambiguous pairs alone", () => {
+    const local: Files = new Map([
+      ["x.md", { ...file("2025-06-21T00:00:00Z"), hash: "h" }],
+      ["y.md", { ...file("2025-06-21T00:00:00Z"), hash: "h" }],
+    ]);
+    const remote: Files = new Map([["old.md", { ...file("2025-06-21T00:00:00Z"), hash: "h" }]]);
+    const actions: Actions = new Map([
+      ["x.md", ActionType.ADD],
+      ["y.md", ActionType.ADD],
+      ["old.md", ActionType.REMOVE],
+    ]);
+    expect(detectMoves(local, remote, actions).size).toBe(0);
+    expect(actions.size).toBe(3);
+  });
+  it("should pair files by the content hash in the manifest", () => {
+    const hashed: ManifestEntries = new Map([
+      ["old.md", { local: { ...file("2025-06-21T00:00:00Z"), hash: "h" }, remote: file("2025-06-21T00:00:00Z", 10, "o") }],
+    ]);
+    const local: Files = new Map([["new.md", { ...file("2025-06-25T00:00:00Z"), hash: "h" }]]);
+    const remote: Files = new Map([["old.md", file("2025-06-21T00:00:00Z", 10, "o")]]);
+    const actions: Actions = new Map([
+      ["new.md", ActionType.ADD],
+      ["old.md", ActionType.REMOVE],
+    ]);
+    expect(detectMoves(local, remote, actions, toSyncBase(hashed, SyncDir.UP)))
+      .toStrictEqual(new Map([["new.md", "old.md"]]));
+
+    local.set("new.md", { ...file("2025-06-25T00:00:00Z"), hash: "other" });
+    expect(detectMoves(local, remote, new Map(actions), toSyncBase(hashed, SyncDir.UP)).size).toBe(0);
+  });
+  it("should not pair files of the same size without a manifest", () => {
+    const local: Files = new Map([["new.md", { ...file("2025-06-21T00:00:00Z"), hash: "h" }]]);
+    const remote: Files = new Map([["old.md", file("2025-06-21T00:00:00Z", 10, "o")]]);
+    const actions: Actions = new Map([
+      ["new.md", ActionType.ADD],
+      ["old.md", ActionType.REMOVE],
+    ]);
+    expect(detectMoves(local, remote, actions).size).toBe(0);
+  });
+});
+
+describe("runSync with moves", () => {
+  it("should pass the old path to onUpdate", async () => {
+    const source: Content = {
+      files: new Map([["new.md", file("2025-06-21T00:00:00Z")]]),
+      folderPaths: [],
+    };
+    const dest: Content = {
+      files: new Map([["old.md", file("2025-06-21T00:00:00Z", 10, "e")]]),
+      folderPaths: [],
+    };
+    const calls: [ActionType, string, FileData | undefined, UpdateContext | undefined][] = [];
+    for await (const _ of runSync(
+      SyncDir.UP,
+      source,
+      dest,
+      new Map([["new.md", ActionType.MOVE]]),
+      () => {},
+      async (type, path, _src, destData, context) => {
+        calls.push([type, path, destData, context]);
+      },
+      async () => ActionType.NOOP,
+      false,
+      1,
+      new Map([["new.md", "old.md"]]),
+    )) {
+      // ignored
+    }
+    expect(calls).toStrictEqual([
+      [ActionType.MOVE, "new.md", dest.files.get("old.md"), { movedFrom: "old.md" }],
+    ]);
+  });
+});
@@ -0,0 +1,136 @@
+import { MultistatusParser } from "../src/fs/multistatus";
+import { RemoteEntry } from "../src/sync/remote_tree";
+
+const RESPONSE = `<?xml version="1.0" encoding="UTF-8"?>
+<D:multistatus xmlns:D="DAV:">
+<D:response>
+  <D:href>/dav/vault/</D:href>
+  <D:propstat>
+    <D:prop>
+      <D:resourcetype><D:collection/></D:resourcetype>
+      <D:getlastmodified>Sat, 21 Jun 2025 00:00:00 GMT</D:getlastmodified>
+    </D:prop>
+    <D:status>HTTP/1.1 200 OK</D:status>
+  </D:propstat>
+</D:response>
+<D:response>
+  <D:href>http://localhost:62169/dav/vault/Tom%20%26%20Jerry.md</D:href>
+  <D:propstat>
+    <D:prop>
+      <D:getcontentlength>12</D:getcontentlength>
+    </D:prop>
+    <D:status>HTTP/1.1 404 Not Found</D:status>
+  </D:propstat>
+  <D:propstat>
+    <D:prop>
+      <D:resourcetype/>
+      <D:getlastmodified>Sat, 21 Jun 2025 00:00:01 GMT</D:getlastmodified>
+      <D:getcontentlength>34</D:getcontentlength>
+      <D:getetag>&quot;abc&quot;</D:getetag>
+    </D:prop>
+    <D:status>HTTP/1.1 200 OK</D:status>
+  </D:propstat>
+</D:response>
+<D:response>
+  <D:href>/dav/vault/Folder/</D:href>
+  <D:propstat>
+    <D:prop>
+      <D:resourcetype><D:collection/></D:resourcetype>
+      <D:getlastmodified>Sat, 21 Jun 2025 00:00:02 GMT</D:getlastmodified>
+    </D:prop>
+    <D:status>HTTP/1.1 200 OK</D:status>
+  </D:propstat>
+</D:response>
+<D:response>
+  <D:href>/dav/vault/Folder/<![CDATA[Note.md]]></D:href>
+  <D:propstat>
+    <D:prop>
+      <D:getlastmodified>Sat, 21 Jun 2025 00:00:03 GMT</D:getlastmodified>
+      <D:getcontentlength>0</D:getcontentlength>
+    </D:prop>
+    <D:status>HTTP/1.1 200 OK</D:status>
+  </D:propstat>
+</D:response>
+</D:multistatus>
+`;
+
+const EXPECTED: RemoteEntry[] = [
+  {
+    filename: "/vault/Tom & Jerry.md",
+    basename: "Tom & Jerry.md",
+    type: "file",
+    lastmod: "Sat, 21 Jun 2025 00:00:01 GMT",
+    size: 34,
+    etag: "abc",
+  },
+  {
+    filename: "/vault/Folder",
+    basename: "Folder",
+    type: "directory",
+    lastmod: "Sat, 21 Jun 2025 00:00:02 GMT",
+    size: 0,
+    etag: null,
+  },
+  {
+    filename: "/vault/Folder/Note.md",
+    basename: "Note.md",
+    type: "file",
+    lastmod: "Sat, 21 Jun 2025 00:00:03 GMT",
+    size: 0,
+    etag: null,
+  },
+];
+
+function parseAll(chunks: string[]): RemoteEntry[] {
+  const parser = new MultistatusParser("/dav", "/vault");
+  const out: RemoteEntry[] = [];
+  for (const chunk of chunks) {
+    out.push(...parser.push(chunk));
+  }
+  out.push(...parser.end());
+  return out;
+}
+
+describe("MultistatusParser", () => {
+  it("should parse a whole response", () => {
+    expect(parseAll([RESPONSE])).toStrictEqual(EXPECTED);
+  });
+  it("should give the same entries regardless of where the response is split", () => {
+    for (let i = 0; i <= RESPONSE.length; ++i) {
+      expect(parseAll([RESPONSE.substring(0, i), RESPONSE.substring(i)])).toStrictEqual(EXPECTED);
+    }
+    expect(parseAll(RESPONSE.split(""))).toStrictEqual(EXPECTED);
+  });
+  it("should return entries as soon as they're complete", () => {
+    const parser = new MultistatusParser("/dav", "/vault");
+    const end = RESPONSE.indexOf("</D:response>", RESPONSE.indexOf("Tom%20")) + "</D:response>".length;
+    expect(parser.push(RESPONSE.substring(0, end - 1))).toStrictEqual([]);
+    expect(parser.push(RESPONSE.substring(end - 1, end))).toStrictEqual([EXPECTED[0]]);
+  });
+  it("should handle other prefixes and default namespaces", () => {
+    const prefixed = RESPONSE.replace(/D:/g, "lp1:");
+    expect(parseAll([prefixed])).toStrictEqual(EXPECTED);
+    const unprefixed = RESPONSE.replace(/D:/g, "").replace("xmlns:D", "xmlns");
+    expect(parseAll([unprefixed])).toStrictEqual(EXPECTED);
+  });
+  it("should handle a server at the root", () => {
+    const parser = new MultistatusParser("/", "/dav/vault");
+    const entries = parser.push(RESPONSE).concat(parser.end());
+    expect(entries.map(entry => entry.filename)).toStrictEqual([
+      "/dav/vault/Tom & Jerry.md",
+      "/dav/vault/Folder",
+      "/dav/vault/Folder/Note.md",
+    ]);
+  });
+  it("should decode character references outside the BMP", () => {
+    const response = RESPONSE.replace("<![CDATA[Note.md]]>", "&#x1F600;&#128512;.md");
+    const entries = parseAll([response]);
+    expect(entries[2].filename).toBe("/vault/Folder/\u{1F600}\u{1F600}.md");
+    expect(entries[2].basename).toBe("\u{1F600}\u{1F600}.md");
+  });
+  it("should throw on a truncated response", () => {
+    const parser = new MultistatusParser("/dav", "/vault");
+    parser.push(RESPONSE.substring(0, RESPONSE.indexOf("/Folder/<![CDATA")));
+    expect(() => parser.end()).toThrow();
+  });
+});
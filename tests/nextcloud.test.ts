@@ -0,0 +1,22 @@
+import { chunkedUploadRoot, chunkName, resolveUrl } from "../src/fs/nextcloud";
+
+describe("Nextcloud chunked uploads", () => {
+  it("should find the upload root of a files URL", () => {
+    expect(chunkedUploadRoot("https://cloud.example.com/remote.php/dav/files/alice/"))
+      .toBe("https://cloud.example.com/remote.php/dav/uploads/alice");
+    expect(chunkedUploadRoot("https://example.com/nc/remote.php/dav/files/alice/Vault"))
+      .toBe("https://example.com/nc/remote.php/dav/uploads/alice");
+    expect(chunkedUploadRoot("https://example.com/remote.php/webdav/")).toBeNull();
+    expect(chunkedUploadRoot("https://example.com/dav/")).toBeNull();
+  });
+  it("should name chunks so they sort in order", () => {
+    const names = [1, 2, 10, 100, 12345].map(chunkName);
+    expect(names).toStrictEqual(["00001", "00002", "00010", "00100", "12345"]);
+    expect(names.slice().sort()).toStrictEqual(names);
+  });
+  it("should resolve and encode paths against the server URL", () => {
+    expect(resolveUrl("https://example.com/remote.php/dav/files/alice/", "/vault/Tom & Jerry.pdf"))
+      .toBe("https://example.com/remote.php/dav/files/alice/vault/Tom%20%26%20Jerry.pdf");
+    expect(resolveUrl("https://example.com/dav", "vault//a.md")).toBe("https://example.com/dav/vault/a.md");
+  });
+});
@@ -0,0 +1,189 @@
+import {
+  ACTION_OVERHEAD,
+  describeProgress,
+  formatBytes,
+  formatDuration,
+  ProgressTracker,
+  throttleProgress
+} from "../src/sync/progress";
+import { ActionedItem, Status } from "../src/sync/status";
+
+class Clock {
+  time = 0;
+  now = () => this.time;
+}
+
+describe("ProgressTracker", () => {
+  it("Should weight progress by bytes", () => {
+    const clock = new Clock();
+    const tracker = new ProgressTracker(clock.now);
+    tracker.plan("big.bin", 1024 * 1024);
+    tracker.plan("small.md", 0);
+    tracker.start();
+
+    tracker.complete("small.md");
+    const afterSmall = tracker.item("small.md");
+    expect(afterSmall.lastProgress).toBeLessThan(5);
+    expect(afterSmall.bytesDone).toBe(0);
+    expect(afterSmall.bytesTotal).toBe(1024 * 1024);
+
+    tracker.advance("big.bin", 512 * 1024);
+    const half = tracker.item("big.bin");
+    expect(half.bytesDone).toBe(512 * 1024);
+    expect(half.lastProgress).toBeGreaterThan(45);
+    expect(half.lastProgress).toBeLessThan(55);
+
+    tracker.complete("big.bin");
+    const done = tracker.item("big.bin");
+    expect(done.lastProgress).toBe(100);
+    expect(done.bytesDone).toBe(1024 * 1024);
+    expect(done.eta).toBe(0);
+  });
+
+  it("Should not count progress twice", () => {
+    const tracker = new ProgressTracker(new Clock().now);
+    tracker.plan("a", 1000);
+    tracker.start();
+    tracker.advance("a", 600);
+    // Retried chunks report progress that's already been counted
+    tracker.advance("a", 400);
+    // Servers can report more than expected if the file changed
+    tracker.advance("a", 5000);
+    expect(tracker.item("a").bytesDone).toBe(1000);
+    tracker.complete("a");
+    expect(tracker.item("a").bytesDone).toBe(1000);
+  });
+
+  it("Should drop skipped files from the total", () => {
+    const tracker = new ProgressTracker(new Clock().now);
+    tracker.plan("a", 1000);
+    tracker.plan("b", 1000);
+    tracker.start();
+    tracker.complete("a");
+    tracker.skip("b");
+    const item = tracker.item("a");
+    expect(item.bytesTotal).toBe(1000);
+    expect(item.lastProgress).toBe(100);
+  });
+
+  it("Should count actions without bytes", () => {
+    const tracker = new ProgressTracker(new Clock().now);
+    for (let i = 0; i < 4; ++i) {
+      tracker.plan(`${i}.md`, 0);
+    }
+    tracker.start();
+    tracker.complete("0.md");
+    expect(tracker.item("0.md").lastProgress).toBe(25);
+    expect(tracker.totalWeight).toBe(4 * ACTION_OVERHEAD);
+  });
+
+  it("Should calculate throughput and ETA", () => {
+    const clock = new Clock();
+    const tracker = new ProgressTracker(clock.now);
+    tracker.plan("a", 10 * 1024 * 1024);
+    tracker.start();
+    expect(tracker.item("a").eta).toBeNull();
+
+    clock.time = 1000;
+    tracker.advance("a", 1024 * 1024);
+    const item = tracker.item("a");
+    expect(item.throughput).toBe(1024 * 1024);
+    // Nine MiB to go, plus the overhead
+    expect(item.eta).toBeCloseTo(9 + ACTION_OVERHEAD / (1024 * 1024), 3);
+  });
+
+  it("Should only average throughput over recent samples", () => {
+    const clock = new Clock();
+    const tracker = new ProgressTracker(clock.now);
+    tracker.plan("a", 100 * 1024 * 1024);
+    tracker.start();
+    // Fast start
+    clock.time = 1000;
+    tracker.advance("a", 50 * 1024 * 1024);
+    // Then it slows down to 1 KiB/s
+    for (let i = 1; i <= 20; ++i) {
+      clock.time = 1000 + i * 1000;
+      tracker.advance("a", 50 * 1024 * 1024 + i * 1024);
+    }
+    const item = tracker.item("a");
+    expect(item.throughput).toBeGreaterThan(1000);
+    expect(item.throughput).toBeLessThan(1100);
+  });
+});
+
+async function* statuses(items: Status[]): AsyncGenerator<Status> {
+  for (const item of items) {
+    yield item;
+  }
+}
+
+async function collect(gen: AsyncGenerator<Status>): Promise<Status[]> {
+  const out: Status[] = [];
+  for await (const item of gen) {
+    out.push(item);
+  }
+  return out;
+}
+
+function progress(file: string): Status {
+  return { result: { lastFile: file, lastProgress: 0 } };
+}
+
+describe("throttleProgress", () => {
+  it("Should coalesce reports within an interval", async () => {
+    const clock = new Clock();
+    const input = [progress("a"), progress("b"), progress("c"), progress("d")];
+    async function* timed(): AsyncGenerator<Status> {
+      for (let i = 0; i < input.length; ++i) {
+        clock.time = i * 40;
+        yield input[i];
+      }
+    }
+    const out = await collect(throttleProgress(timed(), 100, clock.now));
+    // a at 0, c at 80 is too early, d at 120 passes
+    expect(out.map(status => (status.result as ActionedItem).lastFile)).toEqual(["a", "d"]);
+  });
+
+  it("Should always pass the last report and the result through", async () => {
+    const clock = new Clock();
+    const result: Status = { result: { actionedCount: 2, actionedFolders: 0, errorCount: 0 } };
+    const out = await collect(throttleProgress(
+      statuses([progress("a"), progress("b"), result]),
+      100,
+      clock.now
+    ));
+    expect(out).toEqual([progress("a"), progress("b"), result]);
+  });
+
+  it("Should flush the held report at the end", async () => {
+    const clock = new Clock();
+    const out = await collect(throttleProgress(statuses([progress("a"), progress("b")]), 100, clock.now));
+    expect(out).toEqual([progress("a"), progress("b")]);
+  });
+});
+
+describe("Formatting", () => {
+  it("Should format bytes", () => {
+    expect(formatBytes(512)).toBe("512 B");
+    expect(formatBytes(1536)).toBe("1.5 KiB");
+    expect(formatBytes(3 * 1024 * 1024 * 1024)).toBe("3.0 GiB");
+  });
+
+  it("Should format durations", () => {
+    expect(formatDuration(4.2)).toBe("5 s");
+    expect(formatDuration(125)).toBe("2 min 5 s");
+    expect(formatDuration(7260)).toBe("2 h 1 min");
+  });
+
+  it("Should leave out unknowns", () => {
+    expect(describeProgress({ lastFile: "a", lastProgress: 42.7 })).toBe("42%");
+    expect(describeProgress({
+      lastFile: "a",
+      lastProgress: 50,
+      bytesDone: 1024,
+      bytesTotal: 2048,
+      throughput: 512,
+      eta: 2,
+    })).toBe("50%, 1.0 KiB of 2.0 KiB, 512 B/s, about 2 s left");
+  });
+});
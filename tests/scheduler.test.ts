@@ -0,0 +1,201 @@
+import { AutoSyncOptions, AutoSyncScheduler, SchedulerTimers, SyncLock } from "../src/sync/scheduler";
+import { SyncDir } from "../src/sync/syncdir";
+
+/**
+ * Manually advanced timers, so the tests don't depend on wall time.
+ */
+class FakeTimers implements SchedulerTimers {
+  time = 0;
+  nextId = 1;
+  timers: Map<number, { at: number, callback: () => void, interval: number | null }> = new Map();
+
+  setTimeout(callback: () => void, ms: number): number {
+    const id = this.nextId++;
+    this.timers.set(id, { at: this.time + ms, callback, interval: null });
+    return id;
+  }
+  clearTimeout(id: number) {
+    this.timers.delete(id);
+  }
+  setInterval(callback: () => void, ms: number): number {
+    const id = this.nextId++;
+    this.timers.set(id, { at: this.time + ms, callback, interval: ms });
+    return id;
+  }
+  clearInterval(id: number) {
+    this.timers.delete(id);
+  }
+  now() {
+    return this.time;
+  }
+
+  async advance(ms: number) {
+    const end = this.time + ms;
+    for (;;) {
+      let nextId: number | null = null;
+      for (const [id, timer] of this.timers) {
+        if (timer.at <= end && (nextId == null || timer.at < this.timers.get(nextId)!.at)) {
+          nextId = id;
+        }
+      }
+      if (nextId == null) {
+        break;
+      }
+      const timer = this.timers.get(nextId)!;
+      this.time = timer.at;
+      if (timer.interval == null) {
+        this.timers.delete(nextId);
+      } else {
+        timer.at += timer.interval;
+      }
+      timer.callback();
+      // Let the sync promises settle
+      for (let i = 0; i < 10; ++i) {
+        await Promise.resolve();
+      }
+    }
+    this.time = end;
+  }
+}
+
+const OPTIONS: AutoSyncOptions = {
+  pushDelay: 1000,
+  maxPushDelay: 5000,
+  pullInterval: 60000,
+  pullOnFocus: true,
+};
+
+/**
+ * Lets a sync started outside a timer callback finish, and release the lock.
+ */
+async function flushSyncs() {
+  for (let i = 0; i < 10; ++i) {
+    await Promise.resolve();
+  }
+}
+
+function setup() {
+  const timers = new FakeTimers();
+  const lock = new SyncLock();
+  const runs: SyncDir[] = [];
+  const scheduler = new AutoSyncScheduler(lock, async (direction) => {
+    runs.push(direction);
+  }, timers);
+  scheduler.configure(OPTIONS);
+  return { timers, lock, runs, scheduler };
+}
+
+describe("AutoSyncScheduler", () => {
+  it("should coalesce bursts of changes into one push", async () => {
+    const { timers, runs, scheduler } = setup();
+    for (let i = 0; i < 5; ++i) {
+      scheduler.notifyChange();
+      await timers.advance(500);
+    }
+    expect(runs).toEqual([]);
+    await timers.advance(1000);
+    expect(runs).toEqual([SyncDir.UP]);
+  });
+
+  it("should not postpone pushes past the max delay", async () => {
+    const { timers, runs, scheduler } = setup();
+    for (let i = 0; i < 12; ++i) {
+      scheduler.notifyChange();
+      await timers.advance(500);
+    }
+    expect(runs).toEqual([SyncDir.UP]);
+  });
+
+  it("should pull on an interval", async () => {
+    const { timers, runs } = setup();
+    await timers.advance(60000);
+    expect(runs).toEqual([SyncDir.DOWN]);
+    await timers.advance(60000);
+    expect(runs).toEqual([SyncDir.DOWN, SyncDir.DOWN]);
+  });
+
+  it("should pull on focus, at most once per cooldown", async () => {
+    const { timers, runs, scheduler } = setup();
+    scheduler.configure({ ...OPTIONS, pullInterval: 0 });
+    scheduler.notifyFocus();
+    expect(runs).toEqual([SyncDir.DOWN]);
+    await timers.advance(30000);
+    scheduler.notifyFocus();
+    expect(runs).toEqual([SyncDir.DOWN]);
+    await timers.advance(30000);
+    scheduler.notifyFocus();
+    expect(runs).toEqual([SyncDir.DOWN, SyncDir.DOWN]);
+  });
+
+  it("should wait for the lock, and never run two syncs at once", async () => {
+    const { timers, lock, runs, scheduler } = setup();
+    expect(lock.tryAcquire(SyncDir.UP)).toBe(true);
+    scheduler.notifyChange();
+    await timers.advance(1000);
+    scheduler.request(SyncDir.DOWN);
+    scheduler.request(SyncDir.DOWN);
+    expect(runs).toEqual([]);
+
+    lock.release();
+    await timers.advance(0);
+    expect(runs).toEqual([SyncDir.UP, SyncDir.DOWN]);
+    expect(lock.busy).toBe(false);
+  });
+
+  it("should push waiting changes before pulling on focus", async () => {
+    const { timers, runs, scheduler } = setup();
+    scheduler.notifyChange("new.md");
+    await timers.advance(500);
+    scheduler.notifyFocus();
+    expect(runs).toEqual([SyncDir.UP]);
+
+    // The pull runs once the push is done, and the push isn't repeated once the debounce would've run out
+    await flushSyncs();
+    await timers.advance(10000);
+    expect(runs).toEqual([SyncDir.UP, SyncDir.DOWN]);
+  });
+
+  it("should ignore changes made by a pull", async () => {
+    const { timers, lock, runs, scheduler } = setup();
+    lock.tryAcquire(SyncDir.DOWN);
+    lock.written.add("pulled.md");
+    scheduler.notifyChange("pulled.md");
+    lock.release();
+    await timers.advance(10000);
+    expect(runs).toEqual([]);
+  });
+
+  it("should push changes made by the user during a pull", async () => {
+    const { timers, lock, runs, scheduler } = setup();
+    lock.tryAcquire(SyncDir.DOWN);
+    lock.written.add("pulled.md");
+    scheduler.notifyChange("edited.md");
+    await timers.advance(10000);
+    expect(runs).toEqual([]);
+
+    lock.release();
+    await timers.advance(0);
+    expect(runs).toEqual([SyncDir.UP]);
+  });
+
+  it("should forget what a previous sync wrote", async () => {
+    const { timers, lock, runs, scheduler } = setup();
+    lock.tryAcquire(SyncDir.DOWN);
+    lock.written.add("pulled.md");
+    lock.release();
+    lock.tryAcquire(SyncDir.DOWN);
+    scheduler.notifyChange("pulled.md");
+    lock.release();
+    await timers.advance(10000);
+    expect(runs).toEqual([SyncDir.UP]);
+  });
+
+  it("should do nothing once disabled", async () => {
+    const { timers, runs, scheduler } = setup();
+    scheduler.notifyChange();
+    scheduler.configure(null);
+    scheduler.notifyFocus();
+    await timers.advance(120000);
+    expect(runs).toEqual([]);
+  });
+});
@@ -9,7 +9,9 @@ import {
   findDeletedFolders,
   Folder,
   OnUpdateCallback,
+  planDeletions,
   runSync,
+  UpdateContext,
 } from "../src/sync/sync"
 import { SyncDir } from "../src/sync/syncdir";
 import { fromAsync } from "./util/collectAsync";
@@ -422,9 +424,77 @@ describe("Folders", () => {
     expect(selfReported.errorCount).toBe(0);
 
     expect(testData.upload.length).toBe(0);
-    expect(testData.remove.length).toBe(2);
+    // test/topfolder/Index.md is removed along with test/topfolder, rather than separately
+    expect(testData.remove).toStrictEqual(["test/topfolder"]);
     expect(testData.conflict.length).toBe(0);
   });
+  test("Covered files should be reported with the folder, or deleted one by one if it fails", async () => {
+    const actions = calculateSyncActions(src.files, dest.files, ".obsidian").actions as Actions;
+    for (const folderFails of [false, true]) {
+      const removed: string[] = [];
+      const contexts: (UpdateContext | undefined)[] = [];
+      const errors: string[] = [];
+      const it = await fromAsync<Status>(
+        runSync.bind(
+          this,
+          SyncDir.UP,
+          src,
+          dest,
+          actions,
+          (err: string) => { errors.push(err); },
+          async (type, path, _localData, remoteData, context) => {
+            if (folderFails && remoteData == null) {
+              throw new Error("DELETE failed");
+            }
+            removed.push(path);
+            contexts.push(context);
+          },
+          addOnConflict,
+          false
+        )
+      );
+      const result = it[it.length - 1].result as SyncResult;
+      if (folderFails) {
+        expect(removed).toStrictEqual(["test/topfolder/Index.md"]);
+        expect(result.actionedFolders).toBe(0);
+        expect(result.errorCount).toBe(1);
+      } else {
+        expect(removed).toStrictEqual(["test/topfolder"]);
+        expect(contexts).toStrictEqual([{ covered: ["test/topfolder/Index.md"] }]);
+        expect(result.errorCount).toBe(0);
+      }
+      expect(result.actionedCount).toBe(1);
+    }
+  });
+})
+
+test("Deleted subtrees should be planned as one deletion each", () => {
+  const src = [
+    lazyFolder("a"),
+  ];
+  const dest = [
+    lazyFolder("a"),
+    lazyFolder("a/b"),
+    lazyFolder("a/b/c"),
+    lazyFolder("a/b/d"),
+    lazyFolder("e"),
+  ];
+  const actions: Actions = new Map([
+    ["a/keep.md", ActionType.ADD],
+    ["a/gone.md", ActionType.REMOVE],
+    ["a/b/1.md", ActionType.REMOVE],
+    ["a/b/c/2.md", ActionType.REMOVE],
+    ["e/3.md", ActionType.REMOVE],
+  ]);
+  const plan = planDeletions(src, dest, actions);
+  expect(plan.roots.map(folder => folder.commonPath).sort()).toStrictEqual(["a/b", "e"]);
+  expect(plan.covered).toStrictEqual(new Map([
+    ["a/b/1.md", "a/b"],
+    ["a/b/c/2.md", "a/b"],
+    ["e/3.md", "e"],
+  ]));
+  expect(plan.folderCounts.get("a/b")).toBe(3);
+  expect(plan.folderCounts.get("e")).toBe(1);
 })
 
 test("Nested folders should not cause deletion exceptions", () => {
@@ -445,3 +515,97 @@ test("Nested folders should not cause deletion exceptions", () => {
     lazyFolder("test/subfolder"),
   ])
 })
+
+describe("Parallel transfers", () => {
+  const src = new Map<string, FileData>();
+  for (let i = 0; i < 10; ++i) {
+    src.set(`file${i}.md`, { lastModified: Date.parse("2025-06-21T00:00:00Z") } as FileData);
+  }
+  const actionResult = calculateSyncActions(src, new Map(), ".obsidian");
+  const actions = actionResult.actions as Actions;
+
+  test("Should never exceed the concurrency limit", async () => {
+    const testData = lazyTestData();
+    let inFlight = 0;
+    let maxInFlight = 0;
+    const it = await fromAsync<Status>(
+      runSync.bind(
+        this,
+        SyncDir.UP,
+        nofolders(src),
+        nofolders(new Map()),
+        actions,
+        failHardOnError,
+        onUpdate.bind(this, testData, async () => {
+          inFlight += 1;
+          maxInFlight = Math.max(maxInFlight, inFlight);
+          await new Promise(resolve => setTimeout(resolve, 5));
+          inFlight -= 1;
+        }),
+        addOnConflict,
+        false,
+        3
+      )
+    );
+
+    expect(maxInFlight).toBe(3);
+    expect(it.length).toBe(21);
+    expect(testData.upload.length).toBe(10);
+    const selfReported = it[it.length - 1].result as SyncResult;
+    expect(selfReported.actionedCount).toBe(10);
+    expect(selfReported.errorCount).toBe(0);
+  });
+
+  test("Should drain in-flight transfers before resolving conflicts", async () => {
+    const conflictActions: Actions = new Map(actions);
+    conflictActions.set("file5.md", ActionType.ADD_LOCAL);
+    let inFlight = 0;
+    const it = await fromAsync<Status>(
+      runSync.bind(
+        this,
+        SyncDir.UP,
+        nofolders(src),
+        nofolders(new Map()),
+        conflictActions,
+        failHardOnError,
+        onUpdate.bind(this, lazyTestData(), async () => {
+          inFlight += 1;
+          await new Promise(resolve => setTimeout(resolve, 5));
+          inFlight -= 1;
+        }),
+        async () => {
+          expect(inFlight).toBe(0);
+          return ActionType.ADD;
+        },
+        false,
+        4
+      )
+    );
+    const selfReported = it[it.length - 1].result as SyncResult;
+    expect(selfReported.actionedCount).toBe(10);
+  });
+
+  test("Should keep counting errors", async () => {
+    const it = await fromAsync<Status>(
+      runSync.bind(
+        this,
+        SyncDir.UP,
+        nofolders(src),
+        nofolders(new Map()),
+        actions,
+        () => {},
+        async (_type: ActionType, path: string) => {
+          if (path == "file3.md" || path == "file7.md") {
+            throw new Error("Simulated failure");
+          }
+        },
+        addOnConflict,
+        false,
+        4
+      )
+    );
+    const selfReported = it[it.length - 1].result as SyncResult;
+    expect(selfReported.actionedCount).toBe(8);
+    expect(selfReported.errorCount).toBe(2);
+  });
+});
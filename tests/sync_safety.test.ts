@@ -103,4 +103,25 @@ describe("calculateSyncActions", () => {
     expect(actionResult.error).toBeNull();
     expect(actionResult.actions).not.toBeNull();
   });
+  it("should allow syncs to an empty destination", () => {
+    let src = new Map<string, FileData>([
+      [".obsidian/plugins/webdav-sync/index.js", { lastModified: Date.parse("2025-06-21T00:00:00Z") } as FileData],
+      ["Index.md", { lastModified: Date.parse("2025-06-21T00:00:00Z") } as FileData],
+    ]);
+    const actionResult = calculateSyncActions(src, new Map(), ".obsidian", false, false, true);
+    expect(actionResult.error).toBeNull();
+    expect(actionResult.actions?.size).toStrictEqual(2);
+  });
+  it("should allow vaults that only have config files", () => {
+    let src = new Map<string, FileData>([
+      [".obsidian/app.json", { lastModified: Date.parse("2025-06-22T00:00:00Z") } as FileData],
+    ]);
+    const dest = new Map([
+      [".obsidian/app.json", { lastModified: Date.parse("2025-06-21T00:00:00Z") } as FileData],
+      [".obsidian/plugins/webdav-sync/index.js", { lastModified: Date.parse("2025-06-21T00:00:00Z") } as FileData],
+    ]);
+    const actionResult = calculateSyncActions(src, dest, ".obsidian", false, false, true);
+    expect(actionResult.error).toBeNull();
+    expect(actionResult.actions?.get(".obsidian/plugins/webdav-sync/index.js")).toStrictEqual(ActionType.REMOVE);
+  });
 });
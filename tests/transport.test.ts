@@ -0,0 +1,140 @@
+import {
+  AdaptiveLimiter,
+  backoffDelay,
+  DEFAULT_RETRY_POLICY,
+  emptyTransportStats,
+  parseRetryAfter,
+  runRequest,
+} from "../src/fs/transport";
+
+function httpError(status: number, retryAfter: string | null = null) {
+  return Object.assign(new Error(`Invalid response: ${status}`), {
+    status,
+    response: {
+      headers: {
+        get: (name: string) => name == "Retry-After" ? retryAfter : null
+      }
+    }
+  });
+}
+
+describe("Retry-After", () => {
+  it("should parse both seconds and dates", () => {
+    expect(parseRetryAfter("120")).toBe(120000);
+    const now = Date.parse("2025-06-21T00:00:00Z");
+    expect(parseRetryAfter("Sat, 21 Jun 2025 00:00:30 GMT", now)).toBe(30000);
+    expect(parseRetryAfter("soon")).toBeNull();
+    expect(parseRetryAfter(null)).toBeNull();
+  });
+  it("should keep backoff within the exponential ceiling", () => {
+    expect(backoffDelay(0, DEFAULT_RETRY_POLICY, () => 1)).toBe(500);
+    expect(backoffDelay(3, DEFAULT_RETRY_POLICY, () => 1)).toBe(4000);
+    expect(backoffDelay(20, DEFAULT_RETRY_POLICY, () => 1)).toBe(DEFAULT_RETRY_POLICY.maxDelay);
+    expect(backoffDelay(3, DEFAULT_RETRY_POLICY, () => 0)).toBe(0);
+  });
+});
+
+describe("runRequest", () => {
+  it("should retry throttled idempotent requests, honouring Retry-After", async () => {
+    const limiter = new AdaptiveLimiter(8);
+    const stats = emptyTransportStats();
+    const waits: number[] = [];
+    let calls = 0;
+    const result = await runRequest("stat", [], async () => {
+      calls++;
+      if (calls < 3) {
+        throw httpError(429, "2");
+      }
+      return "ok";
+    }, limiter, DEFAULT_RETRY_POLICY, async (ms) => { waits.push(ms); }, stats);
+
+    expect(result).toBe("ok");
+    expect(waits).toStrictEqual([2000, 2000]);
+    expect(stats).toStrictEqual({ requests: 3, retries: 2, failures: 0, methods: { PROPFIND: 3 } });
+    // Halved twice, then grown slightly by the success
+    expect(limiter.limit).toBeLessThan(3);
+    expect(limiter.inFlight).toBe(0);
+  });
+  it("should not retry non-idempotent requests or client errors", async () => {
+    const limiter = new AdaptiveLimiter(8);
+    let calls = 0;
+    const failing = async () => {
+      calls++;
+      throw httpError(503);
+    };
+    await expect(runRequest("moveFile", [], failing, limiter, DEFAULT_RETRY_POLICY, async () => {}))
+      .rejects.toThrow("503");
+    expect(calls).toBe(1);
+
+    calls = 0;
+    await expect(runRequest("stat", [], async () => {
+      calls++;
+      throw httpError(404);
+    }, limiter, DEFAULT_RETRY_POLICY, async () => {})).rejects.toThrow("404");
+    expect(calls).toBe(1);
+    expect(limiter.inFlight).toBe(0);
+  });
+  it("should give up after the retry limit", async () => {
+    const limiter = new AdaptiveLimiter(8);
+    let calls = 0;
+    await expect(runRequest("customRequest", ["/", { method: "PROPFIND" }], async () => {
+      calls++;
+      throw new TypeError("Failed to fetch");
+    }, limiter, DEFAULT_RETRY_POLICY, async () => {})).rejects.toThrow("Failed to fetch");
+    expect(calls).toBe(DEFAULT_RETRY_POLICY.maxRetries + 1);
+  });
+  it("should count requests by HTTP method", async () => {
+    const limiter = new AdaptiveLimiter(8);
+    const stats = emptyTransportStats();
+    const ok = async () => "ok";
+    await runRequest("getDirectoryContents", ["/"], ok, limiter, DEFAULT_RETRY_POLICY, async () => {}, stats);
+    await runRequest("putFileContents", ["/a.md"], ok, limiter, DEFAULT_RETRY_POLICY, async () => {}, stats);
+    await runRequest("customRequest", ["/a.md", { method: "patch" }], ok, limiter, DEFAULT_RETRY_POLICY,
+      async () => {}, stats);
+    await runRequest("customRequest", ["/"], ok, limiter, DEFAULT_RETRY_POLICY, async () => {}, stats);
+    expect(stats.methods).toStrictEqual({ PROPFIND: 1, PUT: 1, PATCH: 1, GET: 1 });
+  });
+});
+
+describe("AdaptiveLimiter", () => {
+  it("should cap requests in flight at the limit", async () => {
+    const limiter = new AdaptiveLimiter(2);
+    let inFlight = 0;
+    let maxInFlight = 0;
+    const requests = [];
+    for (let i = 0; i < 6; ++i) {
+      requests.push(runRequest("getFileContents", [], async () => {
+        inFlight++;
+        maxInFlight = Math.max(maxInFlight, inFlight);
+        await new Promise(resolve => setTimeout(resolve, 2));
+        inFlight--;
+      }, limiter));
+    }
+    await Promise.all(requests);
+    expect(maxInFlight).toBe(2);
+  });
+  it("should back off when latency climbs", () => {
+    const limiter = new AdaptiveLimiter(10);
+    limiter.onSuccess("stat", 50);
+    expect(limiter.limit).toBe(10);
+    limiter.onSuccess("stat", 500);
+    expect(limiter.limit).toBe(9);
+    // Transfers aren't used for the latency signal
+    limiter.onSuccess("getFileContents", 5000);
+    expect(limiter.limit).toBeGreaterThan(9);
+  });
+  it("should not be pinned down by one fast request", () => {
+    const limiter = new AdaptiveLimiter(10);
+    limiter.onSuccess("stat", 5);
+    for (let i = 0; i < 20; ++i) {
+      limiter.onSuccess("stat", 100);
+    }
+    const low = limiter.limit;
+    expect(low).toBeLessThan(10);
+    // Once the baseline has caught up with the usual latency, the limit grows back
+    for (let i = 0; i < 100; ++i) {
+      limiter.onSuccess("stat", 100);
+    }
+    expect(limiter.limit).toBe(10);
+  });
+});
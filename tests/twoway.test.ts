@@ -0,0 +1,207 @@
+import { ActionType } from "../src/sync/actiontype";
+import { Content, FileData, Files, runSync, UpdateContext } from "../src/sync/sync";
+import { ManifestEntries } from "../src/sync/manifest";
+import { calculateTwoWayActions } from "../src/sync/twoway";
+import { SyncDir } from "../src/sync/syncdir";
+
+function file(date: string, size: number = 10, etag: string | null = null): FileData {
+  return {
+    lastModified: Date.parse(date),
+    size,
+    etag,
+  };
+}
+
+const OLD = "2025-06-21T00:00:00Z";
+const NEW = "2025-06-22T00:00:00Z";
+
+describe("calculateTwoWayActions", () => {
+  const base: ManifestEntries = new Map([
+    ["unchanged.md", { local: file(OLD), remote: file(OLD, 10, "u") }],
+    ["local-edit.md", { local: file(OLD), remote: file(OLD, 10, "l") }],
+    ["remote-edit.md", { local: file(OLD), remote: file(OLD, 10, "r") }],
+    ["both-edit.md", { local: file(OLD), remote: file(OLD, 10, "b") }],
+    ["local-delete.md", { local: file(OLD), remote: file(OLD, 10, "ld") }],
+    ["remote-delete.md", { local: file(OLD), remote: file(OLD, 10, "rd") }],
+    ["delete-vs-edit.md", { local: file(OLD), remote: file(OLD, 10, "de") }],
+  ]);
+
+  it("should send each change in the right direction", () => {
+    const local: Files = new Map([
+      ["unchanged.md", file(OLD)],
+      ["local-edit.md", file(NEW, 12)],
+      ["remote-edit.md", file(OLD)],
+      ["both-edit.md", file(NEW, 12)],
+      ["remote-delete.md", file(OLD)],
+      ["delete-vs-edit.md", file(NEW, 12)],
+      ["local-new.md", file(NEW)],
+    ]);
+    const remote: Files = new Map([
+      ["unchanged.md", file(OLD, 10, "u")],
+      ["local-edit.md", file(OLD, 10, "l")],
+      ["remote-edit.md", file(NEW, 14, "r2")],
+      ["both-edit.md", file(NEW, 14, "b2")],
+      ["local-delete.md", file(OLD, 10, "ld")],
+      ["remote-new.md", file(NEW, 10, "n")],
+    ]);
+    const result = calculateTwoWayActions(local, remote, base, ".obsidian");
+    expect(result.error).toBeNull();
+    const actions = Array.from(result.actions!.entries()).sort();
+    expect(actions).toEqual([
+      ["both-edit.md", ActionType.ADD_LOCAL],
+      ["delete-vs-edit.md", ActionType.ADD],
+      ["local-delete.md", ActionType.REMOVE],
+      ["local-edit.md", ActionType.ADD],
+      ["local-new.md", ActionType.ADD],
+      ["remote-delete.md", ActionType.REMOVE],
+      ["remote-edit.md", ActionType.ADD],
+      ["remote-new.md", ActionType.ADD],
+    ]);
+    const directions = result.directions!;
+    expect(directions.get("delete-vs-edit.md")).toBe(SyncDir.UP);
+    expect(directions.get("local-delete.md")).toBe(SyncDir.UP);
+    expect(directions.get("local-edit.md")).toBe(SyncDir.UP);
+    expect(directions.get("local-new.md")).toBe(SyncDir.UP);
+    expect(directions.get("remote-delete.md")).toBe(SyncDir.DOWN);
+    expect(directions.get("remote-edit.md")).toBe(SyncDir.DOWN);
+    expect(directions.get("remote-new.md")).toBe(SyncDir.DOWN);
+  });
+
+  it("should not flag identical files without a base as conflicts", () => {
+    const result = calculateTwoWayActions(
+      new Map([["a.md", file(OLD)], ["b.md", file(OLD)]]),
+      new Map([["a.md", file(OLD, 10, "a")], ["b.md", file(NEW, 10, "b")]]),
+      new Map(),
+      ".obsidian",
+    );
+    expect(Array.from(result.actions!.entries())).toEqual([["b.md", ActionType.ADD]]);
+    expect(result.directions!.get("b.md")).toBe(SyncDir.DOWN);
+  });
+
+  it("should send the newer copy of files without a base", () => {
+    const result = calculateTwoWayActions(
+      new Map([["local-newer.md", file(NEW)], ["remote-newer.md", file(OLD)], ["same-date.md", file(OLD, 12)]]),
+      new Map([
+        ["local-newer.md", file(OLD, 10, "l")],
+        ["remote-newer.md", file(NEW, 10, "r")],
+        ["same-date.md", file(OLD, 10, "s")],
+      ]),
+      new Map(),
+      ".obsidian",
+    );
+    expect(Array.from(result.actions!.entries()).sort()).toEqual([
+      ["local-newer.md", ActionType.ADD],
+      ["remote-newer.md", ActionType.ADD],
+      ["same-date.md", ActionType.ADD_LOCAL],
+    ]);
+    expect(result.directions!.get("local-newer.md")).toBe(SyncDir.UP);
+    expect(result.directions!.get("remote-newer.md")).toBe(SyncDir.DOWN);
+  });
+
+  it("should block wipes on either side", () => {
+    const result = calculateTwoWayActions(
+      new Map([[".obsidian/app.json", file(OLD)]]),
+      new Map([[".obsidian/app.json", file(OLD, 10, "c")], ["a.md", file(OLD, 10, "a")]]),
+      new Map([
+        [".obsidian/app.json", { local: file(OLD), remote: file(OLD, 10, "c") }],
+        ["a.md", { local: file(OLD), remote: file(OLD, 10, "a") }],
+      ]),
+      ".obsidian",
+    );
+    expect(result.error).not.toBeNull();
+  });
+});
+
+describe("runSync in two-way mode", () => {
+  it("should swap the data for actions in the reverse direction", async () => {
+    const local: Content = {
+      files: new Map([
+        ["up.md", file(NEW)],
+        ["Gone/a.md", file(OLD)],
+        ["Gone/Deeper/b.md", file(OLD)],
+      ]),
+      folderPaths: [
+        { realPath: "Gone", commonPath: "Gone" },
+        { realPath: "Gone/Deeper", commonPath: "Gone/Deeper" },
+        { realPath: "Empty", commonPath: "Empty" },
+      ],
+    };
+    const remote: Content = {
+      files: new Map([
+        ["down.md", file(NEW, 10, "d")],
+      ]),
+      folderPaths: [],
+    };
+    const calls: [ActionType, string, FileData | undefined, UpdateContext | undefined][] = [];
+    let result = null;
+    for await (const status of runSync(
+      SyncDir.UP,
+      local,
+      remote,
+      new Map([
+        ["up.md", ActionType.ADD],
+        ["down.md", ActionType.ADD],
+        ["Gone/a.md", ActionType.REMOVE],
+        ["Gone/Deeper/b.md", ActionType.REMOVE],
+      ]),
+      () => {},
+      async (type, path, srcData, _destData, context) => {
+        calls.push([type, path, srcData, context]);
+      },
+      async () => ActionType.NOOP,
+      false,
+      1,
+      new Map(),
+      new Map([
+        ["up.md", SyncDir.UP],
+        ["down.md", SyncDir.DOWN],
+        ["Gone/a.md", SyncDir.DOWN],
+        ["Gone/Deeper/b.md", SyncDir.DOWN],
+      ]),
+    )) {
+      if ("actionedCount" in status.result) {
+        result = status.result;
+      }
+    }
+    // The folder only exists locally, and everything in it is removed locally, so it's deleted as one subtree. The
+    // empty folder could just as well be new, so it's left alone.
+    expect(calls).toStrictEqual([
+      [ActionType.ADD, "up.md", file(NEW), { direction: SyncDir.UP }],
+      [ActionType.ADD, "down.md", file(NEW, 10, "d"), { direction: SyncDir.DOWN }],
+      [ActionType.REMOVE, "Gone", undefined, { direction: SyncDir.DOWN, covered: ["Gone/a.md", "Gone/Deeper/b.md"] }],
+    ]);
+    expect(result).toEqual({
+      actionedCount: 4,
+      actionedFolders: 2,
+      errorCount: 0,
+    });
+  });
+
+  it("should let conflict resolution pick the direction", async () => {
+    const directions = new Map([["both.md", SyncDir.UP]]);
+    const calls: [string, FileData | undefined, UpdateContext | undefined][] = [];
+    for await (const _ of runSync(
+      SyncDir.UP,
+      { files: new Map([["both.md", file(NEW, 12)]]), folderPaths: [] },
+      { files: new Map([["both.md", file(NEW, 14, "b")]]), folderPaths: [] },
+      new Map([["both.md", ActionType.ADD_LOCAL]]),
+      () => {},
+      async (_type, path, srcData, _destData, context) => {
+        calls.push([path, srcData, context]);
+      },
+      async (path) => {
+        directions.set(path, SyncDir.DOWN);
+        return ActionType.ADD;
+      },
+      false,
+      1,
+      new Map(),
+      directions,
+    )) {
+      // ignored
+    }
+    expect(calls).toStrictEqual([
+      ["both.md", file(NEW, 14, "b"), { direction: SyncDir.DOWN }],
+    ]);
+  });
+});